@@ -1,6 +1,5 @@
 from django.contrib import admin
 from django.contrib import messages
-from django.utils import timezone
 from django.utils.html import format_html
 from django import forms
 from django.urls import path
@@ -360,67 +359,24 @@ class JournalEntryAdmin(CompanyFilterMixin, admin.ModelAdmin):
     
     def mark_as_posted(self, request, queryset):
         """Marcar asientos seleccionados como contabilizados"""
-        from django.db import transaction
+        from .services import JournalEntryPostingService
         
-        success_count = 0
-        error_count = 0
-        errors = []
-        inventory_lines_updated = 0
+        results = JournalEntryPostingService.post_entries(queryset, request.user)
         
-        for journal_entry in queryset:
-            try:
-                # Validar que el asiento esté balanceado
-                if not journal_entry.is_balanced:
-                    raise ValueError(f"Asiento {journal_entry.number} no está balanceado")
-                
-                # Validar que esté en estado borrador
-                if journal_entry.state != 'draft':
-                    raise ValueError(f"Asiento {journal_entry.number} no está en estado borrador")
-                
-                with transaction.atomic():
-                    # Cambiar estado y registrar información de contabilización
-                    journal_entry.state = 'posted'
-                    journal_entry.posted_by = request.user
-                    journal_entry.posted_at = timezone.now()
-                    journal_entry.save()
-                    
-                    # NUEVO: Actualizar inventario si es asiento de factura de compra
-                    # Usar relación directa (método robusto)
-                    if journal_entry.source_purchase_invoice:
-                        try:
-                            invoice = journal_entry.source_purchase_invoice
-                            
-                            # Verificar que la factura esté validada
-                            if invoice.status == 'validated':
-                                # Actualizar inventario de líneas con productos de inventario
-                                for line in invoice.lines.filter(
-                                    product__manages_inventory=True, 
-                                    product__product_type='product'
-                                ):
-                                    line.save()  # Activará update_inventory() 
-                                    inventory_lines_updated += 1
-                                    
-                        except Exception as inventory_error:
-                            # Log error pero continuar - el asiento se contabiliza igual
-                            print(f"Error actualizando inventario para asiento {journal_entry.number}: {inventory_error}")
-                            errors.append(f"Error inventario en {journal_entry.number}: {inventory_error}")
-                    
-                    # NUEVO: Crear movimientos bancarios para líneas que afecten cuentas bancarias
-                    bank_transactions_created = self._create_bank_transactions_from_journal_entry(
-                        journal_entry, request
-                    )
-                
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                errors.append(f"{journal_entry.number}: {str(e)}")
+        success_count = sum(1 for result in results if result['success'])
+        error_count = len(results) - success_count
+        errors = [result['error'] for result in results if result['error']]
+        errors += [warning for result in results for warning in result['warnings']]
+        inventory_lines_updated = sum(result['inventory_lines'] for result in results)
+        bank_transactions_created = sum(result['bank_transactions'] for result in results)
         
         # Mensajes de resultado mejorados
         if success_count > 0:
             message_parts = [f"{success_count} asiento(s) contabilizado(s) exitosamente"]
             if inventory_lines_updated > 0:
                 message_parts.append(f"{inventory_lines_updated} líneas de inventario actualizadas")
+            if bank_transactions_created > 0:
+                message_parts.append(f"{bank_transactions_created} movimiento(s) bancario(s) creado(s)")
             
             self.message_user(request, "✅ " + ". ".join(message_parts) + ".", messages.SUCCESS)
         
@@ -518,7 +474,7 @@ class JournalEntryAdmin(CompanyFilterMixin, admin.ModelAdmin):
         custom_urls = [
             path(
                 '<path:object_id>/print-pdf/',
-                self.admin_site.admin_view(self.print_journal_entry_pdf),
+                self.admin_site.admin_view(self.print_journal_entry_pdf, cacheable=True),
                 name='accounting_journalentry_print_pdf'
             ),
         ]
@@ -540,16 +496,44 @@ class JournalEntryAdmin(CompanyFilterMixin, admin.ModelAdmin):
                 from django.core.exceptions import PermissionDenied
                 raise PermissionDenied("No tiene permisos para ver este asiento")
         
+        filename = f"Asiento_{journal_entry.number}_{journal_entry.company.trade_name}.pdf"
+        
+        # Asientos contabilizados: renderizar una vez y servir desde el almacén de documentos
+        if journal_entry.state == JournalEntry.POSTED:
+            from apps.core.document_store import RenderedDocumentStore
+            
+            return RenderedDocumentStore.serve(
+                request,
+                'journal_entry',
+                journal_entry.pk,
+                self._journal_entry_pdf_fingerprint(journal_entry),
+                lambda: generate_journal_entry_pdf(journal_entry).getvalue(),
+                filename
+            )
+        
         # Generar PDF
         pdf_buffer = generate_journal_entry_pdf(journal_entry)
         
         # Preparar respuesta
-        filename = f"Asiento_{journal_entry.number}_{journal_entry.company.trade_name}.pdf"
         response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
         return response
     
+    def _journal_entry_pdf_fingerprint(self, journal_entry):
+        """Datos que determinan el contenido del PDF del asiento"""
+        return {
+            'entry': [
+                journal_entry.number, journal_entry.date, journal_entry.state, journal_entry.reference,
+                journal_entry.description, journal_entry.created_by_id, journal_entry.created_at,
+                journal_entry.posted_by_id, journal_entry.posted_at,
+            ],
+            'company': journal_entry.company.trade_name,
+            'lines': list(journal_entry.lines.order_by('id').values_list(
+                'account__code', 'account__name', 'description', 'debit', 'credit'
+            )),
+        }
+    
     def save_model(self, request, obj, form, change):
         """Personalizar guardado con configuración automática"""
         # Si es un nuevo asiento, configurar valores por defecto
@@ -570,61 +554,6 @@ class JournalEntryAdmin(CompanyFilterMixin, admin.ModelAdmin):
         
         super().save_model(request, obj, form, change)
     
-    def _create_bank_transactions_from_journal_entry(self, journal_entry, request):
-        """
-        Crear movimientos bancarios para líneas que afecten cuentas bancarias
-        Solo se ejecuta cuando el asiento se contabiliza (posted)
-        """
-        try:
-            # Importar servicio bancario (puede fallar si módulo no disponible)
-            from apps.banking.services import BankingIntegrationService
-            
-            # Obtener líneas que afectan cuentas bancarias
-            bank_lines = journal_entry.lines.filter(account__aux_type='bank')
-            
-            if not bank_lines.exists():
-                # No hay líneas bancarias - normal
-                return []
-            
-            transactions_created = []
-            
-            for bank_line in bank_lines:
-                try:
-                    bank_transaction = BankingIntegrationService.create_bank_transaction_from_journal_line(
-                        journal_line=bank_line,
-                        journal_entry=journal_entry
-                    )
-                    
-                    if bank_transaction:
-                        transactions_created.append(bank_transaction)
-                        
-                except Exception as line_error:
-                    # Log error pero continuar con otras líneas
-                    print(f"⚠️ Error creando BankTransaction para línea {bank_line.id}: {line_error}")
-            
-            # Mensaje informativo si se crearon transacciones
-            if transactions_created:
-                try:
-                    from django.contrib import messages
-                    messages.info(
-                        request,
-                        f"🏦 {len(transactions_created)} movimiento(s) bancario(s) creado(s) automáticamente para asiento {journal_entry.number}"
-                    )
-                except Exception:
-                    # Contexto sin mensajes (ej. pruebas)
-                    pass
-            
-            return transactions_created
-            
-        except ImportError:
-            # Módulo Banking no disponible - continuar normalmente
-            print(f"ℹ️ Módulo Banking no disponible para asiento {journal_entry.number}")
-            return []
-        except Exception as e:
-            # Error no crítico - no interrumpir flujo principal
-            print(f"⚠️ Error creando BankTransactions para asiento {journal_entry.number}: {e}")
-            return []
-    
     def _cancel_bank_transactions_from_journal_entry(self, journal_entry, request):
         """
         Anular movimientos bancarios relacionados cuando se anula el asiento
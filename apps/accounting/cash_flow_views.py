@@ -8,7 +8,7 @@ from django.utils import timezone
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from apps.core.pdf_templates import get_sample_styles, paragraph_style
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 import io
@@ -308,8 +308,8 @@ def export_cash_flow_pdf(request):
         )
         
         # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
+        styles = get_sample_styles()
+        title_style = paragraph_style(
             'CustomTitle',
             parent=styles['Heading1'],
             alignment=TA_CENTER,
@@ -318,7 +318,7 @@ def export_cash_flow_pdf(request):
             textColor=colors.HexColor('#1f4788')
         )
         
-        subtitle_style = ParagraphStyle(
+        subtitle_style = paragraph_style(
             'CustomSubtitle',
             parent=styles['Normal'],
             alignment=TA_CENTER,
@@ -327,7 +327,7 @@ def export_cash_flow_pdf(request):
             textColor=colors.HexColor('#666666')
         )
         
-        section_style = ParagraphStyle(
+        section_style = paragraph_style(
             'SectionHeader',
             parent=styles['Heading2'],
             fontSize=12,
@@ -520,7 +520,7 @@ def export_cash_flow_pdf(request):
         story.append(Spacer(1, 30))
         story.append(Paragraph(
             f"Reporte generado el {timezone.localtime(timezone.now()).strftime('%d/%m/%Y a las %H:%M')}",
-            ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.grey)
+            paragraph_style('Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.grey)
         ))
         
         # Generar PDF
@@ -164,7 +164,7 @@ def export_income_statement_pdf(request):
     from reportlab.lib import colors
     from reportlab.lib.pagesizes import letter, A4
     from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from apps.core.pdf_templates import get_sample_styles, paragraph_style
     from reportlab.lib.units import inch
     from io import BytesIO
     
@@ -185,8 +185,8 @@ def export_income_statement_pdf(request):
     elements = []
     
     # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
+    styles = get_sample_styles()
+    title_style = paragraph_style(
         'CustomTitle',
         parent=styles['Heading1'],
         fontSize=16,
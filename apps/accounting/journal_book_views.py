@@ -9,7 +9,7 @@ from django.utils import timezone
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from apps.core.pdf_templates import get_sample_styles, paragraph_style
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
@@ -233,8 +233,8 @@ def export_journal_book_pdf(request):
         )
         
         # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
+        styles = get_sample_styles()
+        title_style = paragraph_style(
             'CustomTitle',
             parent=styles['Heading1'],
             alignment=TA_CENTER,
@@ -243,7 +243,7 @@ def export_journal_book_pdf(request):
             textColor=colors.HexColor('#1f4788')
         )
         
-        subtitle_style = ParagraphStyle(
+        subtitle_style = paragraph_style(
             'CustomSubtitle',
             parent=styles['Normal'],
             alignment=TA_CENTER,
@@ -252,7 +252,7 @@ def export_journal_book_pdf(request):
             textColor=colors.HexColor('#666666')
         )
         
-        entry_header_style = ParagraphStyle(
+        entry_header_style = paragraph_style(
             'EntryHeader',
             parent=styles['Normal'],
             fontSize=10,
@@ -397,7 +397,7 @@ def export_journal_book_pdf(request):
         story.append(Spacer(1, 30))
         story.append(Paragraph(
             f"Reporte generado el {timezone.localtime(timezone.now()).strftime('%d/%m/%Y a las %H:%M')}",
-            ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.grey)
+            paragraph_style('Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.grey)
         ))
         
         # Generar PDF
@@ -7,7 +7,7 @@ from io import BytesIO
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from apps.core.pdf_templates import get_sample_styles, paragraph_style
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from django.utils import timezone
@@ -37,10 +37,10 @@ def generate_journal_entry_pdf(journal_entry):
     )
     
     # Obtener estilos
-    styles = getSampleStyleSheet()
+    styles = get_sample_styles()
     
     # Estilos personalizados
-    title_style = ParagraphStyle(
+    title_style = paragraph_style(
         'CustomTitle',
         parent=styles['Heading1'],
         fontSize=16,
@@ -49,7 +49,7 @@ def generate_journal_entry_pdf(journal_entry):
         textColor=colors.HexColor('#2c3e50')
     )
     
-    subtitle_style = ParagraphStyle(
+    subtitle_style = paragraph_style(
         'CustomSubtitle',
         parent=styles['Heading2'],
         fontSize=12,
@@ -57,7 +57,7 @@ def generate_journal_entry_pdf(journal_entry):
         textColor=colors.HexColor('#34495e')
     )
     
-    normal_style = ParagraphStyle(
+    normal_style = paragraph_style(
         'CustomNormal',
         parent=styles['Normal'],
         fontSize=10,
@@ -65,7 +65,7 @@ def generate_journal_entry_pdf(journal_entry):
     )
     
     # Estilos adicionales para tablas
-    cell_style = ParagraphStyle(
+    cell_style = paragraph_style(
         'CellStyle',
         parent=styles['Normal'],
         fontSize=9,
@@ -230,7 +230,7 @@ def generate_journal_entry_pdf(journal_entry):
     balance_status = "✓ ASIENTO BALANCEADO" if is_balanced else "✗ ASIENTO DESBALANCEADO"
     balance_color = colors.green if is_balanced else colors.red
     
-    balance_style = ParagraphStyle(
+    balance_style = paragraph_style(
         'BalanceStatus',
         parent=normal_style,
         fontSize=12,
@@ -248,7 +248,7 @@ def generate_journal_entry_pdf(journal_entry):
     story.append(Spacer(1, 20))
     
     # 5. PIE DE PÁGINA
-    footer_style = ParagraphStyle(
+    footer_style = paragraph_style(
         'Footer',
         parent=normal_style,
         fontSize=8,
@@ -25,6 +25,7 @@ Cumple con normativa contable ecuatoriana
 
 from decimal import Decimal
 from django.db import transaction
+from django.db.models import Sum
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from apps.accounting.models import JournalEntry, JournalEntryLine, ChartOfAccounts
@@ -70,16 +71,13 @@ class AutomaticJournalEntryService:
             
             # Crear asiento con transacción para atomicidad
             with transaction.atomic():
-                journal_entry = cls._create_journal_entry_header(invoice)
-                cls._create_debit_line(journal_entry, invoice)
-                cls._create_credit_lines(journal_entry, invoice)
-                
-                # NUEVO: Crear líneas de inventario y costo de ventas
-                cls._create_inventory_cost_lines(journal_entry, invoice)
-                
-                # Recalcular totales
-                journal_entry.calculate_totals()
-                
+                journal_entry, lines = cls.build_journal_entry(invoice)
+                journal_entry.save()
+                JournalEntryLine.objects.bulk_create(lines)
+
+                # Recalcular totales (bulk_create no dispara las señales de las líneas)
+                journal_entry.save(update_fields=['total_debit', 'total_credit'])
+
                 # CORRECCIÓN: Eliminada creación automática de movimientos bancarios
                 # Solo crear asiento contable, no movimiento bancario automático
                 # cls._create_bank_transaction_if_applicable(invoice, journal_entry)
@@ -116,8 +114,54 @@ class AutomaticJournalEntryService:
         return True
     
     @classmethod
-    def _create_journal_entry_header(cls, invoice):
-        """Crea el encabezado del asiento contable"""
+    def build_journal_entry(cls, invoice, cache=None):
+        """
+        Arma en memoria el asiento de una factura (sin guardar)
+
+        Args:
+            invoice: Factura validada con _validate_invoice_data
+            cache: dict opcional compartido entre facturas para resolver las
+                cuentas una sola vez por empresa (ver _cached)
+
+        Retorna: (JournalEntry, [JournalEntryLine]) con los totales ya calculados
+        """
+        journal_entry = cls._build_journal_entry_header(invoice, cache)
+        lines = cls._build_debit_lines(journal_entry, invoice, cache)
+        lines += cls._build_credit_lines(journal_entry, invoice, cache)
+
+        # Líneas de inventario y costo de ventas
+        lines += cls._build_inventory_cost_lines(journal_entry, invoice, cache)
+
+        journal_entry.total_debit = sum((line.debit for line in lines), Decimal('0.00'))
+        journal_entry.total_credit = sum((line.credit for line in lines), Decimal('0.00'))
+        return journal_entry, lines
+
+    @classmethod
+    def _cached(cls, cache, key, getter, *args):
+        """Memoriza en cache el resultado de getter(*args) (sin cache consulta siempre)"""
+        if cache is None:
+            return getter(*args)
+        if key not in cache:
+            cache[key] = getter(*args)
+        return cache[key]
+
+    @classmethod
+    def _get_default_user(cls, cache=None):
+        """Usuario por defecto para asientos de facturas sin creador"""
+        return cls._cached(
+            cache, ('default_user',), lambda: User.objects.filter(is_superuser=True).first()
+        )
+
+    @classmethod
+    def _invoice_lines(cls, invoice):
+        """Líneas de la factura con su producto, usando el prefetch si existe"""
+        if 'lines' in getattr(invoice, '_prefetched_objects_cache', {}):
+            return list(invoice.lines.all())
+        return list(invoice.lines.select_related('product'))
+
+    @classmethod
+    def _build_journal_entry_header(cls, invoice, cache=None):
+        """Arma el encabezado del asiento contable"""
         # Descripción base del asiento
         base_description = f"Venta factura #{invoice.number or invoice.id} - {invoice.customer.trade_name or invoice.customer.legal_name}"
         
@@ -131,17 +175,18 @@ class AutomaticJournalEntryService:
         else:
             description = base_description
         
-        return JournalEntry.objects.create(
+        return JournalEntry(
             company=invoice.company,
             date=invoice.date,
             reference=f"FAC-{invoice.id}",
             description=description,
-            created_by=invoice.created_by or User.objects.filter(is_superuser=True).first()
+            created_by=invoice.created_by or cls._get_default_user(cache)
         )
     
     @classmethod
-    def _create_debit_line(cls, journal_entry, invoice):
-        """Crea las líneas DEBE según forma de pago y retenciones del cliente"""
+    def _build_debit_lines(cls, journal_entry, invoice, cache=None):
+        """Arma las líneas DEBE según forma de pago y retenciones del cliente"""
+        lines = []
         # La cuenta DEBE principal es la cuenta seleccionada en la factura
         # (Caja, Banco, o Cuenta por Cobrar según forma de pago)
         debit_account = invoice.account
@@ -157,12 +202,13 @@ class AutomaticJournalEntryService:
             # Calcular retenciones
             retention_amounts = invoice.customer.calculate_retention_amounts(
                 invoice.subtotal, 
-                invoice.tax_amount
+                invoice.tax_amount,
+                invoice.date
             )
             net_amount = invoice.total - retention_amounts['iva_retention'] - retention_amounts['ir_retention']
         
         # Crear línea DEBE principal (monto neto)
-        JournalEntryLine.objects.create(
+        lines.append(JournalEntryLine(
             journal_entry=journal_entry,
             account=debit_account,
             description=f"{payment_type} - Factura {invoice.number or invoice.id}",
@@ -173,25 +219,31 @@ class AutomaticJournalEntryService:
             document_date=invoice.date,
             auxiliary_code=invoice.customer.identification,
             auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-        )
+        ))
         
         print(f"📝 Línea DEBE principal: {debit_account.code} - ${net_amount}")
         
         # Crear líneas DEBE de retenciones (si aplica)
         if invoice.customer.retention_agent:
-            cls._create_retention_debit_lines(journal_entry, invoice, retention_amounts)
+            lines += cls._build_retention_debit_lines(journal_entry, invoice, retention_amounts, cache)
+        
+        return lines
     
     @classmethod
-    def _create_retention_debit_lines(cls, journal_entry, invoice, retention_amounts):
-        """Crea las líneas DEBE para retenciones del cliente agente de retención"""
+    def _build_retention_debit_lines(cls, journal_entry, invoice, retention_amounts, cache=None):
+        """Arma las líneas DEBE para retenciones del cliente agente de retención"""
+        lines = []
         # Línea DEBE: Retención IVA por Cobrar
         if retention_amounts['iva_retention'] > 0:
             # Obtener la tarifa de IVA principal de la factura para buscar cuenta específica
             main_iva_rate = cls._get_main_iva_rate_from_invoice(invoice)
-            iva_retention_account = cls._get_iva_retention_receivable_account(invoice.company, main_iva_rate)
+            iva_retention_account = cls._cached(
+                cache, ('iva_retention', invoice.company_id, main_iva_rate),
+                cls._get_iva_retention_receivable_account, invoice.company, main_iva_rate
+            )
             if iva_retention_account:
-                rates = invoice.customer.get_retention_rates()
-                JournalEntryLine.objects.create(
+                rates = invoice.customer.get_retention_rates(invoice.date)
+                lines.append(JournalEntryLine(
                     journal_entry=journal_entry,
                     account=iva_retention_account,
                     description=f"Retención IVA {rates['iva_retention']}% por cobrar - {invoice.customer.trade_name}",
@@ -202,17 +254,20 @@ class AutomaticJournalEntryService:
                     document_date=invoice.date,
                     auxiliary_code=invoice.customer.identification,
                     auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-                )
+                ))
                 print(f"📝 Línea DEBE Retención IVA: {iva_retention_account.code} - ${retention_amounts['iva_retention']}")
             else:
                 print(f"⚠️ No se encontró cuenta 'Retención IVA por Cobrar' para empresa {invoice.company.id}")
         
         # Línea DEBE: Retención IR por Cobrar  
         if retention_amounts['ir_retention'] > 0:
-            ir_retention_account = cls._get_ir_retention_receivable_account(invoice.company)
+            ir_retention_account = cls._cached(
+                cache, ('ir_retention', invoice.company_id),
+                cls._get_ir_retention_receivable_account, invoice.company
+            )
             if ir_retention_account:
-                rates = invoice.customer.get_retention_rates()
-                JournalEntryLine.objects.create(
+                rates = invoice.customer.get_retention_rates(invoice.date)
+                lines.append(JournalEntryLine(
                     journal_entry=journal_entry,
                     account=ir_retention_account,
                     description=f"Retención IR {rates['ir_retention']}% por cobrar - {invoice.customer.trade_name}",
@@ -223,17 +278,21 @@ class AutomaticJournalEntryService:
                     document_date=invoice.date,
                     auxiliary_code=invoice.customer.identification,
                     auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-                )
+                ))
                 print(f"📝 Línea DEBE Retención IR: {ir_retention_account.code} - ${retention_amounts['ir_retention']}")
             else:
                 print(f"⚠️ No se encontró cuenta 'Retención IR por Cobrar' para empresa {invoice.company.id}")
+        
+        return lines
     
     @classmethod
-    def _create_credit_lines(cls, journal_entry, invoice):
+    def _build_credit_lines(cls, journal_entry, invoice, cache=None):
         """
-        Crea las líneas HABER (Ventas + IVA) con soporte ESTRATEGIA B
+        Arma las líneas HABER (Ventas + IVA) con soporte ESTRATEGIA B
         COMPATIBLE: Mantiene funcionalidad existente + mejoras inteligentes
         """
+        lines = []
+        
         # Calcular totales por tarifa de IVA (sin cambios)
         iva_breakdown = cls._calculate_iva_breakdown(invoice)
         
@@ -247,7 +306,7 @@ class AutomaticJournalEntryService:
         if sales_by_account:
             # NUEVO: Crear una línea HABER por cada cuenta de ventas diferente
             for account, amount in sales_by_account.items():
-                JournalEntryLine.objects.create(
+                lines.append(JournalEntryLine(
                     journal_entry=journal_entry,
                     account=account,
                     description=f"Ventas {account.name} - Factura {invoice.number or invoice.id}",
@@ -258,13 +317,15 @@ class AutomaticJournalEntryService:
                     document_date=invoice.date,
                     auxiliary_code=invoice.customer.identification,
                     auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-                )
+                ))
                 print(f"📝 Línea HABER Ventas ({account.code}): ${amount}")
         else:
             # FALLBACK: Comportamiento original si no hay productos o configuración
-            sales_account = cls._get_sales_account(invoice.company)
+            sales_account = cls._cached(
+                cache, ('sales', invoice.company_id), cls._get_sales_account, invoice.company
+            )
             if sales_account:
-                JournalEntryLine.objects.create(
+                lines.append(JournalEntryLine(
                     journal_entry=journal_entry,
                     account=sales_account,
                     description=f"Ventas - Factura {invoice.number or invoice.id}",
@@ -275,7 +336,7 @@ class AutomaticJournalEntryService:
                     document_date=invoice.date,
                     auxiliary_code=invoice.customer.identification,
                     auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-                )
+                ))
                 print(f"📝 Línea HABER Ventas (fallback): {sales_account.code} - ${invoice.subtotal}")
             else:
                 print(f"⚠️ No se encontró cuenta de ventas para empresa {invoice.company.id}")
@@ -292,9 +353,11 @@ class AutomaticJournalEntryService:
         
         for iva_rate, iva_amount in iva_breakdown.items():
             if iva_amount > 0 and iva_rate > 0:
-                iva_account = cls._get_iva_account(invoice.company, iva_rate)
+                iva_account = cls._cached(
+                    cache, ('iva', invoice.company_id, iva_rate), cls._get_iva_account, invoice.company, iva_rate
+                )
                 if iva_account:
-                    JournalEntryLine.objects.create(
+                    lines.append(JournalEntryLine(
                         journal_entry=journal_entry,
                         account=iva_account,
                         description=f"IVA {iva_rate}% - Factura {invoice.number or invoice.id}",
@@ -305,17 +368,19 @@ class AutomaticJournalEntryService:
                         document_date=invoice.date,
                         auxiliary_code=invoice.customer.identification,
                         auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-                    )
+                    ))
                     print(f"📝 Línea HABER IVA {iva_rate}%: {iva_account.code} - ${iva_amount}")
                 else:
                     print(f"⚠️ No se encontró cuenta IVA {iva_rate}% para empresa {invoice.company.id}")
+        
+        return lines
     
     @classmethod
     def _calculate_iva_breakdown(cls, invoice):
         """Calcula el desglose de IVA por tarifa desde las líneas de factura"""
         iva_breakdown = {15.0: Decimal('0.00'), 5.0: Decimal('0.00'), 0.0: Decimal('0.00')}
         
-        for line in invoice.lines.all():
+        for line in cls._invoice_lines(invoice):
             # Calcular subtotal de la línea
             subtotal_line = (line.quantity * line.unit_price * (Decimal('1') - line.discount/Decimal('100')))
             # Calcular IVA de la línea
@@ -511,8 +576,9 @@ class AutomaticJournalEntryService:
     def _get_main_iva_rate_from_invoice(cls, invoice):
         """Obtiene la tarifa de IVA principal de la factura"""
         # Si hay líneas de factura, usar la tarifa más común
-        if hasattr(invoice, 'lines') and invoice.lines.exists():
-            rates = invoice.lines.values_list('iva_rate', flat=True)
+        lines = cls._invoice_lines(invoice) if invoice.pk else []
+        if lines:
+            rates = [line.iva_rate for line in lines]
             # Retornar la tarifa más frecuente
             rate_counts = {}
             for rate in rates:
@@ -536,10 +602,19 @@ class AutomaticJournalEntryService:
         Returns:
             dict: {ChartOfAccounts: Decimal} - Monto por cuenta de ventas
         """
+        from apps.inventory.services import ProductAccountResolver
+        
         sales_by_account = {}
         
+        lines = cls._invoice_lines(invoice)
+        
+        # Cuentas efectivas de todos los productos de la factura en una sola resolución
+        product_accounts = ProductAccountResolver.resolve_many(
+            line.product for line in lines if line.product_id
+        )
+        
         # Procesar cada línea de la factura
-        for line in invoice.lines.all():
+        for line in lines:
             try:
                 # Calcular subtotal de la línea (sin IVA)
                 line_subtotal = line.quantity * line.unit_price
@@ -547,7 +622,7 @@ class AutomaticJournalEntryService:
                 line_net = line_subtotal - discount_amount
                 
                 # Obtener cuenta de ventas efectiva del producto  
-                sales_account = line.product.get_effective_sales_account()
+                sales_account = product_accounts[line.product_id][ProductAccountResolver.SALES]
                 
                 if sales_account:
                     # Agrupar por cuenta
@@ -611,31 +686,12 @@ class AutomaticJournalEntryService:
             
             # Crear asiento de reversión
             with transaction.atomic():
-                reverse_entry = JournalEntry.objects.create(
-                    company=invoice.company,
-                    date=timezone.now().date(),
-                    reference=f"REV-FAC-{invoice.id}",
-                    description=f"Reversión factura #{invoice.number or invoice.id} - {invoice.customer.trade_name or invoice.customer.legal_name}",
-                    created_by=invoice.created_by or User.objects.filter(is_superuser=True).first()
-                )
-                
-                # Crear líneas inversas (intercambiar DEBE/HABER)
-                for line in original_entry.lines.all():
-                    JournalEntryLine.objects.create(
-                        journal_entry=reverse_entry,
-                        account=line.account,
-                        description=f"REV - {line.description}",
-                        debit=line.credit,  # Invertir DEBE/HABER
-                        credit=line.debit,
-                        document_type='REVERSA',
-                        document_number=f"REV-{invoice.number or invoice.id}",
-                        document_date=timezone.now().date(),
-                        auxiliary_code=line.auxiliary_code,
-                        auxiliary_name=line.auxiliary_name
-                    )
+                reverse_entry, lines = cls.build_reversal(invoice, original_entry.lines.all())
+                reverse_entry.save()
+                JournalEntryLine.objects.bulk_create(lines)
                 
-                # Recalcular totales
-                reverse_entry.calculate_totals()
+                # Recalcular totales (bulk_create no dispara las señales de las líneas)
+                reverse_entry.save(update_fields=['total_debit', 'total_credit'])
                 
                 print(f"✅ Asiento de reversión creado: {reverse_entry.number}")
                 return reverse_entry, True
@@ -647,14 +703,66 @@ class AutomaticJournalEntryService:
             return None, False
     
     @classmethod
-    def _create_inventory_cost_lines(cls, journal_entry, invoice):
-        """Crea líneas de asiento para costo de ventas e inventario"""
+    def build_reversal(cls, invoice, original_lines, cache=None):
+        """
+        Arma en memoria el asiento de reversión de una factura (sin guardar)
+        
+        Retorna: (JournalEntry, [JournalEntryLine]) con DEBE/HABER intercambiados
+        """
+        today = timezone.now().date()
+        reverse_entry = JournalEntry(
+            company=invoice.company,
+            date=today,
+            reference=f"REV-FAC-{invoice.id}",
+            description=f"Reversión factura #{invoice.number or invoice.id} - {invoice.customer.trade_name or invoice.customer.legal_name}",
+            created_by=invoice.created_by or cls._get_default_user(cache)
+        )
+        
+        # Crear líneas inversas (intercambiar DEBE/HABER)
+        lines = [
+            JournalEntryLine(
+                journal_entry=reverse_entry,
+                account_id=line.account_id,
+                description=f"REV - {line.description}",
+                debit=line.credit,  # Invertir DEBE/HABER
+                credit=line.debit,
+                document_type='REVERSA',
+                document_number=f"REV-{invoice.number or invoice.id}",
+                document_date=today,
+                auxiliary_code=line.auxiliary_code,
+                auxiliary_name=line.auxiliary_name
+            )
+            for line in original_lines
+        ]
+        
+        reverse_entry.total_debit = sum((line.debit for line in lines), Decimal('0.00'))
+        reverse_entry.total_credit = sum((line.credit for line in lines), Decimal('0.00'))
+        return reverse_entry, lines
+    
+    @classmethod
+    def _build_inventory_cost_lines(cls, journal_entry, invoice, cache=None):
+        """Arma las líneas de asiento para costo de ventas e inventario"""
+        lines = []
+        
         # Solo procesar facturas con productos que manejan inventario
-        inventory_lines = invoice.lines.filter(product__manages_inventory=True)
+        inventory_lines = [
+            line for line in cls._invoice_lines(invoice)
+            if line.product_id and line.product.manages_inventory
+        ]
         
-        if not inventory_lines.exists():
+        if not inventory_lines:
             print(f"ℹ️ Factura {invoice.id} sin productos de inventario - omitiendo líneas de costo")
-            return
+            return lines
+        
+        # Costo unitario real de la salida (capas PEPS/UEPS o promedio) según los movimientos de la factura
+        unit_costs = cls._cached(
+            cache, ('unit_costs', invoice.id),
+            cls._get_invoice_unit_costs, invoice, {line.product_id for line in inventory_lines}
+        )
+        
+        # Cuentas efectivas de los productos en una sola resolución
+        from apps.inventory.services import ProductAccountResolver
+        product_accounts = ProductAccountResolver.resolve_many(line.product for line in inventory_lines)
         
         # Calcular costo total por categoría/cuenta
         cost_by_account = {}
@@ -662,15 +770,16 @@ class AutomaticJournalEntryService:
         
         for line in inventory_lines:
             product = line.product
-            line_cost = line.quantity * product.cost_price
+            unit_cost = unit_costs.get(product.id, product.cost_price)
+            line_cost = (line.quantity * unit_cost).quantize(Decimal('0.01'))
             
             if line_cost <= 0:
                 print(f"⚠️ Producto {product.code} sin costo configurado - omitiendo")
                 continue
             
             # Obtener cuentas efectivas del producto
-            cost_account = product.get_effective_cost_account()
-            inventory_account = product.get_effective_inventory_account()
+            cost_account = product_accounts[product.id][ProductAccountResolver.COST]
+            inventory_account = product_accounts[product.id][ProductAccountResolver.INVENTORY]
             
             if not cost_account or not cost_account.accepts_movement:
                 print(f"❌ Cuenta de costo no válida para producto {product.code}")
@@ -689,11 +798,11 @@ class AutomaticJournalEntryService:
                 inventory_by_account[inventory_account] = Decimal('0.00')
             inventory_by_account[inventory_account] += line_cost
             
-            print(f"📦 {product.code}: Qty={line.quantity} x Costo=${product.cost_price} = ${line_cost}")
+            print(f"📦 {product.code}: Qty={line.quantity} x Costo=${unit_cost} = ${line_cost}")
         
         # Crear líneas DEBE para costo de ventas
         for cost_account, total_cost in cost_by_account.items():
-            JournalEntryLine.objects.create(
+            lines.append(JournalEntryLine(
                 journal_entry=journal_entry,
                 account=cost_account,
                 description=f"Costo mercadería vendida - Factura {invoice.number or invoice.id}",
@@ -704,12 +813,12 @@ class AutomaticJournalEntryService:
                 document_date=invoice.date,
                 auxiliary_code=invoice.customer.identification,
                 auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-            )
+            ))
             print(f"📝 Línea DEBE Costo: {cost_account.code} - ${total_cost}")
         
         # Crear líneas HABER para reducción de inventario
         for inventory_account, total_inventory in inventory_by_account.items():
-            JournalEntryLine.objects.create(
+            lines.append(JournalEntryLine(
                 journal_entry=journal_entry,
                 account=inventory_account,
                 description=f"Reducción inventario por venta - Factura {invoice.number or invoice.id}",
@@ -720,7 +829,7 @@ class AutomaticJournalEntryService:
                 document_date=invoice.date,
                 auxiliary_code=invoice.customer.identification,
                 auxiliary_name=invoice.customer.trade_name or invoice.customer.legal_name
-            )
+            ))
             print(f"📝 Línea HABER Inventario: {inventory_account.code} - ${total_inventory}")
         
         total_cost_amount = sum(cost_by_account.values())
@@ -731,6 +840,57 @@ class AutomaticJournalEntryService:
         
         if total_cost_amount != total_inventory_amount:
             print(f"⚠️ Advertencia: Costo ({total_cost_amount}) != Inventario ({total_inventory_amount})")
+        
+        return lines
+    
+    @classmethod
+    def _get_invoice_unit_costs(cls, invoice, product_ids):
+        """
+        Costo unitario por producto tomado de las salidas de inventario de la factura
+
+        Returns:
+            dict: {product_id: costo unitario} (vacío si la factura no generó movimientos)
+        """
+        from apps.inventory.models import StockMovement
+        
+        unit_costs = {}
+        for row in StockMovement.objects.filter(
+            source_type=StockMovement.SOURCE_INVOICE,
+            source_id=invoice.pk,
+            movement_type=StockMovement.OUT,
+            product_id__in=product_ids
+        ).values('product_id').annotate(
+            quantity=Sum('quantity'),
+            cost=Sum('total_cost')
+        ):
+            if row['quantity']:
+                unit_costs[row['product_id']] = row['cost'] / row['quantity']
+        return unit_costs
+    
+    @classmethod
+    def preload_invoice_unit_costs(cls, invoices, cache):
+        """
+        Carga en cache los costos unitarios de varias facturas en una consulta agrupada
+        (misma regla que _get_invoice_unit_costs)
+        """
+        from apps.inventory.models import StockMovement
+        
+        invoice_ids = [invoice.id for invoice in invoices]
+        for invoice_id in invoice_ids:
+            cache[('unit_costs', invoice_id)] = {}
+        if not invoice_ids:
+            return
+        
+        for row in StockMovement.objects.filter(
+            source_type=StockMovement.SOURCE_INVOICE,
+            source_id__in=invoice_ids,
+            movement_type=StockMovement.OUT
+        ).values('source_id', 'product_id').annotate(
+            quantity=Sum('quantity'),
+            cost=Sum('total_cost')
+        ):
+            if row['quantity']:
+                cache[('unit_costs', row['source_id'])][row['product_id']] = row['cost'] / row['quantity']
     
     @classmethod
     def _create_bank_transaction_if_applicable(cls, invoice, journal_entry):
@@ -758,4 +918,153 @@ class AutomaticJournalEntryService:
         except Exception as e:
             # Error en creación de BankTransaction - no afectar asiento contable
             print(f"⚠️ Error opcional creando BankTransaction: {e}")
-            print("✅ Asiento contable creado exitosamente (error en Banking no crítico)")
\ No newline at end of file
+            print("✅ Asiento contable creado exitosamente (error en Banking no crítico)")
+
+class JournalEntryPostingService:
+    """
+    Contabilización en lote de asientos
+    Valida todos los asientos primero, resuelve las cuentas bancarias una sola vez,
+    crea los movimientos bancarios con bulk_create y cambia el estado con un único update()
+    """
+    
+    @classmethod
+    def post_entries(cls, queryset, user):
+        """
+        Contabiliza los asientos del queryset
+        
+        Args:
+            queryset: QuerySet de JournalEntry
+            user: Usuario que contabiliza
+            
+        Returns:
+            Lista de dicts por asiento: {'entry', 'number', 'success', 'error',
+            'bank_transactions', 'inventory_lines', 'warnings'}
+        """
+        results = []
+        posted_at = timezone.now()
+        
+        with transaction.atomic():
+            # Filas bloqueadas: otro proceso que contabilice los mismos asientos espera
+            entries = list(
+                queryset.select_for_update(of=('self',)).select_related(
+                    'company', 'source_purchase_invoice__company',
+                    'source_purchase_invoice__supplier', 'source_purchase_invoice__warehouse'
+                )
+                .prefetch_related('lines__account')
+            )
+            
+            valid_entries = []
+            stale_totals = []
+            
+            # 1. Validar todos los asientos antes de modificar nada
+            for journal_entry in entries:
+                result = {
+                    'entry': journal_entry,
+                    'number': journal_entry.number,
+                    'success': False,
+                    'error': None,
+                    'bank_transactions': 0,
+                    'inventory_lines': 0,
+                    'warnings': [],
+                }
+                results.append(result)
+                
+                # Totales desde las líneas (como calculate_totals), no los guardados
+                lines = journal_entry.lines.all()
+                total_debit = sum((line.debit for line in lines), Decimal('0.00'))
+                total_credit = sum((line.credit for line in lines), Decimal('0.00'))
+                if (total_debit, total_credit) != (journal_entry.total_debit, journal_entry.total_credit):
+                    journal_entry.total_debit = total_debit
+                    journal_entry.total_credit = total_credit
+                    stale_totals.append(journal_entry)
+                
+                if journal_entry.state != JournalEntry.DRAFT:
+                    result['error'] = f"Asiento {journal_entry.number} no está en estado borrador"
+                elif not journal_entry.is_balanced:
+                    result['error'] = f"Asiento {journal_entry.number} no está balanceado"
+                else:
+                    valid_entries.append(journal_entry)
+            
+            if stale_totals:
+                JournalEntry.objects.bulk_update(stale_totals, ['total_debit', 'total_credit'])
+            
+            if not valid_entries:
+                return results
+            
+            results_by_id = {result['entry'].id: result for result in results}
+            
+            # 2. Cambiar estado de todos los asientos válidos con una sola consulta;
+            # solo los que siguen en borrador cambian
+            valid_ids = [journal_entry.id for journal_entry in valid_entries]
+            JournalEntry.objects.filter(
+                id__in=valid_ids,
+                state=JournalEntry.DRAFT
+            ).update(
+                state=JournalEntry.POSTED,
+                posted_by=user,
+                posted_at=posted_at,
+                updated_at=posted_at
+            )
+            # Los cambiados por este update llevan su marca de tiempo
+            posted_ids = set(JournalEntry.objects.filter(
+                id__in=valid_ids,
+                state=JournalEntry.POSTED,
+                posted_by=user,
+                posted_at=posted_at
+            ).values_list('id', flat=True))
+            
+            for journal_entry in valid_entries:
+                if journal_entry.id not in posted_ids:
+                    results_by_id[journal_entry.id]['error'] = (
+                        f"Asiento {journal_entry.number} no está en estado borrador"
+                    )
+            valid_entries = [journal_entry for journal_entry in valid_entries if journal_entry.id in posted_ids]
+            
+            for journal_entry in valid_entries:
+                journal_entry.state = JournalEntry.POSTED
+                journal_entry.posted_by = user
+                journal_entry.posted_at = posted_at
+                results_by_id[journal_entry.id]['success'] = True
+            
+            # 3. Inventario de facturas de compra origen
+            for journal_entry in valid_entries:
+                if journal_entry.source_purchase_invoice_id:
+                    cls._update_purchase_inventory(journal_entry, results_by_id[journal_entry.id])
+            
+            # 4. Movimientos bancarios en bloque
+            try:
+                from apps.banking.services import BankingIntegrationService
+                
+                with transaction.atomic():
+                    created = BankingIntegrationService.create_bank_transactions_for_journal_entries(
+                        valid_entries
+                    )
+                for journal_entry_id, bank_transactions in created.items():
+                    results_by_id[journal_entry_id]['bank_transactions'] = len(bank_transactions)
+            except ImportError:
+                # Módulo Banking no disponible - continuar normalmente
+                pass
+            except Exception as e:
+                # Error no crítico - los asientos se contabilizan igual
+                print(f"⚠️ Error creando BankTransactions en lote: {e}")
+                for journal_entry in valid_entries:
+                    results_by_id[journal_entry.id]['warnings'].append(
+                        f"Error bancario en {journal_entry.number}: {e}"
+                    )
+        
+        return results
+    
+    @classmethod
+    def _update_purchase_inventory(cls, journal_entry, result):
+        """Actualizar inventario de la factura de compra origen (si está validada)"""
+        from apps.suppliers.services import PurchaseReceiptService
+        
+        try:
+            with transaction.atomic():
+                # Entradas de inventario y costos en bloque, sin re-guardar las líneas
+                receipt = PurchaseReceiptService.receive(journal_entry.source_purchase_invoice)
+                result['inventory_lines'] += len(receipt['movements'])
+        except Exception as inventory_error:
+            # Log error pero continuar - el asiento se contabiliza igual
+            print(f"Error actualizando inventario para asiento {journal_entry.number}: {inventory_error}")
+            result['warnings'].append(f"Error inventario en {journal_entry.number}: {inventory_error}")
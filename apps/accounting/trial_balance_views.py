@@ -223,7 +223,7 @@ def export_trial_balance_pdf(request):
     from reportlab.lib import colors
     from reportlab.lib.pagesizes import letter, A4, landscape
     from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from apps.core.pdf_templates import get_sample_styles, paragraph_style
     from reportlab.lib.units import inch
     from io import BytesIO
     
@@ -244,8 +244,8 @@ def export_trial_balance_pdf(request):
     elements = []
     
     # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
+    styles = get_sample_styles()
+    title_style = paragraph_style(
         'CustomTitle',
         parent=styles['Heading1'],
         fontSize=14,
@@ -4,13 +4,15 @@ Integración cuidadosa sin afectar funcionalidades existentes
 """
 
 from django.contrib import admin
+from django.http import JsonResponse
+from django.urls import path
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.contrib import messages
 from django.utils import timezone
 from apps.core.filters import UserCompanyListFilter
 from .models import Bank, BankAccount, BankTransaction, ExtractoBancario, ExtractoBancarioDetalle
-from .processors import ExtractoBancarioProcessor
+from .processors import ExtractoProcessingQueue
 
 
 @admin.register(Bank)
@@ -286,6 +288,7 @@ class ExtractoBancarioAdmin(admin.ModelAdmin):
         'initial_balance',
         'final_balance',
         'status_display',
+        'progress_display',
         'uploaded_by',
         'detalles_count'
     ]
@@ -313,16 +316,25 @@ class ExtractoBancarioAdmin(admin.ModelAdmin):
         ('Estado y Observaciones', {
             'fields': ('status', 'notes')
         }),
+        ('Procesamiento', {
+            'fields': ('progress_display', 'processing_started_at', 'processed_at', 'processing_errors'),
+            'classes': ('collapse',)
+        }),
         ('Información de Sistema', {
             'fields': ('uploaded_by',),
             'classes': ('collapse',)
         }),
     )
+    readonly_fields = ['progress_display', 'processing_started_at', 'processed_at', 'processing_errors']
+    
+    class Media:
+        js = ('admin/js/extracto_progress.js',)
     
     def status_display(self, obj):
         """Mostrar status con color"""
         status_colors = {
             'uploaded': 'orange',
+            'queued': 'purple',
             'processing': 'blue',
             'processed': 'green',
             'reconciled': 'darkgreen',
@@ -337,6 +349,21 @@ class ExtractoBancarioAdmin(admin.ModelAdmin):
         )
     status_display.short_description = 'Estado'
 
+    def progress_display(self, obj):
+        """Barra de avance; se actualiza en vivo mientras el extracto está en cola o procesando"""
+        if not obj.pk:
+            return '-'
+        return format_html(
+            '<div class="extracto-progress" data-extracto-id="{}" data-status="{}">'
+            '<div style="background: #eee; width: 120px; height: 10px;">'
+            '<div class="extracto-progress-bar" style="background: #417690; height: 10px; width: {}%;"></div>'
+            '</div>'
+            '<span class="extracto-progress-text">{} / {} filas</span>'
+            '</div>',
+            obj.pk, obj.status, obj.progress_percentage, obj.rows_processed, obj.rows_total
+        )
+    progress_display.short_description = 'Avance'
+
     def detalles_count(self, obj):
         """Mostrar número de detalles del extracto"""
         count = obj.detalles.count()
@@ -352,10 +379,49 @@ class ExtractoBancarioAdmin(admin.ModelAdmin):
     detalles_count.short_description = 'Detalles'
     
     def save_model(self, request, obj, form, change):
-        """Asignar usuario al subir"""
+        """Asignar usuario al subir y poner en cola el procesamiento del archivo"""
         if not obj.uploaded_by:
             obj.uploaded_by = request.user
         super().save_model(request, obj, form, change)
+        
+        # El procesamiento ocurre fuera del request (comando process_bank_statements)
+        if not change or 'file' in form.changed_data:
+            ExtractoProcessingQueue.enqueue(obj)
+            self.message_user(
+                request,
+                "📥 Extracto en cola de procesamiento; el avance se muestra en el listado",
+                messages.INFO
+            )
+    
+    def get_urls(self):
+        """Agregar URL de consulta de avance"""
+        urls = super().get_urls()
+        custom_urls = [
+            path('progress/',
+                 self.admin_site.admin_view(self.progress_view),
+                 name='banking_extractobancario_progress'),
+        ]
+        return custom_urls + urls
+    
+    def progress_view(self, request):
+        """Vista AJAX con el avance de los extractos solicitados (?ids=1,2,3)"""
+        try:
+            ids = [int(value) for value in request.GET.get('ids', '').split(',') if value]
+        except ValueError:
+            return JsonResponse({'error': 'IDs inválidos'}, status=400)
+        
+        extractos = self.get_queryset(request).filter(id__in=ids)
+        data = {
+            str(extracto.id): {
+                'status': extracto.status,
+                'status_display': extracto.get_status_display(),
+                'rows_processed': extracto.rows_processed,
+                'rows_total': extracto.rows_total,
+                'percentage': extracto.progress_percentage,
+            }
+            for extracto in extractos
+        }
+        return JsonResponse(data)
     
     def get_queryset(self, request):
         """Filtrar por empresas del usuario"""
@@ -378,58 +444,23 @@ class ExtractoBancarioAdmin(admin.ModelAdmin):
     # ========== ACCIONES DE ADMIN ==========
     
     def procesar_extractos(self, request, queryset):
-        """Acción para procesar extractos uploaded"""
-        procesados = 0
-        errores = 0
+        """Acción para poner en cola los extractos uploaded"""
+        encolados = 0
         
         for extracto in queryset.filter(status='uploaded'):
-            try:
-                extracto.status = 'processing'
-                extracto.save()
-                
-                success, message = ExtractoBancarioProcessor.process_extracto(extracto)
-                
-                if success:
-                    procesados += 1
-                    self.message_user(
-                        request,
-                        f"✅ {extracto.bank_account}: {message}",
-                        messages.SUCCESS
-                    )
-                else:
-                    extracto.status = 'error'
-                    extracto.notes = f"Error: {message}"
-                    extracto.save()
-                    errores += 1
-                    self.message_user(
-                        request,
-                        f"❌ {extracto.bank_account}: {message}",
-                        messages.ERROR
-                    )
-            
-            except Exception as e:
-                extracto.status = 'error'
-                extracto.notes = f"Error inesperado: {str(e)}"
-                extracto.save()
-                errores += 1
-                self.message_user(
-                    request,
-                    f"❌ {extracto.bank_account}: Error inesperado - {str(e)}",
-                    messages.ERROR
-                )
+            ExtractoProcessingQueue.enqueue(extracto)
+            encolados += 1
         
-        # Mensaje resumen
-        if procesados > 0:
+        if encolados > 0:
             self.message_user(
                 request,
-                f"🎉 Procesados exitosamente: {procesados} extractos",
+                f"📥 En cola para procesamiento: {encolados} extractos",
                 messages.SUCCESS
             )
-        
-        if errores > 0:
+        else:
             self.message_user(
                 request,
-                f"⚠️ Errores encontrados: {errores} extractos",
+                "No hay extractos en estado 'Cargado' para procesar",
                 messages.WARNING
             )
     
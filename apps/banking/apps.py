@@ -8,4 +8,7 @@ from django.apps import AppConfig
 class BankingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.banking'
-    verbose_name = 'Gestión Bancaria'
\ No newline at end of file
+    verbose_name = 'Gestión Bancaria'
+    
+    def ready(self):
+        import apps.banking.signals
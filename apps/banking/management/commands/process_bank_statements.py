@@ -0,0 +1,107 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from apps.banking.processors import ExtractoProcessingQueue
+
+
+def _init_worker():
+    """Inicializar Django en el proceso worker sin heredar conexiones del padre"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _process_extracto(extracto_id):
+    """Tarea ejecutada en el worker"""
+    try:
+        return extracto_id, ExtractoProcessingQueue.run_job(extracto_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Procesar extractos bancarios en cola con un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Número de procesos worker (por defecto 2)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Segundos entre consultas a la cola (por defecto 5)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesar lo que haya en cola y terminar'
+        )
+        parser.add_argument(
+            '--requeue-after',
+            type=int,
+            default=60,
+            help='Minutos tras los cuales un extracto en proceso se devuelve a la cola'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+
+        requeued = ExtractoProcessingQueue.requeue_stale(
+            timezone.now() - timedelta(minutes=options['requeue_after'])
+        )
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'{requeued} extractos devueltos a la cola'))
+
+        # No compartir la conexión del proceso principal con los workers
+        connections.close_all()
+
+        self.stdout.write(f'Procesando extractos con {workers} workers...')
+
+        running = set()
+        processed = 0
+        errors = 0
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            while True:
+                free_slots = workers - len(running)
+                if free_slots > 0:
+                    for extracto_id in ExtractoProcessingQueue.claim(free_slots):
+                        running.add(pool.submit(_process_extracto, extracto_id))
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        extracto_id, (success, message) = future.result()
+                    except Exception as e:
+                        errors += 1
+                        self.stdout.write(self.style.ERROR(f'Worker falló: {str(e)}'))
+                        continue
+
+                    if success:
+                        processed += 1
+                        self.stdout.write(self.style.SUCCESS(f'Extracto {extracto_id}: {message}'))
+                    else:
+                        errors += 1
+                        self.stdout.write(self.style.ERROR(f'Extracto {extracto_id}: {message}'))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. {processed} extractos procesados, {errors} con errores.'
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from apps.banking.models import BankAccount
+from apps.banking.services import BankBalanceService
+
+class Command(BaseCommand):
+    help = 'Reconstruir los puntos de control mensuales de saldos bancarios'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account',
+            type=int,
+            help='ID de la cuenta bancaria (por defecto todas)'
+        )
+    
+    def handle(self, *args, **options):
+        accounts = BankAccount.objects.select_related('bank')
+        if options.get('account'):
+            accounts = accounts.filter(id=options['account'])
+        
+        if not accounts.exists():
+            self.stdout.write(self.style.WARNING('No hay cuentas bancarias para procesar'))
+            return
+        
+        total_checkpoints = 0
+        for account in accounts:
+            created = BankBalanceService.rebuild_checkpoints(account)
+            total_checkpoints += created
+            self.stdout.write(f'{account}: {created} meses')
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. {total_checkpoints} puntos de control generados.'
+            )
+        )
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:01
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_balance_checkpoints(apps, schema_editor):
+    """Generar puntos de control mensuales para los movimientos existentes"""
+    BankTransaction = apps.get_model('banking', 'BankTransaction')
+    BankBalanceCheckpoint = apps.get_model('banking', 'BankBalanceCheckpoint')
+    debit_types = ['debit', 'transfer_out', 'fee']
+    
+    monthly = {}
+    for account_id, transaction_date, transaction_type, amount in BankTransaction.objects.values_list(
+        'bank_account_id', 'transaction_date', 'transaction_type', 'amount'
+    ).order_by('bank_account_id', 'transaction_date').iterator():
+        key = (account_id, transaction_date.replace(day=1))
+        net, count = monthly.get(key, (Decimal('0.00'), 0))
+        signed = -amount if transaction_type in debit_types else amount
+        monthly[key] = (net + signed, count + 1)
+    
+    checkpoints = []
+    cumulative = {}
+    for (account_id, month), (net, count) in sorted(monthly.items()):
+        cumulative[account_id] = cumulative.get(account_id, Decimal('0.00')) + net
+        checkpoints.append(BankBalanceCheckpoint(
+            bank_account_id=account_id,
+            month=month,
+            net_movement=net,
+            cumulative_movement=cumulative[account_id],
+            transaction_count=count
+        ))
+    
+    BankBalanceCheckpoint.objects.bulk_create(checkpoints)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0003_add_processed_at_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankBalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('month', models.DateField(help_text='Primer día del mes del punto de control', verbose_name='Mes')),
+                ('net_movement', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Movimiento Neto del Mes')),
+                ('cumulative_movement', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Suma de movimientos hasta el cierre del mes (sin saldo inicial)', max_digits=14, verbose_name='Movimiento Acumulado')),
+                ('transaction_count', models.PositiveIntegerField(default=0, verbose_name='Número de Movimientos')),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='banking.bankaccount', verbose_name='Cuenta Bancaria')),
+            ],
+            options={
+                'verbose_name': 'Saldo Mensual Bancario',
+                'verbose_name_plural': 'Saldos Mensuales Bancarios',
+                'ordering': ['bank_account', 'month'],
+                'unique_together': {('bank_account', 'month')},
+            },
+        ),
+        migrations.RunPython(build_balance_checkpoints, migrations.RunPython.noop),
+    ]
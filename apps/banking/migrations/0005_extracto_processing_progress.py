@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0004_bankbalancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractobancario',
+            name='processing_errors',
+            field=models.TextField(blank=True, verbose_name='Errores de Procesamiento'),
+        ),
+        migrations.AddField(
+            model_name='extractobancario',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Inicio del Procesamiento'),
+        ),
+        migrations.AddField(
+            model_name='extractobancario',
+            name='rows_processed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Filas Procesadas'),
+        ),
+        migrations.AddField(
+            model_name='extractobancario',
+            name='rows_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Filas Totales'),
+        ),
+        migrations.AlterField(
+            model_name='extractobancario',
+            name='status',
+            field=models.CharField(choices=[('uploaded', 'Cargado'), ('queued', 'En Cola'), ('processing', 'Procesando'), ('processed', 'Procesado'), ('reconciled', 'Conciliado'), ('error', 'Error')], default='uploaded', max_length=12, verbose_name='Estado'),
+        ),
+    ]
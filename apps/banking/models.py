@@ -172,6 +172,9 @@ class BankTransaction(BaseModel):
         ('other', 'Otro'),
     ]
     
+    # Tipos que disminuyen el saldo de la cuenta
+    DEBIT_TYPES = ['debit', 'transfer_out', 'fee']
+    
     bank_account = models.ForeignKey(
         BankAccount,
         on_delete=models.CASCADE,
@@ -241,7 +244,7 @@ class BankTransaction(BaseModel):
     @property
     def is_debit(self):
         """True si es un débito (disminuye el saldo)"""
-        return self.transaction_type in ['debit', 'transfer_out', 'fee']
+        return self.transaction_type in self.DEBIT_TYPES
     
     @property
     def signed_amount(self):
@@ -249,6 +252,55 @@ class BankTransaction(BaseModel):
         return -self.amount if self.is_debit else self.amount
 
 
+class BankBalanceCheckpoint(BaseModel):
+    """
+    Saldo acumulado de una cuenta bancaria al cierre de cada mes
+    Se mantiene al crear, editar o eliminar movimientos bancarios
+    """
+    
+    bank_account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        related_name='balance_checkpoints',
+        verbose_name='Cuenta Bancaria'
+    )
+    month = models.DateField(
+        verbose_name='Mes',
+        help_text='Primer día del mes del punto de control'
+    )
+    net_movement = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Movimiento Neto del Mes'
+    )
+    cumulative_movement = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Movimiento Acumulado',
+        help_text='Suma de movimientos hasta el cierre del mes (sin saldo inicial)'
+    )
+    transaction_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Número de Movimientos'
+    )
+    
+    class Meta:
+        verbose_name = 'Saldo Mensual Bancario'
+        verbose_name_plural = 'Saldos Mensuales Bancarios'
+        ordering = ['bank_account', 'month']
+        unique_together = ['bank_account', 'month']
+    
+    def __str__(self):
+        return f"{self.bank_account} - {self.month:%Y-%m}"
+    
+    @property
+    def closing_balance(self):
+        """Saldo al cierre del mes incluyendo el saldo inicial de la cuenta"""
+        return self.bank_account.initial_balance + self.cumulative_movement
+
+
 class ExtractoBancario(BaseModel):
     """
     Extractos bancarios importados para conciliación
@@ -256,6 +308,7 @@ class ExtractoBancario(BaseModel):
     
     STATUS_CHOICES = [
         ('uploaded', 'Cargado'),
+        ('queued', 'En Cola'),
         ('processing', 'Procesando'),
         ('processed', 'Procesado'),
         ('reconciled', 'Conciliado'),
@@ -310,6 +363,25 @@ class ExtractoBancario(BaseModel):
         verbose_name='Procesado el'
     )
     
+    # Progreso del procesamiento en segundo plano
+    rows_total = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Filas Totales'
+    )
+    rows_processed = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Filas Procesadas'
+    )
+    processing_errors = models.TextField(
+        blank=True,
+        verbose_name='Errores de Procesamiento'
+    )
+    processing_started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Inicio del Procesamiento'
+    )
+    
     class Meta:
         verbose_name = 'Extracto Bancario'
         verbose_name_plural = 'Extractos Bancarios'
@@ -321,6 +393,15 @@ class ExtractoBancario(BaseModel):
     def clean(self):
         if self.period_start and self.period_end and self.period_start > self.period_end:
             raise ValidationError('La fecha de inicio no puede ser mayor que la fecha de fin')
+    
+    @property
+    def progress_percentage(self):
+        """Porcentaje de filas procesadas"""
+        if self.status == 'processed':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(100, round(self.rows_processed * 100 / self.rows_total))
 
 
 class ExtractoBancarioDetalle(BaseModel):
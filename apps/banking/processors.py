@@ -7,6 +7,51 @@ from decimal import Decimal
 from django.utils import timezone
 
 
+class ExtractoProgress:
+    """
+    Inserta los detalles del extracto por lotes y publica el avance
+    (filas leídas y errores) en el extracto para mostrarlo en el admin
+    """
+    
+    BATCH_SIZE = 500
+    
+    def __init__(self, extracto, rows_total):
+        from apps.banking.models import ExtractoBancario
+        
+        self.extracto = extracto
+        self.rows_processed = 0
+        self.created = 0
+        self._pending = []
+        self._queryset = ExtractoBancario.objects.filter(pk=extracto.pk)
+        self._queryset.update(rows_total=rows_total, rows_processed=0, processing_errors='')
+    
+    def row_done(self):
+        """Registrar una fila leída; publica el avance cada BATCH_SIZE filas"""
+        self.rows_processed += 1
+        if self.rows_processed % self.BATCH_SIZE == 0:
+            self.flush()
+    
+    def add(self, detalle):
+        """Agregar un detalle pendiente de inserción"""
+        self._pending.append(detalle)
+    
+    def flush(self):
+        """Insertar detalles pendientes y actualizar el avance"""
+        from apps.banking.models import ExtractoBancarioDetalle
+        
+        if self._pending:
+            ExtractoBancarioDetalle.objects.bulk_create(self._pending, batch_size=self.BATCH_SIZE)
+            self.created += len(self._pending)
+            self._pending = []
+        self._queryset.update(rows_processed=self.rows_processed)
+    
+    def finish(self, errores):
+        """Insertar lo pendiente y guardar los errores encontrados"""
+        self.flush()
+        self._queryset.update(processing_errors='\n'.join(errores))
+        return self.created
+
+
 class ExtractoBancarioProcessor:
     """Procesador base para extractos bancarios"""
     
@@ -108,10 +153,11 @@ class PichinchaProcessor:
             
             # Procesar datos
             datos_filas = rows[datos_inicio:]
-            detalles_creados = 0
+            progress = ExtractoProgress(extracto, len(datos_filas))
             errores = []
             
             for i, row in enumerate(datos_filas):
+                progress.row_done()
                 try:
                     row_clean = [cell.strip() for cell in row]
                     
@@ -197,7 +243,7 @@ class PichinchaProcessor:
                             pass
                     
                     # Crear detalle
-                    ExtractoBancarioDetalle.objects.create(
+                    progress.add(ExtractoBancarioDetalle(
                         extracto=extracto,
                         fecha=fecha,
                         descripcion=concepto or f'Movimiento {fecha}',
@@ -206,20 +252,20 @@ class PichinchaProcessor:
                         credito=credito,
                         saldo=saldo,
                         is_reconciled=False
-                    )
-                    
-                    detalles_creados += 1
+                    ))
                 
                 except Exception as e:
                     errores.append(f"Fila {i+1}: {str(e)}")
                     if len(errores) > 10:  # Limitar errores
                         break
             
+            detalles_creados = progress.finish(errores)
+            
             if detalles_creados > 0:
                 # Actualizar status
                 extracto.status = 'processed'
                 extracto.processed_at = timezone.now()
-                extracto.save()
+                extracto.save(update_fields=['status', 'processed_at', 'updated_at'])
                 
                 return True, f"Procesado exitosamente: {detalles_creados} movimientos"
             else:
@@ -281,16 +327,20 @@ class PacificoProcessor:
                 first_line = f.readline()
                 delimiter = ',' if ',' in first_line else ';'
                 
+                # Contar filas de datos para el avance (sin encabezado)
+                rows_total = sum(1 for _ in f)
+                
                 f.seek(0)
                 reader = csv.DictReader(f, delimiter=delimiter)
                 
                 # Limpiar detalles existentes
                 ExtractoBancarioDetalle.objects.filter(extracto=extracto).delete()
                 
-                detalles_creados = 0
+                progress = ExtractoProgress(extracto, rows_total)
                 errores = []
                 
                 for i, row in enumerate(reader):
+                    progress.row_done()
                     try:
                         # Mapeo flexible de campos
                         fecha_field = cls._find_field(row, ['fecha', 'date'])
@@ -314,7 +364,7 @@ class PacificoProcessor:
                         saldo = cls._parse_decimal(row.get(saldo_field, '')) if saldo_field else Decimal('0.00')
                         
                         # Crear detalle
-                        ExtractoBancarioDetalle.objects.create(
+                        progress.add(ExtractoBancarioDetalle(
                             extracto=extracto,
                             fecha=fecha,
                             descripcion=row.get(desc_field, ''),
@@ -323,19 +373,19 @@ class PacificoProcessor:
                             credito=credito,
                             saldo=saldo,
                             is_reconciled=False
-                        )
-                        
-                        detalles_creados += 1
+                        ))
                     
                     except Exception as e:
                         errores.append(f"Fila {i+1}: {str(e)}")
                         if len(errores) > 10:
                             break
                 
+                detalles_creados = progress.finish(errores)
+                
                 if detalles_creados > 0:
                     extracto.status = 'processed'
                     extracto.processed_at = timezone.now()
-                    extracto.save()
+                    extracto.save(update_fields=['status', 'processed_at', 'updated_at'])
                     
                     return True, f"Procesado exitosamente: {detalles_creados} movimientos"
                 else:
@@ -389,4 +439,89 @@ class GenericProcessor:
     @classmethod
     def process(cls, extracto):
         """Procesamiento genérico"""
-        return False, "Formato de archivo no reconocido. Use formato PICHINCHA o PACÍFICO."
\ No newline at end of file
+        return False, "Formato de archivo no reconocido. Use formato PICHINCHA o PACÍFICO."
+
+
+class ExtractoProcessingQueue:
+    """
+    Cola de procesamiento de extractos en segundo plano
+    El estado del extracto funciona como cola: 'queued' -> 'processing' -> 'processed' / 'error'
+    Los trabajos los ejecuta el comando process_bank_statements fuera del servidor web
+    """
+    
+    @classmethod
+    def enqueue(cls, extracto):
+        """Poner un extracto en cola para procesamiento"""
+        from apps.banking.models import ExtractoBancario
+        
+        ExtractoBancario.objects.filter(pk=extracto.pk).update(
+            status='queued',
+            rows_total=0,
+            rows_processed=0,
+            processing_errors='',
+            processing_started_at=None,
+            updated_at=timezone.now()
+        )
+        extracto.status = 'queued'
+    
+    @classmethod
+    def claim(cls, limit):
+        """
+        Tomar hasta `limit` extractos en cola, marcándolos como 'processing'
+        La actualización condicional evita que dos workers tomen el mismo extracto
+        
+        Returns:
+            Lista de IDs tomados
+        """
+        from apps.banking.models import ExtractoBancario
+        
+        candidates = ExtractoBancario.objects.filter(
+            status='queued'
+        ).order_by('created_at').values_list('pk', flat=True)[:limit]
+        
+        claimed = []
+        for extracto_id in candidates:
+            updated = ExtractoBancario.objects.filter(pk=extracto_id, status='queued').update(
+                status='processing',
+                processing_started_at=timezone.now(),
+                updated_at=timezone.now()
+            )
+            if updated:
+                claimed.append(extracto_id)
+        return claimed
+    
+    @classmethod
+    def requeue_stale(cls, older_than):
+        """Devolver a la cola extractos en 'processing' iniciados antes de `older_than`"""
+        from apps.banking.models import ExtractoBancario
+        
+        return ExtractoBancario.objects.filter(
+            status='processing',
+            processing_started_at__lt=older_than
+        ).update(status='queued', updated_at=timezone.now())
+    
+    @classmethod
+    def run_job(cls, extracto_id):
+        """
+        Procesar un extracto ya tomado de la cola
+        
+        Returns:
+            Tupla (success, message)
+        """
+        from apps.banking.models import ExtractoBancario
+        
+        extracto = ExtractoBancario.objects.select_related('bank_account__bank').get(pk=extracto_id)
+        
+        try:
+            success, message = ExtractoBancarioProcessor.process_extracto(extracto)
+        except Exception as e:
+            success, message = False, f"Error inesperado: {str(e)}"
+        
+        if not success:
+            ExtractoBancario.objects.filter(pk=extracto_id).update(
+                status='error',
+                notes=f"Error: {message}",
+                updated_at=timezone.now()
+            )
+        
+        return success, message
@@ -8,9 +8,73 @@ from django.utils import timezone
 from django.db import transaction
 import logging
 
+from apps.core.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 
+class BankAccountIndex:
+    """
+    Índice en memoria por empresa: cuenta contable -> BankAccount activa
+    Se invalida con señales de BankAccount (ver signals.py)
+    """
+    
+    _cache = TTLCache(ttl_seconds=300)
+    
+    @classmethod
+    def _get_entry(cls, company_id):
+        """Índice de la empresa, cargándolo si no existe o expiró"""
+        return cls._cache.get(company_id, lambda: cls._load(company_id))
+    
+    @classmethod
+    def _load(cls, company_id):
+        """Cuentas bancarias activas de la empresa en una consulta"""
+        from apps.banking.models import BankAccount
+        
+        by_id = {}
+        by_chart_account = {}
+        for bank_account in BankAccount.objects.filter(
+            company_id=company_id,
+            is_active=True
+        ).select_related('bank'):
+            by_id[bank_account.id] = bank_account
+            if bank_account.chart_account_id:
+                # Igual que .first(): conservar la primera según el orden del modelo
+                by_chart_account.setdefault(bank_account.chart_account_id, bank_account)
+        
+        return {
+            'by_id': by_id,
+            'by_chart_account': by_chart_account,
+        }
+    
+    @classmethod
+    def for_chart_account(cls, company_id, chart_account_id):
+        """BankAccount activa vinculada a la cuenta contable, o None"""
+        if not company_id or not chart_account_id:
+            return None
+        return cls._get_entry(company_id)['by_chart_account'].get(chart_account_id)
+    
+    @classmethod
+    def get(cls, company_id, bank_account_id):
+        """BankAccount activa de la empresa por ID, o None"""
+        if not company_id or not bank_account_id:
+            return None
+        return cls._get_entry(company_id)['by_id'].get(int(bank_account_id))
+    
+    @classmethod
+    def first_for_company(cls, company_id):
+        """Primera BankAccount activa de la empresa (menor ID), o None"""
+        if not company_id:
+            return None
+        by_id = cls._get_entry(company_id)['by_id']
+        return by_id[min(by_id)] if by_id else None
+    
+    @classmethod
+    def invalidate(cls, company_id=None):
+        """Descartar el índice de una empresa (o de todas)"""
+        cls._cache.invalidate(company_id)
+
+
 class BankingIntegrationService:
     """
     Servicio para integrar movimientos bancarios con facturas
@@ -34,7 +98,7 @@ class BankingIntegrationService:
         """
         try:
             # Importación tardía para evitar dependencias circulares
-            from apps.banking.models import BankAccount, BankTransaction
+            from apps.banking.models import BankTransaction
             
             # Validación 1: Verificar que es transferencia
             if not cls._is_bank_transfer(invoice):
@@ -47,20 +111,12 @@ class BankingIntegrationService:
                 return None
             
             # Validación 3: Buscar BankAccount vinculado
-            try:
-                bank_account = BankAccount.objects.get(
-                    chart_account=invoice.account,
-                    is_active=True
-                )
-            except BankAccount.DoesNotExist:
+            bank_account = BankAccountIndex.for_chart_account(
+                invoice.account.company_id, invoice.account_id
+            )
+            if not bank_account:
                 logger.info(f"Cuenta contable {invoice.account.code} sin BankAccount vinculado - no se crea movimiento")
                 return None
-            except BankAccount.MultipleObjectsReturned:
-                logger.error(f"Múltiples BankAccounts para cuenta {invoice.account.code} - usando el primero")
-                bank_account = BankAccount.objects.filter(
-                    chart_account=invoice.account,
-                    is_active=True
-                ).first()
             
             # Validación 4: Verificar que no existe ya una transacción para esta factura
             reference = f"FAC-{invoice.id}"
@@ -126,7 +182,8 @@ class BankingIntegrationService:
             try:
                 retention_amounts = invoice.customer.calculate_retention_amounts(
                     invoice.subtotal or Decimal('0.00'), 
-                    invoice.tax_amount or Decimal('0.00')
+                    invoice.tax_amount or Decimal('0.00'),
+                    invoice.date
                 )
                 iva_retention = retention_amounts.get('iva_retention', Decimal('0.00'))
                 ir_retention = retention_amounts.get('ir_retention', Decimal('0.00'))
@@ -229,7 +286,7 @@ class BankingIntegrationService:
             BankTransaction creado o None si no aplica
         """
         try:
-            from apps.banking.models import BankAccount, BankTransaction
+            from apps.banking.models import BankTransaction
             
             # Validación 1: Verificar que es cuenta bancaria
             if not journal_line.account or journal_line.account.aux_type != 'bank':
@@ -242,18 +299,16 @@ class BankingIntegrationService:
                 return None
             
             # Validación 3: Buscar BankAccount vinculada
-            bank_account = BankAccount.objects.filter(
-                chart_account=journal_line.account,
-                company=journal_entry.company,
-                is_active=True
-            ).first()
+            bank_account = BankAccountIndex.for_chart_account(
+                journal_entry.company_id, journal_line.account_id
+            )
             
             if not bank_account:
                 logger.warning(f"No se encontró BankAccount activa para cuenta {journal_line.account.code}")
                 return None
             
             # Validación 4: Verificar que no existe ya un movimiento para esta línea
-            existing_reference = f"AST-{journal_entry.number}-L{journal_line.id}"
+            existing_reference = cls.journal_line_reference(journal_entry, journal_line)
             existing_transaction = BankTransaction.objects.filter(
                 reference=existing_reference,
                 bank_account=bank_account
@@ -263,37 +318,11 @@ class BankingIntegrationService:
                 logger.info(f"Ya existe BankTransaction para línea {journal_line.id}: {existing_transaction.id}")
                 return existing_transaction
             
-            # Determinar tipo de transacción y monto
-            # CORRECCIÓN: Para cuentas bancarias (activo), la lógica contable es:
-            # DEBE = aumenta activo = dinero ENTRA al banco = 'credit' bancario
-            # HABER = disminuye activo = dinero SALE del banco = 'debit' bancario
-            if journal_line.debit > 0:
-                transaction_type = 'credit'  # Ingreso al banco (debe contable = ingreso de dinero)
-                amount = journal_line.debit
-                description_prefix = "Ingreso bancario"
-            else:
-                transaction_type = 'debit'   # Egreso del banco (haber contable = salida de dinero)
-                amount = journal_line.credit
-                description_prefix = "Salida bancaria"
-            
-            # Construir descripción detallada
-            description = cls._build_manual_journal_description(
-                journal_entry, journal_line, description_prefix
-            )
-            
             # Crear movimiento bancario
-            bank_transaction = BankTransaction.objects.create(
-                bank_account=bank_account,
-                transaction_date=journal_entry.date,
-                value_date=journal_entry.date,
-                transaction_type=transaction_type,
-                amount=amount,
-                description=description,
-                reference=existing_reference,  # AST-{number}-L{line_id}
-                # Vincular con asiento si el modelo lo permite
-                **cls._get_journal_entry_relation(journal_entry),
-                is_reconciled=False
+            bank_transaction = cls.build_bank_transaction_from_journal_line(
+                journal_line, journal_entry, bank_account
             )
+            bank_transaction.save()
             
             logger.info(f"BankTransaction {bank_transaction.id} creado para línea manual {journal_line.id}")
             return bank_transaction
@@ -302,6 +331,127 @@ class BankingIntegrationService:
             logger.error(f"Error creando BankTransaction para línea manual {journal_line.id}: {e}")
             return None
     
+    @classmethod
+    def journal_line_reference(cls, journal_entry, journal_line):
+        """Referencia del movimiento bancario generado por una línea de asiento"""
+        return f"AST-{journal_entry.number}-L{journal_line.id}"
+    
+    @classmethod
+    def build_bank_transaction_from_journal_line(cls, journal_line, journal_entry, bank_account):
+        """
+        Construye (sin guardar) el movimiento bancario de una línea de asiento
+        
+        Returns:
+            Instancia de BankTransaction no persistida
+        """
+        from apps.banking.models import BankTransaction
+        
+        # Determinar tipo de transacción y monto
+        # CORRECCIÓN: Para cuentas bancarias (activo), la lógica contable es:
+        # DEBE = aumenta activo = dinero ENTRA al banco = 'credit' bancario
+        # HABER = disminuye activo = dinero SALE del banco = 'debit' bancario
+        if journal_line.debit > 0:
+            transaction_type = 'credit'  # Ingreso al banco (debe contable = ingreso de dinero)
+            amount = journal_line.debit
+            description_prefix = "Ingreso bancario"
+        else:
+            transaction_type = 'debit'   # Egreso del banco (haber contable = salida de dinero)
+            amount = journal_line.credit
+            description_prefix = "Salida bancaria"
+        
+        # Construir descripción detallada
+        description = cls._build_manual_journal_description(
+            journal_entry, journal_line, description_prefix
+        )
+        
+        return BankTransaction(
+            bank_account=bank_account,
+            transaction_date=journal_entry.date,
+            value_date=journal_entry.date,
+            transaction_type=transaction_type,
+            amount=amount,
+            description=description,
+            reference=cls.journal_line_reference(journal_entry, journal_line),  # AST-{number}-L{line_id}
+            # Vincular con asiento si el modelo lo permite
+            **cls._get_journal_entry_relation(journal_entry),
+            is_reconciled=False
+        )
+    
+    @classmethod
+    def get_bank_accounts_by_chart_account(cls, company_ids, chart_account_ids):
+        """
+        Resuelve la cuenta bancaria activa de cada cuenta contable desde el índice en memoria
+        
+        Returns:
+            Dict {(company_id, chart_account_id): BankAccount}
+        """
+        bank_accounts = {}
+        for company_id in company_ids:
+            for chart_account_id in chart_account_ids:
+                bank_account = BankAccountIndex.for_chart_account(company_id, chart_account_id)
+                if bank_account:
+                    bank_accounts[(company_id, chart_account_id)] = bank_account
+        return bank_accounts
+    
+    @classmethod
+    def create_bank_transactions_for_journal_entries(cls, journal_entries):
+        """
+        Crea en bloque los movimientos bancarios de varios asientos contabilizados
+        
+        Args:
+            journal_entries: Asientos con 'lines__account' precargado
+            
+        Returns:
+            Dict {journal_entry_id: [BankTransaction creados]}
+        """
+        from apps.banking.models import BankTransaction
+        
+        bank_lines = [
+            (journal_entry, line)
+            for journal_entry in journal_entries
+            for line in journal_entry.lines.all()
+            if line.account.aux_type == 'bank' and (line.debit != 0 or line.credit != 0)
+        ]
+        created = {journal_entry.id: [] for journal_entry in journal_entries}
+        if not bank_lines:
+            return created
+        
+        bank_accounts = cls.get_bank_accounts_by_chart_account(
+            {journal_entry.company_id for journal_entry, _ in bank_lines},
+            {line.account_id for _, line in bank_lines}
+        )
+        
+        # Movimientos ya existentes (re-contabilización): una sola consulta
+        references = [cls.journal_line_reference(entry, line) for entry, line in bank_lines]
+        existing = set(BankTransaction.objects.filter(
+            reference__in=references
+        ).values_list('bank_account_id', 'reference'))
+        
+        new_transactions = []
+        owners = []
+        for journal_entry, line in bank_lines:
+            bank_account = bank_accounts.get((journal_entry.company_id, line.account_id))
+            if not bank_account:
+                logger.warning(f"No se encontró BankAccount activa para cuenta {line.account.code}")
+                continue
+            if (bank_account.id, cls.journal_line_reference(journal_entry, line)) in existing:
+                continue
+            new_transactions.append(
+                cls.build_bank_transaction_from_journal_line(line, journal_entry, bank_account)
+            )
+            owners.append(journal_entry.id)
+        
+        # bulk_create no dispara señales: aplicar saldos mensuales explícitamente
+        with transaction.atomic():
+            BankTransaction.objects.bulk_create(new_transactions)
+            BankBalanceService.apply_transactions(new_transactions)
+        
+        for journal_entry_id, bank_transaction in zip(owners, new_transactions):
+            created[journal_entry_id].append(bank_transaction)
+        
+        logger.info(f"{len(new_transactions)} BankTransaction creados en bloque para {len(journal_entries)} asientos")
+        return created
+    
     @classmethod
     def _build_manual_journal_description(cls, journal_entry, journal_line, prefix):
         """Construir descripción detallada para movimiento bancario desde asiento manual"""
@@ -337,4 +487,316 @@ class BankingIntegrationService:
                 return {}
                 
         except Exception:
-            return {}
\ No newline at end of file
+            return {}
+
+class BankBalanceService:
+    """
+    Saldos bancarios a partir de puntos de control mensuales
+    El saldo a cualquier fecha es una lectura del punto de control del mes
+    anterior más el movimiento del mes en curso hasta esa fecha
+    """
+    
+    @classmethod
+    def signed_amount_expression(cls):
+        """Expresión SQL equivalente a BankTransaction.signed_amount"""
+        from django.db.models import Case, When, F, DecimalField
+        from apps.banking.models import BankTransaction
+        
+        return Case(
+            When(transaction_type__in=BankTransaction.DEBIT_TYPES, then=-F('amount')),
+            default=F('amount'),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )
+    
+    @classmethod
+    def get_balance(cls, bank_account, as_of_date):
+        """
+        Saldo de la cuenta al cierre del día as_of_date
+        
+        Args:
+            bank_account: Instancia de BankAccount
+            as_of_date: Fecha de corte (inclusive)
+            
+        Returns:
+            Decimal con el saldo incluyendo el saldo inicial de la cuenta
+        """
+        from django.db.models import Sum
+        from apps.banking.models import BankBalanceCheckpoint, BankTransaction
+        
+        month_start = as_of_date.replace(day=1)
+        
+        # Punto de control: cierre del último mes con movimientos antes del mes de corte
+        cumulative = BankBalanceCheckpoint.objects.filter(
+            bank_account=bank_account,
+            month__lt=month_start
+        ).order_by('-month').values_list('cumulative_movement', flat=True).first()
+        
+        # Delta: movimientos del mes de corte hasta la fecha
+        delta = BankTransaction.objects.filter(
+            bank_account=bank_account,
+            transaction_date__gte=month_start,
+            transaction_date__lte=as_of_date
+        ).aggregate(total=Sum(cls.signed_amount_expression()))['total']
+        
+        return (
+            bank_account.initial_balance
+            + (cumulative or Decimal('0.00'))
+            + (delta or Decimal('0.00'))
+        )
+    
+    @classmethod
+    def annotate_running_balance(cls, queryset, opening_balance):
+        """
+        Anota 'running_balance' (saldo después de cada movimiento) con una
+        función de ventana, ordenada por fecha, creación e id
+        
+        Args:
+            queryset: QuerySet de BankTransaction
+            opening_balance: Saldo antes del primer movimiento del queryset
+        """
+        from django.db.models import F, Sum, Value, Window, DecimalField, ExpressionWrapper
+        
+        decimal = DecimalField(max_digits=14, decimal_places=2)
+        
+        return queryset.annotate(
+            running_balance=ExpressionWrapper(
+                Value(opening_balance, output_field=decimal) + Window(
+                    expression=Sum(cls.signed_amount_expression()),
+                    partition_by=[F('bank_account_id')],
+                    order_by=[
+                        F('transaction_date').asc(),
+                        F('created_at').asc(),
+                        F('id').asc(),
+                    ]
+                ),
+                output_field=decimal
+            )
+        ).order_by('transaction_date', 'created_at', 'id')
+    
+    @classmethod
+    def apply_delta(cls, bank_account_id, transaction_date, amount_delta, count_delta=0):
+        """
+        Aplica un cambio de saldo al punto de control del mes y a los meses posteriores
+        
+        Args:
+            bank_account_id: ID de la cuenta bancaria
+            transaction_date: Fecha del movimiento afectado
+            amount_delta: Variación con signo del saldo
+            count_delta: Variación del número de movimientos
+        """
+        from django.db.models import F
+        from apps.banking.models import BankAccount, BankBalanceCheckpoint
+        
+        if not amount_delta and not count_delta:
+            return
+        
+        month = transaction_date.replace(day=1)
+        
+        with transaction.atomic():
+            # Bloquear la cuenta serializa la creación del punto de control de un mes
+            # nuevo: select_for_update sobre los puntos de control no bloquea una fila
+            # que aún no existe
+            list(BankAccount.objects.select_for_update().filter(pk=bank_account_id).values_list('pk', flat=True))
+            checkpoints = BankBalanceCheckpoint.objects.select_for_update().filter(
+                bank_account_id=bank_account_id
+            )
+            
+            if not checkpoints.filter(month=month).exists():
+                # Nuevo mes: parte del acumulado del mes anterior con movimientos
+                previous = checkpoints.filter(
+                    month__lt=month
+                ).order_by('-month').values_list('cumulative_movement', flat=True).first()
+                BankBalanceCheckpoint.objects.create(
+                    bank_account_id=bank_account_id,
+                    month=month,
+                    cumulative_movement=previous or Decimal('0.00')
+                )
+            
+            checkpoints.filter(month=month).update(
+                net_movement=F('net_movement') + amount_delta,
+                transaction_count=F('transaction_count') + count_delta
+            )
+            if amount_delta:
+                checkpoints.filter(month__gte=month).update(
+                    cumulative_movement=F('cumulative_movement') + amount_delta
+                )
+            if count_delta < 0:
+                # Mes sin movimientos: el acumulado del mes anterior sigue siendo válido
+                checkpoints.filter(month=month, transaction_count=0).delete()
+    
+    @classmethod
+    def apply_transactions(cls, transactions, sign=1):
+        """
+        Aplica en bloque el efecto de varios movimientos (p. ej. tras bulk_create)
+        Agrupa por cuenta y mes para ejecutar una actualización por grupo
+        
+        Args:
+            transactions: Iterable de BankTransaction
+            sign: 1 para sumar los movimientos, -1 para revertirlos
+        """
+        grouped = {}
+        for bank_transaction in transactions:
+            key = (bank_transaction.bank_account_id, bank_transaction.transaction_date.replace(day=1))
+            amount, count = grouped.get(key, (Decimal('0.00'), 0))
+            grouped[key] = (amount + bank_transaction.signed_amount * sign, count + sign)
+        
+        for (bank_account_id, month), (amount, count) in grouped.items():
+            cls.apply_delta(bank_account_id, month, amount, count)
+    
+    @classmethod
+    def rebuild_checkpoints(cls, bank_account):
+        """
+        Reconstruye todos los puntos de control de una cuenta con una consulta agrupada
+        
+        Returns:
+            Número de puntos de control creados
+        """
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncMonth
+        from apps.banking.models import BankBalanceCheckpoint, BankTransaction
+        
+        monthly = BankTransaction.objects.filter(
+            bank_account=bank_account
+        ).annotate(
+            month=TruncMonth('transaction_date')
+        ).values('month').annotate(
+            net=Sum(cls.signed_amount_expression()),
+            count=Count('id')
+        ).order_by('month')
+        
+        checkpoints = []
+        cumulative = Decimal('0.00')
+        for row in monthly:
+            cumulative += row['net'] or Decimal('0.00')
+            checkpoints.append(BankBalanceCheckpoint(
+                bank_account=bank_account,
+                month=row['month'],
+                net_movement=row['net'] or Decimal('0.00'),
+                cumulative_movement=cumulative,
+                transaction_count=row['count']
+            ))
+        
+        with transaction.atomic():
+            BankBalanceCheckpoint.objects.filter(bank_account=bank_account).delete()
+            BankBalanceCheckpoint.objects.bulk_create(checkpoints)
+        
+        return len(checkpoints)
+
+
+class BankReconciliationReportService:
+    """
+    Consultas agregadas para los reportes de conciliación
+    Las estadísticas se anotan sobre el queryset de BankAccount con subconsultas
+    correlacionadas, de modo que el reporte completo cuesta un número fijo de
+    consultas sin importar cuántas cuentas tenga la empresa
+    """
+    
+    @classmethod
+    def _aggregate_subquery(cls, queryset, group_field, expression, output_field):
+        """Subconsulta escalar que agrega `expression` por cuenta bancaria"""
+        from django.db.models import Subquery, Value
+        from django.db.models.functions import Coalesce
+        
+        subquery = queryset.order_by().values(group_field).annotate(
+            value=expression
+        ).values('value')
+        return Coalesce(
+            Subquery(subquery, output_field=output_field),
+            Value(0),
+            output_field=output_field
+        )
+    
+    @classmethod
+    def status_by_account(cls, company):
+        """
+        Cuentas activas de la empresa anotadas con estadísticas de conciliación
+        
+        Returns:
+            QuerySet de BankAccount con anotaciones tx_*, ext_*, det_* y ultimo_extracto_id
+        """
+        from django.db.models import (
+            Count, Sum, Q, OuterRef, Subquery, IntegerField, DecimalField
+        )
+        from apps.banking.models import (
+            BankAccount, BankTransaction, ExtractoBancario, ExtractoBancarioDetalle
+        )
+        
+        integer = IntegerField()
+        decimal = DecimalField(max_digits=14, decimal_places=2)
+        
+        transactions = BankTransaction.objects.filter(bank_account=OuterRef('pk'))
+        extractos = ExtractoBancario.objects.filter(bank_account=OuterRef('pk'))
+        detalles = ExtractoBancarioDetalle.objects.filter(extracto__bank_account=OuterRef('pk'))
+        
+        def tx(expression, field):
+            return cls._aggregate_subquery(transactions, 'bank_account', expression, field)
+        
+        def ext(expression):
+            return cls._aggregate_subquery(extractos, 'bank_account', expression, integer)
+        
+        def det(expression):
+            return cls._aggregate_subquery(detalles, 'extracto__bank_account', expression, integer)
+        
+        ultimo_extracto = ExtractoBancario.objects.filter(
+            bank_account=OuterRef('pk'),
+            status__in=['processed', 'reconciled']
+        ).order_by('-period_end').values('pk')[:1]
+        
+        return BankAccount.objects.filter(
+            company=company,
+            is_active=True
+        ).select_related('bank').annotate(
+            tx_total=tx(Count('id'), integer),
+            tx_conciliadas=tx(Count('id', filter=Q(is_reconciled=True)), integer),
+            tx_no_conciliadas=tx(Count('id', filter=Q(is_reconciled=False)), integer),
+            tx_monto_conciliado=tx(Sum('amount', filter=Q(is_reconciled=True)), decimal),
+            tx_monto_no_conciliado=tx(Sum('amount', filter=Q(is_reconciled=False)), decimal),
+            ext_total=ext(Count('id')),
+            ext_procesados=ext(Count('id', filter=Q(status='processed'))),
+            ext_conciliados=ext(Count('id', filter=Q(status='reconciled'))),
+            det_total=det(Count('id')),
+            det_conciliados=det(Count('id', filter=Q(is_reconciled=True))),
+            det_no_conciliados=det(Count('id', filter=Q(is_reconciled=False))),
+            ultimo_extracto_id=Subquery(ultimo_extracto),
+        )
+    
+    @classmethod
+    def unreconciled_totals_by_account(cls, cuentas_qs, fecha_desde=None, fecha_hasta=None):
+        """
+        Anota totales no conciliados (sistema y extracto) sobre un queryset de cuentas
+        
+        Returns:
+            QuerySet de BankAccount con total_transacciones, total_extracto_debitos
+            y total_extracto_creditos
+        """
+        from django.db.models import Sum, OuterRef, DecimalField
+        from apps.banking.models import BankTransaction, ExtractoBancarioDetalle
+        
+        decimal = DecimalField(max_digits=14, decimal_places=2)
+        
+        transactions = BankTransaction.objects.filter(
+            bank_account=OuterRef('pk'),
+            is_reconciled=False
+        )
+        detalles = ExtractoBancarioDetalle.objects.filter(
+            extracto__bank_account=OuterRef('pk'),
+            is_reconciled=False
+        )
+        if fecha_desde:
+            transactions = transactions.filter(transaction_date__gte=fecha_desde)
+            detalles = detalles.filter(fecha__gte=fecha_desde)
+        if fecha_hasta:
+            transactions = transactions.filter(transaction_date__lte=fecha_hasta)
+            detalles = detalles.filter(fecha__lte=fecha_hasta)
+        
+        return cuentas_qs.annotate(
+            total_transacciones=cls._aggregate_subquery(
+                transactions, 'bank_account', Sum('amount'), decimal
+            ),
+            total_extracto_debitos=cls._aggregate_subquery(
+                detalles, 'extracto__bank_account', Sum('debito'), decimal
+            ),
+            total_extracto_creditos=cls._aggregate_subquery(
+                detalles, 'extracto__bank_account', Sum('credito'), decimal
+            ),
+        )
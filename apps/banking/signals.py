@@ -0,0 +1,116 @@
+"""
+Señales del módulo Banking
+Mantienen los puntos de control de saldos al modificar movimientos bancarios
+y el índice en memoria de cuentas bancarias por cuenta contable
+"""
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.accounting.models import ChartOfAccounts
+
+from .models import BankAccount, BankTransaction
+from .services import BankAccountIndex, BankBalanceService
+
+# Campos que afectan el saldo de la cuenta
+BALANCE_FIELDS = {'bank_account', 'bank_account_id', 'transaction_date', 'transaction_type', 'amount'}
+
+
+@receiver(pre_save, sender=BankTransaction)
+def capture_previous_bank_transaction(sender, instance, update_fields=None, **kwargs):
+    """Guardar el estado anterior del movimiento para calcular la variación de saldo"""
+    instance._balance_previous = None
+    
+    if instance._state.adding or not instance.pk:
+        return
+    if update_fields is not None and not BALANCE_FIELDS.intersection(update_fields):
+        return
+    
+    previous = BankTransaction.objects.filter(pk=instance.pk).only(
+        'bank_account_id', 'transaction_date', 'transaction_type', 'amount'
+    ).first()
+    if previous:
+        instance._balance_previous = (
+            previous.bank_account_id, previous.transaction_date, previous.signed_amount
+        )
+
+
+@receiver(post_save, sender=BankTransaction)
+def update_balance_checkpoints_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Actualizar puntos de control al crear o editar un movimiento"""
+    if created:
+        BankBalanceService.apply_delta(
+            instance.bank_account_id, instance.transaction_date, instance.signed_amount, 1
+        )
+        return
+    
+    previous = getattr(instance, '_balance_previous', None)
+    if previous is None:
+        return
+    
+    current = (instance.bank_account_id, instance.transaction_date, instance.signed_amount)
+    if previous == current:
+        return
+    
+    old_account_id, old_date, old_amount = previous
+    same_month = (
+        old_account_id == instance.bank_account_id
+        and old_date.replace(day=1) == instance.transaction_date.replace(day=1)
+    )
+    if same_month:
+        BankBalanceService.apply_delta(
+            instance.bank_account_id, instance.transaction_date, instance.signed_amount - old_amount
+        )
+    else:
+        BankBalanceService.apply_delta(old_account_id, old_date, -old_amount, -1)
+        BankBalanceService.apply_delta(
+            instance.bank_account_id, instance.transaction_date, instance.signed_amount, 1
+        )
+
+
+@receiver(post_delete, sender=BankTransaction)
+def update_balance_checkpoints_on_delete(sender, instance, origin=None, **kwargs):
+    """Revertir el efecto del movimiento eliminado"""
+    # Eliminación en cascada (cuenta o empresa): los puntos de control se eliminan con la cuenta
+    origin_model = getattr(origin, 'model', None) or type(origin)
+    if origin is not None and origin_model is not BankTransaction:
+        return
+    
+    BankBalanceService.apply_delta(
+        instance.bank_account_id, instance.transaction_date, -instance.signed_amount, -1
+    )
+
+
+def _invalidate_bank_account_index(company_id=None):
+    """Invalidar ahora y tras el commit (evita recargar un estado no confirmado)"""
+    BankAccountIndex.invalidate(company_id)
+    transaction.on_commit(lambda: BankAccountIndex.invalidate(company_id))
+
+
+@receiver(pre_save, sender=BankAccount)
+def capture_previous_bank_account_company(sender, instance, **kwargs):
+    """Recordar la empresa anterior de la cuenta bancaria"""
+    instance._index_previous_company_id = None
+    if instance.pk and not instance._state.adding:
+        instance._index_previous_company_id = BankAccount.objects.filter(
+            pk=instance.pk
+        ).values_list('company_id', flat=True).first()
+
+
+@receiver(post_save, sender=BankAccount)
+@receiver(post_delete, sender=BankAccount)
+def invalidate_bank_account_index(sender, instance, **kwargs):
+    """Cambios en cuentas bancarias (activación, cuenta contable, empresa)"""
+    _invalidate_bank_account_index(instance.company_id)
+    
+    # Si la cuenta cambió de empresa, el índice anterior también queda desactualizado
+    previous_company_id = getattr(instance, '_index_previous_company_id', None)
+    if previous_company_id and previous_company_id != instance.company_id:
+        _invalidate_bank_account_index(previous_company_id)
+
+
+@receiver(post_delete, sender=ChartOfAccounts)
+def invalidate_bank_account_index_on_chart_delete(sender, instance, **kwargs):
+    """chart_account usa SET_NULL, que actualiza BankAccount sin disparar señales"""
+    _invalidate_bank_account_index(instance.company_id)
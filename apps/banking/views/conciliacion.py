@@ -9,6 +9,7 @@ from django.views.generic import TemplateView
 from django.http import JsonResponse
 from django.utils import timezone
 from django.db import transaction
+from datetime import timedelta
 from decimal import Decimal
 
 from ..models import (
@@ -16,6 +17,7 @@ from ..models import (
     ExtractoBancarioDetalle
 )
 from ..forms import ReconciliationFilterForm, ReconciliationForm
+from ..services import BankBalanceService
 from apps.core.mixins import CompanyContextMixin
 
 
@@ -58,6 +60,18 @@ class ReconciliationView(LoginRequiredMixin, CompanyContextMixin, TemplateView):
                 # Actualizar opciones de extracto
                 filter_form.filter_extractos(bank_account)
                 
+                # Saldos del sistema desde los puntos de control mensuales
+                if fecha_desde:
+                    saldo_inicial = BankBalanceService.get_balance(
+                        bank_account, fecha_desde - timedelta(days=1)
+                    )
+                else:
+                    saldo_inicial = bank_account.initial_balance
+                context['saldo_inicial_sistema'] = saldo_inicial
+                context['saldo_final_sistema'] = BankBalanceService.get_balance(
+                    bank_account, fecha_hasta or timezone.now().date()
+                )
+                
                 # Obtener transacciones del sistema
                 transactions_qs = BankTransaction.objects.filter(
                     bank_account=bank_account
@@ -73,19 +87,16 @@ class ReconciliationView(LoginRequiredMixin, CompanyContextMixin, TemplateView):
                         transaction_date__lte=fecha_hasta
                     )
                 
+                # Saldo acumulado por movimiento (función de ventana sobre todo el período)
+                transactions = list(BankBalanceService.annotate_running_balance(
+                    transactions_qs, saldo_inicial
+                ))
+                
                 # Solo mostrar no conciliadas por defecto
                 if not self.request.GET.get('show_all'):
-                    transactions_qs = transactions_qs.filter(is_reconciled=False)
-                
-                context['transactions'] = transactions_qs.order_by('transaction_date')
+                    transactions = [t for t in transactions if not t.is_reconciled]
                 
-                # Calcular saldos del sistema
-                if context['transactions']:
-                    context['saldo_inicial_sistema'] = bank_account.initial_balance
-                    saldo_acumulado = bank_account.initial_balance
-                    for trans in context['transactions']:
-                        saldo_acumulado += trans.signed_amount
-                    context['saldo_final_sistema'] = saldo_acumulado
+                context['transactions'] = transactions
                 
                 # Si hay extracto seleccionado
                 if extracto:
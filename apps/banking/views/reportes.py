@@ -7,7 +7,7 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView, ListView
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Sum, Count, Q, Case, When, Value, DecimalField, F
+from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -17,6 +17,8 @@ from ..models import (
     BankAccount, ExtractoBancario, BankTransaction, 
     ExtractoBancarioDetalle
 )
+from ..services import BankBalanceService, BankReconciliationReportService
+from apps.core.exports import stream_export_response
 from apps.core.mixins import CompanyContextMixin
 
 
@@ -42,77 +44,46 @@ class EstadoConciliacionPorCuentaView(LoginRequiredMixin, CompanyContextMixin, T
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Obtener todas las cuentas de la empresa
-        cuentas = BankAccount.objects.filter(
-            company=self.get_current_company(),
-            is_active=True
-        ).select_related('bank')
+        # Cuentas de la empresa con estadísticas anotadas (consulta única)
+        cuentas = list(BankReconciliationReportService.status_by_account(
+            self.get_current_company()
+        ))
+        
+        # Últimos extractos procesados en una sola consulta
+        ultimos_extractos = ExtractoBancario.objects.in_bulk([
+            cuenta.ultimo_extracto_id for cuenta in cuentas if cuenta.ultimo_extracto_id
+        ])
         
         # Preparar datos del reporte
         datos_reporte = []
         
         for cuenta in cuentas:
-            # Obtener estadísticas de transacciones del sistema
-            transacciones_stats = BankTransaction.objects.filter(
-                bank_account=cuenta
-            ).aggregate(
-                total_transacciones=Count('id'),
-                conciliadas=Count('id', filter=Q(is_reconciled=True)),
-                no_conciliadas=Count('id', filter=Q(is_reconciled=False)),
-                monto_conciliado=Sum(
-                    Case(
-                        When(is_reconciled=True, then='amount'),
-                        default=Value(0),
-                        output_field=DecimalField()
-                    )
-                ),
-                monto_no_conciliado=Sum(
-                    Case(
-                        When(is_reconciled=False, then='amount'),
-                        default=Value(0),
-                        output_field=DecimalField()
-                    )
-                )
-            )
-            
-            # Obtener estadísticas de extractos
-            extractos_stats = ExtractoBancario.objects.filter(
-                bank_account=cuenta
-            ).aggregate(
-                total_extractos=Count('id'),
-                extractos_procesados=Count('id', filter=Q(status='processed')),
-                extractos_conciliados=Count('id', filter=Q(status='reconciled'))
-            )
-            
-            # Obtener estadísticas de detalles de extractos
-            detalles_stats = ExtractoBancarioDetalle.objects.filter(
-                extracto__bank_account=cuenta
-            ).aggregate(
-                total_items=Count('id'),
-                items_conciliados=Count('id', filter=Q(is_reconciled=True)),
-                items_no_conciliados=Count('id', filter=Q(is_reconciled=False))
-            )
+            transacciones_stats = {
+                'total_transacciones': cuenta.tx_total,
+                'conciliadas': cuenta.tx_conciliadas,
+                'no_conciliadas': cuenta.tx_no_conciliadas,
+                'monto_conciliado': cuenta.tx_monto_conciliado,
+                'monto_no_conciliado': cuenta.tx_monto_no_conciliado,
+            }
+            extractos_stats = {
+                'total_extractos': cuenta.ext_total,
+                'extractos_procesados': cuenta.ext_procesados,
+                'extractos_conciliados': cuenta.ext_conciliados,
+            }
+            detalles_stats = {
+                'total_items': cuenta.det_total,
+                'items_conciliados': cuenta.det_conciliados,
+                'items_no_conciliados': cuenta.det_no_conciliados,
+            }
             
             # Calcular porcentajes
             porcentaje_transacciones = 0
-            if transacciones_stats['total_transacciones']:
-                porcentaje_transacciones = (
-                    transacciones_stats['conciliadas'] / 
-                    transacciones_stats['total_transacciones'] * 100
-                )
+            if cuenta.tx_total:
+                porcentaje_transacciones = cuenta.tx_conciliadas / cuenta.tx_total * 100
             
             porcentaje_extractos = 0
-            if detalles_stats['total_items']:
-                porcentaje_extractos = (
-                    detalles_stats['items_conciliados'] / 
-                    detalles_stats['total_items'] * 100
-                )
-            
-            # Último extracto procesado
-            ultimo_extracto = ExtractoBancario.objects.filter(
-                bank_account=cuenta,
-                status__in=['processed', 'reconciled']
-            ).order_by('-period_end').first()
+            if cuenta.det_total:
+                porcentaje_extractos = cuenta.det_conciliados / cuenta.det_total * 100
             
             datos_reporte.append({
                 'cuenta': cuenta,
@@ -121,10 +92,10 @@ class EstadoConciliacionPorCuentaView(LoginRequiredMixin, CompanyContextMixin, T
                 'detalles': detalles_stats,
                 'porcentaje_transacciones': round(porcentaje_transacciones, 2),
                 'porcentaje_extractos': round(porcentaje_extractos, 2),
-                'ultimo_extracto': ultimo_extracto,
+                'ultimo_extracto': ultimos_extractos.get(cuenta.ultimo_extracto_id),
                 'saldo_inicial': cuenta.initial_balance,
-                'monto_conciliado': transacciones_stats['monto_conciliado'] or Decimal('0.00'),
-                'monto_no_conciliado': transacciones_stats['monto_no_conciliado'] or Decimal('0.00')
+                'monto_conciliado': cuenta.tx_monto_conciliado or Decimal('0.00'),
+                'monto_no_conciliado': cuenta.tx_monto_no_conciliado or Decimal('0.00')
             })
         
         context['datos_reporte'] = datos_reporte
@@ -164,17 +135,13 @@ class DiferenciasNoConciliadasView(LoginRequiredMixin, CompanyContextMixin, Temp
             except (ValueError, BankAccount.DoesNotExist):
                 pass
         
-        # Obtener transacciones no conciliadas
-        transacciones_qs = BankTransaction.objects.filter(
-            bank_account__in=cuentas_qs,
-            is_reconciled=False
-        ).select_related('bank_account__bank')
+        # Validar filtros de fecha
+        fecha_desde_obj = None
+        fecha_hasta_obj = None
         
-        # Aplicar filtros de fecha
         if fecha_desde:
             try:
                 fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-                transacciones_qs = transacciones_qs.filter(transaction_date__gte=fecha_desde_obj)
                 context['fecha_desde'] = fecha_desde
             except ValueError:
                 pass
@@ -182,60 +149,60 @@ class DiferenciasNoConciliadasView(LoginRequiredMixin, CompanyContextMixin, Temp
         if fecha_hasta:
             try:
                 fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-                transacciones_qs = transacciones_qs.filter(transaction_date__lte=fecha_hasta_obj)
                 context['fecha_hasta'] = fecha_hasta
             except ValueError:
                 pass
         
-        # Obtener items de extracto no conciliados
+        # Cuentas con totales no conciliados anotados (consulta única)
+        cuentas = list(BankReconciliationReportService.unreconciled_totals_by_account(
+            cuentas_qs, fecha_desde_obj, fecha_hasta_obj
+        ))
+        
+        # Obtener transacciones no conciliadas de todas las cuentas
+        transacciones_qs = BankTransaction.objects.filter(
+            bank_account__in=cuentas_qs,
+            is_reconciled=False
+        ).select_related('bank_account__bank')
+        
+        # Obtener items de extracto no conciliados de todas las cuentas
         extracto_items_qs = ExtractoBancarioDetalle.objects.filter(
             extracto__bank_account__in=cuentas_qs,
             is_reconciled=False
         ).select_related('extracto__bank_account__bank')
         
-        # Aplicar mismos filtros de fecha
-        if fecha_desde:
-            try:
-                fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-                extracto_items_qs = extracto_items_qs.filter(fecha__gte=fecha_desde_obj)
-            except ValueError:
-                pass
+        # Aplicar filtros de fecha
+        if fecha_desde_obj:
+            transacciones_qs = transacciones_qs.filter(transaction_date__gte=fecha_desde_obj)
+            extracto_items_qs = extracto_items_qs.filter(fecha__gte=fecha_desde_obj)
         
-        if fecha_hasta:
-            try:
-                fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-                extracto_items_qs = extracto_items_qs.filter(fecha__lte=fecha_hasta_obj)
-            except ValueError:
-                pass
+        if fecha_hasta_obj:
+            transacciones_qs = transacciones_qs.filter(transaction_date__lte=fecha_hasta_obj)
+            extracto_items_qs = extracto_items_qs.filter(fecha__lte=fecha_hasta_obj)
+        
+        # Agrupar por cuenta en memoria (una consulta por tipo de movimiento)
+        transacciones_por_cuenta = {}
+        for trans in transacciones_qs.order_by('-transaction_date'):
+            transacciones_por_cuenta.setdefault(trans.bank_account_id, []).append(trans)
+        
+        items_por_cuenta = {}
+        for item in extracto_items_qs.order_by('-fecha'):
+            items_por_cuenta.setdefault(item.extracto.bank_account_id, []).append(item)
         
-        # Agrupar por cuenta
         diferencias_por_cuenta = {}
         
-        for cuenta in cuentas_qs:
-            transacciones_cuenta = transacciones_qs.filter(bank_account=cuenta).order_by('-transaction_date')
-            extracto_items_cuenta = extracto_items_qs.filter(extracto__bank_account=cuenta).order_by('-fecha')
-            
-            # Calcular totales
-            total_transacciones = transacciones_cuenta.aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
-            
-            total_extracto_debitos = extracto_items_cuenta.filter(
-                debito__isnull=False
-            ).aggregate(total=Sum('debito'))['total'] or Decimal('0.00')
-            
-            total_extracto_creditos = extracto_items_cuenta.filter(
-                credito__isnull=False
-            ).aggregate(total=Sum('credito'))['total'] or Decimal('0.00')
-            
+        for cuenta in cuentas:
             diferencias_por_cuenta[cuenta.id] = {
                 'cuenta': cuenta,
-                'transacciones': transacciones_cuenta,
-                'extracto_items': extracto_items_cuenta,
-                'total_transacciones': total_transacciones,
-                'total_extracto_debitos': total_extracto_debitos,
-                'total_extracto_creditos': total_extracto_creditos,
-                'diferencia_neta': total_extracto_creditos - total_extracto_debitos - total_transacciones
+                'transacciones': transacciones_por_cuenta.get(cuenta.id, []),
+                'extracto_items': items_por_cuenta.get(cuenta.id, []),
+                'total_transacciones': cuenta.total_transacciones,
+                'total_extracto_debitos': cuenta.total_extracto_debitos,
+                'total_extracto_creditos': cuenta.total_extracto_creditos,
+                'diferencia_neta': (
+                    cuenta.total_extracto_creditos
+                    - cuenta.total_extracto_debitos
+                    - cuenta.total_transacciones
+                )
             }
         
         # Lista de todas las cuentas para el filtro
@@ -309,22 +276,10 @@ class ExtractoConciliacionMensualView(LoginRequiredMixin, CompanyContextMixin, T
         reporte_data = None
         
         if cuenta and fecha_inicio and fecha_fin:
-            # Obtener saldo inicial (al final del mes anterior)
-            saldo_inicial = cuenta.initial_balance
-            
-            # Transacciones anteriores al período
-            transacciones_anteriores = BankTransaction.objects.filter(
-                bank_account=cuenta,
-                transaction_date__lt=fecha_inicio
-            ).aggregate(
-                total=Sum(Case(
-                    When(transaction_type__in=['debit', 'transfer_out', 'fee'], then=Value(-1) * F('amount')),
-                    default=F('amount'),
-                    output_field=DecimalField()
-                ))
-            )['total'] or Decimal('0.00')
-            
-            saldo_inicial += transacciones_anteriores
+            # Saldo inicial (al final del mes anterior) desde el punto de control mensual
+            saldo_inicial = BankBalanceService.get_balance(
+                cuenta, fecha_inicio - timedelta(days=1)
+            )
             
             # Transacciones del período
             transacciones_periodo = BankTransaction.objects.filter(
@@ -397,7 +352,9 @@ class ExtractoConciliacionMensualView(LoginRequiredMixin, CompanyContextMixin, T
                     'diferencia': diferencia
                 },
                 'transacciones': {
-                    'queryset': transacciones_periodo,
+                    'queryset': BankBalanceService.annotate_running_balance(
+                        transacciones_periodo, saldo_inicial
+                    ),
                     'stats': stats_transacciones
                 },
                 'extractos': {
@@ -444,9 +401,13 @@ class ExtractoConciliacionMensualView(LoginRequiredMixin, CompanyContextMixin, T
 # Vista AJAX para exportar reportes
 class ExportarReporteView(LoginRequiredMixin, CompanyContextMixin, TemplateView):
     """
-    Vista para exportar reportes en diferentes formatos (JSON, CSV)
+    Vista para exportar reportes en diferentes formatos (JSON, CSV, XLSX)
+    CSV y XLSX se generan en streaming fila por fila
     """
     
+    # Filas leídas por consulta al recorrer los movimientos de una exportación
+    CHUNK_SIZE = 2000
+    
     def get(self, request, *args, **kwargs):
         formato = request.GET.get('formato', 'json')
         tipo_reporte = request.GET.get('tipo')
@@ -460,14 +421,19 @@ class ExportarReporteView(LoginRequiredMixin, CompanyContextMixin, TemplateView)
         
         return JsonResponse({'error': 'Tipo de reporte no válido'}, status=400)
     
+    def _get_view_context(self, view_class):
+        """Reutilizar la lógica de contexto de una vista de reporte"""
+        view = view_class()
+        view.request = self.request
+        return view.get_context_data()
+    
     def _exportar_estado_conciliacion(self, formato):
         """Exportar reporte de estado de conciliación"""
-        # Reutilizar lógica de EstadoConciliacionPorCuentaView
-        view = EstadoConciliacionPorCuentaView()
-        view.request = self.request
-        context = view.get_context_data()
+        nombre_archivo = f'estado_conciliacion_{timezone.now().strftime("%Y%m%d")}'
         
         if formato == 'json':
+            # Reutilizar lógica de EstadoConciliacionPorCuentaView
+            context = self._get_view_context(EstadoConciliacionPorCuentaView)
             data = []
             for item in context['datos_reporte']:
                 data.append({
@@ -485,17 +451,126 @@ class ExportarReporteView(LoginRequiredMixin, CompanyContextMixin, TemplateView)
                 'fecha': context['fecha_reporte'].isoformat(),
                 'datos': data
             })
-            response['Content-Disposition'] = f'attachment; filename="estado_conciliacion_{timezone.now().strftime("%Y%m%d")}.json"'
+            response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.json"'
             return response
         
-        return JsonResponse({'error': 'Formato no soportado'}, status=400)
+        cuentas = BankReconciliationReportService.status_by_account(self.get_current_company())
+        
+        def filas():
+            for cuenta in cuentas.iterator():
+                porcentaje = (
+                    round(cuenta.tx_conciliadas / cuenta.tx_total * 100, 2)
+                    if cuenta.tx_total else 0
+                )
+                yield [
+                    str(cuenta),
+                    cuenta.bank.name,
+                    cuenta.tx_total,
+                    cuenta.tx_conciliadas,
+                    cuenta.tx_no_conciliadas,
+                    porcentaje,
+                    cuenta.tx_monto_conciliado,
+                    cuenta.tx_monto_no_conciliado,
+                    cuenta.ext_total,
+                    cuenta.det_no_conciliados,
+                ]
+        
+        encabezados = [
+            'Cuenta', 'Banco', 'Total Transacciones', 'Conciliadas', 'No Conciliadas',
+            '% Conciliación', 'Monto Conciliado', 'Monto No Conciliado',
+            'Extractos', 'Items Extracto No Conciliados',
+        ]
+        return self._stream(formato, nombre_archivo, encabezados, filas(), 'Estado Conciliación')
     
     def _exportar_diferencias(self, formato):
-        """Exportar reporte de diferencias no conciliadas"""
-        # Implementar exportación de diferencias
-        return JsonResponse({'mensaje': 'Funcionalidad en desarrollo'})
+        """
+        Exportar reporte de diferencias no conciliadas
+        Las filas se leen por bloques de la base mientras se escriben (sin el contexto
+        de DiferenciasNoConciliadasView, que carga todos los movimientos en memoria)
+        """
+        nombre_archivo = f'diferencias_no_conciliadas_{timezone.now().strftime("%Y%m%d")}'
+        
+        cuentas = BankAccount.objects.filter(
+            company=self.get_current_company(),
+            is_active=True
+        ).select_related('bank')
+        cuenta_id = self.request.GET.get('cuenta')
+        if cuenta_id and cuenta_id.isdigit():
+            cuentas = cuentas.filter(id=cuenta_id)
+        
+        transacciones_qs = BankTransaction.objects.filter(is_reconciled=False).only(
+            'transaction_date', 'description', 'reference', 'amount', 'transaction_type'
+        )
+        extracto_items_qs = ExtractoBancarioDetalle.objects.filter(is_reconciled=False).only(
+            'fecha', 'descripcion', 'referencia', 'debito', 'credito'
+        )
+        
+        fecha_desde = self._parse_fecha(self.request.GET.get('fecha_desde'))
+        fecha_hasta = self._parse_fecha(self.request.GET.get('fecha_hasta'))
+        if fecha_desde:
+            transacciones_qs = transacciones_qs.filter(transaction_date__gte=fecha_desde)
+            extracto_items_qs = extracto_items_qs.filter(fecha__gte=fecha_desde)
+        if fecha_hasta:
+            transacciones_qs = transacciones_qs.filter(transaction_date__lte=fecha_hasta)
+            extracto_items_qs = extracto_items_qs.filter(fecha__lte=fecha_hasta)
+        
+        def filas():
+            for cuenta in cuentas:
+                nombre_cuenta = str(cuenta)
+                for trans in transacciones_qs.filter(bank_account=cuenta).order_by(
+                    '-transaction_date'
+                ).iterator(chunk_size=self.CHUNK_SIZE):
+                    yield [
+                        nombre_cuenta, 'Sistema', trans.transaction_date, trans.description,
+                        trans.reference, trans.signed_amount,
+                    ]
+                for item in extracto_items_qs.filter(extracto__bank_account=cuenta).order_by(
+                    '-fecha'
+                ).iterator(chunk_size=self.CHUNK_SIZE):
+                    monto = item.credito if item.credito else -(item.debito or Decimal('0.00'))
+                    yield [
+                        nombre_cuenta, 'Extracto', item.fecha, item.descripcion,
+                        item.referencia, monto,
+                    ]
+        
+        encabezados = ['Cuenta', 'Origen', 'Fecha', 'Descripción', 'Referencia', 'Monto']
+        return self._stream(formato, nombre_archivo, encabezados, filas(), 'Diferencias')
+    
+    def _parse_fecha(self, valor):
+        """Fecha YYYY-MM-DD del filtro o None si falta o no es válida"""
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        except ValueError:
+            return None
     
     def _exportar_extracto_mensual(self, formato):
-        """Exportar extracto de conciliación mensual"""
-        # Implementar exportación de extracto mensual
-        return JsonResponse({'mensaje': 'Funcionalidad en desarrollo'})
\ No newline at end of file
+        """Exportar extracto de conciliación mensual con saldo acumulado"""
+        context = self._get_view_context(ExtractoConciliacionMensualView)
+        reporte_data = context['reporte_data']
+        if not reporte_data:
+            return JsonResponse({'error': 'No hay datos para el período seleccionado'}, status=400)
+        
+        periodo = reporte_data['periodo']
+        nombre_archivo = f'extracto_conciliacion_{periodo["año"]}{periodo["mes"]:02d}'
+        
+        def filas():
+            yield [periodo['inicio'], 'Saldo inicial', '', '', '', reporte_data['saldos']['inicial']]
+            for trans in reporte_data['transacciones']['queryset'].iterator():
+                yield [
+                    trans.transaction_date,
+                    trans.description,
+                    trans.reference,
+                    trans.signed_amount,
+                    'Sí' if trans.is_reconciled else 'No',
+                    trans.running_balance,
+                ]
+        
+        encabezados = ['Fecha', 'Descripción', 'Referencia', 'Monto', 'Conciliado', 'Saldo']
+        return self._stream(formato, nombre_archivo, encabezados, filas(), 'Extracto Mensual')
+    
+    def _stream(self, formato, nombre_archivo, encabezados, filas, hoja):
+        """Respuesta CSV/XLSX en streaming o error si el formato no está soportado"""
+        response = stream_export_response(formato, nombre_archivo, encabezados, filas, hoja)
+        if response is None:
+            return JsonResponse({'error': 'Formato no soportado'}, status=400)
+        return response
@@ -187,7 +187,7 @@ class CompanyUserAdmin(CompanyFilterMixin, admin.ModelAdmin):
 
 @admin.register(CompanySettings)
 class CompanySettingsAdmin(CompanyFilterMixin, admin.ModelAdmin):
-    list_display = ['company', 'invoice_sequential', 'default_iva_rate', 'auto_create_entries', 'default_report_format']
+    list_display = ['company', 'invoice_sequential', 'default_iva_rate', 'inventory_costing_method', 'auto_create_entries', 'default_report_format']
     list_filter = ['auto_create_entries', 'default_report_format', 'default_iva_rate']
     search_fields = ['company__trade_name']
     
@@ -208,6 +208,9 @@ class CompanySettingsAdmin(CompanyFilterMixin, admin.ModelAdmin):
         ('Configuraciones Contables', {
             'fields': ('decimal_places', 'auto_create_entries')
         }),
+        ('Configuraciones de Inventario', {
+            'fields': ('inventory_costing_method',)
+        }),
         ('Configuraciones de Reportes', {
             'fields': ('default_report_format',)
         }),
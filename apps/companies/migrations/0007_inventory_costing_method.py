@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0006_companytaxaccountmapping_retention_account_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companysettings',
+            name='inventory_costing_method',
+            field=models.CharField(choices=[('average', 'Promedio ponderado'), ('fifo', 'PEPS (FIFO)'), ('lifo', 'UEPS (LIFO)')], default='average', help_text='Define el costo de ventas de las salidas de inventario. No recalcula salidas ya registradas.', max_length=10, verbose_name='Método de costeo de inventario'),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from apps.core.models import BaseModel, City, Currency, DocumentType
@@ -344,6 +345,25 @@ class CompanySettings(BaseModel):
         verbose_name='Crear asientos automáticamente'
     )
     
+    # Configuraciones de inventario
+    COSTING_AVERAGE = 'average'
+    COSTING_FIFO = 'fifo'
+    COSTING_LIFO = 'lifo'
+    
+    COSTING_METHOD_CHOICES = [
+        (COSTING_AVERAGE, 'Promedio ponderado'),
+        (COSTING_FIFO, 'PEPS (FIFO)'),
+        (COSTING_LIFO, 'UEPS (LIFO)'),
+    ]
+    
+    inventory_costing_method = models.CharField(
+        max_length=10,
+        choices=COSTING_METHOD_CHOICES,
+        default=COSTING_AVERAGE,
+        verbose_name='Método de costeo de inventario',
+        help_text='Define el costo de ventas de las salidas de inventario. No recalcula salidas ya registradas.'
+    )
+    
     # Configuraciones de reportes
     default_report_format = models.CharField(
         max_length=10,
@@ -366,4 +386,43 @@ class CompanySettings(BaseModel):
         verbose_name_plural = 'Configuraciones de Empresa'
     
     def __str__(self):
-        return f"Configuración de {self.company.trade_name}"
\ No newline at end of file
+        return f"Configuración de {self.company.trade_name}"
+    
+    SEQUENTIAL_FIELDS = (
+        'invoice_sequential',
+        'purchase_invoice_sequential',
+        'credit_note_sequential',
+        'debit_note_sequential',
+        'withholding_sequential',
+    )
+    
+    @classmethod
+    def allocate_sequential(cls, company, field, count=1):
+        """
+        Reservar secuenciales consecutivos de un contador de la empresa
+        
+        El UPDATE atómico bloquea la fila de configuración hasta el fin de la
+        transacción del llamador: dos transacciones nunca obtienen el mismo número
+        y no se consulta ninguna tabla de documentos
+        
+        Args:
+            company: Empresa (instancia o ID)
+            field: Contador (uno de SEQUENTIAL_FIELDS)
+            count: Cantidad de números a reservar
+            
+        Returns:
+            int: Primer secuencial reservado
+        """
+        if field not in cls.SEQUENTIAL_FIELDS:
+            raise ValueError(f"Contador desconocido: {field}")
+        
+        company_id = getattr(company, 'pk', company)
+        
+        with transaction.atomic():
+            counters = cls.objects.filter(company_id=company_id)
+            if not counters.update(**{field: F(field) + count}):
+                cls.objects.get_or_create(company_id=company_id)
+                counters.update(**{field: F(field) + count})
+            next_value = counters.values_list(field, flat=True).get()
+        
+        return next_value - count
\ No newline at end of file
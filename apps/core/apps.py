@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
-    verbose_name = 'Núcleo del Sistema'
\ No newline at end of file
+    verbose_name = 'Núcleo del Sistema'
+
+    def ready(self):
+        import apps.core.signals
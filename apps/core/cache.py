@@ -0,0 +1,50 @@
+"""
+Caché en memoria del proceso con expiración por clave
+Para datos pequeños y muy leídos (catálogos, índices por empresa) que se
+invalidan con señales al cambiar
+"""
+
+import threading
+from time import monotonic
+
+
+class TTLCache:
+    """
+    Valores por clave cargados bajo demanda y descartados al expirar
+
+    Las señales solo invalidan la memoria del proceso que guarda el cambio; el
+    TTL acota la desactualización en los demás procesos del servidor. Los
+    valores se comparten entre hilos y no deben modificarse.
+
+        _cache = TTLCache(ttl_seconds=300)
+        entry = _cache.get(company_id, lambda: load(company_id))
+    """
+
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """Valor de la clave, llamando a load() si no existe o expiró"""
+        entry = self._entries.get(key)
+        now = monotonic()
+        if entry and entry[1] > now:
+            return entry[0]
+
+        value = load()
+        now = monotonic()
+        with self._lock:
+            # Las claves expiradas se descartan al guardar: la memoria no crece sin límite
+            for stale in [stale for stale, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                del self._entries[stale]
+            self._entries[key] = (value, now + self.ttl_seconds)
+        return value
+
+    def invalidate(self, key=None):
+        """Descartar una clave (o todas)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -0,0 +1,170 @@
+"""
+Almacén de documentos renderizados (renderizar una vez, servir muchas)
+Los PDF de documentos finalizados se guardan en disco bajo MEDIA_ROOT con clave
+(tipo de documento, id, hash de los datos renderizados), con desalojo LRU por
+tamaño total, y se sirven con FileResponse y ETag / If-None-Match
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+
+class RenderedDocumentStore:
+    """
+    Cache en disco de PDF de documentos inmutables (facturas emitidas, asientos
+    contabilizados, comprobantes de retención emitidos)
+
+    Un cambio en los datos del documento cambia el hash, de modo que la versión
+    anterior nunca se sirve; el acceso actualiza la fecha de modificación del
+    archivo, que ordena el desalojo LRU cuando se supera DOCUMENT_STORE_MAX_BYTES
+    """
+
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def root(cls):
+        return Path(settings.MEDIA_ROOT) / 'rendered_documents'
+
+    @classmethod
+    def max_bytes(cls):
+        return getattr(settings, 'DOCUMENT_STORE_MAX_BYTES', 0) or cls.DEFAULT_MAX_BYTES
+
+    @classmethod
+    def fingerprint(cls, data):
+        """Hash estable de los datos que determinan el contenido del documento"""
+        payload = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_or_render(cls, doc_type, doc_id, data, render):
+        """
+        Ruta del PDF en disco, renderizándolo solo si no existe
+
+        Args:
+            doc_type: Tipo de documento ('invoice', 'journal_entry', ...)
+            doc_id: ID del documento
+            data: Datos que determinan el contenido (ver fingerprint)
+            render: Callable sin argumentos que retorna los bytes del PDF
+
+        Returns:
+            Path: Archivo del PDF
+        """
+        return cls._get_or_render(doc_type, doc_id, cls.fingerprint(data), render)
+
+    @classmethod
+    def _get_or_render(cls, doc_type, doc_id, digest, render):
+        directory = cls.root() / doc_type
+        path = directory / f"{doc_id}-{digest[:32]}.pdf"
+
+        try:
+            # Acceso: actualizar mtime para el orden LRU
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        content = render()
+        directory.mkdir(parents=True, exist_ok=True)
+
+        # Escritura atómica: otro proceso nunca lee un archivo a medias
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # Versiones anteriores del mismo documento ya no se pueden servir
+        for old_path in directory.glob(f"{doc_id}-*.pdf"):
+            if old_path != path:
+                old_path.unlink(missing_ok=True)
+
+        cls.evict(keep=path)
+        return path
+
+    @classmethod
+    def evict(cls, keep=None):
+        """
+        Eliminar los archivos usados hace más tiempo hasta quedar bajo el límite de tamaño
+
+        Args:
+            keep: Archivo que no se elimina (el recién renderizado)
+        """
+        root = cls.root()
+        if not root.exists():
+            return
+
+        with cls._lock:
+            files = []
+            total = 0
+            for path in root.glob('*/*.pdf'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            limit = cls.max_bytes()
+            if total <= limit:
+                return
+
+            for mtime, size, path in sorted(files):
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
+                if total <= limit:
+                    break
+
+    @classmethod
+    def invalidate(cls, doc_type, doc_id):
+        """Eliminar las versiones guardadas de un documento"""
+        for path in (cls.root() / doc_type).glob(f"{doc_id}-*.pdf"):
+            path.unlink(missing_ok=True)
+
+    @classmethod
+    def serve(cls, request, doc_type, doc_id, data, render, filename):
+        """
+        Respuesta del PDF desde el almacén, con 304 si el navegador ya tiene esta versión
+
+        Args:
+            request: HttpRequest (If-None-Match)
+            filename: Nombre del archivo descargado
+            (resto: ver get_or_render)
+        """
+        digest = cls.fingerprint(data)
+        etag = f'"{digest}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                pdf_file = open(cls._get_or_render(doc_type, doc_id, digest, render), 'rb')
+            except FileNotFoundError:
+                # Desalojado por otro proceso entre la consulta y la apertura
+                pdf_file = open(cls._get_or_render(doc_type, doc_id, digest, render), 'rb')
+            response = FileResponse(
+                pdf_file,
+                as_attachment=True,
+                filename=filename,
+                content_type='application/pdf'
+            )
+
+        response['ETag'] = etag
+        # Revalidar siempre: los datos de acceso no se comparten entre usuarios
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
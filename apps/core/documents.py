@@ -0,0 +1,165 @@
+"""
+Renderizado de documentos por lotes
+Reparte el renderizado (CPU) entre procesos y entrega un ZIP en streaming a medida
+que cada documento termina, sin armar el archivo completo en memoria
+"""
+
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+
+# Con pocos documentos el arranque del pool cuesta más que renderizar en el proceso
+MIN_DOCUMENTS_FOR_POOL = 4
+
+
+def get_render_workers():
+    """Procesos de renderizado (DOCUMENT_RENDER_WORKERS o número de CPUs)"""
+    return getattr(settings, 'DOCUMENT_RENDER_WORKERS', 0) or os.cpu_count() or 1
+
+
+def create_process_pool(workers=None):
+    """
+    Pool de procesos para render_documents que se reutiliza entre lotes
+    (los workers conservan su estado en memoria, p. ej. caches)
+
+    spawn: los workers no heredan hilos ni conexiones a la base de datos del servidor
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers or get_render_workers(),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+def render_documents(render, jobs, workers=None, executor=None):
+    """
+    Renderizar documentos en un pool de procesos
+
+    Args:
+        render: Función de módulo (serializable) que recibe el payload y retorna bytes
+        jobs: Iterable de (nombre, payload); los payloads deben ser datos simples
+        workers: Número de procesos (por defecto get_render_workers())
+        executor: Pool persistente (ver create_process_pool) con `workers` procesos;
+            no se cierra al terminar. Por defecto se crea un pool para esta llamada
+
+    Yields:
+        tuple: (nombre, bytes, error) en orden de finalización; error es None si
+        el documento se generó correctamente
+    """
+    jobs = iter(jobs)
+    workers = workers or get_render_workers()
+
+    # Primeros documentos en memoria para decidir si vale la pena el pool
+    head = []
+    for job in jobs:
+        head.append(job)
+        if len(head) >= MIN_DOCUMENTS_FOR_POOL:
+            break
+
+    if workers <= 1 or len(head) < MIN_DOCUMENTS_FOR_POOL:
+        for name, payload in head:
+            yield _render_job(render, name, payload)
+        for name, payload in jobs:
+            yield _render_job(render, name, payload)
+        return
+
+    owned = executor is None
+    if owned:
+        executor = create_process_pool(workers)
+    pending = set()
+    queued = _chain(head, jobs)
+    try:
+        while True:
+            # Como máximo dos documentos en vuelo por worker: memoria acotada
+            for name, payload in queued:
+                pending.add(executor.submit(_render_job, render, name, payload))
+                if len(pending) >= workers * 2:
+                    break
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        if owned:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            for future in pending:
+                future.cancel()
+
+
+def _chain(head, jobs):
+    yield from head
+    yield from jobs
+
+
+def _render_job(render, name, payload):
+    """Tarea de renderizado: los errores se devuelven en lugar de propagarse"""
+    try:
+        return name, render(payload), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+class _ZipStream:
+    """Destino de escritura no posicionable: acumula los bytes hasta que se vacía"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(entries):
+    """
+    Generar un ZIP por partes
+
+    Args:
+        entries: Iterable de (nombre de archivo, bytes)
+
+    Yields:
+        bytes: Fragmentos del ZIP a medida que se agrega cada archivo
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for filename, content in entries:
+            zip_file.writestr(filename, content)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def stream_zip_response(filename, entries):
+    """
+    Respuesta ZIP en streaming
+
+    Args:
+        filename: Nombre del archivo sin extensión
+        entries: Iterable (idealmente generador) de (nombre de archivo, bytes)
+    """
+    response = StreamingHttpResponse(
+        (chunk for chunk in iter_zip(entries) if chunk),
+        content_type='application/zip'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+    return response
@@ -0,0 +1,101 @@
+"""
+Exportación de reportes en streaming (CSV / XLSX)
+Las filas se generan bajo demanda para no construir el archivo completo en memoria
+"""
+
+import csv
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+
+
+class _EchoBuffer:
+    """Pseudo-buffer para csv.writer: devuelve la línea en lugar de almacenarla"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    """Normaliza valores para CSV"""
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _xlsx_value(value):
+    """Normaliza valores para celdas de Excel"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # Excel no soporta fechas con zona horaria
+        return value.replace(tzinfo=None)
+    return value
+
+
+def stream_csv_response(filename, headers, rows):
+    """
+    Respuesta CSV en streaming
+
+    Args:
+        filename: Nombre del archivo sin extensión
+        headers: Lista de encabezados
+        rows: Iterable (idealmente generador) de listas de valores
+    """
+    writer = csv.writer(_EchoBuffer())
+
+    def generate():
+        # BOM para que Excel detecte UTF-8 (tildes y ñ)
+        yield '\ufeff'
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow([_csv_value(value) for value in row])
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def stream_xlsx_response(filename, headers, rows, sheet_title='Reporte'):
+    """
+    Respuesta XLSX escrita en modo write-only a un archivo temporal y servida por bloques
+
+    openpyxl en modo write_only mantiene en memoria solo la fila actual; el
+    archivo temporal se elimina al cerrar la respuesta
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(headers)
+    for row in rows:
+        sheet.append([_xlsx_value(value) for value in row])
+
+    temp_file = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(temp_file)
+    temp_file.seek(0)
+
+    return FileResponse(
+        temp_file,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+def stream_export_response(formato, filename, headers, rows, sheet_title='Reporte'):
+    """
+    Despacha a CSV o XLSX según el formato solicitado
+
+    Returns:
+        Respuesta en streaming o None si el formato no está soportado
+    """
+    if formato == 'csv':
+        return stream_csv_response(filename, headers, rows)
+    if formato == 'xlsx':
+        return stream_xlsx_response(filename, headers, rows, sheet_title)
+    return None
@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import pdf_templates
+from apps.core.pdf_templates import CompanyHeaderCache
+
+
+class Command(BaseCommand):
+    help = 'Medir el tiempo de renderizado de PDF con y sin el cache de estilos y encabezados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--invoice',
+            type=int,
+            help='ID de la factura a renderizar (por defecto la última)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Repeticiones por medición (por defecto 50)'
+        )
+
+    def handle(self, *args, **options):
+        from apps.invoicing.models import Invoice
+        from apps.invoicing.invoice_pdf import invoice_pdf_data, render_invoice_pdf
+
+        invoices = Invoice.objects.select_related('company', 'customer', 'payment_form')
+        invoice = (
+            invoices.filter(pk=options['invoice']).first() if options['invoice']
+            else invoices.order_by('-pk').first()
+        )
+        if invoice is None:
+            raise CommandError('No hay facturas para renderizar')
+
+        iterations = max(1, options['iterations'])
+
+        def render():
+            render_invoice_pdf(invoice_pdf_data(invoice))
+
+        # Antes: estilos y encabezado construidos en cada documento
+        cold = self._measure(render, iterations, before_each=self._clear_caches)
+        # Después: caches calientes compartidos entre documentos
+        render()
+        warm = self._measure(render, iterations)
+
+        styles_cold = self._measure(self._build_styles, iterations * 20, before_each=self._clear_caches)
+        self._build_styles()
+        styles_warm = self._measure(self._build_styles, iterations * 20)
+
+        self.stdout.write(f'Factura {invoice.number} ({iterations} repeticiones)')
+        self.stdout.write(f'  Estilos sin cache:   {styles_cold:8.3f} ms')
+        self.stdout.write(f'  Estilos con cache:   {styles_warm:8.3f} ms')
+        self.stdout.write(f'  Documento sin cache: {cold:8.3f} ms')
+        self.stdout.write(f'  Documento con cache: {warm:8.3f} ms')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. Ahorro por documento: {cold - warm:.3f} ms '
+                f'({(cold - warm) / cold * 100:.1f}%).'
+            )
+        )
+
+    def _measure(self, function, iterations, before_each=None):
+        """Tiempo promedio por llamada en milisegundos"""
+        total = 0.0
+        for _ in range(iterations):
+            if before_each:
+                before_each()
+            start = time.perf_counter()
+            function()
+            total += time.perf_counter() - start
+        return total / iterations * 1000
+
+    def _clear_caches(self):
+        pdf_templates.get_sample_styles.cache_clear()
+        pdf_templates._paragraph_styles.clear()
+        CompanyHeaderCache.invalidate()
+
+    def _build_styles(self):
+        """Conjunto de estilos típico de un generador (hoja base + seis estilos)"""
+        styles = pdf_templates.get_sample_styles()
+        for index, parent in enumerate(('Heading1', 'Normal', 'Normal', 'Normal', 'Normal', 'Normal')):
+            pdf_templates.paragraph_style(f'Benchmark{index}', parent=styles[parent], fontSize=8 + index)
@@ -0,0 +1,102 @@
+"""
+Plantillas compartidas para los generadores de PDF (ReportLab)
+Hojas de estilo y estilos de párrafo cacheados a nivel de módulo, y encabezados
+por empresa (datos y logo) reutilizados entre renderizados
+"""
+
+import threading
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+from .cache import TTLCache
+
+
+@lru_cache(maxsize=1)
+def get_sample_styles():
+    """
+    Hoja de estilos base de ReportLab, creada una sola vez por proceso
+
+    Compartida entre renderizados: usar paragraph_style para derivar estilos
+    en lugar de modificar los de la hoja
+    """
+    return getSampleStyleSheet()
+
+
+_paragraph_styles = {}
+_paragraph_styles_lock = threading.Lock()
+
+
+def paragraph_style(name, parent=None, **attrs):
+    """
+    ParagraphStyle cacheado: misma firma que ParagraphStyle(name, parent, **attrs)
+
+    Las combinaciones (nombre, estilo padre, atributos) se construyen una sola vez
+    y se reutilizan en todos los documentos; el estilo devuelto no debe modificarse
+    """
+    # El padre por identidad: los de get_sample_styles y paragraph_style son estables
+    key = (
+        name,
+        parent,
+        tuple(sorted((attr, repr(value)) for attr, value in attrs.items())),
+    )
+    style = _paragraph_styles.get(key)
+    if style is None:
+        style = ParagraphStyle(name, parent=parent, **attrs)
+        with _paragraph_styles_lock:
+            style = _paragraph_styles.setdefault(key, style)
+    return style
+
+
+class CompanyHeaderCache:
+    """
+    Bloque de encabezado por empresa (nombre, RUC, dirección, contacto y bytes del logo)
+    Se invalida con señales de Company (ver apps/core/signals.py)
+    """
+
+    _cache = TTLCache(ttl_seconds=300)
+
+    @classmethod
+    def get(cls, company):
+        """
+        Encabezado de la empresa, cargándolo si no existe o expiró
+
+        Returns:
+            dict: trade_name, legal_name, ruc, address, phone, email, logo (bytes o None)
+        """
+        return cls._cache.get(company.pk, lambda: {
+            'trade_name': company.trade_name,
+            'legal_name': company.legal_name,
+            'ruc': company.ruc,
+            'address': company.address,
+            'phone': company.phone,
+            'email': company.email,
+            'logo': cls._read_logo(company),
+        })
+
+    @classmethod
+    def _read_logo(cls, company):
+        """Bytes del logo de la empresa (None si no tiene o no se puede leer)"""
+        if not company.logo:
+            return None
+        try:
+            with company.logo.open('rb') as logo_file:
+                return logo_file.read()
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No se pudo leer el logo de la empresa {company.pk}: {e}")
+            return None
+
+    @classmethod
+    def logo_image(cls, header, width, height):
+        """Flowable Image del logo cacheado (None si la empresa no tiene logo)"""
+        from reportlab.platypus import Image
+
+        if not header.get('logo'):
+            return None
+        return Image(BytesIO(header['logo']), width=width, height=height, kind='proportional')
+
+    @classmethod
+    def invalidate(cls, company_id=None):
+        """Descartar el encabezado de una empresa (o de todas)"""
+        cls._cache.invalidate(company_id)
@@ -0,0 +1,20 @@
+"""
+Señales del núcleo
+Mantienen los encabezados de empresa cacheados para los PDF
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.companies.models import Company
+
+from .pdf_templates import CompanyHeaderCache
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_header(sender, instance, **kwargs):
+    """Cambios en datos de la empresa (nombre, RUC, dirección, logo)"""
+    CompanyHeaderCache.invalidate(instance.pk)
+    transaction.on_commit(lambda: CompanyHeaderCache.invalidate(instance.pk))
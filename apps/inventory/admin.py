@@ -1,5 +1,13 @@
+from datetime import datetime
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.urls import path
+from django.utils import timezone
+from apps.companies.models import Company
+from apps.core.exports import stream_export_response
 from .models import Category, Warehouse, Product, StockMovement, Stock
+from .services import InventoryValuationService
 from apps.core.filters import UserCompanyListFilter, UserCompanyProductFilter, UserCompanyWarehouseFilter
 
 
@@ -179,8 +187,8 @@ class CategoryAdmin(CompanyFilterMixin, admin.ModelAdmin):
 
 @admin.register(Warehouse)
 class WarehouseAdmin(CompanyFilterMixin, admin.ModelAdmin):
-    list_display = ['code', 'name', 'company', 'responsible', 'is_active']
-    list_filter = [UserCompanyListFilter, 'is_active']
+    list_display = ['code', 'name', 'company', 'responsible', 'is_default', 'is_active']
+    list_filter = [UserCompanyListFilter, 'is_default', 'is_active']
     search_fields = ['code', 'name', 'address']
     list_select_related = ['company', 'responsible']
     
@@ -189,7 +197,7 @@ class WarehouseAdmin(CompanyFilterMixin, admin.ModelAdmin):
             'fields': ('company', 'code', 'name', 'address')
         }),
         ('Responsabilidad', {
-            'fields': ('responsible', 'is_active')
+            'fields': ('responsible', 'is_default', 'is_active')
         }),
     )
 
@@ -209,7 +217,7 @@ class ProductAdmin(CompanyFilterMixin, admin.ModelAdmin):
             'fields': ('unit_of_measure',)
         }),
         ('Inventario', {
-            'fields': ('manages_inventory', 'minimum_stock', 'maximum_stock')
+            'fields': ('manages_inventory', 'stock_on_hand', 'minimum_stock', 'maximum_stock')
         }),
         ('Precios', {
             'fields': ('cost_price', 'sale_price')
@@ -227,7 +235,7 @@ class ProductAdmin(CompanyFilterMixin, admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ['display_effective_sales_account', 'display_effective_cost_account', 'display_effective_inventory_account']
+    readonly_fields = ['stock_on_hand', 'display_effective_sales_account', 'display_effective_cost_account', 'display_effective_inventory_account']
     
     def effective_accounts_summary(self, obj):
         """Muestra resumen de configuración contable en la lista"""
@@ -279,8 +287,8 @@ class ProductAdmin(CompanyFilterMixin, admin.ModelAdmin):
         """
         Búsqueda personalizada para autocompletado que:
         1. Filtra por empresas del usuario
-        2. Busca por código y nombre de forma inteligente
-        3. Mejora la relevancia de resultados
+        2. Busca en el índice de productos (código, nombre y descripción)
+        3. Ordena por relevancia: código exacto, prefijo de código y nombre
         """
         # Filtrar por empresas del usuario si no es superusuario
         if not request.user.is_superuser:
@@ -299,43 +307,13 @@ class ProductAdmin(CompanyFilterMixin, admin.ModelAdmin):
         if not search_term:
             return queryset, False
         
-        # Búsqueda inteligente por código y nombre
-        from django.db.models import Q
+        # Búsqueda por índice: código exacto, prefijo de código y palabras del nombre
+        from .services import ProductSearchService
         
-        # Dividir término en palabras para búsqueda más flexible
-        terms = search_term.strip().split()
-        search_query = Q()
-        
-        for term in terms:
-            # Buscar por código (exacto e inicio)
-            term_query = Q(code__iexact=term) | Q(code__istartswith=term)
-            # Buscar por nombre (contiene)
-            term_query |= Q(name__icontains=term)
-            # Buscar por descripción (contiene)
-            term_query |= Q(description__icontains=term)
-            
-            search_query &= term_query
-        
-        # Aplicar filtros y ordenar por relevancia
-        filtered_queryset = queryset.filter(search_query).distinct()
-        
-        # Ordenar por relevancia: código exacto primero, luego por código y nombre
-        if terms:
-            term = terms[0]  # Usar primer término para ordenamiento
-            try:
-                # Ordenar poniendo coincidencias exactas de código primero
-                filtered_queryset = filtered_queryset.extra(
-                    select={
-                        'code_exact_match': "CASE WHEN UPPER(code) = UPPER(%s) THEN 0 ELSE 1 END",
-                        'code_starts_with': "CASE WHEN UPPER(code) LIKE UPPER(%s) THEN 0 ELSE 1 END"
-                    },
-                    select_params=[term, term + '%']
-                ).order_by('code_exact_match', 'code_starts_with', 'code', 'name')
-            except:
-                # Fallback si hay problemas con extra()
-                filtered_queryset = filtered_queryset.order_by('code', 'name')
-        else:
-            filtered_queryset = filtered_queryset.order_by('code', 'name')
+        company_ids = None
+        if not request.user.is_superuser and user_companies:
+            company_ids = list(user_companies)
+        filtered_queryset = ProductSearchService.rank(queryset, search_term, company_ids)
         
         return filtered_queryset, False
 
@@ -343,7 +321,7 @@ class ProductAdmin(CompanyFilterMixin, admin.ModelAdmin):
 @admin.register(StockMovement)
 class StockMovementAdmin(CompanyFilterMixin, admin.ModelAdmin):
     list_display = ['date', 'product', 'warehouse', 'movement_type', 'quantity', 'unit_cost', 'created_by']
-    list_filter = ['movement_type', UserCompanyProductFilter, UserCompanyWarehouseFilter, 'date']
+    list_filter = ['movement_type', 'source_type', UserCompanyProductFilter, UserCompanyWarehouseFilter, 'date']
     search_fields = ['product__code', 'product__name', 'reference', 'description']
     list_select_related = ['product', 'warehouse', 'created_by']
     
@@ -354,12 +332,16 @@ class StockMovementAdmin(CompanyFilterMixin, admin.ModelAdmin):
         ('Cantidades', {
             'fields': ('quantity', 'unit_cost', 'total_cost')
         }),
+        ('Documento Origen', {
+            'fields': ('source_type', 'source_id', 'source_line_id'),
+            'classes': ('collapse',)
+        }),
         ('Usuario', {
             'fields': ('created_by',)
         }),
     )
     
-    readonly_fields = ['total_cost']
+    readonly_fields = ['total_cost', 'source_type', 'source_id', 'source_line_id']
 
 
 @admin.register(Stock)
@@ -369,4 +351,68 @@ class StockAdmin(CompanyFilterMixin, admin.ModelAdmin):
     search_fields = ['product__code', 'product__name']
     list_select_related = ['product', 'warehouse']
     
-    readonly_fields = ['last_movement']
\ No newline at end of file
+    readonly_fields = ['last_movement']
+    
+    def get_urls(self):
+        """Agregar URL del reporte de valoración a fecha"""
+        urls = super().get_urls()
+        custom_urls = [
+            path('valuation/',
+                 self.admin_site.admin_view(self.valuation_report_view),
+                 name='inventory_stock_valuation'),
+        ]
+        return custom_urls + urls
+    
+    def valuation_report_view(self, request):
+        """
+        Existencias y valoración a una fecha desde el kardex (CSV/XLSX en streaming)
+        
+        Parámetros GET: empresa, fecha (AAAA-MM-DD, por defecto hoy),
+        metodo (average|fifo), bodega (opcional), formato (csv|xlsx)
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        
+        try:
+            fecha = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date() if request.GET.get('fecha') else timezone.localdate()
+            company_id = int(request.GET['empresa']) if request.GET.get('empresa') else None
+            warehouse_id = int(request.GET['bodega']) if request.GET.get('bodega') else None
+        except ValueError:
+            return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+        
+        metodo = request.GET.get('metodo', InventoryValuationService.AVERAGE)
+        if metodo not in dict(InventoryValuationService.METHOD_CHOICES):
+            return JsonResponse({'error': 'Método de valoración no válido'}, status=400)
+        
+        # Empresas permitidas para el usuario
+        companies = Company.objects.all()
+        if not request.user.is_superuser:
+            user_companies = request.session.get('user_companies', [])
+            if user_companies == 'all':
+                pass
+            elif user_companies:
+                companies = companies.filter(id__in=user_companies)
+            else:
+                companies = companies.none()
+        
+        if company_id is None:
+            company_ids = list(companies.values_list('id', flat=True)[:2])
+            if len(company_ids) != 1:
+                return JsonResponse({'error': 'Indique la empresa'}, status=400)
+            company_id = company_ids[0]
+        elif not companies.filter(id=company_id).exists():
+            raise PermissionDenied
+        
+        headers = ['Código', 'Producto', 'Bodega', 'Nombre Bodega', 'Cantidad', 'Costo Unitario', 'Valor']
+        rows = InventoryValuationService.iter_report_rows(company_id, fecha, metodo, warehouse_id)
+        
+        response = stream_export_response(
+            request.GET.get('formato', 'csv'),
+            f'valoracion_inventario_{metodo}_{fecha:%Y%m%d}',
+            headers,
+            rows,
+            sheet_title='Valoración'
+        )
+        if response is None:
+            return JsonResponse({'error': 'Formato no soportado'}, status=400)
+        return response
\ No newline at end of file
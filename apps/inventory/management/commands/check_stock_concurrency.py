@@ -0,0 +1,151 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Verificar el ledger de inventario con ventas y compras simultáneas sobre un mismo '
+        'producto (Stock.quantity y Product.stock_on_hand deben cuadrar al final)'
+    )
+
+    # SQLite bloquea la base completa al escribir: se reintenta en lugar de fallar
+    LOCK_RETRIES = 50
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='ID de la empresa (por defecto la primera)'
+        )
+        parser.add_argument(
+            '--sales',
+            type=int,
+            default=200,
+            help='Ventas de una unidad a registrar (por defecto 200)'
+        )
+        parser.add_argument(
+            '--purchases',
+            type=int,
+            default=100,
+            help='Compras de tres unidades a registrar (por defecto 100)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=12,
+            help='Hilos que registran movimientos al mismo tiempo (por defecto 12)'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Conservar el producto de prueba y sus movimientos'
+        )
+
+    def handle(self, *args, **options):
+        from apps.companies.models import Company
+        from apps.inventory.models import Category, Product, Stock, StockMovement
+        from apps.inventory.services import WarehouseRouter
+        from apps.users.models import User
+
+        company = (
+            Company.objects.filter(pk=options['company']).first() if options['company']
+            else Company.objects.order_by('pk').first()
+        )
+        if company is None:
+            raise CommandError('No existe la empresa indicada')
+        user = User.objects.order_by('-is_superuser', 'pk').first()
+        if user is None:
+            raise CommandError('No hay usuarios para registrar los movimientos')
+        warehouse = WarehouseRouter.default_for_company(company, responsible=user)
+
+        suffix = uuid.uuid4().hex[:8].upper()
+        category = Category.objects.create(company=company, name=f'Prueba concurrencia {suffix}')
+        product = Product.objects.create(
+            company=company,
+            category=category,
+            code=f'CONC-{suffix}',
+            name=f'Producto prueba concurrencia {suffix}',
+            product_type='product',
+            unit_of_measure='u',
+            manages_inventory=True,
+            cost_price=Decimal('10.00'),
+            sale_price=Decimal('15.00'),
+        )
+
+        sale_quantity = Decimal('1.00')
+        purchase_quantity = Decimal('3.00')
+        jobs = (
+            [(StockMovement.OUT, sale_quantity, index) for index in range(options['sales'])]
+            + [(StockMovement.IN, purchase_quantity, index) for index in range(options['purchases'])]
+        )
+        # Intercalar ventas y compras para que compitan sobre la misma fila
+        jobs.sort(key=lambda job: (job[2], job[0]))
+        expected = purchase_quantity * options['purchases'] - sale_quantity * options['sales']
+
+        self.stdout.write(
+            f'Registrando {options["sales"]} ventas y {options["purchases"]} compras de '
+            f'{product.code} con {options["workers"]} hilos...'
+        )
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            retries = sum(pool.map(
+                lambda job: self._record(product, warehouse, user, *job), jobs
+            ))
+        elapsed = time.perf_counter() - start
+
+        stock = Stock.objects.get(product=product, warehouse=warehouse).quantity
+        product.refresh_from_db(fields=['stock_on_hand'])
+        movements = StockMovement.objects.filter(product=product).count()
+
+        self.stdout.write(f'  Movimientos registrados: {movements} de {len(jobs)}')
+        self.stdout.write(f'  Stock esperado:          {expected}')
+        self.stdout.write(f'  Stock.quantity:          {stock}')
+        self.stdout.write(f'  Product.stock_on_hand:   {product.stock_on_hand}')
+        self.stdout.write(f'  Reintentos por bloqueo:  {retries} ({elapsed:.1f} s)')
+
+        if not options['keep']:
+            product.delete()
+            category.delete()
+
+        if movements != len(jobs) or stock != expected or product.stock_on_hand != expected:
+            raise CommandError('El stock no cuadra después de los movimientos simultáneos')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. {len(jobs)} movimientos simultáneos sin pérdida de stock.'
+            )
+        )
+
+    def _record(self, product, warehouse, user, movement_type, quantity, index):
+        """Registrar un movimiento en una conexión propia del hilo; devuelve los reintentos"""
+        from apps.inventory.models import StockMovement
+        from apps.inventory.services import InventoryLedgerService
+
+        close_old_connections()
+        try:
+            for attempt in range(self.LOCK_RETRIES):
+                try:
+                    InventoryLedgerService.record_movements([StockMovement(
+                        product=product,
+                        warehouse=warehouse,
+                        movement_type=movement_type,
+                        quantity=quantity,
+                        unit_cost=product.cost_price,
+                        total_cost=quantity * product.cost_price,
+                        reference=f'Prueba {index}',
+                        description='Prueba de concurrencia del ledger de inventario',
+                        created_by=user,
+                    )])
+                    return attempt
+                except OperationalError as e:
+                    if 'locked' not in str(e) or transaction.get_connection().in_atomic_block:
+                        raise
+                    time.sleep(0.01 * (attempt + 1))
+            raise CommandError('La base de datos siguió bloqueada')
+        finally:
+            connection.close()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.inventory.services import ProductSearchService
+
+class Command(BaseCommand):
+    help = 'Reconstruir el índice de búsqueda de productos (autocompletado de facturas)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='ID de la empresa (por defecto todas)'
+        )
+    
+    def handle(self, *args, **options):
+        products, terms = ProductSearchService.rebuild(company_id=options.get('company'))
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. {products} productos indexados con {terms} términos.'
+            )
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.inventory.models import Product
+from apps.inventory.services import InventoryLedgerService
+
+class Command(BaseCommand):
+    help = 'Recalcular el stock total desnormalizado de los productos desde Stock'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='ID de la empresa (por defecto todas)'
+        )
+    
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options.get('company'):
+            products = products.filter(company_id=options['company'])
+        
+        updated = InventoryLedgerService.rebuild_stock_on_hand(products)
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. {updated} productos corregidos de {products.count()}.'
+            )
+        )
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:16
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_stock_on_hand(apps, schema_editor):
+    """Inicializar el stock desnormalizado desde los registros de Stock"""
+    Product = apps.get_model('inventory', 'Product')
+    Stock = apps.get_model('inventory', 'Stock')
+    
+    totals = Stock.objects.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    products = []
+    for product_id, total in totals.iterator():
+        products.append(Product(id=product_id, stock_on_hand=total or Decimal('0.00')))
+    
+    Product.objects.bulk_update(products, ['stock_on_hand'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_add_accounting_integration_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_on_hand',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Total en todas las bodegas, mantenido por InventoryLedgerService', max_digits=12, verbose_name='Stock disponible'),
+        ),
+        migrations.RunPython(fill_stock_on_hand, migrations.RunPython.noop),
+    ]
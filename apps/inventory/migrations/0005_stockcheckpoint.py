@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:18
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_product_stock_on_hand'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('month', models.DateField(help_text='Primer día del mes del punto de control', verbose_name='Mes')),
+                ('quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Cantidad al cierre')),
+                ('average_cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Costo promedio al cierre')),
+                ('movement_count', models.PositiveIntegerField(default=0, verbose_name='Movimientos del mes')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.product', verbose_name='Producto')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='inventory.warehouse', verbose_name='Bodega')),
+            ],
+            options={
+                'verbose_name': 'Existencia Mensual',
+                'verbose_name_plural': 'Existencias Mensuales',
+                'ordering': ['product', 'warehouse', 'month'],
+                'unique_together': {('product', 'warehouse', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:21
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def create_opening_layers(apps, schema_editor):
+    """Una capa inicial por registro de Stock con existencias, al costo promedio vigente"""
+    Stock = apps.get_model('inventory', 'Stock')
+    StockCostLayer = apps.get_model('inventory', 'StockCostLayer')
+    
+    now = timezone.now()
+    layers = []
+    for stock in Stock.objects.filter(quantity__gt=0).iterator():
+        layers.append(StockCostLayer(
+            product_id=stock.product_id,
+            warehouse_id=stock.warehouse_id,
+            received_at=stock.last_movement or now,
+            unit_cost=stock.average_cost,
+            remaining_quantity=stock.quantity
+        ))
+    
+    StockCostLayer.objects.bulk_create(layers, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stockcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('received_at', models.DateTimeField(verbose_name='Fecha de entrada')),
+                ('unit_cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Costo unitario')),
+                ('remaining_quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Cantidad pendiente')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.product', verbose_name='Producto')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.warehouse', verbose_name='Bodega')),
+            ],
+            options={
+                'verbose_name': 'Capa de Costo',
+                'verbose_name_plural': 'Capas de Costo',
+                'ordering': ['product', 'warehouse', 'received_at', 'id'],
+                'indexes': [models.Index(fields=['product', 'warehouse', 'received_at'], name='inv_costlayer_lookup_idx')],
+            },
+        ),
+        migrations.RunPython(create_opening_layers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_existing_products(apps, schema_editor):
+    """Indexar los productos existentes con el tokenizador de ProductSearchService"""
+    from apps.inventory.services import ProductSearchService
+    
+    Product = apps.get_model('inventory', 'Product')
+    ProductSearchToken = apps.get_model('inventory', 'ProductSearchToken')
+    
+    tokens = []
+    for product in Product.objects.only('pk', 'company_id', 'code', 'name', 'description').iterator():
+        for term, weight in ProductSearchService.build_terms(product.code, product.name, product.description).items():
+            tokens.append(ProductSearchToken(
+                company_id=product.company_id,
+                product_id=product.pk,
+                term=term,
+                weight=weight
+            ))
+        if len(tokens) >= 5000:
+            ProductSearchToken.objects.bulk_create(tokens)
+            tokens = []
+    
+    ProductSearchToken.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_inventory_costing_method'),
+        ('inventory', '0006_stockcostlayer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('term', models.CharField(max_length=50, verbose_name='Término')),
+                ('weight', models.PositiveSmallIntegerField(default=0, verbose_name='Peso')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_search_tokens', to='companies.company', verbose_name='Empresa')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='inventory.product', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda',
+                'verbose_name_plural': 'Términos de Búsqueda',
+                'indexes': [models.Index(fields=['term', 'company'], name='inv_search_term_idx')],
+                'unique_together': {('product', 'term')},
+            },
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
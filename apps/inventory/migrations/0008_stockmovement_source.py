@@ -0,0 +1,97 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:30
+
+from django.db import migrations, models
+
+
+def _link_movements(StockMovement, movement_type, prefix, source_type, documents_by_key, lines_by_document):
+    """Asignar cada movimiento existente a una línea libre del documento (mismo producto, preferentemente misma cantidad)"""
+    updated = []
+    used = set()
+    for movement in StockMovement.objects.filter(
+        movement_type=movement_type,
+        reference__startswith=prefix,
+        source_type=''
+    ).select_related('warehouse').order_by('id'):
+        document_id = documents_by_key.get((movement.warehouse.company_id, movement.reference[len(prefix):]))
+        if document_id is None:
+            continue
+        
+        candidates = [
+            line for line in lines_by_document.get(document_id, [])
+            if line[0] not in used and line[1] == movement.product_id
+        ]
+        exact = [line for line in candidates if line[2] == movement.quantity]
+        line = (exact or candidates or [None])[0]
+        if line is None:
+            continue
+        
+        used.add(line[0])
+        movement.source_type = source_type
+        movement.source_id = document_id
+        movement.source_line_id = line[0]
+        updated.append(movement)
+    
+    StockMovement.objects.bulk_update(updated, ['source_type', 'source_id', 'source_line_id'], batch_size=500)
+
+
+def link_existing_movements(apps, schema_editor):
+    """Completar la clave de origen de los movimientos creados por facturas de venta y compra"""
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    InvoiceLine = apps.get_model('invoicing', 'InvoiceLine')
+    PurchaseInvoice = apps.get_model('suppliers', 'PurchaseInvoice')
+    PurchaseInvoiceLine = apps.get_model('suppliers', 'PurchaseInvoiceLine')
+    
+    invoices = {
+        (company_id, number): invoice_id
+        for invoice_id, company_id, number in Invoice.objects.values_list('id', 'company_id', 'number')
+    }
+    invoice_lines = {}
+    for line_id, invoice_id, product_id, quantity in InvoiceLine.objects.order_by('id').values_list(
+        'id', 'invoice_id', 'product_id', 'quantity'
+    ):
+        invoice_lines.setdefault(invoice_id, []).append((line_id, product_id, quantity))
+    _link_movements(StockMovement, 'out', 'Factura ', 'invoice', invoices, invoice_lines)
+    
+    purchases = {
+        (company_id, number): purchase_id
+        for purchase_id, company_id, number in PurchaseInvoice.objects.values_list('id', 'company_id', 'internal_number')
+    }
+    purchase_lines = {}
+    for line_id, purchase_id, product_id, quantity in PurchaseInvoiceLine.objects.order_by('id').values_list(
+        'id', 'purchase_invoice_id', 'product_id', 'quantity'
+    ):
+        purchase_lines.setdefault(purchase_id, []).append((line_id, product_id, quantity))
+    _link_movements(StockMovement, 'in', 'Compra ', 'purchase_invoice', purchases, purchase_lines)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_productsearchtoken'),
+        ('invoicing', '0018_invoice_bank_observations'),
+        ('suppliers', '0003_change_iva_default_to_15'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='source_id',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Documento origen'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='source_line_id',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Línea origen'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='source_type',
+            field=models.CharField(blank=True, choices=[('invoice', 'Factura de venta'), ('purchase_invoice', 'Factura de compra')], max_length=30, verbose_name='Tipo de documento origen'),
+        ),
+        migrations.RunPython(link_existing_movements, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockmovement',
+            constraint=models.UniqueConstraint(fields=('source_type', 'source_id', 'source_line_id'), name='inv_movement_source_uniq'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stockmovement_source'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='stockmovement',
+            name='inv_movement_source_uniq',
+        ),
+        migrations.AddField(
+            model_name='warehouse',
+            name='is_default',
+            field=models.BooleanField(default=False, help_text='Bodega usada por las facturas que no indican otra (si no hay ninguna, la primera activa)', verbose_name='Bodega por defecto'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockmovement',
+            constraint=models.UniqueConstraint(fields=('source_type', 'source_id', 'source_line_id', 'warehouse'), name='inv_movement_source_uniq'),
+        ),
+    ]
@@ -71,6 +71,11 @@ class Warehouse(BaseModel):
         verbose_name='Responsable'
     )
     is_active = models.BooleanField(default=True, verbose_name='Activo')
+    is_default = models.BooleanField(
+        default=False,
+        verbose_name='Bodega por defecto',
+        help_text='Bodega usada por las facturas que no indican otra (si no hay ninguna, la primera activa)'
+    )
     
     class Meta:
         verbose_name = 'Bodega'
@@ -80,6 +85,12 @@ class Warehouse(BaseModel):
     
     def __str__(self):
         return f"{self.code} - {self.name}"
+    
+    def save(self, *args, **kwargs):
+        """Una sola bodega por defecto por empresa"""
+        super().save(*args, **kwargs)
+        if self.is_default:
+            Warehouse.objects.filter(company_id=self.company_id, is_default=True).exclude(pk=self.pk).update(is_default=False)
 
 
 class Product(BaseModel):
@@ -124,6 +135,14 @@ class Product(BaseModel):
         default=Decimal('0.00'),
         verbose_name='Stock máximo'
     )
+    stock_on_hand = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2, 
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name='Stock disponible',
+        help_text='Total en todas las bodegas, mantenido por InventoryLedgerService'
+    )
     
     # Precios
     cost_price = models.DecimalField(
@@ -184,10 +203,10 @@ class Product(BaseModel):
             stock_obj = Stock.objects.filter(product=self, warehouse=warehouse).first()
             return stock_obj.quantity if stock_obj else Decimal('0.00')
         else:
-            # Total en todas las bodegas
-            return Stock.objects.filter(product=self).aggregate(
-                total=models.Sum('quantity')
-            )['total'] or Decimal('0.00')
+            # Total en todas las bodegas (desnormalizado, ver InventoryLedgerService)
+            if self.pk and not self._state.adding:
+                self.refresh_from_db(fields=['stock_on_hand'])
+            return self.stock_on_hand
     
     def has_sufficient_stock(self, quantity, warehouse=None):
         """Verifica si hay stock suficiente para la cantidad solicitada"""
@@ -208,30 +227,8 @@ class Product(BaseModel):
         2. Cuenta por defecto de la empresa
         3. Primera cuenta de ventas disponible (código 4)
         """
-        # Prioridad 1: Cuenta específica de la categoría
-        if (self.category and 
-            self.category.default_sales_account and 
-            self.category.default_sales_account.accepts_movement):
-            return self.category.default_sales_account
-        
-        # Prioridad 2: Cuenta por defecto de la empresa (si existe configuración)
-        try:
-            from apps.companies.models import CompanyAccountDefaults
-            defaults = CompanyAccountDefaults.objects.get(company=self.company)
-            if (defaults.default_sales_account and 
-                defaults.default_sales_account.accepts_movement):
-                return defaults.default_sales_account
-        except:
-            pass  # Si no existe el modelo o configuración, continuar al fallback
-        
-        # Prioridad 3: Primera cuenta de ventas disponible (fallback actual)
-        from apps.accounting.models import ChartOfAccounts
-        return ChartOfAccounts.objects.filter(
-            company=self.company,
-            code__startswith='4',
-            accepts_movement=True,
-            is_detail=True
-        ).first()
+        from .services import ProductAccountResolver
+        return ProductAccountResolver.resolve(self)[ProductAccountResolver.SALES]
     
     def get_effective_cost_account(self):
         """
@@ -240,30 +237,8 @@ class Product(BaseModel):
         2. Cuenta por defecto de la empresa
         3. Primera cuenta de costos disponible (código 5.1)
         """
-        # Prioridad 1: Cuenta específica de la categoría
-        if (self.category and 
-            self.category.default_cost_account and 
-            self.category.default_cost_account.accepts_movement):
-            return self.category.default_cost_account
-        
-        # Prioridad 2: Cuenta por defecto de la empresa (si existe configuración)
-        try:
-            from apps.companies.models import CompanyAccountDefaults
-            defaults = CompanyAccountDefaults.objects.get(company=self.company)
-            if (defaults.default_cost_account and 
-                defaults.default_cost_account.accepts_movement):
-                return defaults.default_cost_account
-        except:
-            pass
-        
-        # Prioridad 3: Primera cuenta de costos disponible (fallback)
-        from apps.accounting.models import ChartOfAccounts
-        return ChartOfAccounts.objects.filter(
-            company=self.company,
-            code__startswith='5.1',
-            accepts_movement=True,
-            is_detail=True
-        ).first()
+        from .services import ProductAccountResolver
+        return ProductAccountResolver.resolve(self)[ProductAccountResolver.COST]
     
     def get_effective_inventory_account(self):
         """
@@ -272,30 +247,8 @@ class Product(BaseModel):
         2. Cuenta por defecto de la empresa  
         3. Primera cuenta de inventario disponible (código 1.1)
         """
-        # Prioridad 1: Cuenta específica de la categoría
-        if (self.category and 
-            self.category.default_inventory_account and 
-            self.category.default_inventory_account.accepts_movement):
-            return self.category.default_inventory_account
-        
-        # Prioridad 2: Cuenta por defecto de la empresa (si existe configuración)
-        try:
-            from apps.companies.models import CompanyAccountDefaults
-            defaults = CompanyAccountDefaults.objects.get(company=self.company)
-            if (defaults.default_inventory_account and 
-                defaults.default_inventory_account.accepts_movement):
-                return defaults.default_inventory_account
-        except:
-            pass
-        
-        # Prioridad 3: Primera cuenta de inventario disponible (fallback)
-        from apps.accounting.models import ChartOfAccounts
-        return ChartOfAccounts.objects.filter(
-            company=self.company,
-            code__startswith='1.1',
-            accepts_movement=True,
-            is_detail=True
-        ).first()
+        from .services import ProductAccountResolver
+        return ProductAccountResolver.resolve(self)[ProductAccountResolver.INVENTORY]
     
     def get_account_configuration_status(self):
         """
@@ -327,6 +280,15 @@ class StockMovement(BaseModel):
         (ADJUSTMENT, 'Ajuste'),
     ]
     
+    # Documentos de origen (clave de idempotencia junto con source_id / source_line_id)
+    SOURCE_INVOICE = 'invoice'
+    SOURCE_PURCHASE_INVOICE = 'purchase_invoice'
+    
+    SOURCE_CHOICES = [
+        (SOURCE_INVOICE, 'Factura de venta'),
+        (SOURCE_PURCHASE_INVOICE, 'Factura de compra'),
+    ]
+    
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Producto')
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='Bodega')
     
@@ -362,10 +324,27 @@ class StockMovement(BaseModel):
         verbose_name='Creado por'
     )
     
+    # Documento y línea que originaron el movimiento (vacío en movimientos manuales)
+    source_type = models.CharField(
+        max_length=30,
+        choices=SOURCE_CHOICES,
+        blank=True,
+        verbose_name='Tipo de documento origen'
+    )
+    source_id = models.PositiveIntegerField(null=True, blank=True, verbose_name='Documento origen')
+    source_line_id = models.PositiveIntegerField(null=True, blank=True, verbose_name='Línea origen')
+    
     class Meta:
         verbose_name = 'Movimiento de Stock'
         verbose_name_plural = 'Movimientos de Stock'
         ordering = ['-date']
+        constraints = [
+            # Un movimiento por línea de documento y bodega: volver a contabilizar no duplica stock
+            models.UniqueConstraint(
+                fields=['source_type', 'source_id', 'source_line_id', 'warehouse'],
+                name='inv_movement_source_uniq'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.product.code} - {self.get_movement_type_display()}"
@@ -398,4 +377,134 @@ class Stock(BaseModel):
         ordering = ['product__code']
     
     def __str__(self):
-        return f"{self.product.code} - {self.warehouse.code}: {self.quantity}"
\ No newline at end of file
+        return f"{self.product.code} - {self.warehouse.code}: {self.quantity}"
+
+class StockCheckpoint(BaseModel):
+    """
+    Existencias y costo promedio de un producto en una bodega al cierre de un mes
+    Reconstruido desde StockMovement por InventoryValuationService (solo meses cerrados)
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_checkpoints',
+        verbose_name='Producto'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name='stock_checkpoints',
+        verbose_name='Bodega'
+    )
+    month = models.DateField(
+        verbose_name='Mes',
+        help_text='Primer día del mes del punto de control'
+    )
+    quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Cantidad al cierre'
+    )
+    average_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Costo promedio al cierre'
+    )
+    movement_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Movimientos del mes'
+    )
+    
+    class Meta:
+        verbose_name = 'Existencia Mensual'
+        verbose_name_plural = 'Existencias Mensuales'
+        ordering = ['product', 'warehouse', 'month']
+        unique_together = ['product', 'warehouse', 'month']
+    
+    def __str__(self):
+        return f"{self.product.code} - {self.warehouse.code} {self.month:%Y-%m}: {self.quantity}"
+    
+    @property
+    def value(self):
+        """Valor al costo promedio"""
+        return self.quantity * self.average_cost
+
+
+class StockCostLayer(BaseModel):
+    """
+    Capa de costo abierta: entrada con cantidad pendiente de consumir
+    Las salidas consumen capas en orden PEPS o UEPS (CompanySettings.inventory_costing_method);
+    las capas agotadas se eliminan y entradas consecutivas al mismo costo se acumulan en una sola capa
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='cost_layers',
+        verbose_name='Producto'
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name='cost_layers',
+        verbose_name='Bodega'
+    )
+    received_at = models.DateTimeField(verbose_name='Fecha de entrada')
+    unit_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Costo unitario'
+    )
+    remaining_quantity = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Cantidad pendiente'
+    )
+    
+    class Meta:
+        verbose_name = 'Capa de Costo'
+        verbose_name_plural = 'Capas de Costo'
+        ordering = ['product', 'warehouse', 'received_at', 'id']
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'received_at'], name='inv_costlayer_lookup_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.code} - {self.warehouse.code}: {self.remaining_quantity} @ {self.unit_cost}"
+
+
+class ProductSearchToken(BaseModel):
+    """
+    Índice de búsqueda de productos por empresa
+    Términos normalizados (minúsculas, sin tildes) y sus prefijos, con un peso que
+    ordena los resultados: código exacto, prefijo de código y luego palabras del nombre.
+    Se mantiene con las señales de Product (ver ProductSearchService).
+    """
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='product_search_tokens',
+        verbose_name='Empresa'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+        verbose_name='Producto'
+    )
+    term = models.CharField(max_length=50, verbose_name='Término')
+    weight = models.PositiveSmallIntegerField(default=0, verbose_name='Peso')
+    
+    class Meta:
+        verbose_name = 'Término de Búsqueda'
+        verbose_name_plural = 'Términos de Búsqueda'
+        unique_together = ['product', 'term']
+        indexes = [
+            models.Index(fields=['term', 'company'], name='inv_search_term_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.code}: {self.term} ({self.weight})"
@@ -0,0 +1,1327 @@
+"""
+Servicios de inventario
+Kardex (aplicación atómica de movimientos), costeo por capas, valoración a fecha,
+disponibilidad de stock por documento, selección de bodegas, índice de búsqueda
+de productos y resolución de cuentas contables por categoría
+"""
+
+import re
+import unicodedata
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from apps.core.cache import TTLCache
+
+
+class InventoryLedgerService:
+    """
+    Único punto de modificación de Stock
+
+    Aplica movimientos con UPDATE basados en F(): la cantidad y el total
+    desnormalizado Product.stock_on_hand se calculan en la base de datos a partir
+    de los valores vigentes de la fila, de modo que dos ventas concurrentes del
+    mismo producto no se pisan. Las entradas recalculan el costo promedio
+    ponderado sobre filas bloqueadas con select_for_update.
+    """
+
+    # Efecto de cada tipo de movimiento sobre la cantidad
+    SIGNS = {
+        'in': 1,
+        'out': -1,
+    }
+
+    @classmethod
+    def apply_movement(cls, movement):
+        """Aplicar un movimiento ya guardado"""
+        cls.apply_movements([movement])
+
+    @classmethod
+    def record_movements(cls, movements):
+        """
+        Guardar y aplicar los movimientos de un documento de forma idempotente
+
+        Las líneas de origen (source_type, source_id, source_line_id) que ya
+        tienen movimientos se omiten por completo, de modo que volver a
+        contabilizar un documento no duplica stock. Una línea repartida entre
+        bodegas lleva un movimiento por bodega. Una consulta de claves y un
+        bulk_create por documento; la restricción única cubre a dos procesos
+        concurrentes.
+
+        Returns:
+            list: Movimientos creados y aplicados
+        """
+        from django.db import IntegrityError
+        from .models import StockMovement
+
+        movements = list(movements)
+        if not movements:
+            return []
+
+        with transaction.atomic():
+            pending = cls._unrecorded(movements)
+            if not pending:
+                return []
+
+            try:
+                with transaction.atomic():
+                    StockMovement.objects.bulk_create(pending)
+            except IntegrityError:
+                # Otro proceso registró parte del documento al mismo tiempo
+                for movement in pending:
+                    movement.pk = None
+                pending = cls._unrecorded(pending)
+                StockMovement.objects.bulk_create(pending)
+
+            cls.apply_movements(pending)
+        return pending
+
+    @classmethod
+    def recorded_lines(cls, source_type, source_ids):
+        """
+        Líneas de origen que ya tienen movimientos
+
+        Returns:
+            set: {(source_type, source_id, source_line_id)}
+        """
+        from .models import StockMovement
+
+        return set(
+            StockMovement.objects.filter(
+                source_type=source_type,
+                source_id__in=source_ids
+            ).values_list('source_type', 'source_id', 'source_line_id')
+        )
+
+    @classmethod
+    def _unrecorded(cls, movements):
+        """Movimientos de líneas de origen sin registrar (sin duplicados dentro del lote)"""
+        source_ids = {}
+        for movement in movements:
+            if movement.source_type:
+                source_ids.setdefault(movement.source_type, set()).add(movement.source_id)
+
+        recorded = set()
+        for source_type, ids in source_ids.items():
+            recorded.update(cls.recorded_lines(source_type, ids))
+
+        pending = []
+        seen = set()
+        for movement in movements:
+            if movement.source_type:
+                key = (movement.source_type, movement.source_id, movement.source_line_id)
+                if key in recorded or (key, movement.warehouse_id) in seen:
+                    continue
+                seen.add((key, movement.warehouse_id))
+            pending.append(movement)
+        return pending
+
+    @classmethod
+    def apply_movements(cls, movements):
+        """
+        Aplicar movimientos ya guardados (las salidas reciben su costo de InventoryCostingService)
+
+        Agrupa por bodega y producto y ejecuta un UPDATE por bodega sobre Stock y
+        uno sobre Product, sin importar cuántas líneas tenga el documento.
+        """
+        from .models import Product, Stock
+
+        # {warehouse_id: {product_id: [cantidad neta, cantidad de entrada, valor de entrada, costo inicial]}}
+        deltas = {}
+        product_deltas = {}
+        for movement in movements:
+            sign = cls.SIGNS.get(movement.movement_type)
+            if not sign:
+                continue
+            quantity = Decimal(str(movement.quantity))
+            unit_cost = Decimal(str(movement.unit_cost or 0))
+
+            delta = deltas.setdefault(movement.warehouse_id, {}).setdefault(
+                movement.product_id, [Decimal('0'), Decimal('0'), Decimal('0'), unit_cost]
+            )
+            delta[0] += sign * quantity
+            if sign > 0:
+                delta[1] += quantity
+                delta[2] += quantity * unit_cost
+            product_deltas[movement.product_id] = product_deltas.get(movement.product_id, Decimal('0')) + sign * quantity
+
+        if not deltas:
+            return
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Capas de costo y costo de las salidas según el método de la empresa
+            InventoryCostingService.process(movements)
+
+            for warehouse_id, product_map in deltas.items():
+                # Filas faltantes en cero; el UPDATE siguiente aplica el movimiento
+                Stock.objects.bulk_create(
+                    [
+                        Stock(
+                            product_id=product_id,
+                            warehouse_id=warehouse_id,
+                            quantity=Decimal('0.00'),
+                            average_cost=values[3],
+                            last_movement=now
+                        )
+                        for product_id, values in product_map.items()
+                    ],
+                    ignore_conflicts=True
+                )
+
+                quantity_delta = cls._case('product_id', {
+                    product_id: values[0] for product_id, values in product_map.items()
+                })
+                update = {
+                    'quantity': F('quantity') + quantity_delta,
+                    'last_movement': now,
+                    'updated_at': now,
+                }
+
+                incoming = {
+                    product_id: values for product_id, values in product_map.items() if values[1]
+                }
+                if incoming:
+                    # Costo promedio ponderado: filas bloqueadas hasta el fin de la transacción
+                    average_costs = {}
+                    for product_id, quantity, average_cost in Stock.objects.select_for_update().filter(
+                        warehouse_id=warehouse_id,
+                        product_id__in=list(incoming)
+                    ).values_list('product_id', 'quantity', 'average_cost'):
+                        quantity_in, value_in = incoming[product_id][1], incoming[product_id][2]
+                        quantity_after = quantity + quantity_in
+                        if quantity_after > 0:
+                            average_costs[product_id] = (
+                                (quantity * average_cost + value_in) / quantity_after
+                            ).quantize(Decimal('0.01'))
+                    if average_costs:
+                        update['average_cost'] = Case(
+                            *[When(product_id=product_id, then=Value(cost)) for product_id, cost in average_costs.items()],
+                            default=F('average_cost'),
+                            output_field=DecimalField(max_digits=10, decimal_places=2)
+                        )
+
+                Stock.objects.filter(
+                    warehouse_id=warehouse_id,
+                    product_id__in=list(product_map)
+                ).update(**update)
+
+            Product.objects.filter(id__in=list(product_deltas)).update(
+                stock_on_hand=F('stock_on_hand') + cls._case('id', product_deltas),
+                updated_at=now
+            )
+
+    @classmethod
+    def _case(cls, field, values):
+        """CASE field WHEN id THEN valor ... ELSE 0"""
+        return Case(
+            *[When(**{field: key}, then=Value(value)) for key, value in values.items()],
+            default=Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+
+    @classmethod
+    def rebuild_stock_on_hand(cls, products=None):
+        """
+        Recalcular Product.stock_on_hand desde Stock
+
+        Returns:
+            int: Productos actualizados
+        """
+        from .models import Product, Stock
+
+        products = products if products is not None else Product.objects.all()
+        totals = dict(
+            Stock.objects.filter(product__in=products)
+            .values('product_id')
+            .annotate(total=Sum('quantity'))
+            .values_list('product_id', 'total')
+        )
+
+        to_update = []
+        for product in products.only('id', 'stock_on_hand').iterator():
+            total = totals.get(product.id) or Decimal('0.00')
+            if product.stock_on_hand != total:
+                product.stock_on_hand = total
+                to_update.append(product)
+
+        Product.objects.bulk_update(to_update, ['stock_on_hand'], batch_size=500)
+        return len(to_update)
+
+
+class InventoryCostingService:
+    """
+    Costo de las salidas de inventario según el método de la empresa
+
+    Mantiene las capas de costo (StockCostLayer) por producto y bodega: cada
+    entrada agrega una capa (o se acumula en la más reciente si tiene el mismo
+    costo) y cada salida consume capas en orden PEPS o UEPS. Con promedio
+    ponderado la salida se valora al costo promedio vigente de Stock y las capas
+    se consumen en orden PEPS para mantenerlas al día.
+
+    Todas las salidas de un documento se procesan juntas: una lectura de capas,
+    y una escritura por lote para capas y movimientos.
+    """
+
+    @classmethod
+    def get_methods(cls, company_ids):
+        """
+        Método de costeo por empresa
+
+        Returns:
+            dict: {company_id: método} (promedio ponderado si no hay configuración)
+        """
+        from apps.companies.models import CompanySettings
+
+        methods = dict(
+            CompanySettings.objects.filter(company_id__in=company_ids)
+            .values_list('company_id', 'inventory_costing_method')
+        )
+        return {
+            company_id: methods.get(company_id) or CompanySettings.COSTING_AVERAGE
+            for company_id in company_ids
+        }
+
+    @classmethod
+    def process(cls, movements):
+        """
+        Actualizar capas y asignar costo a las salidas (unit_cost / total_cost)
+
+        Debe llamarse dentro de la transacción que aplica los movimientos
+        (InventoryLedgerService.apply_movements).
+        """
+        from apps.companies.models import CompanySettings
+        from .models import Stock, StockCostLayer, StockMovement
+
+        movements = [
+            movement for movement in movements
+            if movement.movement_type in (StockMovement.IN, StockMovement.OUT)
+        ]
+        if not movements:
+            return
+
+        keys = {(movement.product_id, movement.warehouse_id) for movement in movements}
+        product_ids = {key[0] for key in keys}
+        warehouse_ids = {key[1] for key in keys}
+        company_by_product = {movement.product_id: movement.product.company_id for movement in movements}
+        methods = cls.get_methods(set(company_by_product.values()))
+
+        # Capas abiertas en orden de entrada, bloqueadas hasta el fin de la transacción
+        layers = {}
+        for layer in StockCostLayer.objects.select_for_update().filter(
+            product_id__in=product_ids,
+            warehouse_id__in=warehouse_ids,
+            remaining_quantity__gt=0
+        ).order_by('received_at', 'id'):
+            key = (layer.product_id, layer.warehouse_id)
+            if key in keys:
+                layers.setdefault(key, []).append(layer)
+
+        # Costo promedio vigente para las salidas de empresas con promedio ponderado
+        average_costs = {}
+        if any(
+            movement.movement_type == StockMovement.OUT
+            and methods[company_by_product[movement.product_id]] == CompanySettings.COSTING_AVERAGE
+            for movement in movements
+        ):
+            average_costs = {
+                (product_id, warehouse_id): average_cost
+                for product_id, warehouse_id, average_cost in Stock.objects.filter(
+                    product_id__in=product_ids,
+                    warehouse_id__in=warehouse_ids
+                ).values_list('product_id', 'warehouse_id', 'average_cost')
+            }
+
+        now = timezone.now()
+        new_layers = []
+        changed_layers = {}
+        exhausted_ids = set()
+        costed_movements = []
+
+        for movement in movements:
+            key = (movement.product_id, movement.warehouse_id)
+            queue = layers.setdefault(key, [])
+            quantity = Decimal(str(movement.quantity))
+
+            if movement.movement_type == StockMovement.IN:
+                newest = queue[-1] if queue else None
+                if newest is not None and newest.unit_cost == movement.unit_cost:
+                    # Mismo costo que la capa más reciente: acumular (capas compactas)
+                    newest.remaining_quantity += quantity
+                    if newest.pk:
+                        changed_layers[newest.pk] = newest
+                else:
+                    layer = StockCostLayer(
+                        product_id=movement.product_id,
+                        warehouse_id=movement.warehouse_id,
+                        received_at=movement.date or now,
+                        unit_cost=movement.unit_cost,
+                        remaining_quantity=quantity
+                    )
+                    queue.append(layer)
+                    new_layers.append(layer)
+                continue
+
+            method = methods[company_by_product[movement.product_id]]
+            layer_cost, shortage = cls._consume(
+                queue, quantity, method == CompanySettings.COSTING_LIFO, changed_layers, exhausted_ids
+            )
+
+            if method == CompanySettings.COSTING_AVERAGE:
+                total_cost = quantity * average_costs.get(key, movement.unit_cost)
+            else:
+                # Sin capas suficientes (stock negativo): el faltante al costo informado
+                total_cost = layer_cost + shortage * movement.unit_cost
+
+            movement.total_cost = total_cost.quantize(Decimal('0.01'))
+            movement.unit_cost = (total_cost / quantity).quantize(Decimal('0.01')) if quantity else movement.unit_cost
+            costed_movements.append(movement)
+
+        if exhausted_ids:
+            StockCostLayer.objects.filter(pk__in=exhausted_ids).delete()
+
+        to_update = [layer for pk, layer in changed_layers.items() if pk not in exhausted_ids]
+        if to_update:
+            for layer in to_update:
+                layer.updated_at = now
+            StockCostLayer.objects.bulk_update(to_update, ['remaining_quantity', 'updated_at'])
+
+        to_create = [layer for layer in new_layers if layer.remaining_quantity > 0]
+        if to_create:
+            StockCostLayer.objects.bulk_create(to_create)
+
+        to_cost = [movement for movement in costed_movements if movement.pk]
+        if to_cost:
+            StockMovement.objects.bulk_update(to_cost, ['unit_cost', 'total_cost'])
+
+    @classmethod
+    def _consume(cls, queue, quantity, lifo, changed_layers, exhausted_ids):
+        """
+        Consumir capas de una cola (PEPS desde el inicio, UEPS desde el final)
+
+        Returns:
+            tuple: (costo de lo consumido, cantidad no cubierta por capas)
+        """
+        cost = Decimal('0.00')
+        while quantity > 0 and queue:
+            layer = queue[-1] if lifo else queue[0]
+            taken = min(quantity, layer.remaining_quantity)
+            cost += taken * layer.unit_cost
+            quantity -= taken
+            layer.remaining_quantity -= taken
+
+            if layer.remaining_quantity <= 0:
+                queue.remove(layer)
+                if layer.pk:
+                    exhausted_ids.add(layer.pk)
+            elif layer.pk:
+                changed_layers[layer.pk] = layer
+        return cost, quantity
+
+
+class WarehouseRouter:
+    """
+    Selección de bodegas para los movimientos de un documento
+
+    Mantiene en memoria, por empresa, las bodegas activas y la bodega por
+    defecto (la marcada como tal o la primera activa por código). Las salidas
+    se toman de la bodega de la línea, de la del documento o de la por
+    defecto; si no alcanza, el faltante se reparte entre las demás bodegas
+    con existencias usando una sola consulta de stock para todo el documento.
+    Se invalida con señales de Warehouse (ver signals.py).
+    """
+
+    _cache = TTLCache(ttl_seconds=300)
+
+    @classmethod
+    def _get_entry(cls, company_id):
+        """Bodegas activas de la empresa, cargándolas si no existen o expiraron"""
+        return cls._cache.get(company_id, lambda: cls._load(company_id))
+
+    @classmethod
+    def _load(cls, company_id):
+        from .models import Warehouse
+
+        warehouses = list(Warehouse.objects.filter(company_id=company_id, is_active=True))
+        default = next((warehouse for warehouse in warehouses if warehouse.is_default), None)
+        if default is None and warehouses:
+            default = warehouses[0]
+
+        return {
+            'warehouses': warehouses,
+            'default': default,
+        }
+
+    @classmethod
+    def default_for_company(cls, company, responsible=None):
+        """
+        Bodega por defecto de la empresa
+
+        Si la empresa no tiene bodegas activas se crea la "Bodega Principal",
+        como hacían los documentos hasta ahora.
+        """
+        default = cls._get_entry(company.pk)['default']
+        if default is not None:
+            return default
+
+        from .models import Warehouse
+
+        default, created = Warehouse.objects.get_or_create(
+            company=company,
+            code='001',
+            defaults={
+                'name': 'Bodega Principal',
+                'address': 'Oficina principal',
+                'responsible': responsible,
+                'is_active': True,
+                'is_default': True,
+            }
+        )
+        cls.invalidate(company.pk)
+        return default
+
+    @classmethod
+    def allocate(cls, company, requests, preferred=None, responsible=None):
+        """
+        Repartir salidas entre bodegas
+
+        Args:
+            company: Empresa del documento
+            requests: Iterable de (clave, product_id, cantidad, bodega fija o None)
+            preferred: Bodega del documento (None: bodega por defecto)
+            responsible: Usuario para la bodega por defecto si hay que crearla
+
+        Returns:
+            list: (clave, bodega, cantidad) en el orden de las solicitudes
+        """
+        from .models import Stock
+
+        requests = list(requests)
+        if not requests:
+            return []
+
+        preferred = preferred or cls.default_for_company(company, responsible)
+        warehouses = cls._get_entry(company.pk)['warehouses']
+        by_id = {warehouse.id: warehouse for warehouse in warehouses}
+        by_id.setdefault(preferred.id, preferred)
+
+        # Existencias de todos los productos en todas las bodegas activas (una consulta)
+        available = {}
+        for product_id, warehouse_id, quantity in Stock.objects.filter(
+            product_id__in={request[1] for request in requests},
+            warehouse_id__in=list(by_id)
+        ).values_list('product_id', 'warehouse_id', 'quantity'):
+            available[(product_id, warehouse_id)] = quantity
+
+        allocations = []
+        for key, product_id, quantity, fixed_warehouse in requests:
+            if fixed_warehouse is not None:
+                allocations.append((key, fixed_warehouse, quantity))
+                available[(product_id, fixed_warehouse.id)] = (
+                    available.get((product_id, fixed_warehouse.id), Decimal('0')) - quantity
+                )
+                continue
+
+            remaining = Decimal(str(quantity))
+            # Primero la bodega preferida, luego las demás con más existencias
+            candidates = [preferred] + sorted(
+                (warehouse for warehouse in warehouses if warehouse.id != preferred.id),
+                key=lambda warehouse: -available.get((product_id, warehouse.id), Decimal('0'))
+            )
+            for warehouse in candidates:
+                if remaining <= 0:
+                    break
+                stock = available.get((product_id, warehouse.id), Decimal('0'))
+                if stock <= 0:
+                    continue
+                taken = min(stock, remaining)
+                allocations.append((key, warehouse, taken))
+                available[(product_id, warehouse.id)] = stock - taken
+                remaining -= taken
+
+            if remaining > 0:
+                # Sin existencias suficientes en ninguna bodega: el faltante sale de la preferida
+                merged = False
+                for index, (allocated_key, warehouse, taken) in enumerate(allocations):
+                    if allocated_key == key and warehouse.id == preferred.id:
+                        allocations[index] = (key, warehouse, taken + remaining)
+                        merged = True
+                        break
+                if not merged:
+                    allocations.append((key, preferred, remaining))
+                available[(product_id, preferred.id)] = (
+                    available.get((product_id, preferred.id), Decimal('0')) - remaining
+                )
+
+        return allocations
+
+    @classmethod
+    def invalidate(cls, company_id=None):
+        """Descartar las bodegas de una empresa (o de todas)"""
+        cls._cache.invalidate(company_id)
+
+
+class StockAvailabilityService:
+    """
+    Disponibilidad de stock para documentos (facturas)
+
+    Recibe {product_id: cantidad solicitada} del documento completo y lo resuelve
+    con una sola consulta sobre el stock desnormalizado. Las cantidades de un mismo producto
+    repetido en varias líneas se suman antes de comparar con el disponible.
+    """
+
+    CRITICAL_LEVEL = Decimal('5')
+    LOW_LEVEL = Decimal('10')
+    HIGH_USAGE_RATIO = Decimal('0.8')
+
+    @classmethod
+    def get_stock_levels(cls, product_ids):
+        """
+        Stock total por producto en todas las bodegas
+
+        Returns:
+            dict: {product_id: Decimal}
+        """
+        from .models import Product
+
+        product_ids = {product_id for product_id in product_ids if product_id}
+        if not product_ids:
+            return {}
+        return dict(
+            Product.objects.filter(id__in=product_ids).values_list('id', 'stock_on_hand')
+        )
+
+    @classmethod
+    def aggregate_requests(cls, items):
+        """
+        Sumar cantidades por producto
+
+        Args:
+            items: Iterable de (product_id, cantidad)
+        """
+        requested = {}
+        for product_id, quantity in items:
+            if not product_id or not quantity:
+                continue
+            requested[product_id] = requested.get(product_id, Decimal('0')) + Decimal(str(quantity))
+        return requested
+
+    @classmethod
+    def check_document(cls, requested, products=None):
+        """
+        Verificar disponibilidad de todos los productos de un documento
+
+        Args:
+            requested: {product_id: cantidad solicitada total}
+            products: {product_id: Product} ya cargados (opcional)
+
+        Returns:
+            dict: {product_id: stock_info} (ver build_stock_info); los productos
+            que no manejan inventario no se verifican y quedan con None
+        """
+        from .models import Product
+
+        if not requested:
+            return {}
+
+        products = dict(products or {})
+        missing_ids = set(requested) - set(products)
+        if missing_ids:
+            products.update(Product.objects.in_bulk(missing_ids))
+
+        inventory_ids = [
+            product_id for product_id in requested
+            if product_id in products and products[product_id].manages_inventory
+        ]
+        stock_levels = cls.get_stock_levels(inventory_ids)
+
+        result = {}
+        for product_id, quantity in requested.items():
+            product = products.get(product_id)
+            if product is None or not product.manages_inventory:
+                result[product_id] = None
+                continue
+            result[product_id] = cls.build_stock_info(
+                product, stock_levels.get(product_id, Decimal('0.00')), quantity
+            )
+        return result
+
+    @classmethod
+    def build_stock_info(cls, product, available_stock, requested_quantity):
+        """
+        Nivel de alerta y mensaje para un producto
+
+        Returns:
+            dict: {
+                'has_sufficient_stock': bool,
+                'available_stock': Decimal,
+                'requested_quantity': Decimal,
+                'shortage': Decimal,
+                'level': str ('error', 'warning', 'info', 'success'),
+                'message': str (mensaje para mostrar al usuario),
+                'icon': str (emoji para el mensaje)
+            }
+        """
+        available_stock = Decimal(str(available_stock or 0))
+        requested_quantity = Decimal(str(requested_quantity or 0))
+
+        # Calcular diferencia
+        shortage = max(Decimal('0'), requested_quantity - available_stock)
+        has_sufficient_stock = available_stock >= requested_quantity
+        code = getattr(product, 'code', 'N/A')
+
+        info = {
+            'has_sufficient_stock': has_sufficient_stock,
+            'available_stock': available_stock,
+            'requested_quantity': requested_quantity,
+            'shortage': shortage,
+        }
+
+        if not has_sufficient_stock:
+            # STOCK INSUFICIENTE - Error crítico
+            info.update({
+                'level': 'error',
+                'icon': '🚨',
+                'message': (
+                    f"{product.name} "
+                    f"(Código: {code}) - "
+                    f"Solicitado: {requested_quantity}, "
+                    f"Disponible: {available_stock}, "
+                    f"Faltante: {shortage}"
+                )
+            })
+        elif available_stock <= cls.CRITICAL_LEVEL:
+            # STOCK CRÍTICO - Advertencia alta
+            info.update({
+                'level': 'warning',
+                'icon': '⚠️',
+                'message': (
+                    f"{product.name} "
+                    f"(Código: {code}) - "
+                    f"Solo quedan {available_stock} unidades disponibles. "
+                    f"Considere reabastecer urgentemente."
+                )
+            })
+        elif available_stock <= cls.LOW_LEVEL:
+            # STOCK BAJO - Advertencia media
+            info.update({
+                'level': 'warning',
+                'icon': '📦',
+                'message': (
+                    f"{product.name} "
+                    f"(Código: {code}) - "
+                    f"Quedan {available_stock} unidades. Planifique reabastecimiento."
+                )
+            })
+        elif requested_quantity > (available_stock * cls.HIGH_USAGE_RATIO):
+            # USANDO GRAN PARTE DEL STOCK - Información
+            percentage = int((requested_quantity / available_stock) * 100)
+            info.update({
+                'level': 'info',
+                'icon': '📊',
+                'message': (
+                    f"{product.name} - "
+                    f"Utilizando {percentage}% del stock disponible "
+                    f"({requested_quantity} de {available_stock} unidades)."
+                )
+            })
+        else:
+            # STOCK SUFICIENTE - Todo OK
+            info.update({
+                'level': 'success',
+                'icon': '✅',
+                'message': (
+                    f"{product.name} - "
+                    f"Disponible: {available_stock} unidades."
+                )
+            })
+
+        return info
+
+
+class InventoryValuationService:
+    """
+    Existencias y valoración de inventario a una fecha, reconstruidas desde StockMovement
+
+    Los meses cerrados se resumen en StockCheckpoint (cantidad y costo promedio
+    al cierre por producto y bodega); una consulta a fecha parte del último
+    punto de control anterior y solo recorre los movimientos del mes en curso.
+
+    Métodos de valoración:
+        average: promedio ponderado, mismo cálculo que InventoryLedgerService
+        fifo: PEPS, las existencias se valoran con las últimas entradas recibidas
+    """
+
+    AVERAGE = 'average'
+    FIFO = 'fifo'
+
+    METHOD_CHOICES = [
+        (AVERAGE, 'Promedio ponderado'),
+        (FIFO, 'PEPS (FIFO)'),
+    ]
+
+    @classmethod
+    def _day_start(cls, day):
+        """Inicio del día en la zona horaria actual"""
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @classmethod
+    def _next_month(cls, month):
+        return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    @classmethod
+    def _replay(cls, state, movement_type, quantity, unit_cost):
+        """Aplicar un movimiento a [cantidad, costo promedio] (igual que el kardex)"""
+        sign = InventoryLedgerService.SIGNS.get(movement_type)
+        if sign == 1:
+            quantity_after = state[0] + quantity
+            if quantity_after > 0:
+                state[1] = ((state[0] * state[1] + quantity * unit_cost) / quantity_after).quantize(Decimal('0.01'))
+            state[0] = quantity_after
+        elif sign == -1:
+            state[0] -= quantity
+
+    @classmethod
+    def _checkpoint_states(cls, company_id, before_month, warehouse_id=None):
+        """
+        Último punto de control anterior a un mes, por producto y bodega
+
+        Returns:
+            dict: {(product_id, warehouse_id): [cantidad, costo promedio]}
+        """
+        from django.db.models import OuterRef, Subquery
+        from .models import StockCheckpoint
+
+        latest_month = StockCheckpoint.objects.filter(
+            product_id=OuterRef('product_id'),
+            warehouse_id=OuterRef('warehouse_id'),
+            month__lt=before_month
+        ).order_by('-month').values('month')[:1]
+
+        checkpoints = StockCheckpoint.objects.filter(
+            product__company_id=company_id,
+            month__lt=before_month,
+            month=Subquery(latest_month)
+        )
+        if warehouse_id:
+            checkpoints = checkpoints.filter(warehouse_id=warehouse_id)
+
+        return {
+            (product_id, warehouse_id): [quantity, average_cost]
+            for product_id, warehouse_id, quantity, average_cost in checkpoints.values_list(
+                'product_id', 'warehouse_id', 'quantity', 'average_cost'
+            )
+        }
+
+    @classmethod
+    def _movements(cls, company_id, date_from=None, date_to=None, warehouse_id=None):
+        """Movimientos de la empresa en [date_from, date_to) en orden cronológico"""
+        from .models import StockMovement
+
+        movements = StockMovement.objects.filter(
+            product__company_id=company_id,
+            movement_type__in=list(InventoryLedgerService.SIGNS)
+        )
+        if date_from:
+            movements = movements.filter(date__gte=cls._day_start(date_from))
+        if date_to:
+            movements = movements.filter(date__lt=cls._day_start(date_to))
+        if warehouse_id:
+            movements = movements.filter(warehouse_id=warehouse_id)
+        return movements.order_by('date', 'id')
+
+    @classmethod
+    def ensure_checkpoints(cls, company_id, until_month):
+        """
+        Generar los puntos de control de los meses cerrados anteriores a until_month
+
+        Continúa desde el último mes ya resumido de la empresa, de modo que cada
+        movimiento se recorre una sola vez.
+
+        Returns:
+            int: Puntos de control creados
+        """
+        from django.db.models import Max
+        from .models import StockCheckpoint
+
+        until_month = min(until_month, timezone.localdate().replace(day=1))
+        last_month = StockCheckpoint.objects.filter(
+            product__company_id=company_id
+        ).aggregate(last=Max('month'))['last']
+
+        start_month = cls._next_month(last_month) if last_month else None
+        if start_month and start_month >= until_month:
+            return 0
+
+        states = cls._checkpoint_states(company_id, start_month) if start_month else {}
+        closing = {}
+        for product_id, warehouse_id, movement_type, quantity, unit_cost, date in cls._movements(
+            company_id, start_month, until_month
+        ).values_list(
+            'product_id', 'warehouse_id', 'movement_type', 'quantity', 'unit_cost', 'date'
+        ).iterator():
+            key = (product_id, warehouse_id)
+            state = states.setdefault(key, [Decimal('0.00'), Decimal('0.00')])
+            cls._replay(state, movement_type, quantity, unit_cost)
+
+            month = timezone.localtime(date).date().replace(day=1)
+            count = closing.get((key, month), (None, 0))[1]
+            closing[(key, month)] = (tuple(state), count + 1)
+
+        StockCheckpoint.objects.bulk_create(
+            [
+                StockCheckpoint(
+                    product_id=product_id,
+                    warehouse_id=warehouse_id,
+                    month=month,
+                    quantity=state[0],
+                    average_cost=state[1],
+                    movement_count=count
+                )
+                for ((product_id, warehouse_id), month), (state, count) in closing.items()
+            ],
+            batch_size=500,
+            ignore_conflicts=True
+        )
+        return len(closing)
+
+    @classmethod
+    def invalidate_checkpoints(cls, company_id, from_month):
+        """Descartar puntos de control desde un mes (se regeneran en la próxima consulta)"""
+        from .models import StockCheckpoint
+
+        StockCheckpoint.objects.filter(
+            product__company_id=company_id,
+            month__gte=from_month
+        ).delete()
+
+    @classmethod
+    def stock_as_of(cls, company_id, as_of, method=AVERAGE, warehouse_id=None):
+        """
+        Existencias y valor por producto y bodega al cierre de una fecha
+
+        Returns:
+            dict: {(product_id, warehouse_id): {'quantity', 'unit_cost', 'value'}}
+        """
+        # Los meses aún abiertos no tienen punto de control: se recorren sus movimientos
+        replay_from = min(as_of.replace(day=1), timezone.localdate().replace(day=1))
+        cls.ensure_checkpoints(company_id, replay_from)
+
+        states = cls._checkpoint_states(company_id, replay_from, warehouse_id)
+        for product_id, warehouse_id_, movement_type, quantity, unit_cost in cls._movements(
+            company_id, replay_from, as_of + timedelta(days=1), warehouse_id
+        ).values_list(
+            'product_id', 'warehouse_id', 'movement_type', 'quantity', 'unit_cost'
+        ).iterator():
+            state = states.setdefault((product_id, warehouse_id_), [Decimal('0.00'), Decimal('0.00')])
+            cls._replay(state, movement_type, quantity, unit_cost)
+
+        fifo_values = {}
+        if method == cls.FIFO:
+            fifo_values = cls._fifo_values(company_id, as_of, {
+                key: state for key, state in states.items() if state[0] > 0
+            })
+
+        result = {}
+        for key, (quantity, average_cost) in states.items():
+            if not quantity:
+                continue
+            value = fifo_values.get(key, quantity * average_cost)
+            result[key] = {
+                'quantity': quantity,
+                'unit_cost': (value / quantity).quantize(Decimal('0.0001')),
+                'value': value.quantize(Decimal('0.01')),
+            }
+        return result
+
+    @classmethod
+    def _fifo_values(cls, company_id, as_of, states):
+        """
+        Valor PEPS: las existencias corresponden a las entradas más recientes
+
+        Recorre las entradas hacia atrás desde la fecha hasta cubrir la cantidad de
+        cada producto/bodega; lo que no cubren las entradas registradas (saldos
+        iniciales cargados sin movimiento) se valora al costo promedio.
+        """
+        from .models import StockMovement
+
+        remaining = {key: state[0] for key, state in states.items()}
+        values = {key: Decimal('0.00') for key in states}
+        if not remaining:
+            return values
+
+        incoming = StockMovement.objects.filter(
+            product__company_id=company_id,
+            movement_type=StockMovement.IN,
+            date__lt=cls._day_start(as_of + timedelta(days=1)),
+            product_id__in={key[0] for key in remaining},
+            warehouse_id__in={key[1] for key in remaining}
+        ).order_by('-date', '-id').values_list('product_id', 'warehouse_id', 'quantity', 'unit_cost')
+
+        for product_id, warehouse_id, quantity, unit_cost in incoming.iterator():
+            key = (product_id, warehouse_id)
+            if key not in remaining:
+                continue
+            taken = min(quantity, remaining[key])
+            values[key] += taken * unit_cost
+            remaining[key] -= taken
+            if not remaining[key]:
+                del remaining[key]
+                if not remaining:
+                    break
+
+        for key, quantity in remaining.items():
+            values[key] += quantity * states[key][1]
+        return values
+
+    @classmethod
+    def iter_report_rows(cls, company_id, as_of, method=AVERAGE, warehouse_id=None):
+        """Filas del reporte: código, producto, bodega, cantidad, costo unitario, valor"""
+        from .models import Product, Warehouse
+
+        stock = cls.stock_as_of(company_id, as_of, method, warehouse_id)
+        products = Product.objects.in_bulk({key[0] for key in stock})
+        warehouses = Warehouse.objects.in_bulk({key[1] for key in stock})
+
+        rows = sorted(
+            stock.items(),
+            key=lambda item: (products[item[0][0]].code, warehouses[item[0][1]].code)
+        )
+        for (product_id, warehouse_id_), data in rows:
+            product = products[product_id]
+            warehouse = warehouses[warehouse_id_]
+            yield [
+                product.code,
+                product.name,
+                warehouse.code,
+                warehouse.name,
+                data['quantity'],
+                data['unit_cost'],
+                data['value'],
+            ]
+
+
+class ProductSearchService:
+    """
+    Búsqueda de productos sobre el índice ProductSearchToken
+
+    Cada producto se indexa con términos normalizados (minúsculas, sin tildes ni
+    signos) y sus prefijos, de modo que cada pulsación del autocompletado es una
+    búsqueda por igualdad sobre un índice en lugar de un icontains sobre toda la
+    tabla. El peso de cada término ordena los resultados: código exacto, prefijo
+    de código, palabra del nombre, prefijo de palabra y por último descripción.
+    Funciona igual en SQLite y PostgreSQL.
+    """
+
+    CODE_EXACT = 100
+    CODE_PREFIX = 50
+    NAME_WORD = 20
+    NAME_PREFIX = 10
+    DESCRIPTION_WORD = 2
+
+    MIN_PREFIX = 2
+    MAX_TERM_LENGTH = 50
+    # Las descripciones pueden ser largas: solo palabras completas y con tope
+    MAX_DESCRIPTION_WORDS = 30
+
+    # Campos de Product que afectan al índice
+    INDEXED_FIELDS = {'company', 'company_id', 'code', 'name', 'description'}
+
+    @classmethod
+    def normalize(cls, text):
+        """Minúsculas y sin tildes ('Café Ñandú' -> 'cafe nandu')"""
+        text = unicodedata.normalize('NFKD', str(text or '')).lower()
+        return ''.join(char for char in text if not unicodedata.combining(char))
+
+    @classmethod
+    def split_words(cls, text):
+        """
+        Palabras normalizadas de un texto
+
+        Cada palabra separada por espacios se indexa compacta ('usb-c' -> 'usbc')
+        y también por sus partes ('usb', 'c'), para encontrarla escrita de ambas formas
+        """
+        words = []
+        for chunk in cls.normalize(text).split():
+            parts = [part for part in re.split(r'[^a-z0-9]+', chunk) if part]
+            compact = ''.join(parts)
+            if compact:
+                words.append(compact[:cls.MAX_TERM_LENGTH])
+            if len(parts) > 1:
+                words.extend(part[:cls.MAX_TERM_LENGTH] for part in parts)
+        return words
+
+    @classmethod
+    def query_terms(cls, query):
+        """Términos de una búsqueda (sin duplicados, en orden)"""
+        return list(dict.fromkeys(cls.split_words(query)))
+
+    @classmethod
+    def build_terms(cls, code, name, description=''):
+        """
+        Términos de un producto con su peso (se conserva el mayor por término)
+
+        Returns:
+            dict: {término: peso}
+        """
+        terms = {}
+
+        def add(term, weight):
+            if len(term) >= cls.MIN_PREFIX and weight > terms.get(term, 0):
+                terms[term] = weight
+
+        def add_with_prefixes(word, word_weight, prefix_weight):
+            add(word, word_weight)
+            for length in range(cls.MIN_PREFIX, len(word)):
+                add(word[:length], prefix_weight)
+
+        code_words = cls.split_words(code)
+        code_compact = ''.join(re.findall(r'[a-z0-9]+', cls.normalize(code)))[:cls.MAX_TERM_LENGTH]
+        for word in code_words:
+            add_with_prefixes(word, cls.CODE_PREFIX, cls.CODE_PREFIX)
+        if code_compact:
+            add_with_prefixes(code_compact, cls.CODE_EXACT, cls.CODE_PREFIX)
+            # Códigos de un solo carácter también se encuentran por igualdad
+            terms.setdefault(code_compact, cls.CODE_EXACT)
+
+        for word in cls.split_words(name):
+            add_with_prefixes(word, cls.NAME_WORD, cls.NAME_PREFIX)
+
+        for word in cls.split_words(description)[:cls.MAX_DESCRIPTION_WORDS]:
+            add(word, cls.DESCRIPTION_WORD)
+
+        return terms
+
+    @classmethod
+    def index_products(cls, products):
+        """
+        Reconstruir los términos de los productos indicados
+
+        Returns:
+            int: Términos creados
+        """
+        from .models import ProductSearchToken
+
+        products = list(products)
+        if not products:
+            return 0
+
+        tokens = []
+        for product in products:
+            for term, weight in cls.build_terms(product.code, product.name, product.description).items():
+                tokens.append(ProductSearchToken(
+                    company_id=product.company_id,
+                    product_id=product.pk,
+                    term=term,
+                    weight=weight
+                ))
+
+        with transaction.atomic():
+            ProductSearchToken.objects.filter(product_id__in=[product.pk for product in products]).delete()
+            ProductSearchToken.objects.bulk_create(tokens, batch_size=1000)
+        return len(tokens)
+
+    @classmethod
+    def rebuild(cls, company_id=None, batch_size=500):
+        """
+        Reconstruir el índice completo (o el de una empresa)
+
+        Returns:
+            tuple: (productos indexados, términos creados)
+        """
+        from .models import Product
+
+        products = Product.objects.only('pk', 'company_id', 'code', 'name', 'description').order_by('pk')
+        if company_id:
+            products = products.filter(company_id=company_id)
+
+        product_count = 0
+        token_count = 0
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                token_count += cls.index_products(batch)
+                product_count += len(batch)
+                batch = []
+        if batch:
+            token_count += cls.index_products(batch)
+            product_count += len(batch)
+        return product_count, token_count
+
+    @classmethod
+    def rank(cls, queryset, query, company_ids=None):
+        """
+        Filtrar y ordenar un queryset de Product por relevancia
+
+        Un producto coincide si todas las palabras de la búsqueda están en su
+        índice; se anota search_score y se ordena por puntaje y código. El stock
+        viaja en la misma fila (Product.stock_on_hand).
+
+        Las partes de un carácter ('c' en 'usb-c', '1' en '1/2') no se indexan:
+        se ignoran al comparar, y si la búsqueda solo tiene partes así se filtra
+        con icontains sobre código, nombre y descripción.
+
+        Args:
+            queryset: QuerySet de Product ya filtrado por permisos
+            query: Texto ingresado por el usuario
+            company_ids: Empresas a buscar (acota el índice); None para todas
+        """
+        from .models import ProductSearchToken
+
+        terms = cls.query_terms(query)
+        if not terms:
+            return queryset.none()
+
+        terms = [term for term in terms if len(term) >= cls.MIN_PREFIX]
+        if not terms:
+            query = query.strip()
+            return queryset.filter(
+                Q(code__icontains=query) | Q(name__icontains=query) | Q(description__icontains=query)
+            ).annotate(search_score=Value(0)).order_by('code', 'name')
+
+        tokens = ProductSearchToken.objects.filter(term__in=terms)
+        if company_ids is not None:
+            tokens = tokens.filter(company_id__in=company_ids)
+
+        matching = tokens.values('product_id').annotate(
+            matched=Count('id')
+        ).filter(matched=len(terms)).values('product_id')
+
+        score = ProductSearchToken.objects.filter(
+            product_id=OuterRef('pk'),
+            term__in=terms
+        ).values('product_id').annotate(total=Sum('weight')).values('total')
+
+        return queryset.filter(pk__in=matching).annotate(
+            search_score=Subquery(score)
+        ).order_by('-search_score', 'code', 'name')
+
+    @classmethod
+    def search(cls, query, company_ids=None, limit=20):
+        """
+        Productos activos que coinciden con la búsqueda, ordenados por relevancia
+
+        Returns:
+            list: Productos (con empresa y categoría cargadas) en una sola consulta
+        """
+        from .models import Product
+
+        products = Product.objects.filter(is_active=True)
+        if company_ids is not None:
+            products = products.filter(company_id__in=company_ids)
+        return list(
+            cls.rank(products, query, company_ids).select_related('company', 'category')[:limit]
+        )
+
+
+class ProductAccountResolver:
+    """
+    Cuentas contables efectivas de productos, resueltas por (empresa, categoría)
+
+    Aplica la misma prioridad que Product.get_effective_*_account (cuenta de la
+    categoría, cuenta por defecto de la empresa, primera cuenta de detalle del
+    grupo) pero carga cada empresa una sola vez: categorías, configuración y
+    cuentas de respaldo. El mapa se invalida con señales de Category,
+    CompanyAccountDefaults y ChartOfAccounts (ver signals.py).
+    """
+
+    SALES = 'sales'
+    COST = 'cost'
+    INVENTORY = 'inventory'
+
+    # Tipo de cuenta -> (campo en Category / CompanyAccountDefaults, prefijo de respaldo)
+    KINDS = {
+        SALES: ('default_sales_account', '4'),
+        COST: ('default_cost_account', '5.1'),
+        INVENTORY: ('default_inventory_account', '1.1'),
+    }
+
+    _cache = TTLCache(ttl_seconds=300)
+
+    @classmethod
+    def _usable(cls, account):
+        return account if account is not None and account.accepts_movement else None
+
+    @classmethod
+    def _get_entry(cls, company_id):
+        """Mapa de la empresa, cargándolo si no existe o expiró"""
+        return cls._cache.get(company_id, lambda: cls._load(company_id))
+
+    @classmethod
+    def _load(cls, company_id):
+        from apps.accounting.models import ChartOfAccounts
+        from apps.companies.models import CompanyAccountDefaults
+        from .models import Category
+
+        # Prioridad 2: cuentas por defecto de la empresa (no todas existen en la configuración)
+        company_defaults = {}
+        defaults = CompanyAccountDefaults.objects.filter(
+            company_id=company_id
+        ).select_related('default_sales_account').first()
+        for kind, (field, prefix) in cls.KINDS.items():
+            company_defaults[kind] = cls._usable(getattr(defaults, field, None))
+
+        # Prioridad 3: primera cuenta de detalle del grupo, solo si hace falta
+        for kind, (field, prefix) in cls.KINDS.items():
+            if company_defaults[kind] is None:
+                company_defaults[kind] = ChartOfAccounts.objects.filter(
+                    company_id=company_id,
+                    code__startswith=prefix,
+                    accepts_movement=True,
+                    is_detail=True
+                ).first()
+
+        # Prioridad 1: cuentas de cada categoría
+        categories = {}
+        for category in Category.objects.filter(company_id=company_id).select_related(
+            'default_sales_account', 'default_cost_account', 'default_inventory_account'
+        ):
+            categories[category.id] = cls._resolve_category(category, company_defaults)
+
+        return {
+            'defaults': company_defaults,
+            'categories': categories,
+        }
+
+    @classmethod
+    def _resolve_category(cls, category, company_defaults):
+        return {
+            kind: cls._usable(getattr(category, field)) or company_defaults[kind]
+            for kind, (field, prefix) in cls.KINDS.items()
+        }
+
+    @classmethod
+    def resolve(cls, product):
+        """
+        Cuentas efectivas de un producto
+
+        Returns:
+            dict: {'sales', 'cost', 'inventory': ChartOfAccounts o None}
+        """
+        entry = cls._get_entry(product.company_id)
+        accounts = entry['categories'].get(product.category_id)
+        if accounts is None:
+            # Categoría de otra empresa o creada después de cargar el mapa
+            accounts = (
+                cls._resolve_category(product.category, entry['defaults'])
+                if product.category_id else dict(entry['defaults'])
+            )
+        return accounts
+
+    @classmethod
+    def resolve_many(cls, products):
+        """
+        Cuentas efectivas de varios productos (una carga por empresa como máximo)
+
+        Returns:
+            dict: {product_id: {'sales', 'cost', 'inventory'}}
+        """
+        return {product.id: cls.resolve(product) for product in products}
+
+    @classmethod
+    def invalidate(cls, company_id=None):
+        """Descartar el mapa de una empresa (o de todas)"""
+        cls._cache.invalidate(company_id)
@@ -0,0 +1,82 @@
+"""
+Señales del módulo Inventario
+Mantienen Product.stock_on_hand cuando Stock se modifica fuera de InventoryLedgerService
+(admin, scripts); el kardex usa UPDATE y no dispara estas señales.
+También descartan los puntos de control mensuales afectados por movimientos editados
+y mantienen el índice de búsqueda de productos, el mapa de cuentas contables por categoría
+y las bodegas en memoria de WarehouseRouter.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.accounting.models import ChartOfAccounts
+from apps.companies.models import CompanyAccountDefaults
+
+from .models import Category, Product, Stock, StockMovement, Warehouse
+from .services import (
+    InventoryLedgerService, InventoryValuationService, ProductAccountResolver, ProductSearchService,
+    WarehouseRouter
+)
+
+
+@receiver(post_save, sender=Product)
+def index_product_search_terms(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Reindexar el producto cuando cambian código, nombre o descripción"""
+    if raw:
+        return
+    if update_fields is not None and not ProductSearchService.INDEXED_FIELDS.intersection(update_fields):
+        return
+    ProductSearchService.index_products([instance])
+
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def refresh_stock_on_hand(sender, instance, **kwargs):
+    """Recalcular el total del producto desde sus registros de Stock"""
+    InventoryLedgerService.rebuild_stock_on_hand(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(post_save, sender=StockMovement)
+@receiver(post_delete, sender=StockMovement)
+def invalidate_stock_checkpoints(sender, instance, created=False, origin=None, **kwargs):
+    """Un movimiento editado o eliminado cambia los cierres desde su mes"""
+    if created or not instance.date:
+        return  # Los movimientos nuevos caen en el mes en curso, que no tiene cierre
+    
+    # Eliminación en cascada (producto, bodega o empresa): los cierres se eliminan con ellos
+    origin_model = getattr(origin, 'model', None) or type(origin)
+    if origin is not None and origin_model is not StockMovement:
+        return
+    
+    InventoryValuationService.invalidate_checkpoints(
+        instance.product.company_id,
+        timezone.localtime(instance.date).date().replace(day=1)
+    )
+
+
+def _invalidate_product_accounts(company_id):
+    """Invalidar ahora y tras el commit (evita recargar un estado no confirmado)"""
+    ProductAccountResolver.invalidate(company_id)
+    transaction.on_commit(lambda: ProductAccountResolver.invalidate(company_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CompanyAccountDefaults)
+@receiver(post_delete, sender=CompanyAccountDefaults)
+@receiver(post_save, sender=ChartOfAccounts)
+@receiver(post_delete, sender=ChartOfAccounts)
+def invalidate_product_accounts(sender, instance, **kwargs):
+    """Cuentas de categoría, cuentas por defecto o plan de cuentas modificados"""
+    _invalidate_product_accounts(instance.company_id)
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def invalidate_warehouse_router(sender, instance, **kwargs):
+    """Bodegas creadas, activadas o marcadas por defecto"""
+    WarehouseRouter.invalidate(instance.company_id)
+    transaction.on_commit(lambda: WarehouseRouter.invalidate(instance.company_id))
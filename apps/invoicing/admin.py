@@ -6,6 +6,7 @@ from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django import forms
 from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
 from decimal import Decimal
 import json
 from .models import Customer, Invoice, InvoiceLine
@@ -59,59 +60,30 @@ class IntelligentInvoiceLineForm(forms.ModelForm):
         
         if not product or not quantity:
             return cleaned_data
-            
-        try:
-            # Obtener stock actual
-            available_stock = Decimal(str(product.get_current_stock() or 0))
-            requested_quantity = Decimal(str(quantity))
-            
-            # VALIDACIÓN CRÍTICA: Stock insuficiente - Solo JavaScript maneja el bloqueo
-            if available_stock < requested_quantity:
-                # No mostrar mensaje invasivo, solo marcar como inválido silenciosamente
-                # El JavaScript detectará esto y deshabilitará botones de guardar
-                pass
-            
-            # Stock crítico - Solo notificaciones flotantes, NO mensajes invasivos
-            elif available_stock <= 5:
-                # Solo log para debug - Las notificaciones flotantes se encargan del UX
-                pass  # Sin mensajes invasivos, solo JavaScript maneja la notificación
-            
-            # INFORMACIÓN: Stock bajo (≤10 unidades) 
-            elif available_stock <= 10:
-                # Solo mensaje informativo, no error
-                pass  # Se manejará en JavaScript para mejor UX
-            
-            # Validar cantidad mínima
-            if requested_quantity <= 0:
-                raise ValidationError({
-                    'quantity': 'La cantidad debe ser mayor a cero.'
-                })
-                
-        except Exception as e:
-            # Error en validación - permitir continuar pero advertir
-            if 'STOCK INSUFICIENTE' in str(e):
-                raise  # Re-lanzar errores críticos
-            else:
-                # Otros errores no críticos
-                self.add_error(
-                    'quantity',
-                    f"⚠️ Error verificando stock: {str(e)}. Verifique manualmente."
-                )
         
+        # Validar cantidad mínima
+        if Decimal(str(quantity)) <= 0:
+            raise ValidationError({
+                'quantity': 'La cantidad debe ser mayor a cero.'
+            })
+        
+        # El stock se verifica para la factura completa en InvoiceLineFormSet
+        # (una consulta agrupada); InvoiceLine.clean() reutiliza ese resultado
         return cleaned_data
     
     def save(self, commit=True):
         """Guardar con actualización automática de información de stock"""
         instance = super().save(commit=False)
         
-        # Auto-actualizar stock informativo
-        if instance.product:
-            try:
-                instance.stock = Decimal(str(instance.product.get_current_stock() or 0))
-            except:
-                instance.stock = Decimal('0')
-        
         if commit:
+            # Auto-actualizar stock informativo
+            # (con commit=False lo asigna InvoiceTotalsService.save_lines por lotes)
+            if instance.product:
+                try:
+                    instance.stock = Decimal(str(instance.product.get_current_stock() or 0))
+                except:
+                    instance.stock = Decimal('0')
+            
             instance.save()
             
         return instance
@@ -144,9 +116,57 @@ class CustomerAdmin(CompanyFilterMixin, admin.ModelAdmin):
 # PRODUCTOS AHORA SE ADMINISTRAN DESDE apps.inventory.admin
 # Los productos están unificados en el módulo de inventario
 
+class InvoiceLineFormSet(BaseInlineFormSet):
+    """
+    Formset de líneas con verificación de stock por factura completa.
+    
+    Antes de validar los formularios suma las cantidades por producto de todas
+    las líneas (un producto repetido cuenta una sola vez con la suma) y consulta
+    el stock con una sola consulta agrupada. El resultado queda en
+    self.stock_availability y en cada instancia, para que InvoiceLine.clean()
+    y los mensajes del admin no vuelvan a consultar.
+    """
+    
+    def full_clean(self):
+        self.stock_availability = {}
+        if self.is_bound:
+            self._prepare_stock_availability()
+        super().full_clean()
+    
+    def _prepare_stock_availability(self):
+        from apps.inventory.services import StockAvailabilityService
+        
+        line_products = []
+        for form in self.forms:
+            if not form.has_changed() and form.instance.pk is None:
+                continue  # Fila extra vacía
+            if self.can_delete and form['DELETE'].value():
+                continue
+            
+            try:
+                product_id = int(form['product'].value())
+                quantity = Decimal(str(form['quantity'].value()))
+            except (TypeError, ValueError, ArithmeticError):
+                continue  # El formulario reportará el error del campo
+            line_products.append((form, product_id, quantity))
+        
+        requested = StockAvailabilityService.aggregate_requests(
+            (product_id, quantity) for form, product_id, quantity in line_products
+        )
+        try:
+            self.stock_availability = StockAvailabilityService.check_document(requested)
+        except Exception as e:
+            print(f"⚠️ Error en validación previa de stock: {e}")
+            return
+        
+        for form, product_id, quantity in line_products:
+            form.instance._stock_info = self.stock_availability.get(product_id)
+
+
 class InvoiceLineInline(admin.TabularInline):
     model = InvoiceLine
     form = IntelligentInvoiceLineForm  # Usar formulario inteligente
+    formset = InvoiceLineFormSet  # Stock verificado por factura completa
     extra = 0  # Por defecto no líneas extras
     min_num = 0  # Sin mínimo de líneas
     max_num = 50  # Máximo 50 líneas
@@ -180,80 +200,6 @@ class InvoiceLineInline(admin.TabularInline):
             })
         return super().formfield_for_dbfield(db_field, request, **kwargs)
     
-    def save_formset(self, request, form, formset, change):
-        """
-        Guardar formset con validación inteligente de stock y mensajes nativos de Django.
-        
-        Proceso:
-        1. Validar stock ANTES de guardar (crítico)
-        2. Guardar solo si pasa validaciones críticas
-        3. Mostrar mensajes informativos post-guardado
-        """
-        
-        # PASO 1: Validaciones PREVIAS críticas
-        instances = formset.save(commit=False)
-        critical_errors = []
-        warning_messages = []
-        info_messages = []
-        
-        for instance in instances:
-            try:
-                if hasattr(instance, 'check_stock_availability') and instance.product and instance.quantity:
-                    stock_info = instance.check_stock_availability()
-                    
-                    if stock_info:
-                        level = stock_info.get('level', 'info')
-                        message = stock_info['message']
-                        
-                        if level == 'error' and not stock_info.get('has_sufficient_stock', True):
-                            # ERROR CRÍTICO: Stock insuficiente - BLOQUEAR guardado
-                            critical_errors.append(message)
-                        elif level == 'warning':
-                            # Advertencia: Stock bajo - permitir pero advertir
-                            warning_messages.append(message)
-                        elif level == 'info':
-                            # Información: Consumo alto - solo informar
-                            info_messages.append(message)
-                            
-            except Exception as validation_error:
-                print(f"⚠️ Error en validación previa: {validation_error}")
-                continue
-        
-        # PASO 2: Verificar errores críticos
-        if critical_errors:
-            # HAY ERRORES CRÍTICOS - NO GUARDAR
-            for error_msg in critical_errors:
-                messages.error(request, error_msg)
-            
-            messages.error(
-                request, 
-                "❌ GUARDADO BLOQUEADO: Corrija los problemas de stock insuficiente antes de continuar."
-            )
-            
-            # Lanzar excepción para evitar guardado
-            from django.core.exceptions import ValidationError
-            raise ValidationError("Stock insuficiente detectado")
-        
-        # PASO 3: Guardar si no hay errores críticos
-        for instance in instances:
-            instance.save()
-        
-        formset.save_m2m()
-        
-        # Eliminar objetos marcados para eliminación
-        for obj in formset.deleted_objects:
-            obj.delete()
-        
-        # PASO 4: Solo mensaje básico de éxito - Sin mensajes invasivos adicionales
-        # Las notificaciones flotantes JavaScript manejan toda la información de stock
-        
-        messages.success(
-            request,
-            f"✅ Factura guardada exitosamente con {len(instances)} líneas procesadas."
-        )
-        
-        # Sin mensajes adicionales de stock - Solo notificaciones flotantes discretas
-    
     def get_extra(self, request, obj=None, **kwargs):
         """
         SOLUCIÓN ÓPTIMA: 3 filas iniciales + interceptación de filas dinámicas.
@@ -272,14 +218,14 @@ class InvoiceLineInline(admin.TabularInline):
 @admin.register(Invoice)
 class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
     list_display = ['number', 'date', 'customer', 'company', 'get_status_display', 'subtotal', 'tax_amount', 'total']
-    list_filter = ['status', 'date', UserCompanyListFilter]
+    list_filter = ['status', 'sri_status', 'date', UserCompanyListFilter]
     search_fields = ['number', 'customer__trade_name', 'customer__identification']
     list_select_related = ['customer', 'company', 'created_by']
     autocomplete_fields = ['customer']  # Habilitar autocompletado para el campo cliente
     inlines = [InvoiceLineInline]
     
     # Acciones grupales para cambio de estado
-    actions = ['mark_as_sent', 'mark_as_paid', 'mark_as_cancelled', 'mark_as_draft', 'print_selected_invoices_pdf']
+    actions = ['mark_as_sent', 'mark_as_paid', 'mark_as_cancelled', 'mark_as_draft', 'print_selected_invoices_pdf', 'issue_electronic_invoices']
     
     def get_status_display(self, obj):
         """Mostrar estado con colores para facturas de venta"""
@@ -311,6 +257,7 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
         # Verificar permiso para marcar como enviada
         if request.user.has_perm('invoicing.mark_invoice_sent'):
             filtered_actions['mark_as_sent'] = actions.get('mark_as_sent')
+            filtered_actions['issue_electronic_invoices'] = actions.get('issue_electronic_invoices')
         
         # Verificar permiso para marcar como pagada
         if request.user.has_perm('invoicing.mark_invoice_paid'):
@@ -337,14 +284,14 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
     # Fieldsets base - será personalizado dinámicamente (SIN sección Estado)
     base_fieldsets_no_status = (
         ('Información Básica', {
-            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'bank_observations')
+            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'warehouse', 'bank_observations')
         }),
     )
     
     # Fieldsets originales (mantenidos para referencia si se necesitan)
     base_fieldsets = (
         ('Información Básica', {
-            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'bank_observations')
+            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'warehouse', 'bank_observations')
         }),
         ('Estado', {
             'fields': (('status', 'created_by'),)
@@ -354,18 +301,22 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
     # Fieldsets con totales para edición (SIN sección Estado)
     edit_fieldsets_no_status = (
         ('Información Básica', {
-            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'bank_observations')
+            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'warehouse', 'bank_observations')
         }),
         ('Totales', {
             'fields': (('subtotal', 'tax_amount', 'total'),),
             'classes': ('collapse',)
         }),
+        ('Factura Electrónica', {
+            'fields': (('sri_status', 'sri_authorization_number', 'sri_authorized_at'),),
+            'classes': ('collapse',)
+        }),
     )
     
     # Fieldsets originales (mantenidos para referencia si se necesitan)
     edit_fieldsets = (
         ('Información Básica', {
-            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'bank_observations')
+            'fields': ('company', 'customer', 'date', 'payment_form', 'account', 'warehouse', 'bank_observations')
         }),
         ('Totales', {
             'fields': (('subtotal', 'tax_amount', 'total'),),
@@ -421,7 +372,7 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
                  self.admin_site.admin_view(self.search_products_ajax_view),
                  name='invoicing_invoice_search_products'),
             path('<path:object_id>/print-pdf/',
-                 self.admin_site.admin_view(self.print_invoice_pdf),
+                 self.admin_site.admin_view(self.print_invoice_pdf, cacheable=True),
                  name='invoicing_invoice_print_pdf'),
         ]
         return custom_urls + urls
@@ -709,7 +660,10 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
     
     def get_readonly_fields(self, request, obj=None):
         """Campos de solo lectura dependiendo de permisos"""
-        base_readonly = ['created_by', 'subtotal', 'tax_amount', 'total']
+        base_readonly = [
+            'created_by', 'subtotal', 'tax_amount', 'total',
+            'sri_status', 'sri_authorization_number', 'sri_authorized_at'
+        ]
         
         # OPCIÓN B: Ocultar campo status siempre (no aparece en fieldsets)
         # Al no estar en fieldsets, estos campos se manejan automáticamente
@@ -850,38 +804,44 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
         # CRÍTICO: Manejar creación de asientos contables INMEDIATAMENTE después del guardado
         # Esto no debe ser afectado por verificaciones de stock
         self._handle_journal_entry_creation(obj, old_status, request)
+    
+    def save_formset(self, request, form, formset, change):
+        """Guardar líneas por lotes y persistir los totales de la cabecera una sola vez"""
+        if formset.model is not InvoiceLine:
+            return super().save_formset(request, form, formset, change)
         
-        # OPCIONAL: Verificar stock y mostrar mensajes informativos (no crítico)
-        # Se ejecuta al final para no interferir con operaciones críticas
-        self._check_stock_and_notify(request, obj)
+        from .services import InvoiceTotalsService
+        
+        instances = formset.save(commit=False)
+        InvoiceTotalsService.save_lines(form.instance, instances, formset.deleted_objects)
+        formset.save_m2m()
+        
+        # OPCIONAL: Mensajes de stock (no crítico) con el resultado ya calculado en la validación
+        self._check_stock_and_notify(request, form.instance, getattr(formset, 'stock_availability', {}))
     
-    def _check_stock_and_notify(self, request, invoice):
+    def _check_stock_and_notify(self, request, invoice, stock_availability):
         """
-        Verificar stock de líneas y mostrar mensajes informativos de Django Admin.
+        Avisar en el admin los niveles de stock de la factura guardada (solo informativo).
         
         CRÍTICO: Esta función NO debe interferir con:
         1. El guardado de la factura
         2. La creación de asientos contables
         3. El cambio de estado de la factura
         
-        Solo proporciona información adicional al usuario.
+        Usa el resultado de InvoiceLineFormSet ({product_id: stock_info}); no consulta stock.
         """
         try:
-            # Solo validar stock sin mostrar mensajes invasivos
-            # Las notificaciones flotantes JavaScript se encargan del UX
-            for line in invoice.lines.all():
-                try:
-                    stock_info = line.check_stock_availability()
-                    # Solo log para debug, NO mensajes invasivos a usuario
-                except Exception as line_error:
-                    # Error en línea específica no debe afectar el flujo principal
-                    print(f"⚠️ Error verificando stock en línea {line.id}: {line_error}")
-                    continue
+            # Un aviso por producto con stock bajo o insuficiente; no bloquea el guardado
+            for product_id, stock_info in stock_availability.items():
+                if stock_info and stock_info.get('level') in ('error', 'warning'):
+                    messages.warning(
+                        request,
+                        f"{stock_info['icon']} Factura {invoice.number}: {stock_info['message']}"
+                    )
                     
         except Exception as e:
             # Error general en verificación de stock no debe afectar el guardado
             print(f"⚠️ Error general en verificación de stock: {e}")
-            pass  # Continuar sin mostrar mensajes de stock
     
     def _handle_journal_entry_creation(self, invoice, old_status, request):
         """Maneja la creación de asientos contables según cambios de estado"""
@@ -957,6 +917,17 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
                 ).values_list('company', flat=True)
                 if user_companies:
                     kwargs["queryset"] = Customer.objects.filter(company__in=user_companies)
+        elif db_field.name == "warehouse":
+            # Solo bodegas activas de las empresas del usuario
+            from apps.inventory.models import Warehouse
+            queryset = Warehouse.objects.filter(is_active=True)
+            if not request.user.is_superuser:
+                from apps.companies.models import CompanyUser
+                queryset = queryset.filter(company__in=CompanyUser.objects.filter(
+                    user=request.user,
+                    is_active=True
+                ).values_list('company', flat=True))
+            kwargs["queryset"] = queryset
         
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
     
@@ -1007,8 +978,7 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
     def search_products_ajax_view(self, request):
         """Vista AJAX para búsqueda inteligente de productos"""
         from django.http import JsonResponse
-        from django.db.models import Q
-        from apps.inventory.models import Product
+        from apps.inventory.services import ProductSearchService
         
         # Verificar que sea petición AJAX
         if not request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -1029,40 +999,27 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
                     'message': 'Ingrese al menos 2 caracteres para buscar'
                 })
             
-            # Filtros base
-            filters = Q(is_active=True)
-            
-            # Filtrar por empresa si se especifica
+            # Empresas a buscar
+            company_ids = None
             if company_id:
-                filters &= Q(company_id=company_id)
+                company_ids = [company_id]
             elif not request.user.is_superuser:
                 # Para usuarios no admin, filtrar por empresas permitidas
                 from apps.companies.models import CompanyUser
-                user_companies = CompanyUser.objects.filter(
+                user_companies = list(CompanyUser.objects.filter(
                     user=request.user, 
                     is_active=True
-                ).values_list('company_id', flat=True)
+                ).values_list('company_id', flat=True))
                 if user_companies:
-                    filters &= Q(company_id__in=user_companies)
-            
-            # Búsqueda inteligente por código, nombre y descripción
-            search_filters = (
-                Q(code__icontains=query) |
-                Q(name__icontains=query) |
-                Q(description__icontains=query)
-            )
+                    company_ids = user_companies
             
-            products = Product.objects.filter(filters & search_filters).select_related(
-                'company'
-            ).order_by('code', 'name')[:limit]
+            # Búsqueda por índice: código exacto, prefijo de código y palabras del nombre
+            products = ProductSearchService.search(query, company_ids=company_ids, limit=limit)
             
             results = []
             for product in products:
-                # Obtener stock actual de forma segura
-                try:
-                    current_stock = float(getattr(product, 'current_stock', 0))
-                except (ValueError, TypeError):
-                    current_stock = 0
+                # Stock total desnormalizado, viene en la misma consulta
+                current_stock = float(product.stock_on_hand) if product.manages_inventory else 0
                 
                 # Determinar estado del stock
                 if current_stock > 10:
@@ -1116,7 +1073,9 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
         from django.http import HttpResponse
         from .invoice_pdf import generate_invoice_pdf
         
-        invoice = get_object_or_404(Invoice, pk=object_id)
+        invoice = get_object_or_404(
+            Invoice.objects.select_related('company', 'customer', 'payment_form'), pk=object_id
+        )
         
         # Verificar permisos de empresa si no es superuser
         if not request.user.is_superuser:
@@ -1129,11 +1088,23 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
                 from django.core.exceptions import PermissionDenied
                 raise PermissionDenied("No tiene permisos para ver esta factura")
         
+        filename = f"Factura_{invoice.number}_{invoice.customer.trade_name.replace(' ', '_')}.pdf"
+        
+        # Facturas emitidas: renderizar una vez y servir desde el almacén de documentos
+        if invoice.status in ('sent', 'paid'):
+            from apps.core.document_store import RenderedDocumentStore
+            from .invoice_pdf import invoice_pdf_data, render_invoice_pdf
+            
+            data = invoice_pdf_data(invoice)
+            fingerprint = {key: value for key, value in data.items() if key != 'generated_at'}
+            return RenderedDocumentStore.serve(
+                request, 'invoice', invoice.pk, fingerprint, lambda: render_invoice_pdf(data), filename
+            )
+        
         # Generar PDF
         pdf_buffer = generate_invoice_pdf(invoice)
         
         # Preparar respuesta
-        filename = f"Factura_{invoice.number}_{invoice.customer.trade_name.replace(' ', '_')}.pdf"
         response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         
@@ -1153,6 +1124,31 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
     # ACCIONES GRUPALES PARA CAMBIO DE ESTADO
     # ==========================================
     
+    def _transition_invoices(self, request, queryset, target_status, label):
+        """Cambio de estado masivo con asientos por lotes (InvoiceTransitionService)"""
+        from .services import InvoiceTransitionService
+        
+        results = InvoiceTransitionService.transition(queryset, target_status)
+        
+        updated = [result for result in results if result['changed']]
+        entries = [result for result in updated if result['journal_entry']]
+        errors = [
+            f"Error en factura {result['invoice'].number}: {result['message']}"
+            for result in results if not result['success']
+        ]
+        
+        if updated:
+            message = f"✅ {len(updated)} factura(s) marcada(s) como '{label}' exitosamente."
+            if entries:
+                message += f" {len(entries)} asiento(s) contable(s) generado(s)."
+            self.message_user(request, message)
+        if errors:
+            self.message_user(
+                request,
+                f"❌ Errores: {'; '.join(errors)}",
+                level=messages.ERROR
+            )
+    
     def mark_as_sent(self, request, queryset):
         """Marcar facturas seleccionadas como 'Enviadas'"""
         # Validar permiso específico
@@ -1164,34 +1160,7 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
             )
             return
         
-        updated = 0
-        errors = []
-        
-        for invoice in queryset:
-            try:
-                if invoice.status != 'sent':
-                    old_status = invoice.status
-                    invoice.status = 'sent'
-                    invoice.save()
-                    
-                    # Crear asiento contable automáticamente
-                    self._handle_journal_entry_creation(invoice, old_status, request)
-                    updated += 1
-                    
-            except Exception as e:
-                errors.append(f"Error en factura {invoice.number}: {str(e)}")
-        
-        if updated:
-            self.message_user(
-                request, 
-                f"✅ {updated} factura(s) marcada(s) como 'Enviadas' exitosamente."
-            )
-        if errors:
-            self.message_user(
-                request,
-                f"❌ Errores: {'; '.join(errors)}",
-                level=messages.ERROR
-            )
+        self._transition_invoices(request, queryset, 'sent', 'Enviadas')
     
     mark_as_sent.short_description = "📤 Marcar como Enviadas"
     
@@ -1206,35 +1175,7 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
             )
             return
         
-        updated = 0
-        errors = []
-        
-        for invoice in queryset:
-            try:
-                if invoice.status != 'paid':
-                    old_status = invoice.status
-                    invoice.status = 'paid'
-                    invoice.save()
-                    
-                    # Crear asiento contable si es necesario
-                    if old_status != 'sent':  # Si no venía de 'sent', crear asiento
-                        self._handle_journal_entry_creation(invoice, old_status, request)
-                    updated += 1
-                    
-            except Exception as e:
-                errors.append(f"Error en factura {invoice.number}: {str(e)}")
-        
-        if updated:
-            self.message_user(
-                request, 
-                f"✅ {updated} factura(s) marcada(s) como 'Pagadas' exitosamente."
-            )
-        if errors:
-            self.message_user(
-                request,
-                f"❌ Errores: {'; '.join(errors)}",
-                level=messages.ERROR
-            )
+        self._transition_invoices(request, queryset, 'paid', 'Pagadas')
     
     mark_as_paid.short_description = "💰 Marcar como Pagadas"
     
@@ -1249,37 +1190,7 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
             )
             return
         
-        updated = 0
-        errors = []
-        
-        for invoice in queryset:
-            try:
-                if invoice.status != 'cancelled':
-                    old_status = invoice.status
-                    invoice.status = 'cancelled'
-                    invoice.save()
-                    
-                    # Crear asiento de reversión si tenía asiento contable
-                    if old_status in ['sent', 'paid']:
-                        from apps.accounting.services import AutomaticJournalEntryService
-                        AutomaticJournalEntryService.reverse_journal_entry(invoice)
-                    
-                    updated += 1
-                    
-            except Exception as e:
-                errors.append(f"Error en factura {invoice.number}: {str(e)}")
-        
-        if updated:
-            self.message_user(
-                request, 
-                f"✅ {updated} factura(s) marcada(s) como 'Anuladas' exitosamente."
-            )
-        if errors:
-            self.message_user(
-                request,
-                f"❌ Errores: {'; '.join(errors)}",
-                level=messages.ERROR
-            )
+        self._transition_invoices(request, queryset, 'cancelled', 'Anuladas')
     
     mark_as_cancelled.short_description = "❌ Marcar como Anuladas"
     
@@ -1329,11 +1240,17 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
     mark_as_draft.short_description = "📝 Marcar como Borrador"
     
     def print_selected_invoices_pdf(self, request, queryset):
-        """Acción masiva para imprimir facturas seleccionadas"""
+        """
+        Acción masiva para imprimir facturas seleccionadas
+        
+        Varias facturas se renderizan en un pool de procesos y se entregan en un
+        ZIP en streaming a medida que cada PDF termina
+        """
         from django.http import HttpResponse
-        from .invoice_pdf import generate_invoice_pdf
-        from io import BytesIO
-        import zipfile
+        from apps.core.documents import render_documents, stream_zip_response
+        from .invoice_pdf import (
+            generate_invoice_pdf, invoice_pdf_filename, iter_invoice_pdf_data, render_invoice_pdf
+        )
         
         # Filtrar facturas según permisos del usuario
         if not request.user.is_superuser:
@@ -1343,104 +1260,64 @@ class InvoiceAdmin(CompanyFilterMixin, admin.ModelAdmin):
             ).values_list('company', flat=True)
             queryset = queryset.filter(company__in=user_companies)
         
-        if queryset.count() == 0:
-            from django.contrib import messages
+        count = queryset.count()
+        if count == 0:
             messages.error(request, "No se encontraron facturas para imprimir")
             return
         
-        elif queryset.count() == 1:
+        elif count == 1:
             # Si es solo una factura, generar PDF individual
-            invoice = queryset.first()
+            invoice = queryset.select_related('company', 'customer', 'payment_form').first()
             pdf_buffer = generate_invoice_pdf(invoice)
             filename = f"Factura_{invoice.number}_{invoice.customer.trade_name.replace(' ', '_')}.pdf"
             response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
             return response
         
-        else:
-            # Múltiples facturas: crear ZIP con PDFs individuales
-            zip_buffer = BytesIO()
-            processed_count = 0
-            
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for invoice in queryset:
-                    try:
-                        pdf_buffer = generate_invoice_pdf(invoice)
-                        safe_customer_name = invoice.customer.trade_name.replace(' ', '_').replace('/', '_')[:50]
-                        filename = f"Factura_{invoice.number}_{safe_customer_name}.pdf"
-                        zip_file.writestr(filename, pdf_buffer.getvalue())
-                        processed_count += 1
-                        
-                    except Exception as e:
-                        # Si hay error con una factura, continuar con las demás
-                        print(f"Error generando PDF para factura {invoice.number}: {e}")
-                        continue
-            
-            if processed_count == 0:
-                from django.contrib import messages
-                messages.error(request, "No se pudieron generar PDFs de las facturas seleccionadas")
-                return
-            
-            zip_buffer.seek(0)
-            response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
-            response['Content-Disposition'] = f'attachment; filename="Facturas_{processed_count}_documentos.zip"'
-            
-            from django.contrib import messages
-            messages.success(request, f"✅ Se generaron {processed_count} facturas en PDF")
-            return response
+        # Múltiples facturas: ZIP con PDFs individuales
+        jobs = (
+            (invoice_pdf_filename(data), data)
+            for data in iter_invoice_pdf_data(queryset)
+        )
+        
+        def entries():
+            errors = []
+            for filename, content, error in render_documents(render_invoice_pdf, jobs):
+                if error:
+                    # Si hay error con una factura, continuar con las demás
+                    print(f"Error generando PDF {filename}: {error}")
+                    errors.append(f"{filename}: {error}")
+                    continue
+                yield filename, content
+            if errors:
+                yield 'ERRORES.txt', '\n'.join(errors).encode('utf-8')
+        
+        return stream_zip_response(f"Facturas_{count}_documentos", entries())
     
     print_selected_invoices_pdf.short_description = "🖨️ Imprimir facturas seleccionadas"
     
-    def print_selected_invoices_pdf(self, request, queryset):
-        """Acción masiva para imprimir facturas seleccionadas"""
-        from django.http import HttpResponse
-        from .invoice_pdf import generate_invoice_pdf
-        from reportlab.lib.pagesizes import A4
-        from reportlab.platypus import SimpleDocTemplate
-        from io import BytesIO
-        import zipfile
-        
-        if queryset.count() == 1:
-            # Si es solo una factura, generar PDF individual
-            invoice = queryset.first()
-            pdf_buffer = generate_invoice_pdf(invoice)
-            filename = f"Factura_{invoice.number}_{invoice.customer.trade_name.replace(' ', '_')}.pdf"
-            response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+    def issue_electronic_invoices(self, request, queryset):
+        """Poner en cola de emisión electrónica (SRI) las facturas enviadas o pagadas"""
+        if not request.user.has_perm('invoicing.mark_invoice_sent'):
+            self.message_user(
+                request,
+                "❌ No tiene permisos para emitir facturas",
+                level=messages.ERROR
+            )
+            return
         
-        elif queryset.count() > 1:
-            # Múltiples facturas: crear ZIP con PDFs individuales
-            zip_buffer = BytesIO()
-            
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for invoice in queryset:
-                    try:
-                        # Verificar permisos por factura
-                        if not request.user.is_superuser:
-                            from apps.companies.models import CompanyUser
-                            user_companies = CompanyUser.objects.filter(
-                                user=request.user, is_active=True
-                            ).values_list('company', flat=True)
-                            
-                            if invoice.company_id not in user_companies:
-                                continue  # Saltar facturas sin permisos
-                        
-                        pdf_buffer = generate_invoice_pdf(invoice)
-                        filename = f"Factura_{invoice.number}_{invoice.customer.trade_name.replace(' ', '_')}.pdf"
-                        zip_file.writestr(filename, pdf_buffer.getvalue())
-                        
-                    except Exception as e:
-                        # Si hay error con una factura, continuar con las demás
-                        continue
-            
-            zip_buffer.seek(0)
-            response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
-            response['Content-Disposition'] = f'attachment; filename="Facturas_Seleccionadas.zip"'
-            return response
+        from apps.sri_integration.services import ElectronicDocumentService
         
-        else:
-            from django.contrib import messages
-            messages.error(request, "No se seleccionaron facturas para imprimir")
+        documents, errors = ElectronicDocumentService.issue_many(
+            ElectronicDocumentService.issue_invoice,
+            queryset.select_related('company')
+        )
+        if documents:
+            self.message_user(
+                request,
+                f"✅ {len(documents)} facturas en cola de emisión electrónica"
+            )
+        for invoice, error in errors:
+            self.message_user(request, f"❌ {invoice.number}: {error}", level=messages.ERROR)
     
-    print_selected_invoices_pdf.short_description = "🖨️ Imprimir facturas seleccionadas"
\ No newline at end of file
+    issue_electronic_invoices.short_description = "🧾 Emitir factura electrónica (SRI)"
\ No newline at end of file
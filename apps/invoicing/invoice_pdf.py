@@ -8,7 +8,7 @@ from io import BytesIO
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from apps.core.pdf_templates import get_sample_styles, paragraph_style
 from reportlab.lib.units import inch, cm, mm
 from reportlab.pdfgen import canvas
 from django.utils import timezone
@@ -27,6 +27,91 @@ def generate_invoice_pdf(invoice):
     Returns:
         BytesIO: Buffer con el contenido del PDF
     """
+    return BytesIO(render_invoice_pdf(invoice_pdf_data(invoice)))
+
+
+def invoice_pdf_data(invoice):
+    """
+    Datos de la factura como dict simple (serializable para renderizar en otro proceso)
+    
+    Usa las relaciones ya cargadas (select_related / prefetch_related) si existen
+    """
+    from apps.core.pdf_templates import CompanyHeaderCache
+    
+    company = CompanyHeaderCache.get(invoice.company)
+    customer = invoice.customer
+    return {
+        'number': invoice.number,
+        'date': invoice.date,
+        'due_date': invoice.due_date,
+        'status_display': invoice.get_status_display(),
+        'payment_form': invoice.payment_form.name if invoice.payment_form else None,
+        'transfer_detail': getattr(invoice, 'transfer_detail', '') or '',
+        'company': {
+            'trade_name': company['trade_name'],
+            'ruc': company['ruc'],
+            'address': company['address'],
+            'phone': company['phone'],
+            'email': company['email'],
+        },
+        'customer': {
+            'trade_name': customer.trade_name,
+            'identification': customer.identification,
+            'address': customer.address,
+            'phone': customer.phone,
+            'email': customer.email,
+        },
+        'lines': [
+            {
+                'product_name': line.product.name,
+                'quantity': line.quantity,
+                'unit_price': line.unit_price,
+                'discount': line.discount,
+                'iva_rate': line.iva_rate,
+            }
+            for line in invoice.lines.all()
+        ],
+        # Hora local de Ecuador calculada aquí: el renderizado no depende de Django
+        'generated_at': timezone.localtime(),
+    }
+
+
+def iter_invoice_pdf_data(queryset, chunk_size=100):
+    """
+    Datos de varias facturas por bloques: empresa, cliente, forma de pago, líneas
+    y productos en pocas consultas por bloque y memoria acotada
+    
+    Yields:
+        dict: Ver invoice_pdf_data
+    """
+    invoice_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(invoice_ids), chunk_size):
+        invoices = (
+            queryset.model.objects
+            .filter(pk__in=invoice_ids[start:start + chunk_size])
+            .select_related('company', 'customer', 'payment_form')
+            .prefetch_related('lines__product')
+            .order_by('pk')
+        )
+        for invoice in invoices:
+            yield invoice_pdf_data(invoice)
+
+
+def invoice_pdf_filename(data):
+    """Nombre de archivo del PDF de una factura"""
+    safe_customer_name = data['customer']['trade_name'].replace(' ', '_').replace('/', '_')[:50]
+    return f"Factura_{data['number']}_{safe_customer_name}.pdf"
+
+
+def render_invoice_pdf(data):
+    """
+    Renderiza el PDF de la factura a partir de invoice_pdf_data
+    
+    No accede a la base de datos: puede ejecutarse en un proceso worker
+    
+    Returns:
+        bytes: Contenido del PDF
+    """
     buffer = BytesIO()
     
     # Configurar documento PDF
@@ -40,10 +125,10 @@ def generate_invoice_pdf(invoice):
     )
     
     # Obtener estilos
-    styles = getSampleStyleSheet()
+    styles = get_sample_styles()
     
     # Estilos personalizados conforme regulaciones ecuatorianas
-    title_style = ParagraphStyle(
+    title_style = paragraph_style(
         'FacturaTitle',
         parent=styles['Heading1'],
         fontSize=16,
@@ -53,7 +138,7 @@ def generate_invoice_pdf(invoice):
         fontName='Helvetica-Bold'
     )
     
-    company_style = ParagraphStyle(
+    company_style = paragraph_style(
         'CompanyStyle',
         parent=styles['Normal'],
         fontSize=10,
@@ -63,7 +148,7 @@ def generate_invoice_pdf(invoice):
         fontName='Helvetica'
     )
     
-    header_style = ParagraphStyle(
+    header_style = paragraph_style(
         'HeaderStyle',
         parent=styles['Normal'],
         fontSize=9,
@@ -72,7 +157,7 @@ def generate_invoice_pdf(invoice):
         fontName='Helvetica-Bold'
     )
     
-    normal_style = ParagraphStyle(
+    normal_style = paragraph_style(
         'NormalStyle',
         parent=styles['Normal'],
         fontSize=8,
@@ -82,7 +167,7 @@ def generate_invoice_pdf(invoice):
     )
     
     # Estilo específico para productos con texto largo
-    product_style = ParagraphStyle(
+    product_style = paragraph_style(
         'ProductStyle',
         parent=styles['Normal'],
         fontSize=8,
@@ -93,7 +178,7 @@ def generate_invoice_pdf(invoice):
     )
     
     # Estilo para información legal obligatoria
-    legal_style = ParagraphStyle(
+    legal_style = paragraph_style(
         'LegalStyle',
         parent=styles['Normal'],
         fontSize=7,
@@ -107,32 +192,33 @@ def generate_invoice_pdf(invoice):
     story = []
     
     # === ENCABEZADO CONFORME REGULACIONES ECUATORIANAS ===
-    company = invoice.company
+    company = data['company']
+    customer = data['customer']
     
     # Título principal con numeración SRI
-    title_text = f"FACTURA N° {invoice.number}"
+    title_text = f"FACTURA N° {data['number']}"
     story.append(Paragraph(title_text, title_style))
     
     # Información obligatoria de la empresa (Art. 18 Reglamento de Comprobantes de Venta)
-    company_name = Paragraph(f"<b>{company.trade_name}</b>", company_style)
+    company_name = Paragraph(f"<b>{company['trade_name']}</b>", company_style)
     story.append(company_name)
     
     # RUC obligatorio
-    ruc_text = f"RUC: {company.ruc}"
+    ruc_text = f"RUC: {company['ruc']}"
     story.append(Paragraph(ruc_text, company_style))
     
     # Dirección obligatoria usando Paragraph para manejo de texto largo
-    address_text = f"Dirección: {company.address}"
+    address_text = f"Dirección: {company['address']}"
     address_para = Paragraph(address_text, company_style)
     story.append(address_para)
     
     # Información de contacto opcional
-    if company.phone or company.email:
+    if company['phone'] or company['email']:
         contact_parts = []
-        if company.phone:
-            contact_parts.append(f"Teléfono: {company.phone}")
-        if company.email:
-            contact_parts.append(f"Email: {company.email}")
+        if company['phone']:
+            contact_parts.append(f"Teléfono: {company['phone']}")
+        if company['email']:
+            contact_parts.append(f"Email: {company['email']}")
         contact_text = " | ".join(contact_parts)
         story.append(Paragraph(contact_text, normal_style))
     
@@ -147,7 +233,7 @@ def generate_invoice_pdf(invoice):
     # Información obligatoria según Art. 18 del Reglamento
     invoice_info_data = [
         [Paragraph('<b>FECHA DE EMISIÓN:</b>', header_style), 
-         Paragraph(invoice.date.strftime('%d/%m/%Y'), normal_style),
+         Paragraph(data['date'].strftime('%d/%m/%Y'), normal_style),
          Paragraph('<b>AMBIENTE:</b>', header_style), 
          Paragraph('PRODUCCIÓN', normal_style)],
         [Paragraph('<b>EMISIÓN:</b>', header_style), 
@@ -157,18 +243,18 @@ def generate_invoice_pdf(invoice):
     ]
     
     # Añadir forma de pago y vencimiento si aplica
-    payment_form = invoice.payment_form.name if invoice.payment_form else 'EFECTIVO'
+    payment_form = data['payment_form'] or 'EFECTIVO'
     invoice_info_data.append([
         Paragraph('<b>FORMA DE PAGO:</b>', header_style),
         Paragraph(payment_form, normal_style),
         Paragraph('<b>ESTADO:</b>', header_style),
-        Paragraph(invoice.get_status_display().upper(), normal_style)
+        Paragraph(data['status_display'].upper(), normal_style)
     ])
     
-    if invoice.due_date:
+    if data['due_date']:
         invoice_info_data.append([
             Paragraph('<b>FECHA DE VENCIMIENTO:</b>', header_style),
-            Paragraph(invoice.due_date.strftime('%d/%m/%Y'), normal_style),
+            Paragraph(data['due_date'].strftime('%d/%m/%Y'), normal_style),
             Paragraph('', normal_style),
             Paragraph('', normal_style)
         ])
@@ -195,15 +281,15 @@ def generate_invoice_pdf(invoice):
     customer_data = []
     
     # Razón Social/Nombres (obligatorio)
-    customer_name_para = Paragraph(f"<b>Razón Social/Nombres:</b> {invoice.customer.trade_name}", normal_style)
+    customer_name_para = Paragraph(f"<b>Razón Social/Nombres:</b> {customer['trade_name']}", normal_style)
     customer_data.append([customer_name_para])
     
     # Identificación (obligatorio con tipo)
-    identification_text = f"<b>Identificación:</b> {invoice.customer.identification}"
+    identification_text = f"<b>Identificación:</b> {customer['identification']}"
     # Determinar tipo de identificación según longitud
-    if len(invoice.customer.identification) == 13:
+    if len(customer['identification']) == 13:
         identification_text += " (RUC)"
-    elif len(invoice.customer.identification) == 10:
+    elif len(customer['identification']) == 10:
         identification_text += " (CÉDULA)"
     else:
         identification_text += " (PASAPORTE)"
@@ -212,16 +298,16 @@ def generate_invoice_pdf(invoice):
     customer_data.append([identification_para])
     
     # Dirección usando Paragraph para texto largo
-    address_para = Paragraph(f"<b>Dirección:</b> {invoice.customer.address}", normal_style)
+    address_para = Paragraph(f"<b>Dirección:</b> {customer['address']}", normal_style)
     customer_data.append([address_para])
     
     # Información adicional si existe
-    if invoice.customer.phone:
-        phone_para = Paragraph(f"<b>Teléfono:</b> {invoice.customer.phone}", normal_style)
+    if customer['phone']:
+        phone_para = Paragraph(f"<b>Teléfono:</b> {customer['phone']}", normal_style)
         customer_data.append([phone_para])
     
-    if invoice.customer.email:
-        email_para = Paragraph(f"<b>Email:</b> {invoice.customer.email}", normal_style)
+    if customer['email']:
+        email_para = Paragraph(f"<b>Email:</b> {customer['email']}", normal_style)
         customer_data.append([email_para])
     
     customer_table = Table(customer_data, colWidths=[17*cm])
@@ -261,16 +347,16 @@ def generate_invoice_pdf(invoice):
     total_iva = Decimal('0.00')    # IVA total
     total_descuentos = Decimal('0.00')  # Descuentos totales
     
-    for line in invoice.lines.all():
+    for line in data['lines']:
         # Cálculos por línea
-        subtotal_linea = line.quantity * line.unit_price
-        descuento_linea = subtotal_linea * (line.discount / 100)
+        subtotal_linea = line['quantity'] * line['unit_price']
+        descuento_linea = subtotal_linea * (line['discount'] / 100)
         base_imponible = subtotal_linea - descuento_linea
-        iva_linea = base_imponible * (line.iva_rate / 100)
+        iva_linea = base_imponible * (line['iva_rate'] / 100)
         total_linea = base_imponible + iva_linea
         
         # Acumular por tarifas de IVA
-        if line.iva_rate == 0:
+        if line['iva_rate'] == 0:
             subtotal_0 += base_imponible
         else:
             subtotal_12 += base_imponible
@@ -279,13 +365,13 @@ def generate_invoice_pdf(invoice):
         total_descuentos += descuento_linea
         
         # Usar Paragraph para descripción de producto (maneja texto largo)
-        product_description = Paragraph(line.product.name, product_style)
+        product_description = Paragraph(line['product_name'], product_style)
         
         # Construir fila de datos
         row_data = [
             product_description,
-            Paragraph(f"{line.quantity:.2f}", normal_style),
-            Paragraph(f"${line.unit_price:.2f}", normal_style),
+            Paragraph(f"{line['quantity']:.2f}", normal_style),
+            Paragraph(f"${line['unit_price']:.2f}", normal_style),
             Paragraph(f"${descuento_linea:.2f}", normal_style),
             Paragraph(f"${total_linea:.2f}", normal_style)
         ]
@@ -327,8 +413,8 @@ def generate_invoice_pdf(invoice):
         story.append(Spacer(1, 5))
     
     # Información de pago usando Paragraph para texto largo
-    if hasattr(invoice, 'transfer_detail') and invoice.transfer_detail:
-        transfer_info = Paragraph(f"<b>Información de Transferencia:</b> {invoice.transfer_detail}", normal_style)
+    if data['transfer_detail']:
+        transfer_info = Paragraph(f"<b>Información de Transferencia:</b> {data['transfer_detail']}", normal_style)
         story.append(transfer_info)
         story.append(Spacer(1, 8))
     
@@ -388,7 +474,7 @@ def generate_invoice_pdf(invoice):
     # === INFORMACIÓN ADICIONAL OBLIGATORIA (SRI) ===
     
     # Forma de pago detallada
-    forma_pago = invoice.payment_form.name if invoice.payment_form else 'EFECTIVO'
+    forma_pago = data['payment_form'] or 'EFECTIVO'
     story.append(Paragraph(f"<b>Forma de Pago:</b> {forma_pago}", legal_style))
     
     # Validez del comprobante
@@ -404,10 +490,10 @@ def generate_invoice_pdf(invoice):
     
     # === PIE DE PÁGINA ===
     # Usar hora local de Ecuador en lugar de UTC
-    local_time = timezone.localtime()
+    local_time = data['generated_at']
     footer_parts = []
     footer_parts.append(f"Documento generado el {local_time.strftime('%d/%m/%Y a las %H:%M')}")
-    footer_parts.append(f"Sistema: ContaEC - {company.trade_name}")
+    footer_parts.append(f"Sistema: ContaEC - {company['trade_name']}")
     
     footer_text = " | ".join(footer_parts)
     footer_para = Paragraph(f'<para alignment="center"><font size="7">{footer_text}</font></para>', styles['Normal'])
@@ -415,6 +501,5 @@ def generate_invoice_pdf(invoice):
     
     # Generar PDF
     doc.build(story)
-    buffer.seek(0)
     
-    return buffer
\ No newline at end of file
+    return buffer.getvalue()
\ No newline at end of file
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.invoicing.models import Invoice
+from apps.invoicing.services import InvoiceTransitionService
+
+
+class Command(BaseCommand):
+    help = 'Cambiar el estado de facturas en lote generando sus asientos contables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'status',
+            choices=[choice for choice, label in Invoice.STATUS_CHOICES],
+            help='Estado destino'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='ID de empresa (por defecto todas)'
+        )
+        parser.add_argument(
+            '--from-status',
+            choices=[choice for choice, label in Invoice.STATUS_CHOICES],
+            help='Solo facturas en este estado'
+        )
+        parser.add_argument(
+            '--date-to',
+            help='Solo facturas con fecha hasta (AAAA-MM-DD)'
+        )
+        parser.add_argument(
+            '--ids',
+            type=int,
+            nargs='+',
+            help='IDs de facturas específicas'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=InvoiceTransitionService.CHUNK_SIZE,
+            help=f'Facturas por transacción (por defecto {InvoiceTransitionService.CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options['company']:
+            invoices = invoices.filter(company_id=options['company'])
+        if options['from_status']:
+            invoices = invoices.filter(status=options['from_status'])
+        if options['date_to']:
+            invoices = invoices.filter(date__lte=options['date_to'])
+        if options['ids']:
+            invoices = invoices.filter(pk__in=options['ids'])
+        elif not (options['company'] or options['from_status'] or options['date_to']):
+            raise CommandError('Indique --ids, --company, --from-status o --date-to para acotar las facturas')
+
+        results = InvoiceTransitionService.transition(
+            invoices, options['status'], chunk_size=options['chunk_size']
+        )
+
+        updated = 0
+        entries = 0
+        errors = 0
+        for result in results:
+            if not result['success']:
+                errors += 1
+                self.stdout.write(
+                    self.style.ERROR(f"Factura {result['invoice'].number}: {result['message']}")
+                )
+            elif result['changed']:
+                updated += 1
+                if result['journal_entry']:
+                    entries += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. {updated} facturas actualizadas, '
+                f'{entries} asientos generados, {errors} con errores.'
+            )
+        )
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_warehouse_is_default'),
+        ('invoicing', '0018_invoice_bank_observations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, help_text='Bodega de despacho (vacío: bodega por defecto de la empresa)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='invoices', to='inventory.warehouse', verbose_name='Bodega'),
+        ),
+        migrations.AddField(
+            model_name='invoiceline',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, help_text='Despachar esta línea solo desde esta bodega (vacío: según la factura)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='invoice_lines', to='inventory.warehouse', verbose_name='Bodega'),
+        ),
+    ]
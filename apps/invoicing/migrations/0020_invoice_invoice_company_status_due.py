@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0019_invoice_warehouse_invoiceline_warehouse'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'status', 'due_date'], name='invoice_company_status_due'),
+        ),
+    ]
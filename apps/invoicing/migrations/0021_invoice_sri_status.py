@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0020_invoice_invoice_company_status_due'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='sri_authorization_number',
+            field=models.CharField(blank=True, max_length=49, verbose_name='Número de autorización SRI'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='sri_authorized_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha de autorización SRI'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='sri_status',
+            field=models.CharField(blank=True, choices=[('', 'Sin emitir'), ('pending', 'En trámite'), ('authorized', 'Autorizada'), ('rejected', 'Devuelta o no autorizada'), ('failed', 'Error de emisión')], default='', max_length=10, verbose_name='Estado SRI'),
+        ),
+    ]
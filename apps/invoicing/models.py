@@ -93,75 +93,56 @@ class Customer(BaseModel):
     def __str__(self):
         return f"{self.identification} - {self.trade_name}"
     
-    def get_retention_rates(self):
+    def get_retention_rates(self, on_date=None):
         """
         Calcula las tasas de retención aplicables según clasificación SRI
-        Similar al método en Supplier pero para clientes como agentes de retención
+        Tomadas del catálogo de retenciones vigente a la fecha (por defecto hoy);
+        los porcentajes configurados en el cliente reemplazan a los del catálogo
         """
-        rates = {
-            'iva_retention': Decimal('0.00'),
-            'ir_retention': Decimal('0.00')
-        }
+        from apps.sri_integration.services import RetentionService
         
         if not self.retention_agent:
-            return rates
-        
-        # Tasas de retención IVA según clasificación SRI (normativa ecuatoriana)
-        iva_rates = {
-            'persona_natural_no_obligada': Decimal('30.00'),
-            'persona_natural_obligada': Decimal('30.00'), 
-            'sociedad': Decimal('70.00'),
-            'institucion_publica': Decimal('100.00'),
-            'regimen_rimpe': Decimal('30.00'),
-        }
-        
-        # Tasas de retención IR por defecto (pueden ser ajustadas manualmente)
-        ir_rates = {
-            'persona_natural_no_obligada': Decimal('2.00'),
-            'persona_natural_obligada': Decimal('2.00'),
-            'sociedad': Decimal('1.00'),
-            'institucion_publica': Decimal('1.00'),
-            'regimen_rimpe': Decimal('1.00'),
-        }
-        
-        # Usar tasas personalizadas si están configuradas, sino usar automáticas
-        rates['iva_retention'] = (
-            self.iva_retention_percentage if self.iva_retention_percentage > 0
-            else iva_rates.get(self.sri_classification, Decimal('0.00'))
-        )
+            return {
+                'iva_retention': Decimal('0.00'),
+                'ir_retention': Decimal('0.00')
+            }
         
-        rates['ir_retention'] = (
-            self.ir_retention_percentage if self.ir_retention_percentage > 0
-            else ir_rates.get(self.sri_classification, Decimal('0.00'))
+        return RetentionService.default_rates(
+            self.sri_classification,
+            on_date,
+            iva_percentage=self.iva_retention_percentage,
+            ir_percentage=self.ir_retention_percentage
         )
-        
-        return rates
     
-    def calculate_retention_amounts(self, subtotal, tax_amount):
+    def calculate_retention_amounts(self, subtotal, tax_amount, on_date=None):
         """
         Calcula los montos de retención para una factura
         
         Args:
             subtotal: Subtotal de la factura
             tax_amount: Monto del IVA de la factura
+            on_date: Fecha de la factura (por defecto hoy)
             
         Returns:
             dict: {'iva_retention': amount, 'ir_retention': amount}
         """
+        from apps.sri_integration.services import RetentionService
+        
         if not self.retention_agent:
             return {'iva_retention': Decimal('0.00'), 'ir_retention': Decimal('0.00')}
         
-        rates = self.get_retention_rates()
-        
-        # Cálculo de retención IVA (se aplica sobre el IVA de la factura)
-        iva_retention_amount = (tax_amount * rates['iva_retention'] / Decimal('100.00')).quantize(Decimal('0.01'))
-        
-        # Cálculo de retención IR (se aplica sobre el subtotal)
-        ir_retention_amount = (subtotal * rates['ir_retention'] / Decimal('100.00')).quantize(Decimal('0.01'))
+        # IVA retenido sobre el IVA de la factura, IR sobre el subtotal
+        result = RetentionService.compute(
+            [(subtotal, tax_amount, '')],
+            self.sri_classification,
+            on_date,
+            iva_percentage=self.iva_retention_percentage,
+            ir_percentage=self.ir_retention_percentage
+        )
         
         return {
-            'iva_retention': iva_retention_amount,
-            'ir_retention': ir_retention_amount
+            'iva_retention': result['iva_retention_amount'],
+            'ir_retention': result['ir_retention_amount']
         }
 
 
@@ -183,6 +164,20 @@ class Invoice(BaseModel):
         (CANCELLED, 'Anulada'),
     ]
     
+    # Estado de la factura electrónica en el SRI (lo actualiza apps.sri_integration)
+    SRI_PENDING = 'pending'
+    SRI_AUTHORIZED = 'authorized'
+    SRI_REJECTED = 'rejected'
+    SRI_FAILED = 'failed'
+    
+    SRI_STATUS_CHOICES = [
+        ('', 'Sin emitir'),
+        (SRI_PENDING, 'En trámite'),
+        (SRI_AUTHORIZED, 'Autorizada'),
+        (SRI_REJECTED, 'Devuelta o no autorizada'),
+        (SRI_FAILED, 'Error de emisión'),
+    ]
+    
     company = models.ForeignKey(Company, on_delete=models.CASCADE, verbose_name='Empresa')
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, verbose_name='Cliente')
     
@@ -198,6 +193,15 @@ class Invoice(BaseModel):
         verbose_name='Forma de Pago'
     )
     account = models.ForeignKey('accounting.ChartOfAccounts', on_delete=models.PROTECT, null=True, blank=True, verbose_name='Cuenta')
+    warehouse = models.ForeignKey(
+        'inventory.Warehouse',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='invoices',
+        verbose_name='Bodega',
+        help_text='Bodega de despacho (vacío: bodega por defecto de la empresa)'
+    )
     transfer_detail = models.TextField(blank=True, verbose_name='Detalle Transferencia')  # DEPRECATED - usar bank_observations
     bank_observations = models.TextField(blank=True, verbose_name='Observaciones Bancarias', help_text='Observaciones adicionales para transferencias bancarias')
     
@@ -229,6 +233,25 @@ class Invoice(BaseModel):
         verbose_name='Estado'
     )
     
+    # Factura electrónica
+    sri_status = models.CharField(
+        max_length=10,
+        choices=SRI_STATUS_CHOICES,
+        blank=True,
+        default='',
+        verbose_name='Estado SRI'
+    )
+    sri_authorization_number = models.CharField(
+        max_length=49,
+        blank=True,
+        verbose_name='Número de autorización SRI'
+    )
+    sri_authorized_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha de autorización SRI'
+    )
+    
     # Usuario
     created_by = models.ForeignKey(
         User, 
@@ -241,6 +264,10 @@ class Invoice(BaseModel):
         verbose_name_plural = 'Facturas'
         unique_together = ['company', 'number']
         ordering = ['-date', '-number']
+        indexes = [
+            # Antigüedad de cuentas por cobrar (apps.reports)
+            models.Index(fields=['company', 'status', 'due_date'], name='invoice_company_status_due'),
+        ]
         
         # Permisos personalizados para control granular de estados
         permissions = [
@@ -259,28 +286,14 @@ class Invoice(BaseModel):
         """Genera número automático de factura según normativa ecuatoriana"""
         from apps.companies.models import CompanySettings
         
-        # Obtener o crear configuración de la empresa
-        settings, created = CompanySettings.objects.get_or_create(
-            company=self.company,
-            defaults={
-                'invoice_sequential': 1,
-                'credit_note_sequential': 1,
-                'debit_note_sequential': 1,
-                'withholding_sequential': 1,
-            }
-        )
+        # Secuencial reservado con UPDATE atómico: no pisa los demás contadores
+        sequential = CompanySettings.allocate_sequential(self.company, 'invoice_sequential')
         
         # Formato ecuatoriano: ESTABLECIMIENTO-PUNTO_EMISION-SECUENCIAL
         # Ejemplo: 001-001-000000001
         establishment = self.company.establishment_code.zfill(3)
         emission_point = self.company.emission_point.zfill(3)
-        sequential = str(settings.invoice_sequential).zfill(9)
-        
-        invoice_number = f"{establishment}-{emission_point}-{sequential}"
-        
-        # Incrementar secuencial para la próxima factura
-        settings.invoice_sequential += 1
-        settings.save()
+        invoice_number = f"{establishment}-{emission_point}-{str(sequential).zfill(9)}"
         
         return invoice_number
     
@@ -290,69 +303,32 @@ class Invoice(BaseModel):
             with transaction.atomic():
                 self.number = self.generate_invoice_number()
         
-        super().save(*args, **kwargs)
+        # Totales calculados antes de guardar: una sola escritura de la cabecera
+        if self.pk and kwargs.get('update_fields') is None:
+            from .services import InvoiceTotalsService
+            InvoiceTotalsService.apply_totals(self, InvoiceTotalsService.compute(self.lines.all()))
         
-        # Recalcular totales después de guardar
-        self.calculate_totals()
+        super().save(*args, **kwargs)
+    
+    def save_totals(self):
+        """Persistir solo los montos (no sobrescribe payment_form, account, transfer_detail)"""
+        super().save(update_fields=['subtotal', 'tax_amount', 'total', 'updated_at'])
     
     def get_tax_breakdown(self):
         """Obtener desglose de impuestos por tasa de IVA"""
-        lines = self.lines.all()
-        tax_breakdown = {}
-        
-        for line in lines:
-            line_subtotal = line.quantity * line.unit_price
-            discount_amount = line_subtotal * (line.discount / 100)
-            line_net = line_subtotal - discount_amount
-            
-            # Usar la tasa de IVA de la línea (no del producto)
-            iva_rate = line.iva_rate
-            line_tax = line_net * (iva_rate / 100)
-            
-            if iva_rate in tax_breakdown:
-                tax_breakdown[iva_rate]['base'] += line_net
-                tax_breakdown[iva_rate]['tax'] += line_tax
-            else:
-                tax_breakdown[iva_rate] = {
-                    'rate': iva_rate,
-                    'base': line_net,
-                    'tax': line_tax
-                }
-        
-        return tax_breakdown
+        from .services import InvoiceTotalsService
+        return InvoiceTotalsService.compute(self.lines.all())['breakdown']
     
     def calculate_totals(self):
         """Calcular subtotal, impuestos y total de la factura"""
-        lines = self.lines.all()
+        from .services import InvoiceTotalsService
         
-        subtotal = Decimal('0.00')
-        tax_amount = Decimal('0.00')
-        
-        for line in lines:
-            line_subtotal = line.quantity * line.unit_price
-            discount_amount = line_subtotal * (line.discount / 100)
-            line_net = line_subtotal - discount_amount
-            
-            subtotal += line_net
-            
-            # Calcular IVA usando la tasa de la línea
-            line_tax = line_net * (line.iva_rate / 100)
-            tax_amount += line_tax
+        totals = InvoiceTotalsService.compute(self.lines.all())
         
         # Actualizar solo si hay cambios
-        if (self.subtotal != subtotal or 
-            self.tax_amount != tax_amount or 
-            self.total != subtotal + tax_amount):
-            
-            self.subtotal = subtotal
-            self.tax_amount = tax_amount
-            self.total = subtotal + tax_amount
-            
-            # CORRECCIÓN: Usar save() con update_fields para preservar otros campos
-            if self.pk:
-                # Usar save() con update_fields para no sobrescribir payment_form, account, transfer_detail
-                super().save(update_fields=['subtotal', 'tax_amount', 'total'])
-            # Si es nueva factura, los valores se guardan en el siguiente save()
+        if InvoiceTotalsService.apply_totals(self, totals) and self.pk:
+            self.save_totals()
+        # Si es nueva factura, los valores se guardan en el siguiente save()
 
 
 class InvoiceLine(BaseModel):
@@ -369,6 +345,15 @@ class InvoiceLine(BaseModel):
         on_delete=models.PROTECT, 
         verbose_name='Producto'
     )
+    warehouse = models.ForeignKey(
+        'inventory.Warehouse',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='invoice_lines',
+        verbose_name='Bodega',
+        help_text='Despachar esta línea solo desde esta bodega (vacío: según la factura)'
+    )
     
     description = models.CharField(max_length=200, verbose_name='Descripción')
     quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Cantidad')
@@ -440,6 +425,7 @@ class InvoiceLine(BaseModel):
     def check_stock_availability(self):
         """
         Verificar disponibilidad de stock con niveles inteligentes de alerta.
+        Los productos que no manejan inventario no se verifican (retorna None).
         
         Returns:
             dict: {
@@ -454,99 +440,19 @@ class InvoiceLine(BaseModel):
         """
         if not self.product or not self.quantity:
             return None
+        
+        # Resultado ya calculado para el documento completo (InvoiceLineFormSet)
+        if hasattr(self, '_stock_info'):
+            return self._stock_info
             
+        from apps.inventory.services import StockAvailabilityService
+        
+        requested_quantity = Decimal(str(self.quantity or 0))
         try:
-            # Obtener stock actual del producto
-            available_stock = Decimal(str(self.product.get_current_stock() or 0))
-            requested_quantity = Decimal(str(self.quantity or 0))
-            
-            # Calcular diferencia
-            shortage = max(Decimal('0'), requested_quantity - available_stock)
-            has_sufficient_stock = available_stock >= requested_quantity
-            
-            # Determinar nivel y mensaje según las condiciones
-            if not has_sufficient_stock:
-                # STOCK INSUFICIENTE - Error crítico
-                return {
-                    'has_sufficient_stock': False,
-                    'available_stock': available_stock,
-                    'requested_quantity': requested_quantity,
-                    'shortage': shortage,
-                    'level': 'error',
-                    'icon': '🚨',
-                    'message': (
-                        f"{self.product.name} "
-                        f"(Código: {getattr(self.product, 'code', 'N/A')}) - "
-                        f"Solicitado: {requested_quantity}, "
-                        f"Disponible: {available_stock}, "
-                        f"Faltante: {shortage}"
-                    )
-                }
-            
-            elif available_stock <= 5:
-                # STOCK CRÍTICO - Advertencia alta
-                return {
-                    'has_sufficient_stock': True,
-                    'available_stock': available_stock,
-                    'requested_quantity': requested_quantity,
-                    'shortage': Decimal('0'),
-                    'level': 'warning',
-                    'icon': '⚠️',
-                    'message': (
-                        f"{self.product.name} "
-                        f"(Código: {getattr(self.product, 'code', 'N/A')}) - "
-                        f"Solo quedan {available_stock} unidades disponibles. "
-                        f"Considere reabastecer urgentemente."
-                    )
-                }
-            
-            elif available_stock <= 10:
-                # STOCK BAJO - Advertencia media
-                return {
-                    'has_sufficient_stock': True,
-                    'available_stock': available_stock,
-                    'requested_quantity': requested_quantity,
-                    'shortage': Decimal('0'),
-                    'level': 'warning',
-                    'icon': '📦',
-                    'message': (
-                        f"{self.product.name} "
-                        f"(Código: {getattr(self.product, 'code', 'N/A')}) - "
-                        f"Quedan {available_stock} unidades. Planifique reabastecimiento."
-                    )
-                }
-            
-            elif requested_quantity > (available_stock * Decimal('0.8')):
-                # USANDO GRAN PARTE DEL STOCK - Información
-                percentage = int((requested_quantity / available_stock) * 100)
-                return {
-                    'has_sufficient_stock': True,
-                    'available_stock': available_stock,
-                    'requested_quantity': requested_quantity,
-                    'shortage': Decimal('0'),
-                    'level': 'info',
-                    'icon': '📊',
-                    'message': (
-                        f"{self.product.name} - "
-                        f"Utilizando {percentage}% del stock disponible "
-                        f"({requested_quantity} de {available_stock} unidades)."
-                    )
-                }
-            
-            else:
-                # STOCK SUFICIENTE - Todo OK
-                return {
-                    'has_sufficient_stock': True,
-                    'available_stock': available_stock,
-                    'requested_quantity': requested_quantity,
-                    'shortage': Decimal('0'),
-                    'level': 'success',
-                    'icon': '✅',
-                    'message': (
-                        f"{self.product.name} - "
-                        f"Disponible: {available_stock} unidades."
-                    )
-                }
+            return StockAvailabilityService.check_document(
+                {self.product_id: requested_quantity},
+                products={self.product_id: self.product}
+            )[self.product_id]
                 
         except Exception as e:
             # Error al verificar stock - No crítico
@@ -634,9 +540,14 @@ class InvoiceLine(BaseModel):
     
 
         
-    def save(self, *args, **kwargs):
-        """Guardar línea de factura con cálculos automáticos"""
-        # Detectar si es una línea nueva
+    def apply_product_defaults(self, company_settings=None):
+        """
+        Completar precio, descripción e IVA desde el producto
+        
+        Args:
+            company_settings: CompanySettings de la empresa para líneas nuevas
+                (IVA por defecto); se pasa ya cargada al guardar por lotes
+        """
         is_new = self.pk is None
         
         # Establecer valores por defecto del producto si es necesario
@@ -649,12 +560,22 @@ class InvoiceLine(BaseModel):
                 self.iva_rate = self.product.iva_rate if hasattr(self.product, 'iva_rate') else Decimal('15.00')
         
         # Si es nueva línea y no hay producto o el IVA es el por defecto, usar el IVA de la empresa
+        if is_new and company_settings and (not self.iva_rate or self.iva_rate == Decimal('15.00')):
+            self.iva_rate = company_settings.default_iva_rate
+    
+    def save(self, *args, **kwargs):
+        """Guardar línea de factura con cálculos automáticos"""
+        # Detectar si es una línea nueva
+        is_new = self.pk is None
+        
+        company_settings = None
         if is_new and self.invoice and (not self.iva_rate or self.iva_rate == Decimal('15.00')):
             # Obtener la configuración de la empresa desde la factura
             if hasattr(self.invoice, 'company') and self.invoice.company:
                 from apps.companies.models import CompanySettings
                 company_settings, created = CompanySettings.objects.get_or_create(company=self.invoice.company)
-                self.iva_rate = company_settings.default_iva_rate
+        
+        self.apply_product_defaults(company_settings)
         
         # Calcular total de línea usando el método especializado
         self.line_total = self.calculate_line_total()
@@ -686,80 +607,7 @@ class InvoiceLine(BaseModel):
         Crear movimiento de salida en inventario al facturar
         Solo si es un producto físico que maneja inventario
         """
-        from apps.inventory.models import StockMovement, Warehouse
-        
-        # Obtener bodega principal de la empresa
-        main_warehouse = Warehouse.objects.filter(
-            company=self.invoice.company,
-            is_active=True
-        ).first()
-        
-        if not main_warehouse:
-            # Si no hay bodegas, crear una por defecto
-            main_warehouse = Warehouse.objects.create(
-                company=self.invoice.company,
-                code='001',
-                name='Bodega Principal',
-                address='Oficina principal',
-                responsible=self.invoice.created_by,
-                is_active=True
-            )
-        
-        # Verificar si ya existe un movimiento para esta línea de factura
-        existing_movement = StockMovement.objects.filter(
-            product=self.product,
-            warehouse=main_warehouse,
-            reference=f"Factura {self.invoice.number}",
-            movement_type=StockMovement.OUT,
-            quantity=self.quantity
-        ).first()
-        
-        if not existing_movement:
-            # Crear movimiento de salida
-            movement = StockMovement.objects.create(
-                product=self.product,
-                warehouse=main_warehouse,
-                movement_type=StockMovement.OUT,
-                quantity=self.quantity,
-                unit_cost=self.product.cost_price,
-                total_cost=self.quantity * self.product.cost_price,
-                reference=f"Factura {self.invoice.number}",
-                description=f"Venta según factura {self.invoice.number} - Cliente: {self.invoice.customer.trade_name}",
-                created_by=self.invoice.created_by
-            )
-            
-            # Actualizar stock actual
-            self.update_stock_quantity(main_warehouse, movement)
-    
-    def update_stock_quantity(self, warehouse, movement):
-        """Actualizar la cantidad en stock después del movimiento"""
-        from apps.inventory.models import Stock, StockMovement
-        from django.utils import timezone
-        
-        # Obtener o crear registro de stock
-        stock, created = Stock.objects.get_or_create(
-            product=self.product,
-            warehouse=warehouse,
-            defaults={
-                'quantity': Decimal('0.00'),
-                'average_cost': self.product.cost_price,
-                'last_movement': timezone.now()
-            }
-        )
-        
-        if movement.movement_type == StockMovement.OUT:
-            # Salida: reducir stock
-            stock.quantity -= movement.quantity
-        elif movement.movement_type == StockMovement.IN:
-            # Entrada: aumentar stock y recalcular costo promedio
-            total_value_before = stock.quantity * stock.average_cost
-            total_value_new = movement.quantity * movement.unit_cost
-            total_quantity_after = stock.quantity + movement.quantity
-            
-            if total_quantity_after > 0:
-                stock.average_cost = (total_value_before + total_value_new) / total_quantity_after
-            
-            stock.quantity += movement.quantity
+        from .services import InvoiceTotalsService
         
-        stock.last_movement = timezone.now()
-        stock.save()
\ No newline at end of file
+        # Bodega según línea, factura o empresa; un movimiento por línea y bodega
+        InvoiceTotalsService.update_inventory(self.invoice, [self])
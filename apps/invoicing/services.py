@@ -0,0 +1,460 @@
+"""
+Servicios de facturación
+Cálculo de totales en memoria y guardado de líneas por lotes
+"""
+
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+
+class InvoiceTotalsService:
+    """
+    Motor de totales de factura
+
+    Calcula totales de línea, bases e IVA por tarifa y total general en una sola
+    pasada sobre objetos InvoiceLine en memoria. El guardado de líneas usa
+    bulk_create / bulk_update y persiste la cabecera una sola vez, de modo que
+    guardar una factura cuesta un número constante de consultas.
+    """
+
+    CENT = Decimal('0.01')
+
+    @classmethod
+    def line_amounts(cls, line):
+        """
+        Montos de una línea
+
+        Returns:
+            tuple: (base neta sin redondear, IVA sin redondear, total de línea redondeado)
+        """
+        quantity = Decimal(str(line.quantity or 0))
+        unit_price = Decimal(str(line.unit_price or 0))
+        discount = Decimal(str(line.discount or 0))
+        iva_rate = Decimal(str(line.iva_rate or 0))
+
+        gross = quantity * unit_price
+        net = gross - gross * (discount / 100)
+        tax = net * (iva_rate / 100)
+        return net, tax, (net + tax).quantize(cls.CENT)
+
+    @classmethod
+    def compute(cls, lines):
+        """
+        Calcular totales de un conjunto de líneas (asigna line_total en cada línea)
+
+        Returns:
+            dict: {
+                'subtotal', 'tax_amount', 'total': Decimal,
+                'breakdown': {iva_rate: {'rate', 'base', 'tax'}}
+            }
+        """
+        subtotal = Decimal('0.00')
+        tax_amount = Decimal('0.00')
+        breakdown = {}
+
+        for line in lines:
+            net, tax, line_total = cls.line_amounts(line)
+            line.line_total = line_total
+
+            subtotal += net
+            tax_amount += tax
+
+            rate_totals = breakdown.setdefault(
+                line.iva_rate, {'rate': line.iva_rate, 'base': Decimal('0.00'), 'tax': Decimal('0.00')}
+            )
+            rate_totals['base'] += net
+            rate_totals['tax'] += tax
+
+        return {
+            'subtotal': subtotal.quantize(cls.CENT),
+            'tax_amount': tax_amount.quantize(cls.CENT),
+            'total': (subtotal + tax_amount).quantize(cls.CENT),
+            'breakdown': breakdown,
+        }
+
+    @classmethod
+    def apply_totals(cls, invoice, totals):
+        """
+        Asignar totales a la cabecera
+
+        Returns:
+            bool: True si algún monto cambió
+        """
+        changed = (
+            invoice.subtotal != totals['subtotal'] or
+            invoice.tax_amount != totals['tax_amount'] or
+            invoice.total != totals['total']
+        )
+        invoice.subtotal = totals['subtotal']
+        invoice.tax_amount = totals['tax_amount']
+        invoice.total = totals['total']
+        return changed
+
+    @classmethod
+    def save_lines(cls, invoice, lines, deleted_lines=()):
+        """
+        Guardar líneas nuevas o modificadas y recalcular la cabecera
+
+        Args:
+            invoice: Factura ya guardada
+            lines: Líneas nuevas (sin pk) o modificadas
+            deleted_lines: Líneas a eliminar
+
+        Returns:
+            dict: Totales calculados (ver compute)
+        """
+        from apps.inventory.models import Product
+        from .models import InvoiceLine
+
+        lines = list(lines)
+        deleted_ids = {line.pk for line in deleted_lines if line.pk}
+
+        # Productos en una consulta para las líneas que no los traen cargados
+        missing_product_ids = {
+            line.product_id for line in lines
+            if line.product_id and not InvoiceLine.product.is_cached(line)
+        }
+        if missing_product_ids:
+            products = Product.objects.in_bulk(missing_product_ids)
+            for line in lines:
+                if line.product_id in products:
+                    line.product = products[line.product_id]
+
+        stock_levels = cls._get_stock_levels(lines)
+
+        company_settings = None
+        new_lines = []
+        changed_lines = []
+
+        for line in lines:
+            line.invoice = invoice
+            is_new = line.pk is None
+            if is_new and company_settings is None:
+                company_settings = cls._get_company_settings(invoice)
+            line.apply_product_defaults(company_settings if is_new else None)
+
+            # Stock informativo al momento de la venta
+            if line.product_id:
+                line.stock = stock_levels.get(line.product_id, Decimal('0.00'))
+
+            if line.quantity is not None and line.quantity <= 0:
+                raise ValidationError({'quantity': 'La cantidad debe ser mayor a cero.'})
+
+            (new_lines if is_new else changed_lines).append(line)
+
+        # Resto de líneas de la factura, para totalizar sin volver a guardarlas
+        written_ids = {line.pk for line in changed_lines}
+        other_lines = list(
+            invoice.lines.exclude(pk__in=written_ids | deleted_ids)
+        )
+
+        totals = cls.compute(other_lines + lines)
+
+        with transaction.atomic():
+            if deleted_ids:
+                InvoiceLine.objects.filter(pk__in=deleted_ids).delete()
+
+            if new_lines:
+                InvoiceLine.objects.bulk_create(new_lines)
+
+            if changed_lines:
+                # bulk_update no aplica auto_now
+                now = timezone.now()
+                for line in changed_lines:
+                    line.updated_at = now
+                InvoiceLine.objects.bulk_update(changed_lines, [
+                    'product', 'description', 'quantity', 'unit_price', 'discount',
+                    'stock', 'iva_rate', 'line_total', 'is_active', 'updated_at'
+                ])
+
+            if cls.apply_totals(invoice, totals):
+                invoice.save_totals()
+
+            cls.update_inventory(invoice, new_lines + changed_lines)
+
+        return totals
+
+    @classmethod
+    def _get_stock_levels(cls, lines):
+        """Stock total por producto (todas las bodegas) en una consulta agrupada"""
+        from apps.inventory.services import StockAvailabilityService
+
+        return StockAvailabilityService.get_stock_levels(
+            line.product_id for line in lines
+            if line.product_id and line.product.manages_inventory
+        )
+
+    @classmethod
+    def _get_company_settings(cls, invoice):
+        """Configuración de la empresa (una consulta por guardado)"""
+        from apps.companies.models import CompanySettings
+
+        if not invoice.company_id:
+            return None
+        company_settings, created = CompanySettings.objects.get_or_create(company_id=invoice.company_id)
+        return company_settings
+
+    @classmethod
+    def update_inventory(cls, invoice, lines):
+        """
+        Salidas de inventario por lotes para las líneas guardadas
+
+        Cada línea sale de su bodega, de la bodega de la factura o de la bodega
+        por defecto de la empresa, repartiéndose entre bodegas si no alcanza
+        (WarehouseRouter). Las líneas que ya tienen movimientos se omiten.
+        """
+        from apps.inventory.models import StockMovement
+        from apps.inventory.services import InventoryLedgerService, WarehouseRouter
+
+        if invoice.status == 'cancelled':
+            return
+
+        recorded = InventoryLedgerService.recorded_lines(StockMovement.SOURCE_INVOICE, [invoice.pk])
+        inventory_lines = [
+            line for line in lines
+            if line.product.manages_inventory and line.product.product_type == 'product'
+            and (StockMovement.SOURCE_INVOICE, invoice.pk, line.pk) not in recorded
+        ]
+        if not inventory_lines:
+            return
+
+        allocations = WarehouseRouter.allocate(
+            invoice.company,
+            (
+                (line, line.product_id, line.quantity, line.warehouse if line.warehouse_id else None)
+                for line in inventory_lines
+            ),
+            preferred=invoice.warehouse if invoice.warehouse_id else None,
+            responsible=invoice.created_by
+        )
+
+        InventoryLedgerService.record_movements(
+            StockMovement(
+                product=line.product,
+                warehouse=warehouse,
+                movement_type=StockMovement.OUT,
+                quantity=quantity,
+                unit_cost=line.product.cost_price,
+                total_cost=quantity * line.product.cost_price,
+                reference=f"Factura {invoice.number}",
+                description=f"Venta según factura {invoice.number} - Cliente: {invoice.customer.trade_name}",
+                created_by=invoice.created_by,
+                source_type=StockMovement.SOURCE_INVOICE,
+                source_id=invoice.pk,
+                source_line_id=line.pk
+            )
+            for line, warehouse, quantity in allocations
+        )
+
+
+class InvoiceTransitionService:
+    """
+    Cambio de estado masivo de facturas con asientos contables por lotes
+
+    Por cada bloque de facturas: carga cliente, forma de pago, líneas y productos
+    en consultas agrupadas, resuelve las cuentas una sola vez por empresa, arma
+    asientos y líneas en memoria (AutomaticJournalEntryService) y los guarda con
+    bulk_create dentro de una transacción por bloque. Cada factura recibe su
+    propio resultado; las que fallan conservan su estado anterior.
+    """
+
+    # Igual que las acciones del admin: el asiento se genera al enviar la factura
+    # (pasar directo de borrador a pagada no lo crea) y se revierte al anular una
+    # factura enviada o pagada
+    ENTRY_STATUS = 'sent'
+    REVERSIBLE_STATUSES = ('sent', 'paid')
+    CHUNK_SIZE = 200
+
+    @classmethod
+    def transition(cls, invoices, target_status, chunk_size=None):
+        """
+        Cambiar el estado de varias facturas
+
+        Args:
+            invoices: QuerySet, lista de facturas o de ids
+            target_status: 'sent', 'paid', 'cancelled' o 'draft'
+            chunk_size: Facturas por transacción (por defecto CHUNK_SIZE)
+
+        Returns:
+            list: [{'invoice', 'success', 'changed', 'message', 'journal_entry'}]
+        """
+        from .models import Invoice
+
+        if target_status not in dict(Invoice.STATUS_CHOICES):
+            raise ValueError(f"Estado no válido: {target_status}")
+
+        if hasattr(invoices, 'values_list'):
+            invoice_ids = list(invoices.order_by('pk').values_list('pk', flat=True))
+        else:
+            invoice_ids = sorted({getattr(invoice, 'pk', invoice) for invoice in invoices})
+
+        chunk_size = max(1, chunk_size or cls.CHUNK_SIZE)
+        cache = {}
+        results = []
+
+        for start in range(0, len(invoice_ids), chunk_size):
+            chunk = list(
+                Invoice.objects.filter(pk__in=invoice_ids[start:start + chunk_size])
+                .select_related('company', 'customer', 'payment_form', 'account', 'created_by')
+                .prefetch_related('lines__product')
+                .order_by('pk')
+            )
+            results.extend(cls._transition_chunk(chunk, target_status, cache))
+
+        return results
+
+    @classmethod
+    def _result(cls, invoice, success, message, changed=False, journal_entry=None):
+        return {
+            'invoice': invoice,
+            'success': success,
+            'changed': changed,
+            'message': message,
+            'journal_entry': journal_entry,
+        }
+
+    @classmethod
+    def _transition_chunk(cls, invoices, target_status, cache):
+        """Procesar un bloque: asientos en memoria y una transacción para todo el bloque"""
+        from django.db import IntegrityError
+        from apps.accounting.models import JournalEntry
+        from apps.accounting.services import AutomaticJournalEntryService
+
+        results = {}
+        pending = []
+        for invoice in invoices:
+            if invoice.status == target_status:
+                results[invoice.pk] = cls._result(invoice, True, 'Sin cambios')
+            else:
+                pending.append(invoice)
+
+        if not pending:
+            return [results[invoice.pk] for invoice in invoices]
+
+        # Asientos existentes (originales y reversiones) en una consulta
+        references = [f"FAC-{invoice.pk}" for invoice in pending]
+        references += [f"REV-FAC-{invoice.pk}" for invoice in pending]
+        entries = JournalEntry.objects.filter(reference__in=references)
+        if target_status == 'cancelled':
+            entries = entries.prefetch_related('lines')
+        existing = {(entry.company_id, entry.reference): entry for entry in entries}
+
+        if target_status == cls.ENTRY_STATUS:
+            AutomaticJournalEntryService.preload_invoice_unit_costs(
+                [invoice for invoice in pending if (invoice.company_id, f"FAC-{invoice.pk}") not in existing],
+                cache
+            )
+
+        # Asientos y líneas en memoria
+        transitioned = []
+        built = []
+        for invoice in pending:
+            old_status = invoice.status
+            try:
+                entry_and_lines = None
+                if target_status == cls.ENTRY_STATUS:
+                    if (invoice.company_id, f"FAC-{invoice.pk}") not in existing:
+                        if not AutomaticJournalEntryService._validate_invoice_data(invoice):
+                            raise ValidationError('Datos de factura incompletos para asiento contable')
+                        entry_and_lines = AutomaticJournalEntryService.build_journal_entry(invoice, cache)
+                elif target_status == 'cancelled' and old_status in cls.REVERSIBLE_STATUSES:
+                    original = existing.get((invoice.company_id, f"FAC-{invoice.pk}"))
+                    if original and (invoice.company_id, f"REV-FAC-{invoice.pk}") not in existing:
+                        entry_and_lines = AutomaticJournalEntryService.build_reversal(
+                            invoice, original.lines.all(), cache
+                        )
+            except Exception as e:
+                results[invoice.pk] = cls._result(invoice, False, cls._error_message(e))
+                continue
+
+            transitioned.append(invoice)
+            if entry_and_lines:
+                built.append((invoice, entry_and_lines))
+
+        try:
+            with transaction.atomic():
+                cls._save_chunk(transitioned, built, target_status)
+        except IntegrityError:
+            # Numeración de asientos tomada por otro proceso: una transacción por factura
+            for invoice in transitioned:
+                results[invoice.pk] = cls._transition_one(invoice, target_status)
+        else:
+            entries = {invoice.pk: entry for invoice, (entry, lines) in built}
+            for invoice in transitioned:
+                invoice.status = target_status
+                results[invoice.pk] = cls._result(
+                    invoice, True, 'Estado actualizado', changed=True, journal_entry=entries.get(invoice.pk)
+                )
+
+        return [results[invoice.pk] for invoice in invoices]
+
+    @classmethod
+    def _save_chunk(cls, invoices, built, target_status):
+        """Numerar y guardar asientos y líneas con bulk_create; actualizar estados en una consulta"""
+        from apps.accounting.models import JournalEntry, JournalEntryLine
+        from .models import Invoice
+
+        next_numbers = {}
+        for invoice, (entry, lines) in built:
+            company_id = entry.company_id
+            if company_id not in next_numbers:
+                next_numbers[company_id] = cls._next_entry_number(company_id)
+            entry.number = str(next_numbers[company_id]).zfill(6)
+            next_numbers[company_id] += 1
+
+        if built:
+            JournalEntry.objects.bulk_create([entry for invoice, (entry, lines) in built])
+            JournalEntryLine.objects.bulk_create(
+                [line for invoice, (entry, lines) in built for line in lines]
+            )
+
+        if invoices:
+            Invoice.objects.filter(pk__in=[invoice.pk for invoice in invoices]).update(
+                status=target_status, updated_at=timezone.now()
+            )
+
+    @classmethod
+    def _next_entry_number(cls, company_id):
+        """Siguiente número de asiento de la empresa (misma regla que JournalEntry.save)"""
+        from apps.accounting.models import JournalEntry
+
+        last_entry = JournalEntry.objects.filter(company_id=company_id).order_by('-id').first()
+        if last_entry and last_entry.number.isdigit():
+            return int(last_entry.number) + 1
+        return 1
+
+    @classmethod
+    def _transition_one(cls, invoice, target_status):
+        """Camino individual (usado si el guardado por lote choca con otro proceso)"""
+        from apps.accounting.services import AutomaticJournalEntryService
+
+        old_status = invoice.status
+        try:
+            with transaction.atomic():
+                journal_entry = None
+                if target_status == cls.ENTRY_STATUS:
+                    journal_entry, created = AutomaticJournalEntryService.create_journal_entry_from_invoice(invoice)
+                    if journal_entry is None:
+                        raise ValidationError('No se pudo crear el asiento contable')
+                    if not created:
+                        journal_entry = None
+                elif target_status == 'cancelled' and old_status in cls.REVERSIBLE_STATUSES:
+                    journal_entry, created = AutomaticJournalEntryService.reverse_journal_entry(invoice)
+                    if not created:
+                        journal_entry = None
+
+                invoice.status = target_status
+                invoice.save(update_fields=['status', 'updated_at'])
+        except Exception as e:
+            invoice.status = old_status
+            return cls._result(invoice, False, cls._error_message(e))
+
+        return cls._result(invoice, True, 'Estado actualizado', changed=True, journal_entry=journal_entry)
+
+    @classmethod
+    def _error_message(cls, error):
+        if isinstance(error, ValidationError):
+            return '; '.join(error.messages)
+        return str(error)
@@ -27,7 +27,7 @@ class BankingInvoiceService:
         """
         try:
             # Verificar si el módulo banking está disponible
-            from apps.banking.models import BankAccount, BankTransaction
+            from apps.banking.models import BankTransaction
         except ImportError:
             print("⚠️ Módulo Banking no disponible, saltando creación de BankTransaction")
             return None, False
@@ -119,40 +119,30 @@ class BankingInvoiceService:
     def _get_bank_account(cls, invoice, bank_account_id=None):
         """Obtener cuenta bancaria para el movimiento"""
         try:
-            from apps.banking.models import BankAccount
+            from apps.banking.services import BankAccountIndex
             
             # Opción 1: BankAccount específica proporcionada
             if bank_account_id:
-                try:
-                    return BankAccount.objects.get(
-                        id=bank_account_id,
-                        company=invoice.company,
-                        is_active=True
-                    )
-                except BankAccount.DoesNotExist:
-                    print(f"⚠️ BankAccount {bank_account_id} no encontrada o no activa")
+                bank_account = BankAccountIndex.get(invoice.company_id, bank_account_id)
+                if bank_account:
+                    return bank_account
+                print(f"⚠️ BankAccount {bank_account_id} no encontrada o no activa")
             
             # Opción 2: Inferir desde cuenta contable de la factura
             if invoice.account and hasattr(invoice.account, 'aux_type'):
                 if invoice.account.aux_type == 'bank':
                     # Buscar BankAccount que use esta chart_account
-                    bank_account_qs = BankAccount.objects.filter(
-                        chart_account=invoice.account,
-                        company=invoice.company,
-                        is_active=True
+                    bank_account = BankAccountIndex.for_chart_account(
+                        invoice.company_id, invoice.account_id
                     )
-                    if bank_account_qs.exists():
-                        return bank_account_qs.first()
+                    if bank_account:
+                        return bank_account
             
             # Opción 3: Primera cuenta bancaria disponible de la empresa
-            bank_account_qs = BankAccount.objects.filter(
-                company=invoice.company,
-                is_active=True
-            ).order_by('id')
-            
-            if bank_account_qs.exists():
+            bank_account = BankAccountIndex.first_for_company(invoice.company_id)
+            if bank_account:
                 print(f"ℹ️ Usando primera cuenta bancaria disponible para empresa {invoice.company}")
-                return bank_account_qs.first()
+                return bank_account
                 
         except Exception as e:
             print(f"❌ Error obteniendo BankAccount: {e}")
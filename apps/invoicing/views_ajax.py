@@ -2,8 +2,8 @@ from django.http import JsonResponse
 from django.views.generic import View
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
-from django.db.models import Q
 from apps.inventory.models import Product
+from apps.inventory.services import ProductSearchService
 from apps.companies.models import CompanyUser
 
 @method_decorator(staff_member_required, name='dispatch')
@@ -34,18 +34,17 @@ class ProductDescriptionAutocompleteView(View):
         # Obtener empresas del usuario
         if self.request.user.is_superuser:
             products = Product.objects.all()
+            company_ids = None
         else:
-            user_companies = CompanyUser.objects.filter(
+            company_ids = list(CompanyUser.objects.filter(
                 user=self.request.user, 
                 is_active=True
-            ).values_list('company_id', flat=True)
-            products = Product.objects.filter(company_id__in=user_companies)
+            ).values_list('company_id', flat=True))
+            products = Product.objects.filter(company_id__in=company_ids)
         
-        # Buscar por nombre, descripción o código
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(code__icontains=query)
+        # Buscar en el índice por código, nombre o descripción, ordenado por relevancia
+        products = ProductSearchService.rank(
+            products, query, company_ids
         ).select_related('company')[:20]  # Limitar a 20 resultados
         
         results = []
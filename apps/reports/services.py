@@ -0,0 +1,161 @@
+"""
+Servicios de Reportes
+Antigüedad de saldos de cuentas por pagar (facturas de compra) y por cobrar (facturas de venta)
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+
+class AgingReportService:
+    """
+    Antigüedad de saldos por proveedor / cliente
+    Todos los rangos de todas las contrapartes se calculan en una sola consulta con
+    agregación condicional, sobre el índice (empresa, estado, fecha de vencimiento)
+    """
+
+    PAYABLES = 'payables'
+    RECEIVABLES = 'receivables'
+
+    BUCKETS = [
+        ('current', 'Por vencer'),
+        ('days_1_30', '1-30 días'),
+        ('days_31_60', '31-60 días'),
+        ('days_61_90', '61-90 días'),
+        ('days_over_90', 'Más de 90 días'),
+    ]
+
+    @classmethod
+    def _config(cls, kind):
+        """Modelo, contraparte, estados abiertos y campo de saldo de cada reporte"""
+        if kind == cls.PAYABLES:
+            from apps.suppliers.models import PurchaseInvoice
+            return {
+                'queryset': PurchaseInvoice.objects.all(),
+                'party': 'supplier',
+                'open_statuses': [PurchaseInvoice.RECEIVED, PurchaseInvoice.VALIDATED],
+                'amount': 'net_payable',
+            }
+        if kind == cls.RECEIVABLES:
+            from apps.invoicing.models import Invoice
+            return {
+                'queryset': Invoice.objects.all(),
+                'party': 'customer',
+                'open_statuses': [Invoice.SENT],
+                'amount': 'total',
+            }
+        raise ValueError(f"Tipo de reporte de antigüedad desconocido: {kind}")
+
+    @classmethod
+    def _due_range(cls, start=None, end=None):
+        """
+        Documentos con vencimiento en [start, end); sin fecha de vencimiento se usa la
+        fecha de emisión (contado)
+        """
+        due = Q()
+        issued = Q(due_date__isnull=True)
+        if start is not None:
+            due &= Q(due_date__gte=start)
+            issued &= Q(date__gte=start)
+        if end is not None:
+            due &= Q(due_date__lt=end)
+            issued &= Q(date__lt=end)
+        return (due & Q(due_date__isnull=False)) | issued
+
+    @classmethod
+    def _bucket_filters(cls, as_of):
+        """Filtro por rango: vencido hace N días = vencimiento anterior a la fecha de corte"""
+        return {
+            'current': cls._due_range(start=as_of),
+            'days_1_30': cls._due_range(start=as_of - timedelta(days=30), end=as_of),
+            'days_31_60': cls._due_range(start=as_of - timedelta(days=60), end=as_of - timedelta(days=30)),
+            'days_61_90': cls._due_range(start=as_of - timedelta(days=90), end=as_of - timedelta(days=60)),
+            'days_over_90': cls._due_range(end=as_of - timedelta(days=90)),
+        }
+
+    @classmethod
+    def by_party(cls, kind, company_id, as_of=None):
+        """
+        Saldos abiertos por contraparte y rango de antigüedad (una consulta)
+
+        Args:
+            kind: PAYABLES o RECEIVABLES
+            company_id: ID de la empresa
+            as_of: Fecha de corte (por defecto hoy); documentos emitidos hasta esa fecha
+
+        Returns:
+            QuerySet de dicts: party_id, identification, name, documents,
+            un campo por rango (BUCKETS) y balance (saldo total)
+        """
+        config = cls._config(kind)
+        as_of = as_of or timezone.localdate()
+        party = config['party']
+        amount = config['amount']
+
+        aggregates = {
+            bucket: Sum(amount, filter=bucket_filter, default=Decimal('0.00'))
+            for bucket, bucket_filter in cls._bucket_filters(as_of).items()
+        }
+
+        return config['queryset'].filter(
+            company_id=company_id,
+            status__in=config['open_statuses'],
+            date__lte=as_of,
+        ).values(
+            party_id=F(f'{party}_id'),
+            identification=F(f'{party}__identification'),
+            name=F(f'{party}__trade_name'),
+        ).annotate(
+            documents=Count('id'),
+            balance=Sum(amount, default=Decimal('0.00')),
+            **aggregates
+        ).order_by('name', 'party_id')
+
+    @classmethod
+    def summary(cls, kind, company_id, as_of=None):
+        """
+        Reporte completo para la interfaz: filas por contraparte y totales por rango
+
+        Returns:
+            dict: kind, as_of, buckets, rows, totals
+        """
+        as_of = as_of or timezone.localdate()
+        rows = list(cls.by_party(kind, company_id, as_of))
+
+        totals = {bucket: Decimal('0.00') for bucket, label in cls.BUCKETS}
+        totals['balance'] = Decimal('0.00')
+        totals['documents'] = 0
+        for row in rows:
+            for field in totals:
+                totals[field] += row[field]
+
+        return {
+            'kind': kind,
+            'as_of': as_of,
+            'buckets': [{'key': bucket, 'label': label} for bucket, label in cls.BUCKETS],
+            'rows': rows,
+            'totals': totals,
+        }
+
+    @classmethod
+    def export_headers(cls, kind):
+        """Encabezados de la exportación CSV / XLSX"""
+        party_label = 'Proveedor' if kind == cls.PAYABLES else 'Cliente'
+        return (
+            ['Identificación', party_label, 'Documentos']
+            + [label for bucket, label in cls.BUCKETS]
+            + ['Total']
+        )
+
+    @classmethod
+    def iter_export_rows(cls, kind, company_id, as_of=None):
+        """Filas para exportación en streaming (sin cargar el reporte completo)"""
+        for row in cls.by_party(kind, company_id, as_of).iterator():
+            yield (
+                [row['identification'], row['name'], row['documents']]
+                + [row[bucket] for bucket, label in cls.BUCKETS]
+                + [row['balance']]
+            )
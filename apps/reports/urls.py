@@ -1,8 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from .views import AgingReportView
+
 router = DefaultRouter()
 
 urlpatterns = [
+    path('aging/<str:kind>/', AgingReportView.as_view(), name='aging_report'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Vistas de reportes
+Antigüedad de saldos de cuentas por pagar y por cobrar (JSON para la interfaz, CSV/XLSX en streaming)
+"""
+
+from datetime import datetime
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.views import View
+
+from apps.core.exports import stream_export_response
+from apps.core.mixins import CompanyContextMixin
+
+from .services import AgingReportService
+
+
+class AgingReportView(LoginRequiredMixin, CompanyContextMixin, View):
+    """
+    Antigüedad de saldos por proveedor (payables) o cliente (receivables)
+
+    Parámetros GET: empresa (por defecto la actual), fecha de corte (AAAA-MM-DD,
+    por defecto hoy), formato (json|csv|xlsx, por defecto json)
+    """
+
+    def get(self, request, kind):
+        if kind not in (AgingReportService.PAYABLES, AgingReportService.RECEIVABLES):
+            raise Http404
+
+        try:
+            fecha = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date() if request.GET.get('fecha') else None
+            company_id = int(request.GET['empresa']) if request.GET.get('empresa') else None
+        except ValueError:
+            return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+
+        if company_id is None:
+            company = self.get_current_company()
+            if company is None:
+                return JsonResponse({'error': 'Indique la empresa'}, status=400)
+            company_id = company.id
+        elif not self.get_user_companies().filter(id=company_id).exists():
+            raise PermissionDenied
+
+        formato = request.GET.get('formato', 'json')
+        if formato == 'json':
+            return JsonResponse(AgingReportService.summary(kind, company_id, fecha))
+
+        nombre = 'cuentas_por_pagar' if kind == AgingReportService.PAYABLES else 'cuentas_por_cobrar'
+        response = stream_export_response(
+            formato,
+            f'antiguedad_{nombre}_{(fecha or timezone.localdate()):%Y%m%d}',
+            AgingReportService.export_headers(kind),
+            AgingReportService.iter_export_rows(kind, company_id, fecha),
+            sheet_title='Antigüedad de saldos'
+        )
+        if response is None:
+            return JsonResponse({'error': 'Formato no soportado'}, status=400)
+        return response
@@ -1,4 +1,50 @@
 from django.contrib import admin
+from .models import AuthorizationPoll, ElectronicDocument, RetentionRate
 
-# Placeholder admin for SRI integration app
-# Models will be registered here when they are created
\ No newline at end of file
+
+@admin.register(RetentionRate)
+class RetentionRateAdmin(admin.ModelAdmin):
+    """Catálogo de porcentajes de retención del SRI"""
+    list_display = ['tax_type', 'concept_code', 'classification', 'description', 'percentage', 'valid_from', 'valid_to', 'is_active']
+    list_filter = ['tax_type', 'classification', 'is_active']
+    search_fields = ['concept_code', 'description']
+    date_hierarchy = 'valid_from'
+
+
+@admin.register(ElectronicDocument)
+class ElectronicDocumentAdmin(admin.ModelAdmin):
+    """Comprobantes electrónicos y su estado en la cola de emisión"""
+    list_display = ['number', 'document_type', 'company', 'issue_date', 'status', 'attempts', 'next_attempt_at', 'authorized_at']
+    list_filter = ['document_type', 'status', 'environment', 'company']
+    search_fields = ['number', 'access_key', 'authorization_number']
+    date_hierarchy = 'issue_date'
+    list_select_related = ['company']
+    raw_id_fields = ['invoice', 'purchase_invoice']
+    readonly_fields = [
+        'access_key', 'status', 'attempts', 'next_attempt_at', 'messages',
+        'xml', 'authorization_number', 'authorized_at', 'created_at', 'updated_at'
+    ]
+    actions = ['requeue_documents']
+
+    @admin.action(description='Reintentar emisión (devueltos, no autorizados o fallidos)')
+    def requeue_documents(self, request, queryset):
+        from .services import ElectronicDocumentService
+
+        requeued = ElectronicDocumentService.requeue(queryset)
+        self.message_user(request, f'{requeued} comprobantes vueltos a la cola.')
+
+
+@admin.register(AuthorizationPoll)
+class AuthorizationPollAdmin(admin.ModelAdmin):
+    """Claves de acceso que esperan su autorización en el SRI"""
+    list_display = ['access_key', 'document', 'polls', 'interval_seconds', 'next_poll_at', 'last_polled_at', 'last_state']
+    search_fields = ['access_key', 'document__number']
+    list_select_related = ['document']
+    raw_id_fields = ['document']
+    readonly_fields = [
+        'document', 'access_key', 'polls', 'interval_seconds', 'next_poll_at',
+        'last_polled_at', 'last_state', 'created_at', 'updated_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class SriIntegrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.sri_integration'
-    verbose_name = 'Integración SRI'
\ No newline at end of file
+    verbose_name = 'Integración SRI'
+
+    def ready(self):
+        import apps.sri_integration.signals
@@ -0,0 +1,178 @@
+"""
+Cliente SOAP de los servicios web offline del SRI
+Recepción (validarComprobante) y autorización (autorizacionComprobante)
+"""
+
+import base64
+import xml.etree.ElementTree as ET
+
+import requests
+from django.conf import settings
+
+RECEPCION_NS = 'http://ec.gob.sri.ws.recepcion'
+AUTORIZACION_NS = 'http://ec.gob.sri.ws.autorizacion'
+
+ENVELOPE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:ec="{namespace}"><soapenv:Header/><soapenv:Body>{body}</soapenv:Body></soapenv:Envelope>'
+)
+
+# Mensajes de recepción que indican que el comprobante ya está en el SRI
+ALREADY_RECEIVED_CODES = {'43', '70'}  # Clave registrada / en procesamiento
+
+
+class SRIServiceError(Exception):
+    """Servicio del SRI no disponible o respuesta no reconocida (se reintenta)"""
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(element, name):
+    """Primer descendiente con ese nombre local (las respuestas mezclan namespaces)"""
+    for child in element.iter():
+        if child is not element and _local(child.tag) == name:
+            return child
+    return None
+
+
+def _text(element, name, default=''):
+    found = _find(element, name) if element is not None else None
+    return (found.text or '').strip() if found is not None and found.text else default
+
+
+def _messages(element):
+    """Mensajes del SRI: [{'code', 'message', 'info', 'type'}]"""
+    messages = []
+    if element is None:
+        return messages
+    for child in element.iter():
+        if _local(child.tag) == 'mensaje' and len(child):
+            messages.append({
+                'code': _text(child, 'identificador'),
+                'message': _text(child, 'mensaje'),
+                'info': _text(child, 'informacionAdicional'),
+                'type': _text(child, 'tipo'),
+            })
+    return messages
+
+
+def format_messages(messages):
+    """Mensajes en texto, uno por línea"""
+    return '\n'.join(
+        f"[{message['code']}] {message['message']}"
+        + (f": {message['info']}" if message['info'] else '')
+        for message in messages
+    )
+
+
+class SRIClient:
+    """
+    Cliente de los servicios de recepción y autorización
+
+    Usa una sesión HTTP con conexiones persistentes; una instancia por hilo
+    """
+
+    def __init__(self, recepcion_url=None, autorizacion_url=None, timeout=None):
+        config = settings.SRI_CONFIG
+        self.recepcion_url = self._endpoint(recepcion_url or config['WS_RECEPCION'])
+        self.autorizacion_url = self._endpoint(autorizacion_url or config['WS_AUTORIZACION'])
+        self.timeout = timeout or config.get('TIMEOUT', 30)
+        self.session = requests.Session()
+
+    @staticmethod
+    def _endpoint(url):
+        """El servicio se invoca en la URL del WSDL sin el parámetro ?wsdl"""
+        return url.split('?', 1)[0]
+
+    def _call(self, url, namespace, body):
+        envelope = ENVELOPE.format(namespace=namespace, body=body)
+        try:
+            response = self.session.post(
+                url,
+                data=envelope.encode('utf-8'),
+                headers={'Content-Type': 'text/xml; charset=utf-8'},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise SRIServiceError(f"Servicio del SRI no disponible: {e}")
+
+        if response.status_code >= 500 and b'Fault' not in response.content:
+            raise SRIServiceError(f"Servicio del SRI respondió HTTP {response.status_code}")
+
+        try:
+            root = ET.fromstring(response.content)
+        except ET.ParseError as e:
+            raise SRIServiceError(f"Respuesta del SRI no reconocida: {e}")
+
+        fault = _find(root, 'Fault')
+        if fault is not None:
+            raise SRIServiceError(f"Error SOAP del SRI: {_text(fault, 'faultstring')}")
+        return root
+
+    def validate(self, signed_xml):
+        """
+        Enviar un comprobante firmado a recepción
+
+        Returns:
+            dict: {'state': 'RECIBIDA' | 'DEVUELTA', 'messages': [...],
+                   'already_received': bool}
+        """
+        if isinstance(signed_xml, str):
+            signed_xml = signed_xml.encode('utf-8')
+        body = (
+            '<ec:validarComprobante><xml>'
+            f'{base64.b64encode(signed_xml).decode("ascii")}'
+            '</xml></ec:validarComprobante>'
+        )
+        root = self._call(self.recepcion_url, RECEPCION_NS, body)
+
+        response = _find(root, 'RespuestaRecepcionComprobante')
+        state = _text(response, 'estado')
+        if state not in ('RECIBIDA', 'DEVUELTA'):
+            raise SRIServiceError(f"Estado de recepción no reconocido: {state or 'vacío'}")
+
+        messages = _messages(_find(response, 'comprobantes'))
+        return {
+            'state': state,
+            'messages': messages,
+            'already_received': any(message['code'] in ALREADY_RECEIVED_CODES for message in messages),
+        }
+
+    def authorization(self, access_key):
+        """
+        Consultar la autorización de una clave de acceso
+
+        Returns:
+            dict: {'state': 'AUTORIZADO' | 'NO AUTORIZADO' | 'EN PROCESO' | '',
+                   'number', 'date' (texto), 'messages': [...]}
+            state vacío si el SRI todavía no registra el comprobante
+        """
+        body = (
+            '<ec:autorizacionComprobante>'
+            f'<claveAccesoComprobante>{access_key}</claveAccesoComprobante>'
+            '</ec:autorizacionComprobante>'
+        )
+        root = self._call(self.autorizacion_url, AUTORIZACION_NS, body)
+
+        response = _find(root, 'RespuestaAutorizacionComprobante')
+        if response is None:
+            raise SRIServiceError("Respuesta de autorización no reconocida")
+
+        # Con varios intentos registrados, el SRI devuelve una autorización por intento:
+        # prevalece la autorizada
+        authorizations = [child for child in response.iter() if _local(child.tag) == 'autorizacion']
+        if not authorizations:
+            return {'state': '', 'number': '', 'date': '', 'messages': []}
+
+        authorization = next(
+            (item for item in authorizations if _text(item, 'estado') == 'AUTORIZADO'),
+            authorizations[0]
+        )
+        return {
+            'state': _text(authorization, 'estado'),
+            'number': _text(authorization, 'numeroAutorizacion'),
+            'date': _text(authorization, 'fechaAutorizacion'),
+            'messages': _messages(_find(authorization, 'mensajes')),
+        }
@@ -0,0 +1,466 @@
+"""
+Comprobantes electrónicos del SRI
+Clave de acceso (49 dígitos, módulo 11) y XML de factura, nota de crédito y
+comprobante de retención según las fichas técnicas del SRI
+
+El XML se arma con plantillas precompiladas que ya están en forma canónica C14N
+(sin declaración, sin etiquetas vacías abreviadas, texto escapado): la firma no
+necesita volver a canonicalizar el comprobante
+"""
+
+from decimal import Decimal
+from string import Formatter
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+# Código de porcentaje de IVA (tabla 17 de la ficha técnica)
+IVA_PERCENTAGE_CODES = {
+    Decimal('0'): '0',
+    Decimal('5'): '5',
+    Decimal('8'): '8',
+    Decimal('12'): '2',
+    Decimal('13'): '10',
+    Decimal('14'): '3',
+    Decimal('15'): '4',
+}
+
+# Código de retención de IVA por porcentaje (tabla 21)
+IVA_RETENTION_CODES = {
+    Decimal('10'): '9',
+    Decimal('20'): '10',
+    Decimal('30'): '1',
+    Decimal('50'): '11',
+    Decimal('70'): '2',
+    Decimal('100'): '3',
+}
+
+# Concepto de retención en la fuente cuando la línea no define uno
+DEFAULT_IR_CONCEPT = '3440'
+
+# Formas de pago (tabla 24) por palabra clave del nombre de la forma de pago
+PAYMENT_FORM_CODES = [
+    ('efectivo', '01'),
+    ('débito', '16'),
+    ('debito', '16'),
+    ('crédito', '19'),
+    ('credito', '19'),
+]
+DEFAULT_PAYMENT_FORM_CODE = '20'  # Otros con utilización del sistema financiero
+
+FINAL_CONSUMER_IDENTIFICATION = '9999999999999'
+
+
+def amount(value):
+    """Monto con dos decimales"""
+    return f"{Decimal(value or 0).quantize(CENT)}"
+
+
+def percentage(value):
+    """Porcentaje sin ceros a la derecha innecesarios (15.00 -> 15)"""
+    value = Decimal(value or 0).quantize(CENT)
+    return f"{value.normalize():f}" if value == value.to_integral() else f"{value}"
+
+
+def identification_type(identification, for_retention=False):
+    """Tipo de identificación del comprador / sujeto retenido (tablas 6 y 7)"""
+    if identification == FINAL_CONSUMER_IDENTIFICATION:
+        return '07'
+    if len(identification) == 13 and identification.isdigit():
+        return '04'
+    if len(identification) == 10 and identification.isdigit():
+        return '05'
+    return '08' if for_retention else '06'
+
+
+def payment_form_code(payment_form):
+    """Código SRI de la forma de pago (la tabla de formas de pago no guarda el código)"""
+    if payment_form is None:
+        return '01'
+    name = payment_form.name.lower()
+    for keyword, code in PAYMENT_FORM_CODES:
+        if keyword in name:
+            return code
+    return DEFAULT_PAYMENT_FORM_CODE
+
+
+def split_number(number):
+    """'001-002-000000123' -> ('001', '002', '000000123')"""
+    parts = number.split('-')
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        raise ValueError(f"Número de comprobante inválido: {number}")
+    establishment, emission_point, sequential = parts
+    return establishment.zfill(3), emission_point.zfill(3), sequential.zfill(9)
+
+
+class AccessKey:
+    """Clave de acceso de 49 dígitos"""
+
+    LENGTH = 49
+
+    @staticmethod
+    def check_digit(digits):
+        """Dígito verificador módulo 11 con pesos 2..7 de derecha a izquierda"""
+        total = 0
+        weight = 2
+        for digit in reversed(digits):
+            total += int(digit) * weight
+            weight = 2 if weight == 7 else weight + 1
+        result = 11 - total % 11
+        if result == 11:
+            return '0'
+        if result == 10:
+            return '1'
+        return str(result)
+
+    @classmethod
+    def build(cls, issue_date, document_type, ruc, environment, establishment,
+              emission_point, sequential, numeric_code, emission_type='1'):
+        """
+        Armar la clave de acceso
+
+        Args:
+            issue_date: Fecha de emisión
+            document_type: Código de comprobante ('01', '04', '07')
+            ruc: RUC del emisor
+            environment: '1' pruebas / '2' producción
+            establishment / emission_point / sequential: Serie y secuencial
+            numeric_code: Código numérico de 8 dígitos
+            emission_type: '1' emisión normal
+        """
+        digits = (
+            f"{issue_date:%d%m%Y}{document_type}{ruc}{environment}"
+            f"{str(establishment).zfill(3)}{str(emission_point).zfill(3)}"
+            f"{str(sequential).zfill(9)}{str(numeric_code).zfill(8)}{emission_type}"
+        )
+        if len(digits) != cls.LENGTH - 1 or not digits.isdigit():
+            raise ValueError(f"Datos inválidos para la clave de acceso: {digits}")
+        return digits + cls.check_digit(digits)
+
+    @classmethod
+    def is_valid(cls, key):
+        """Longitud, solo dígitos y dígito verificador correcto"""
+        return (
+            len(key) == cls.LENGTH and key.isdigit()
+            and cls.check_digit(key[:-1]) == key[-1]
+        )
+
+
+def escape_text(value):
+    """Escape de texto C14N (&, <, > y retorno de carro)"""
+    return (
+        str(value).replace('&', '&amp;').replace('<', '&lt;')
+        .replace('>', '&gt;').replace('\r', '&#xD;')
+    )
+
+
+class XMLTemplate:
+    """
+    Plantilla XML compilada una sola vez: fragmentos literales y campos {nombre}
+
+    Los valores se escapan al renderizar, salvo los campos terminados en _xml que
+    reciben fragmentos ya renderizados por otra plantilla
+    """
+
+    __slots__ = ('parts',)
+
+    def __init__(self, text):
+        parts = []
+        for literal, field, format_spec, conversion in Formatter().parse(text):
+            if literal:
+                parts.append((literal, None, False))
+            if field is not None:
+                parts.append(('', field, field.endswith('_xml')))
+        self.parts = tuple(parts)
+
+    def render(self, **values):
+        out = []
+        append = out.append
+        for literal, field, raw in self.parts:
+            if field is None:
+                append(literal)
+            elif raw:
+                append(values[field])
+            else:
+                append(escape_text(values[field]))
+        return ''.join(out)
+
+
+INFO_TRIBUTARIA = XMLTemplate(
+    '<infoTributaria><ambiente>{ambiente}</ambiente><tipoEmision>{tipo_emision}</tipoEmision>'
+    '<razonSocial>{razon_social}</razonSocial><nombreComercial>{nombre_comercial}</nombreComercial>'
+    '<ruc>{ruc}</ruc><claveAcceso>{clave_acceso}</claveAcceso><codDoc>{cod_doc}</codDoc>'
+    '<estab>{estab}</estab><ptoEmi>{pto_emi}</ptoEmi><secuencial>{secuencial}</secuencial>'
+    '<dirMatriz>{dir_matriz}</dirMatriz></infoTributaria>'
+)
+
+TOTAL_IMPUESTO = XMLTemplate(
+    '<totalImpuesto><codigo>2</codigo><codigoPorcentaje>{codigo_porcentaje}</codigoPorcentaje>'
+    '<baseImponible>{base}</baseImponible><valor>{valor}</valor></totalImpuesto>'
+)
+
+DETALLE = XMLTemplate(
+    '<detalle><{code_tag_xml}>{codigo}</{code_tag_xml}><descripcion>{descripcion}</descripcion>'
+    '<cantidad>{cantidad}</cantidad><precioUnitario>{precio_unitario}</precioUnitario>'
+    '<descuento>{descuento}</descuento><precioTotalSinImpuesto>{precio_total}</precioTotalSinImpuesto>'
+    '<impuestos><impuesto><codigo>2</codigo><codigoPorcentaje>{codigo_porcentaje}</codigoPorcentaje>'
+    '<tarifa>{tarifa}</tarifa><baseImponible>{base}</baseImponible><valor>{valor}</valor>'
+    '</impuesto></impuestos></detalle>'
+)
+
+FACTURA = XMLTemplate(
+    '<factura id="comprobante" version="1.1.0">{info_tributaria_xml}<infoFactura>'
+    '<fechaEmision>{fecha_emision}</fechaEmision><dirEstablecimiento>{dir_establecimiento}</dirEstablecimiento>'
+    '<tipoIdentificacionComprador>{tipo_identificacion}</tipoIdentificacionComprador>'
+    '<razonSocialComprador>{razon_social}</razonSocialComprador>'
+    '<identificacionComprador>{identificacion}</identificacionComprador>'
+    '<direccionComprador>{direccion}</direccionComprador>'
+    '<totalSinImpuestos>{total_sin_impuestos}</totalSinImpuestos><totalDescuento>{total_descuento}</totalDescuento>'
+    '<totalConImpuestos>{total_impuestos_xml}</totalConImpuestos><propina>0.00</propina>'
+    '<importeTotal>{importe_total}</importeTotal><moneda>DOLAR</moneda>'
+    '<pagos><pago><formaPago>{forma_pago}</formaPago><total>{importe_total}</total>{plazo_xml}</pago></pagos>'
+    '</infoFactura><detalles>{detalles_xml}</detalles></factura>'
+)
+
+PLAZO = XMLTemplate('<plazo>{plazo}</plazo><unidadTiempo>dias</unidadTiempo>')
+
+NOTA_CREDITO = XMLTemplate(
+    '<notaCredito id="comprobante" version="1.1.0">{info_tributaria_xml}<infoNotaCredito>'
+    '<fechaEmision>{fecha_emision}</fechaEmision><dirEstablecimiento>{dir_establecimiento}</dirEstablecimiento>'
+    '<tipoIdentificacionComprador>{tipo_identificacion}</tipoIdentificacionComprador>'
+    '<razonSocialComprador>{razon_social}</razonSocialComprador>'
+    '<identificacionComprador>{identificacion}</identificacionComprador>'
+    '<codDocModificado>01</codDocModificado><numDocModificado>{num_doc_modificado}</numDocModificado>'
+    '<fechaEmisionDocSustento>{fecha_sustento}</fechaEmisionDocSustento>'
+    '<totalSinImpuestos>{total_sin_impuestos}</totalSinImpuestos>'
+    '<valorModificacion>{valor_modificacion}</valorModificacion><moneda>DOLAR</moneda>'
+    '<totalConImpuestos>{total_impuestos_xml}</totalConImpuestos><motivo>{motivo}</motivo>'
+    '</infoNotaCredito><detalles>{detalles_xml}</detalles></notaCredito>'
+)
+
+IMPUESTO_RETENCION = XMLTemplate(
+    '<impuesto><codigo>{codigo}</codigo><codigoRetencion>{codigo_retencion}</codigoRetencion>'
+    '<baseImponible>{base}</baseImponible><porcentajeRetener>{porcentaje}</porcentajeRetener>'
+    '<valorRetenido>{valor}</valorRetenido><codDocSustento>01</codDocSustento>'
+    '<numDocSustento>{num_doc_sustento}</numDocSustento>'
+    '<fechaEmisionDocSustento>{fecha_sustento}</fechaEmisionDocSustento></impuesto>'
+)
+
+COMPROBANTE_RETENCION = XMLTemplate(
+    '<comprobanteRetencion id="comprobante" version="1.0.0">{info_tributaria_xml}<infoCompRetencion>'
+    '<fechaEmision>{fecha_emision}</fechaEmision><dirEstablecimiento>{dir_establecimiento}</dirEstablecimiento>'
+    '<tipoIdentificacionSujetoRetenido>{tipo_identificacion}</tipoIdentificacionSujetoRetenido>'
+    '<razonSocialSujetoRetenido>{razon_social}</razonSocialSujetoRetenido>'
+    '<identificacionSujetoRetenido>{identificacion}</identificacionSujetoRetenido>'
+    '<periodoFiscal>{periodo_fiscal}</periodoFiscal></infoCompRetencion>'
+    '<impuestos>{impuestos_xml}</impuestos></comprobanteRetencion>'
+)
+
+
+class ComprobanteXMLBuilder:
+    """
+    XML sin firmar de un ElectronicDocument
+    El documento debe traer cargadas sus relaciones (ver ElectronicDocumentService)
+    """
+
+    @classmethod
+    def build(cls, document, emission_type='1'):
+        """
+        Returns:
+            str: XML canónico del comprobante (sin declaración), raíz con id="comprobante"
+        """
+        info_tributaria = cls._info_tributaria(document, emission_type)
+        if document.document_type == '01':
+            return cls._factura(document, info_tributaria)
+        if document.document_type == '04':
+            return cls._nota_credito(document, info_tributaria)
+        return cls._comprobante_retencion(document, info_tributaria)
+
+    @classmethod
+    def _info_tributaria(cls, document, emission_type):
+        company = document.company
+        establishment, emission_point, sequential = split_number(document.number)
+        return INFO_TRIBUTARIA.render(
+            ambiente=document.environment,
+            tipo_emision=emission_type,
+            razon_social=company.legal_name,
+            nombre_comercial=company.trade_name,
+            ruc=company.ruc,
+            clave_acceso=document.access_key,
+            cod_doc=document.document_type,
+            estab=establishment,
+            pto_emi=emission_point,
+            secuencial=sequential,
+            dir_matriz=company.address,
+        )
+
+    @classmethod
+    def _tax_totals(cls, breakdown):
+        """totalConImpuestos: una entrada por tarifa de IVA"""
+        return ''.join(
+            TOTAL_IMPUESTO.render(
+                codigo_porcentaje=cls._iva_code(rate),
+                base=amount(values['base']),
+                valor=amount(values['tax']),
+            )
+            for rate, values in sorted(breakdown.items())
+        )
+
+    @classmethod
+    def _details(cls, lines, code_tag):
+        """Detalles con impuesto por línea (factura y nota de crédito)"""
+        from apps.invoicing.services import InvoiceTotalsService
+
+        details = []
+        for line in lines:
+            net, tax, line_total = InvoiceTotalsService.line_amounts(line)
+            gross = Decimal(str(line.quantity)) * Decimal(str(line.unit_price))
+            details.append(DETALLE.render(
+                code_tag_xml=code_tag,
+                codigo=line.product.code,
+                descripcion=line.description or line.product.name,
+                cantidad=amount(line.quantity),
+                precio_unitario=amount(line.unit_price),
+                descuento=amount(gross - net),
+                precio_total=amount(net),
+                codigo_porcentaje=cls._iva_code(line.iva_rate),
+                tarifa=percentage(line.iva_rate),
+                base=amount(net),
+                valor=amount(tax),
+            ))
+        return ''.join(details)
+
+    @classmethod
+    def _iva_code(cls, rate):
+        code = IVA_PERCENTAGE_CODES.get(Decimal(rate).normalize())
+        if code is None:
+            raise ValueError(f"Tarifa de IVA sin código SRI: {rate}%")
+        return code
+
+    @classmethod
+    def _party(cls, party, for_retention=False):
+        """Identificación del comprador / sujeto retenido"""
+        return {
+            'tipo_identificacion': identification_type(party.identification, for_retention),
+            'razon_social': party.legal_name or party.trade_name,
+            'identificacion': party.identification,
+        }
+
+    @classmethod
+    def _factura(cls, document, info_tributaria):
+        from apps.invoicing.services import InvoiceTotalsService
+
+        invoice = document.invoice
+        lines = list(invoice.lines.all())
+        totals = InvoiceTotalsService.compute(lines)
+        gross = sum(
+            (Decimal(str(line.quantity)) * Decimal(str(line.unit_price)) for line in lines),
+            Decimal('0')
+        )
+
+        plazo = ''
+        if invoice.due_date and invoice.due_date > invoice.date:
+            plazo = PLAZO.render(plazo=(invoice.due_date - invoice.date).days)
+
+        return FACTURA.render(
+            info_tributaria_xml=info_tributaria,
+            fecha_emision=f"{document.issue_date:%d/%m/%Y}",
+            dir_establecimiento=document.company.address,
+            direccion=invoice.customer.address,
+            total_sin_impuestos=amount(totals['subtotal']),
+            total_descuento=amount(gross - totals['subtotal']),
+            total_impuestos_xml=cls._tax_totals(totals['breakdown']),
+            importe_total=amount(totals['total']),
+            forma_pago=payment_form_code(invoice.payment_form),
+            plazo_xml=plazo,
+            detalles_xml=cls._details(lines, 'codigoPrincipal'),
+            **cls._party(invoice.customer)
+        )
+
+    @classmethod
+    def _nota_credito(cls, document, info_tributaria):
+        """Nota de crédito por el total de la factura modificada"""
+        from apps.invoicing.services import InvoiceTotalsService
+
+        invoice = document.invoice
+        lines = list(invoice.lines.all())
+        totals = InvoiceTotalsService.compute(lines)
+
+        return NOTA_CREDITO.render(
+            info_tributaria_xml=info_tributaria,
+            fecha_emision=f"{document.issue_date:%d/%m/%Y}",
+            dir_establecimiento=document.company.address,
+            num_doc_modificado=invoice.number,
+            fecha_sustento=f"{invoice.date:%d/%m/%Y}",
+            total_sin_impuestos=amount(totals['subtotal']),
+            valor_modificacion=amount(totals['total']),
+            total_impuestos_xml=cls._tax_totals(totals['breakdown']),
+            motivo=document.reason or 'Anulación de factura',
+            detalles_xml=cls._details(lines, 'codigoInterno'),
+            **cls._party(invoice.customer)
+        )
+
+    @classmethod
+    def _comprobante_retencion(cls, document, info_tributaria):
+        purchase_invoice = document.purchase_invoice
+        support_number = ''.join(split_number(purchase_invoice.supplier_invoice_number))
+        support_date = f"{purchase_invoice.date:%d/%m/%Y}"
+
+        taxes = []
+        for retention in cls.retention_lines(purchase_invoice):
+            if retention['retention_amount'] <= 0:
+                continue
+            if retention['tax_type'] == 'iva':
+                code = IVA_RETENTION_CODES.get(retention['percentage'].normalize())
+                if code is None:
+                    raise ValueError(f"Porcentaje de retención de IVA sin código SRI: {retention['percentage']}%")
+                tax_code = '2'
+            else:
+                code = retention['concept_code'] or DEFAULT_IR_CONCEPT
+                tax_code = '1'
+            taxes.append(IMPUESTO_RETENCION.render(
+                codigo=tax_code,
+                codigo_retencion=code,
+                base=amount(retention['base_amount']),
+                porcentaje=percentage(retention['percentage']),
+                valor=amount(retention['retention_amount']),
+                num_doc_sustento=support_number,
+                fecha_sustento=support_date,
+            ))
+
+        return COMPROBANTE_RETENCION.render(
+            info_tributaria_xml=info_tributaria,
+            fecha_emision=f"{document.issue_date:%d/%m/%Y}",
+            dir_establecimiento=document.company.address,
+            periodo_fiscal=f"{purchase_invoice.date:%m/%Y}",
+            impuestos_xml=''.join(taxes),
+            **cls._party(purchase_invoice.supplier, for_retention=True)
+        )
+
+    @classmethod
+    def retention_lines(cls, purchase_invoice):
+        """
+        Retenciones del comprobante: agrupadas por concepto según el catálogo, o los
+        porcentajes registrados en la factura si fueron ingresados manualmente
+        """
+        from apps.sri_integration.services import RetentionService
+
+        if not purchase_invoice.manual_retention_rates:
+            return RetentionService.compute_purchase_invoice(purchase_invoice)['retentions']
+
+        return [
+            {
+                'tax_type': 'renta',
+                'concept_code': '',
+                'percentage': purchase_invoice.ir_retention_percentage,
+                'base_amount': purchase_invoice.subtotal,
+                'retention_amount': purchase_invoice.ir_retention_amount,
+            },
+            {
+                'tax_type': 'iva',
+                'concept_code': '',
+                'percentage': purchase_invoice.iva_retention_percentage,
+                'base_amount': purchase_invoice.tax_amount,
+                'retention_amount': purchase_invoice.iva_retention_amount,
+            },
+        ]
@@ -0,0 +1,180 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Medir la generación y firma de comprobantes electrónicos (documentos por segundo por núcleo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--invoice',
+            type=int,
+            help='ID de la factura de ejemplo (por defecto la última con líneas)'
+        )
+        parser.add_argument(
+            '--documents',
+            type=int,
+            default=500,
+            help='Comprobantes a firmar en la medición con pool (por defecto 500)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Repeticiones de las mediciones en un solo proceso (por defecto 50)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Procesos de firma (por defecto SRI_SIGNING_WORKERS o número de CPUs)'
+        )
+
+    def handle(self, *args, **options):
+        from apps.invoicing.models import Invoice, InvoiceLine
+        from apps.sri_integration.electronic import AccessKey, ComprobanteXMLBuilder, split_number
+        from apps.sri_integration.models import ElectronicDocument
+        from apps.sri_integration.services import ElectronicDocumentQueue
+        from apps.sri_integration.signing import SigningKeyCache, sign_xml
+
+        invoices = Invoice.objects.filter(lines__isnull=False).distinct().select_related(
+            'company', 'customer', 'payment_form'
+        ).prefetch_related(
+            Prefetch('lines', queryset=InvoiceLine.objects.select_related('product'))
+        )
+        invoice = (
+            invoices.filter(pk=options['invoice']).first() if options['invoice']
+            else invoices.order_by('-pk').first()
+        )
+        if invoice is None:
+            raise CommandError('No hay facturas con líneas para generar comprobantes')
+
+        p12, password = self._certificate(invoice.company)
+        iterations = max(1, options['iterations'])
+        workers = ElectronicDocumentQueue.signing_workers(options['workers'] or None)
+
+        # Comprobante en memoria: no se escribe nada en la base de datos
+        establishment, emission_point, sequential = split_number(invoice.number)
+        document = ElectronicDocument(
+            company=invoice.company,
+            document_type=ElectronicDocument.FACTURA,
+            invoice=invoice,
+            number=invoice.number,
+            issue_date=invoice.date,
+            environment=invoice.company.sri_environment,
+            access_key=AccessKey.build(
+                invoice.date, ElectronicDocument.FACTURA, invoice.company.ruc,
+                invoice.company.sri_environment, establishment, emission_point,
+                sequential, int(sequential) % 10 ** 8
+            ),
+        )
+        xml = ComprobanteXMLBuilder.build(document)
+        signing_time = timezone.localtime()
+
+        build = self._measure(lambda: ComprobanteXMLBuilder.build(document), iterations)
+
+        def sign_cold():
+            SigningKeyCache.invalidate()
+            sign_xml(xml, SigningKeyCache.get(p12, password), signing_time, canonical=True)
+
+        def sign_warm():
+            sign_xml(xml, SigningKeyCache.get(p12, password), signing_time, canonical=True)
+
+        def sign_canonicalizing():
+            sign_xml(xml, SigningKeyCache.get(p12, password), signing_time)
+
+        cold = self._measure(sign_cold, max(1, iterations // 5))
+        sign_warm()
+        warm = self._measure(sign_warm, iterations)
+        canonicalizing = self._measure(sign_canonicalizing, iterations)
+
+        pool_rate = self._measure_pool(xml, p12, password, max(1, options['documents']), workers)
+        ElectronicDocumentQueue.shutdown()
+
+        self.stdout.write(f'Factura {invoice.number} ({len(xml)} bytes, {iterations} repeticiones)')
+        self.stdout.write(f'  XML desde plantillas:          {build:8.3f} ms')
+        self.stdout.write(f'  Firma abriendo el certificado: {cold:8.3f} ms')
+        self.stdout.write(f'  Firma con llave en memoria:    {warm:8.3f} ms')
+        self.stdout.write(f'  Firma canonicalizando el XML:  {canonicalizing:8.3f} ms')
+        self.stdout.write(
+            f'  Un proceso: {1000 / (build + warm):8.1f} comprobantes/s'
+        )
+        cores = min(workers, os.cpu_count() or 1)
+        self.stdout.write(
+            f'  Pool de {workers} procesos en {cores} núcleos ({options["documents"]} comprobantes): '
+            f'{pool_rate:8.1f} comprobantes/s, {pool_rate / cores:8.1f} por núcleo'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Proceso completado. {pool_rate * 60:.0f} comprobantes firmados por minuto.'
+            )
+        )
+
+    def _certificate(self, company):
+        """Certificado de la empresa, o uno autofirmado temporal si no tiene"""
+        if company.certificate_file:
+            with company.certificate_file.open('rb') as certificate_file:
+                return certificate_file.read(), company.certificate_password
+
+        import datetime
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.primitives.serialization import pkcs12
+        from cryptography.x509.oid import NameOID
+
+        self.stdout.write(self.style.WARNING(
+            f'{company.trade_name} no tiene certificado: se usa uno autofirmado temporal'
+        ))
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, company.legal_name)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+            key.public_key()
+        ).serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(
+            now + datetime.timedelta(days=1)
+        ).sign(key, hashes.SHA256())
+        password = 'benchmark'
+        p12 = pkcs12.serialize_key_and_certificates(
+            b'benchmark', key, certificate, None,
+            serialization.BestAvailableEncryption(password.encode('utf-8'))
+        )
+        return p12, password
+
+    def _measure(self, function, iterations):
+        """Tiempo promedio por llamada en milisegundos"""
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        return (time.perf_counter() - start) / iterations * 1000
+
+    def _measure_pool(self, xml, p12, password, documents, workers):
+        """Comprobantes por segundo firmando en el pool de procesos (ya iniciado)"""
+        from apps.core.documents import render_documents
+        from apps.sri_integration.services import ElectronicDocumentQueue
+        from apps.sri_integration.signing import sign_batch
+
+        signing_time = timezone.localtime().isoformat(timespec='seconds')
+        executor = ElectronicDocumentQueue.signing_pool(workers) if workers > 1 else None
+
+        def run(count):
+            jobs = ElectronicDocumentQueue.signing_jobs(
+                ((index, xml, p12, password) for index in range(count)), workers, signing_time
+            )
+            signed = 0
+            for chunk, results, error in render_documents(sign_batch, jobs, workers, executor=executor):
+                if error:
+                    raise CommandError(f'Error de firma: {error}')
+                signed += len(results)
+            return signed
+
+        # Arranque de los workers y descifrado de la llave fuera de la medición
+        run(workers * 4)
+
+        start = time.perf_counter()
+        signed = run(documents)
+        return signed / (time.perf_counter() - start)
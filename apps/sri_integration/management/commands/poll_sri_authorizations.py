@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.sri_integration.services import AdaptiveConcurrency, AuthorizationScheduler
+
+
+class Command(BaseCommand):
+    help = 'Consultar en el SRI la autorización de los comprobantes recibidos hasta que queden resueltos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=AuthorizationScheduler.BATCH_SIZE,
+            help=f'Claves de acceso por pasada (por defecto {AuthorizationScheduler.BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=0,
+            help='Máximo de consultas simultáneas al SRI (por defecto SRI_CONCURRENCY)'
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=float,
+            default=30.0,
+            help='Espera máxima en segundos cuando no hay consultas vencidas (por defecto 30)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Consultar las claves vencidas y terminar'
+        )
+
+    def handle(self, *args, **options):
+        concurrency = AdaptiveConcurrency(
+            options['concurrency'] or settings.SRI_CONFIG.get('CONCURRENCY', 8)
+        )
+        totals = {}
+        self.stdout.write('Consultando autorizaciones en el SRI...')
+
+        while True:
+            result = AuthorizationScheduler.poll(options['batch_size'], concurrency=concurrency.current)
+            calls = sum(result.values())
+            for key, value in result.items():
+                totals[key] = totals.get(key, 0) + value
+
+            if calls:
+                self.stdout.write(
+                    ', '.join(f'{key}: {value}' for key, value in result.items() if value)
+                    + f' (concurrencia {concurrency.current})'
+                )
+                concurrency.record(calls, result['errors'])
+                continue
+
+            if options['once']:
+                break
+
+            # Dormir hasta la próxima consulta programada
+            wait = AuthorizationScheduler.next_poll_in()
+            time.sleep(min(options['max_sleep'], max(0.5, wait if wait is not None else options['max_sleep'])))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Proceso completado. {totals.get('authorized', 0)} autorizados, "
+                f"{totals.get('rejected', 0)} no autorizados, {totals.get('expired', 0)} sin respuesta, "
+                f"{totals.get('pending', 0)} consultas en proceso, {totals.get('errors', 0)} errores."
+            )
+        )
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.sri_integration.services import ElectronicDocumentQueue
+
+
+class Command(BaseCommand):
+    help = 'Firmar y enviar al SRI los comprobantes electrónicos en cola, y consultar su autorización'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ElectronicDocumentQueue.BATCH_SIZE,
+            help=f'Comprobantes por lote y etapa (por defecto {ElectronicDocumentQueue.BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Procesos de firma (por defecto SRI_SIGNING_WORKERS o número de CPUs)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=0,
+            help='Llamadas simultáneas al SRI (por defecto SRI_CONCURRENCY)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Segundos entre consultas a la cola cuando no hay trabajo (por defecto 5)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesar lo que haya vencido en cola y terminar'
+        )
+
+    def handle(self, *args, **options):
+        totals = {}
+        self.stdout.write('Procesando cola de comprobantes electrónicos...')
+
+        try:
+            while True:
+                result = ElectronicDocumentQueue.run_once(
+                    limit=options['batch_size'],
+                    workers=options['workers'] or None,
+                    concurrency=options['concurrency'] or None
+                )
+                for key, value in result.items():
+                    totals[key] = totals.get(key, 0) + value
+
+                if any(result.values()):
+                    self.stdout.write(', '.join(f'{key}: {value}' for key, value in result.items() if value))
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        finally:
+            ElectronicDocumentQueue.shutdown()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Proceso completado. {totals.get('signed', 0)} firmados, "
+                f"{totals.get('received', 0)} recibidos, {totals.get('authorized', 0)} autorizados, "
+                f"{totals.get('returned', 0) + totals.get('rejected', 0)} devueltos o no autorizados, "
+                f"{totals.get('expired', 0)} sin respuesta de autorización, "
+                f"{totals.get('errors', 0)} errores."
+            )
+        )
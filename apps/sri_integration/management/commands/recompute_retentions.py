@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.sri_integration.services import RetentionService
+from apps.suppliers.models import PurchaseInvoice
+
+
+class Command(BaseCommand):
+    help = 'Recalcular las retenciones de facturas de compra de un período según el catálogo vigente'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date-from',
+            required=True,
+            help='Fecha inicial del período (AAAA-MM-DD)'
+        )
+        parser.add_argument(
+            '--date-to',
+            required=True,
+            help='Fecha final del período (AAAA-MM-DD)'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='ID de empresa (por defecto todas)'
+        )
+        parser.add_argument(
+            '--include-manual',
+            action='store_true',
+            help='Recalcular también las facturas con porcentajes manuales'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RetentionService.CHUNK_SIZE,
+            help=f'Facturas por lote (por defecto {RetentionService.CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['date_from'] > options['date_to']:
+            raise CommandError('--date-from debe ser anterior o igual a --date-to')
+
+        invoices = PurchaseInvoice.objects.filter(
+            date__gte=options['date_from'],
+            date__lte=options['date_to']
+        )
+        if options['company']:
+            invoices = invoices.filter(company_id=options['company'])
+
+        result = RetentionService.recompute_purchase_invoices(
+            invoices,
+            include_manual=options['include_manual'],
+            chunk_size=options['chunk_size']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Proceso completado. {result['checked']} facturas revisadas, "
+                f"{result['updated']} con retenciones actualizadas."
+            )
+        )
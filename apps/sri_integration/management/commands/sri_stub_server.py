@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from apps.sri_integration.stub import SRIStubServer
+
+
+class Command(BaseCommand):
+    help = 'Levantar un SRI de prueba local (recepción y autorización offline) para desarrollo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help='Dirección de escucha (por defecto 127.0.0.1)'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8099,
+            help='Puerto (por defecto 8099)'
+        )
+        parser.add_argument(
+            '--authorization-delay',
+            type=float,
+            default=0.0,
+            help='Segundos entre la recepción y la autorización de cada comprobante'
+        )
+        parser.add_argument(
+            '--no-verify',
+            action='store_true',
+            help='No verificar la firma de los comprobantes recibidos'
+        )
+
+    def handle(self, *args, **options):
+        stub = SRIStubServer(
+            host=options['host'],
+            port=options['port'],
+            authorization_delay=options['authorization_delay'],
+            verify_signatures=not options['no_verify']
+        )
+        self.stdout.write(f'SRI de prueba escuchando en {stub.url}')
+        self.stdout.write(f'  SRI_WS_RECEPCION={stub.recepcion_url}')
+        self.stdout.write(f'  SRI_WS_AUTORIZACION={stub.autorizacion_url}')
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
+        self.stdout.write(self.style.SUCCESS('Proceso completado. SRI de prueba detenido.'))
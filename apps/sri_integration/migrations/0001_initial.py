@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:48
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetentionRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('tax_type', models.CharField(choices=[('renta', 'Impuesto a la Renta'), ('iva', 'IVA')], max_length=5, verbose_name='Impuesto')),
+                ('classification', models.CharField(blank=True, choices=[('persona_natural_no_obligada', 'Persona Natural No Obligada'), ('persona_natural_obligada', 'Persona Natural Obligada'), ('sociedad', 'Sociedad'), ('institucion_publica', 'Institución Pública'), ('regimen_rimpe', 'Régimen RIMPE')], help_text='Clasificación del sujeto retenido (vacío: aplica a cualquier clasificación)', max_length=30, verbose_name='Clasificación SRI')),
+                ('concept_code', models.CharField(blank=True, help_text='Código SRI del concepto de retención (vacío: porcentaje por defecto de la clasificación)', max_length=10, verbose_name='Código de concepto')),
+                ('description', models.CharField(blank=True, max_length=200, verbose_name='Descripción')),
+                ('percentage', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5, verbose_name='Porcentaje (%)')),
+                ('valid_from', models.DateField(verbose_name='Vigente desde')),
+                ('valid_to', models.DateField(blank=True, help_text='Vacío: vigente hasta nueva versión', null=True, verbose_name='Vigente hasta')),
+            ],
+            options={
+                'verbose_name': 'Porcentaje de Retención',
+                'verbose_name_plural': 'Porcentajes de Retención',
+                'ordering': ['tax_type', 'concept_code', 'classification', '-valid_from'],
+                'unique_together': {('tax_type', 'classification', 'concept_code', 'valid_from')},
+            },
+        ),
+    ]
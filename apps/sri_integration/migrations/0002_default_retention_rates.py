@@ -0,0 +1,65 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import migrations
+
+
+# Porcentajes por defecto por clasificación (los que estaban fijos en Supplier y Customer)
+DEFAULT_RATES = {
+    'persona_natural_no_obligada': (Decimal('30.00'), Decimal('2.00')),
+    'persona_natural_obligada': (Decimal('30.00'), Decimal('2.00')),
+    'sociedad': (Decimal('70.00'), Decimal('1.00')),
+    'institucion_publica': (Decimal('100.00'), Decimal('1.00')),
+    'regimen_rimpe': (Decimal('30.00'), Decimal('1.00')),
+}
+
+# Conceptos de retención en la fuente más usados (aplican a cualquier clasificación)
+CONCEPT_RATES = [
+    ('303', 'Honorarios profesionales y demás pagos por servicios relacionados con el título profesional', Decimal('10.00')),
+    ('312', 'Transferencia de bienes muebles de naturaleza corporal', Decimal('1.75')),
+    ('332', 'Otras compras de bienes y servicios no sujetas a retención', Decimal('0.00')),
+    ('3440', 'Otras retenciones aplicables el 2,75%', Decimal('2.75')),
+]
+
+VALID_FROM = date(2000, 1, 1)
+
+
+def create_default_rates(apps, schema_editor):
+    RetentionRate = apps.get_model('sri_integration', 'RetentionRate')
+
+    rates = []
+    for classification, (iva_rate, ir_rate) in DEFAULT_RATES.items():
+        rates.append(RetentionRate(
+            tax_type='iva', classification=classification, concept_code='',
+            description='Retención de IVA por defecto', percentage=iva_rate,
+            valid_from=VALID_FROM
+        ))
+        rates.append(RetentionRate(
+            tax_type='renta', classification=classification, concept_code='',
+            description='Retención en la fuente por defecto', percentage=ir_rate,
+            valid_from=VALID_FROM
+        ))
+    for concept_code, description, percentage in CONCEPT_RATES:
+        rates.append(RetentionRate(
+            tax_type='renta', classification='', concept_code=concept_code,
+            description=description, percentage=percentage,
+            valid_from=VALID_FROM
+        ))
+
+    RetentionRate.objects.bulk_create(rates, ignore_conflicts=True)
+
+
+def delete_default_rates(apps, schema_editor):
+    RetentionRate = apps.get_model('sri_integration', 'RetentionRate')
+    RetentionRate.objects.filter(valid_from=VALID_FROM).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sri_integration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_rates, delete_default_rates),
+    ]
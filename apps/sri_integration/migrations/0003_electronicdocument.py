@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0020_invoice_invoice_company_status_due'),
+        ('companies', '0007_inventory_costing_method'),
+        ('suppliers', '0007_purchaseinvoice_purchase_company_status_due'),
+        ('sri_integration', '0002_default_retention_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectronicDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('document_type', models.CharField(choices=[('01', 'Factura'), ('04', 'Nota de crédito'), ('07', 'Comprobante de retención')], max_length=2, verbose_name='Tipo de comprobante')),
+                ('number', models.CharField(max_length=17, verbose_name='Número')),
+                ('issue_date', models.DateField(verbose_name='Fecha de emisión')),
+                ('reason', models.CharField(blank=True, help_text='Motivo de la nota de crédito', max_length=300, verbose_name='Motivo')),
+                ('environment', models.CharField(choices=[('1', 'Pruebas'), ('2', 'Producción')], default='1', max_length=1, verbose_name='Ambiente SRI')),
+                ('access_key', models.CharField(max_length=49, unique=True, verbose_name='Clave de acceso')),
+                ('status', models.CharField(choices=[('pending', 'Por firmar'), ('signed', 'Firmado'), ('received', 'Recibido por el SRI'), ('authorized', 'Autorizado'), ('returned', 'Devuelto'), ('rejected', 'No autorizado'), ('failed', 'Fallido')], default='pending', max_length=10, verbose_name='Estado')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='Próximo intento')),
+                ('messages', models.TextField(blank=True, verbose_name='Mensajes del SRI')),
+                ('xml', models.TextField(blank=True, verbose_name='XML firmado')),
+                ('authorization_number', models.CharField(blank=True, max_length=49, verbose_name='Número de autorización')),
+                ('authorized_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de autorización')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='electronic_documents', to='companies.company', verbose_name='Empresa')),
+                ('invoice', models.ForeignKey(blank=True, help_text='Factura emitida, o factura que modifica la nota de crédito', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='electronic_documents', to='invoicing.invoice', verbose_name='Factura')),
+                ('purchase_invoice', models.ForeignKey(blank=True, help_text='Factura de compra que sustenta el comprobante de retención', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='electronic_documents', to='suppliers.purchaseinvoice', verbose_name='Factura de compra')),
+            ],
+            options={
+                'verbose_name': 'Comprobante Electrónico',
+                'verbose_name_plural': 'Comprobantes Electrónicos',
+                'ordering': ['-issue_date', '-number'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='edoc_status_next_attempt')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='electronicdocument',
+            constraint=models.UniqueConstraint(condition=models.Q(('invoice__isnull', False)), fields=('invoice', 'document_type'), name='unique_electronic_document_invoice'),
+        ),
+        migrations.AddConstraint(
+            model_name='electronicdocument',
+            constraint=models.UniqueConstraint(condition=models.Q(('purchase_invoice__isnull', False)), fields=('purchase_invoice', 'document_type'), name='unique_electronic_document_purchase_invoice'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sri_integration', '0003_electronicdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorizationPoll',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('access_key', models.CharField(max_length=49, unique=True, verbose_name='Clave de acceso')),
+                ('next_poll_at', models.DateTimeField(verbose_name='Próxima consulta')),
+                ('interval_seconds', models.PositiveIntegerField(default=3, help_text='Espera actual entre consultas; crece mientras el SRI no responde el comprobante', verbose_name='Intervalo (segundos)')),
+                ('polls', models.PositiveIntegerField(default=0, verbose_name='Consultas')),
+                ('last_polled_at', models.DateTimeField(blank=True, null=True, verbose_name='Última consulta')),
+                ('last_state', models.CharField(blank=True, help_text='EN PROCESO, sin registro o el error de la última consulta', max_length=200, verbose_name='Última respuesta')),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='authorization_poll', to='sri_integration.electronicdocument', verbose_name='Comprobante')),
+            ],
+            options={
+                'verbose_name': 'Consulta de Autorización',
+                'verbose_name_plural': 'Consultas de Autorización',
+                'ordering': ['next_poll_at'],
+                'indexes': [models.Index(fields=['next_poll_at'], name='authpoll_next_poll')],
+            },
+        ),
+    ]
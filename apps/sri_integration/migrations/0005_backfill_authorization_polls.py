@@ -0,0 +1,60 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+# Estado del comprobante -> estado SRI de la factura o factura de compra de origen
+SOURCE_STATUS = {
+    'pending': 'pending',
+    'signed': 'pending',
+    'received': 'pending',
+    'authorized': 'authorized',
+    'returned': 'rejected',
+    'rejected': 'rejected',
+    'failed': 'failed',
+}
+
+
+def backfill(apps, schema_editor):
+    ElectronicDocument = apps.get_model('sri_integration', 'ElectronicDocument')
+    AuthorizationPoll = apps.get_model('sri_integration', 'AuthorizationPoll')
+    Invoice = apps.get_model('invoicing', 'Invoice')
+    PurchaseInvoice = apps.get_model('suppliers', 'PurchaseInvoice')
+
+    # Los recibidos se consultaban desde la cola de comprobantes
+    now = timezone.now()
+    AuthorizationPoll.objects.bulk_create([
+        AuthorizationPoll(document_id=document_id, access_key=access_key, next_poll_at=now)
+        for document_id, access_key in ElectronicDocument.objects.filter(
+            status='received'
+        ).values_list('pk', 'access_key')
+    ], ignore_conflicts=True)
+    ElectronicDocument.objects.filter(status='received').update(next_attempt_at=None)
+
+    for document in ElectronicDocument.objects.filter(document_type__in=['01', '07']).iterator():
+        status = SOURCE_STATUS[document.status]
+        authorized = status == 'authorized'
+        if document.document_type == '01' and document.invoice_id:
+            Invoice.objects.filter(pk=document.invoice_id).update(
+                sri_status=status,
+                sri_authorization_number=document.authorization_number if authorized else '',
+                sri_authorized_at=document.authorized_at if authorized else None,
+            )
+        elif document.document_type == '07' and document.purchase_invoice_id:
+            PurchaseInvoice.objects.filter(pk=document.purchase_invoice_id).update(
+                retention_sri_status=status,
+                retention_authorization_number=document.authorization_number if authorized else '',
+                retention_authorized_at=document.authorized_at if authorized else None,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sri_integration', '0004_authorizationpoll'),
+        ('invoicing', '0021_invoice_sri_status'),
+        ('suppliers', '0008_purchaseinvoice_retention_sri_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
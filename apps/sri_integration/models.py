@@ -0,0 +1,245 @@
+from django.db import models
+from decimal import Decimal
+from apps.core.models import BaseModel
+
+
+class RetentionRate(BaseModel):
+    """
+    Catálogo versionado de porcentajes de retención del SRI
+    Cada fila es una versión vigente entre valid_from y valid_to para una
+    combinación (impuesto, clasificación del retenido, código de concepto)
+    """
+    RENTA = 'renta'
+    IVA = 'iva'
+
+    TAX_TYPE_CHOICES = [
+        (RENTA, 'Impuesto a la Renta'),
+        (IVA, 'IVA'),
+    ]
+
+    # Mismas clasificaciones que Supplier / Customer
+    SRI_CLASSIFICATION_CHOICES = [
+        ('persona_natural_no_obligada', 'Persona Natural No Obligada'),
+        ('persona_natural_obligada', 'Persona Natural Obligada'),
+        ('sociedad', 'Sociedad'),
+        ('institucion_publica', 'Institución Pública'),
+        ('regimen_rimpe', 'Régimen RIMPE'),
+    ]
+
+    tax_type = models.CharField(
+        max_length=5,
+        choices=TAX_TYPE_CHOICES,
+        verbose_name='Impuesto'
+    )
+    classification = models.CharField(
+        max_length=30,
+        choices=SRI_CLASSIFICATION_CHOICES,
+        blank=True,
+        verbose_name='Clasificación SRI',
+        help_text='Clasificación del sujeto retenido (vacío: aplica a cualquier clasificación)'
+    )
+    concept_code = models.CharField(
+        max_length=10,
+        blank=True,
+        verbose_name='Código de concepto',
+        help_text='Código SRI del concepto de retención (vacío: porcentaje por defecto de la clasificación)'
+    )
+    description = models.CharField(max_length=200, blank=True, verbose_name='Descripción')
+    percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Porcentaje (%)'
+    )
+    valid_from = models.DateField(verbose_name='Vigente desde')
+    valid_to = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Vigente hasta',
+        help_text='Vacío: vigente hasta nueva versión'
+    )
+
+    class Meta:
+        verbose_name = 'Porcentaje de Retención'
+        verbose_name_plural = 'Porcentajes de Retención'
+        unique_together = ['tax_type', 'classification', 'concept_code', 'valid_from']
+        ordering = ['tax_type', 'concept_code', 'classification', '-valid_from']
+
+    def __str__(self):
+        concept = self.concept_code or self.get_classification_display() or 'General'
+        return f"{self.get_tax_type_display()} {concept} - {self.percentage}% (desde {self.valid_from})"
+
+
+class ElectronicDocument(BaseModel):
+    """
+    Comprobante electrónico emitido al SRI (factura, nota de crédito, retención)
+    El estado funciona como cola: 'pending' -> 'signed' -> 'received' -> 'authorized';
+    next_attempt_at programa el siguiente intento de firma o envío (reintentos con espera)
+    y los recibidos esperan su autorización en AuthorizationPoll
+    Los trabajos los ejecutan los comandos process_sri_queue y poll_sri_authorizations
+    fuera del servidor web
+    """
+    FACTURA = '01'
+    NOTA_CREDITO = '04'
+    COMPROBANTE_RETENCION = '07'
+
+    DOCUMENT_TYPE_CHOICES = [
+        (FACTURA, 'Factura'),
+        (NOTA_CREDITO, 'Nota de crédito'),
+        (COMPROBANTE_RETENCION, 'Comprobante de retención'),
+    ]
+
+    PENDING = 'pending'
+    SIGNED = 'signed'
+    RECEIVED = 'received'
+    AUTHORIZED = 'authorized'
+    RETURNED = 'returned'
+    REJECTED = 'rejected'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Por firmar'),
+        (SIGNED, 'Firmado'),
+        (RECEIVED, 'Recibido por el SRI'),
+        (AUTHORIZED, 'Autorizado'),
+        (RETURNED, 'Devuelto'),
+        (REJECTED, 'No autorizado'),
+        (FAILED, 'Fallido'),
+    ]
+
+    # Estados con trabajo pendiente en la cola (los recibidos se consultan desde AuthorizationPoll)
+    QUEUED_STATUSES = [PENDING, SIGNED]
+    # Estados finales: se reflejan en la factura o factura de compra de origen
+    SETTLED_STATUSES = [AUTHORIZED, RETURNED, REJECTED, FAILED]
+
+    company = models.ForeignKey(
+        'companies.Company',
+        on_delete=models.CASCADE,
+        related_name='electronic_documents',
+        verbose_name='Empresa'
+    )
+    document_type = models.CharField(
+        max_length=2,
+        choices=DOCUMENT_TYPE_CHOICES,
+        verbose_name='Tipo de comprobante'
+    )
+    invoice = models.ForeignKey(
+        'invoicing.Invoice',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='electronic_documents',
+        verbose_name='Factura',
+        help_text='Factura emitida, o factura que modifica la nota de crédito'
+    )
+    purchase_invoice = models.ForeignKey(
+        'suppliers.PurchaseInvoice',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='electronic_documents',
+        verbose_name='Factura de compra',
+        help_text='Factura de compra que sustenta el comprobante de retención'
+    )
+    number = models.CharField(max_length=17, verbose_name='Número')
+    issue_date = models.DateField(verbose_name='Fecha de emisión')
+    reason = models.CharField(
+        max_length=300,
+        blank=True,
+        verbose_name='Motivo',
+        help_text='Motivo de la nota de crédito'
+    )
+    environment = models.CharField(
+        max_length=1,
+        choices=[('1', 'Pruebas'), ('2', 'Producción')],
+        default='1',
+        verbose_name='Ambiente SRI'
+    )
+    access_key = models.CharField(max_length=49, unique=True, verbose_name='Clave de acceso')
+
+    # Cola
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name='Estado'
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Intentos')
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Próximo intento'
+    )
+    messages = models.TextField(blank=True, verbose_name='Mensajes del SRI')
+
+    # Resultado
+    xml = models.TextField(blank=True, verbose_name='XML firmado')
+    authorization_number = models.CharField(max_length=49, blank=True, verbose_name='Número de autorización')
+    authorized_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de autorización')
+
+    class Meta:
+        verbose_name = 'Comprobante Electrónico'
+        verbose_name_plural = 'Comprobantes Electrónicos'
+        ordering = ['-issue_date', '-number']
+        constraints = [
+            # Un comprobante de cada tipo por documento de origen
+            models.UniqueConstraint(
+                fields=['invoice', 'document_type'],
+                condition=models.Q(invoice__isnull=False),
+                name='unique_electronic_document_invoice'
+            ),
+            models.UniqueConstraint(
+                fields=['purchase_invoice', 'document_type'],
+                condition=models.Q(purchase_invoice__isnull=False),
+                name='unique_electronic_document_purchase_invoice'
+            ),
+        ]
+        indexes = [
+            # Consulta de la cola: trabajos vencidos por estado
+            models.Index(fields=['status', 'next_attempt_at'], name='edoc_status_next_attempt'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_document_type_display()} {self.number}"
+
+
+class AuthorizationPoll(BaseModel):
+    """
+    Clave de acceso recibida por el SRI que espera su autorización
+    Tabla angosta e indexada por next_poll_at: solo contiene los comprobantes por
+    consultar y la fila se borra al quedar AUTORIZADO o NO AUTORIZADO, así la
+    consulta de pendientes no recorre el histórico ni carga los XML firmados
+    """
+    document = models.OneToOneField(
+        ElectronicDocument,
+        on_delete=models.CASCADE,
+        related_name='authorization_poll',
+        verbose_name='Comprobante'
+    )
+    access_key = models.CharField(max_length=49, unique=True, verbose_name='Clave de acceso')
+    next_poll_at = models.DateTimeField(verbose_name='Próxima consulta')
+    interval_seconds = models.PositiveIntegerField(
+        default=3,
+        verbose_name='Intervalo (segundos)',
+        help_text='Espera actual entre consultas; crece mientras el SRI no responde el comprobante'
+    )
+    polls = models.PositiveIntegerField(default=0, verbose_name='Consultas')
+    last_polled_at = models.DateTimeField(null=True, blank=True, verbose_name='Última consulta')
+    last_state = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Última respuesta',
+        help_text='EN PROCESO, sin registro o el error de la última consulta'
+    )
+
+    class Meta:
+        verbose_name = 'Consulta de Autorización'
+        verbose_name_plural = 'Consultas de Autorización'
+        ordering = ['next_poll_at']
+        indexes = [
+            # Consulta del programador: claves vencidas
+            models.Index(fields=['next_poll_at'], name='authpoll_next_poll'),
+        ]
+
+    def __str__(self):
+        return self.access_key
@@ -0,0 +1,1062 @@
+"""
+Servicios de Integración SRI
+Catálogo de porcentajes de retención y cálculo de retenciones por documento;
+emisión de comprobantes electrónicos (XML, firma y envío al SRI en cola)
+"""
+
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import MappingProxyType
+import logging
+import random
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+class RetentionRateTable:
+    """
+    Tabla inmutable de porcentajes de retención
+    Clave (impuesto, clasificación, código de concepto) -> versiones ordenadas por
+    fecha de vigencia; la consulta por fecha es una búsqueda binaria
+    """
+
+    __slots__ = ('_versions',)
+
+    def __init__(self, rates):
+        """
+        Args:
+            rates: Iterable de (tax_type, classification, concept_code,
+                   valid_from, valid_to, percentage)
+        """
+        grouped = {}
+        for tax_type, classification, concept_code, valid_from, valid_to, percentage in rates:
+            grouped.setdefault((tax_type, classification, concept_code), []).append(
+                (valid_from, valid_to, percentage)
+            )
+
+        versions = {}
+        for key, rows in grouped.items():
+            rows.sort(key=lambda row: row[0])
+            versions[key] = (
+                tuple(row[0] for row in rows),
+                tuple(rows),
+            )
+        self._versions = MappingProxyType(versions)
+
+    def _find(self, key, on_date):
+        entry = self._versions.get(key)
+        if entry is None:
+            return None
+        starts, rows = entry
+        index = bisect_right(starts, on_date) - 1
+        if index < 0:
+            return None
+        valid_from, valid_to, percentage = rows[index]
+        if valid_to and on_date > valid_to:
+            return None
+        return percentage
+
+    def rate(self, tax_type, classification, concept_code, on_date):
+        """
+        Porcentaje vigente a la fecha, o None si el catálogo no lo define
+
+        Busca primero la clasificación exacta y luego la fila general (sin clasificación)
+        """
+        # Documentos sin guardar conservan el default timezone.now (datetime)
+        if isinstance(on_date, datetime):
+            on_date = on_date.date()
+        percentage = self._find((tax_type, classification, concept_code), on_date)
+        if percentage is None and classification:
+            percentage = self._find((tax_type, '', concept_code), on_date)
+        return percentage
+
+
+class RetentionRateCatalog:
+    """
+    Catálogo de retenciones en memoria (único para todas las empresas)
+    Se invalida con señales de RetentionRate (ver signals.py)
+    """
+
+    _cache = TTLCache(ttl_seconds=300)
+
+    @classmethod
+    def table(cls):
+        """RetentionRateTable vigente, cargándola si no existe o expiró"""
+        return cls._cache.get('table', cls._load)
+
+    @classmethod
+    def _load(cls):
+        """Catálogo activo en una consulta"""
+        from .models import RetentionRate
+
+        return RetentionRateTable(
+            RetentionRate.objects.filter(is_active=True).values_list(
+                'tax_type', 'classification', 'concept_code',
+                'valid_from', 'valid_to', 'percentage'
+            )
+        )
+
+    @classmethod
+    def invalidate(cls):
+        """Descartar el catálogo cargado"""
+        cls._cache.invalidate()
+
+
+class RetentionService:
+    """
+    Cálculo de retenciones en la fuente (IR) y de IVA según el catálogo del SRI
+    Las retenciones se calculan por línea y se agrupan por concepto y porcentaje,
+    igual que en el comprobante de retención
+    """
+
+    CHUNK_SIZE = 500
+
+    @classmethod
+    def default_rates(cls, classification, on_date=None, iva_percentage=None,
+                      ir_percentage=None, table=None):
+        """
+        Porcentajes por defecto de una clasificación SRI
+
+        Args:
+            iva_percentage / ir_percentage: Porcentajes propios del retenido; si son
+                mayores a cero reemplazan al catálogo
+
+        Returns:
+            dict: {'iva_retention': Decimal, 'ir_retention': Decimal}
+        """
+        table = table or RetentionRateCatalog.table()
+        on_date = on_date or timezone.now().date()
+
+        from .models import RetentionRate
+
+        iva_rate = iva_percentage if iva_percentage and iva_percentage > 0 else (
+            table.rate(RetentionRate.IVA, classification, '', on_date)
+        )
+        ir_rate = ir_percentage if ir_percentage and ir_percentage > 0 else (
+            table.rate(RetentionRate.RENTA, classification, '', on_date)
+        )
+        return {
+            'iva_retention': iva_rate if iva_rate is not None else ZERO,
+            'ir_retention': ir_rate if ir_rate is not None else ZERO,
+        }
+
+    @classmethod
+    def compute(cls, lines, classification, on_date=None, iva_percentage=None,
+                ir_percentage=None, table=None):
+        """
+        Retenciones de un documento completo en una pasada
+
+        Args:
+            lines: Iterable de (base imponible, IVA de la línea, código de concepto IR)
+            classification: Clasificación SRI del retenido
+            on_date: Fecha del documento (por defecto hoy)
+            iva_percentage / ir_percentage: Porcentajes propios del retenido
+                (ver default_rates); el concepto de la línea tiene prioridad en IR
+            table: RetentionRateTable (por defecto la del catálogo)
+
+        Returns:
+            dict: lines (porcentajes por línea), retentions (agrupadas por impuesto,
+            concepto y porcentaje), montos totales y porcentajes efectivos
+        """
+        from .models import RetentionRate
+
+        table = table or RetentionRateCatalog.table()
+        on_date = on_date or timezone.now().date()
+        defaults = cls.default_rates(
+            classification, on_date, iva_percentage, ir_percentage, table=table
+        )
+
+        line_rates = []
+        groups = {}
+        for base, iva_amount, concept_code in lines:
+            concept_code = (concept_code or '').strip()
+
+            ir_rate = None
+            if concept_code:
+                ir_rate = table.rate(RetentionRate.RENTA, classification, concept_code, on_date)
+                if ir_rate is None:
+                    logger.warning(
+                        f"Concepto de retención {concept_code} sin porcentaje vigente al {on_date}; "
+                        f"se usa el porcentaje por defecto"
+                    )
+                    concept_code = ''
+            if ir_rate is None:
+                ir_rate = defaults['ir_retention']
+            iva_rate = defaults['iva_retention']
+
+            line_rates.append({
+                'ir_concept': concept_code,
+                'ir_percentage': ir_rate,
+                'iva_percentage': iva_rate,
+            })
+
+            for key, amount in (
+                ((RetentionRate.RENTA, concept_code, ir_rate), base),
+                ((RetentionRate.IVA, '', iva_rate), iva_amount),
+            ):
+                groups[key] = groups.get(key, ZERO) + amount
+
+        retentions = []
+        totals = {RetentionRate.RENTA: [ZERO, ZERO, set()], RetentionRate.IVA: [ZERO, ZERO, set()]}
+        for (tax_type, concept_code, percentage), base in groups.items():
+            amount = (base * percentage / HUNDRED).quantize(CENT)
+            retentions.append({
+                'tax_type': tax_type,
+                'concept_code': concept_code,
+                'percentage': percentage,
+                'base_amount': base.quantize(CENT),
+                'retention_amount': amount,
+            })
+            total = totals[tax_type]
+            total[0] += base
+            total[1] += amount
+            total[2].add(percentage)
+
+        def effective_rate(tax_type):
+            base, amount, percentages = totals[tax_type]
+            if len(percentages) == 1:
+                return next(iter(percentages))
+            if not percentages:
+                return defaults['iva_retention' if tax_type == RetentionRate.IVA else 'ir_retention']
+            return (amount * HUNDRED / base).quantize(CENT) if base else ZERO
+
+        iva_amount = totals[RetentionRate.IVA][1]
+        ir_amount = totals[RetentionRate.RENTA][1]
+        return {
+            'lines': line_rates,
+            'retentions': retentions,
+            'iva_retention_rate': effective_rate(RetentionRate.IVA),
+            'ir_retention_rate': effective_rate(RetentionRate.RENTA),
+            'iva_retention_amount': iva_amount,
+            'ir_retention_amount': ir_amount,
+            'total_retentions': iva_amount + ir_amount,
+        }
+
+    @classmethod
+    def purchase_line_values(cls, line):
+        """(base imponible, IVA, concepto IR) de una línea de factura de compra"""
+        line_subtotal = line.quantity * line.unit_cost
+        line_net = line_subtotal - line_subtotal * (line.discount / 100)
+        return line_net, line_net * (line.iva_rate / 100), line.retention_concept
+
+    @classmethod
+    def compute_purchase_invoice(cls, purchase_invoice, lines=None, table=None):
+        """
+        Retenciones automáticas de una factura de compra según su proveedor
+
+        Args:
+            lines: Líneas ya cargadas (por defecto purchase_invoice.lines.all())
+        """
+        supplier = purchase_invoice.supplier
+        if lines is None:
+            lines = purchase_invoice.lines.all()
+        return cls.compute(
+            [cls.purchase_line_values(line) for line in lines],
+            supplier.sri_classification,
+            purchase_invoice.date,
+            iva_percentage=supplier.iva_retention_percentage,
+            ir_percentage=supplier.ir_retention_percentage,
+            table=table,
+        )
+
+    @classmethod
+    def recompute_purchase_invoices(cls, queryset, include_manual=False, chunk_size=None):
+        """
+        Recalcular en lote las retenciones de facturas de compra (cambio de porcentajes)
+
+        Solo se recalculan facturas en borrador o recibidas, sin comprobante de retención
+        emitido ni asiento contable; las de porcentajes manuales solo con include_manual
+
+        Returns:
+            dict: {'checked': int, 'updated': int}
+        """
+        from apps.suppliers.models import PurchaseInvoice, PurchaseInvoiceLine
+        from django.db.models import Prefetch
+
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        table = RetentionRateCatalog.table()
+
+        queryset = queryset.filter(
+            status__in=[PurchaseInvoice.DRAFT, PurchaseInvoice.RECEIVED],
+            retention_voucher_number='',
+            journal_entries__isnull=True,
+            supplier__retention_agent=True,
+        )
+        if not include_manual:
+            queryset = queryset.filter(manual_retention_rates=False)
+
+        invoice_ids = list(queryset.order_by('pk').values_list('pk', flat=True).distinct())
+        fields = [
+            'iva_retention_percentage', 'ir_retention_percentage',
+            'iva_retention_amount', 'ir_retention_amount',
+            'total_retentions', 'net_payable', 'manual_retention_rates',
+        ]
+
+        updated = 0
+        for start in range(0, len(invoice_ids), chunk_size):
+            invoices = PurchaseInvoice.objects.filter(
+                pk__in=invoice_ids[start:start + chunk_size]
+            ).select_related('supplier').prefetch_related(
+                Prefetch(
+                    'lines',
+                    queryset=PurchaseInvoiceLine.objects.only(
+                        'purchase_invoice_id', 'quantity', 'unit_cost',
+                        'discount', 'iva_rate', 'retention_concept'
+                    )
+                )
+            )
+
+            changed = []
+            for invoice in invoices:
+                if cls._apply_to_purchase_invoice(invoice, table):
+                    changed.append(invoice)
+
+            if changed:
+                with transaction.atomic():
+                    PurchaseInvoice.objects.bulk_update(changed, fields)
+                updated += len(changed)
+
+        return {'checked': len(invoice_ids), 'updated': updated}
+
+    @classmethod
+    def _apply_to_purchase_invoice(cls, invoice, table):
+        """Asignar las retenciones recalculadas en memoria; True si algo cambió"""
+        if invoice.subtotal <= 0:
+            return False
+
+        result = cls.compute_purchase_invoice(invoice, list(invoice.lines.all()), table)
+        values = {
+            'iva_retention_percentage': result['iva_retention_rate'],
+            'ir_retention_percentage': result['ir_retention_rate'],
+            'iva_retention_amount': result['iva_retention_amount'],
+            'ir_retention_amount': result['ir_retention_amount'],
+            'total_retentions': result['total_retentions'],
+            'net_payable': invoice.total - result['total_retentions'],
+            'manual_retention_rates': False,
+        }
+        if all(getattr(invoice, field) == value for field, value in values.items()):
+            return False
+
+        for field, value in values.items():
+            setattr(invoice, field, value)
+        return True
+
+
+def _lease(queryset, field, limit, seconds):
+    """
+    Reservar hasta `limit` filas vencidas según un campo de fecha y hora
+
+    Returns:
+        Lista de IDs reservados
+    """
+    now = timezone.now()
+    due = queryset.filter(**{f'{field}__lte': now})
+    candidates = list(due.order_by(field).values_list('pk', flat=True)[:limit])
+    if not candidates:
+        return []
+
+    lease = now + timedelta(seconds=seconds, microseconds=random.randrange(1000000))
+    due.filter(pk__in=candidates).update(**{field: lease, 'updated_at': now})
+    return list(queryset.model.objects.filter(
+        pk__in=candidates, **{field: lease}
+    ).values_list('pk', flat=True))
+
+
+class ElectronicDocumentService:
+    """
+    Emisión de comprobantes electrónicos
+    Registra el comprobante con su clave de acceso y lo deja en cola; la generación
+    del XML, la firma y el envío los hace ElectronicDocumentQueue y la consulta de
+    autorización AuthorizationScheduler
+    """
+
+    # Estado del comprobante -> estado SRI de la factura o factura de compra de origen
+    SOURCE_STATUS = {
+        'pending': 'pending',
+        'signed': 'pending',
+        'received': 'pending',
+        'authorized': 'authorized',
+        'returned': 'rejected',
+        'rejected': 'rejected',
+        'failed': 'failed',
+    }
+
+    @classmethod
+    def _enqueue(cls, company, document_type, number, issue_date, **source):
+        """Crear el comprobante pendiente (idempotente por documento de origen)"""
+        from apps.sri_integration.electronic import AccessKey, split_number
+        from .models import ElectronicDocument
+
+        establishment, emission_point, sequential = split_number(number)
+        environment = company.sri_environment or settings.SRI_CONFIG['AMBIENTE']
+        access_key = AccessKey.build(
+            issue_date, document_type, company.ruc, environment,
+            establishment, emission_point, sequential,
+            # Código numérico derivado del secuencial: reemitir da la misma clave
+            numeric_code=int(sequential) % 10 ** 8,
+            emission_type=settings.SRI_CONFIG['TIPO_EMISION']
+        )
+
+        document, created = ElectronicDocument.objects.get_or_create(
+            document_type=document_type,
+            **source,
+            defaults={
+                'company': company,
+                'number': number,
+                'issue_date': issue_date,
+                'environment': environment,
+                'access_key': access_key,
+                'status': ElectronicDocument.PENDING,
+                'next_attempt_at': timezone.now(),
+            }
+        )
+        if created:
+            cls.sync_sources([document])
+        return document
+
+    @classmethod
+    def sync_sources(cls, documents):
+        """
+        Reflejar el estado de los comprobantes en sus documentos de origen
+        Facturas (sri_status) y facturas de compra (retention_sri_status) en un
+        UPDATE por modelo; las notas de crédito no cambian la factura que modifican
+        """
+        from apps.invoicing.models import Invoice
+        from apps.suppliers.models import PurchaseInvoice
+        from .models import ElectronicDocument
+
+        invoices = []
+        purchase_invoices = []
+        for document in documents:
+            status = cls.SOURCE_STATUS[document.status]
+            authorized = document.status == ElectronicDocument.AUTHORIZED
+            number = document.authorization_number if authorized else ''
+            authorized_at = document.authorized_at if authorized else None
+            if document.document_type == ElectronicDocument.FACTURA and document.invoice_id:
+                invoices.append(Invoice(
+                    pk=document.invoice_id, sri_status=status,
+                    sri_authorization_number=number, sri_authorized_at=authorized_at
+                ))
+            elif document.document_type == ElectronicDocument.COMPROBANTE_RETENCION and document.purchase_invoice_id:
+                purchase_invoices.append(PurchaseInvoice(
+                    pk=document.purchase_invoice_id, retention_sri_status=status,
+                    retention_authorization_number=number, retention_authorized_at=authorized_at
+                ))
+
+        with transaction.atomic():
+            if invoices:
+                Invoice.objects.bulk_update(
+                    invoices, ['sri_status', 'sri_authorization_number', 'sri_authorized_at']
+                )
+            if purchase_invoices:
+                PurchaseInvoice.objects.bulk_update(
+                    purchase_invoices,
+                    ['retention_sri_status', 'retention_authorization_number', 'retention_authorized_at']
+                )
+        return len(invoices) + len(purchase_invoices)
+
+    @classmethod
+    def issue_invoice(cls, invoice):
+        """Factura electrónica de una factura de venta"""
+        from .models import ElectronicDocument
+
+        if invoice.status in (invoice.DRAFT, invoice.CANCELLED):
+            raise ValueError(f"La factura {invoice.number} no está emitida")
+        return cls._enqueue(
+            invoice.company, ElectronicDocument.FACTURA, invoice.number, invoice.date,
+            invoice=invoice
+        )
+
+    @classmethod
+    def issue_credit_note(cls, invoice, reason=''):
+        """
+        Nota de crédito por el total de una factura (anulación o devolución total)
+        El número sale del contador de notas de crédito de la empresa
+        """
+        from apps.companies.models import CompanySettings
+        from apps.invoicing.models import Invoice
+        from .models import ElectronicDocument
+
+        company = invoice.company
+        with transaction.atomic():
+            # La fila de la factura serializa las emisiones simultáneas: la segunda
+            # encuentra la nota ya creada y no consume otro secuencial
+            list(Invoice.objects.select_for_update().filter(pk=invoice.pk).values_list('pk', flat=True))
+            existing = ElectronicDocument.objects.select_for_update().filter(
+                invoice=invoice, document_type=ElectronicDocument.NOTA_CREDITO
+            ).first()
+            if existing:
+                return existing
+
+            sequential = CompanySettings.allocate_sequential(company, 'credit_note_sequential')
+            number = (
+                f"{company.establishment_code.zfill(3)}-{company.emission_point.zfill(3)}-"
+                f"{str(sequential).zfill(9)}"
+            )
+            document = cls._enqueue(
+                company, ElectronicDocument.NOTA_CREDITO, number, timezone.localdate(),
+                invoice=invoice
+            )
+            if reason and document.reason != reason:
+                document.reason = reason
+                document.save(update_fields=['reason', 'updated_at'])
+        return document
+
+    @classmethod
+    def issue_retention(cls, purchase_invoice):
+        """Comprobante de retención de una factura de compra"""
+        from .models import ElectronicDocument
+
+        voucher_number = purchase_invoice.retention_voucher_number or purchase_invoice.generate_retention_voucher()
+        if not voucher_number:
+            raise ValueError(f"La factura de compra {purchase_invoice.internal_number} no tiene retenciones")
+        return cls._enqueue(
+            purchase_invoice.company, ElectronicDocument.COMPROBANTE_RETENCION, voucher_number,
+            purchase_invoice.retention_voucher_date or timezone.localdate(),
+            purchase_invoice=purchase_invoice
+        )
+
+    @classmethod
+    def issue_many(cls, issue, sources):
+        """
+        Emitir varios documentos; los errores no detienen el lote
+
+        Returns:
+            tuple: (comprobantes, [(documento de origen, error)])
+        """
+        documents = []
+        errors = []
+        for source in sources:
+            try:
+                documents.append(issue(source))
+            except Exception as e:
+                errors.append((source, str(e)))
+        return documents, errors
+
+    @classmethod
+    def requeue(cls, queryset):
+        """Volver a generar y enviar comprobantes devueltos, no autorizados o fallidos"""
+        from .models import ElectronicDocument
+
+        documents = list(queryset.filter(
+            status__in=[ElectronicDocument.RETURNED, ElectronicDocument.REJECTED, ElectronicDocument.FAILED]
+        ).defer('xml'))
+        if not documents:
+            return 0
+
+        with transaction.atomic():
+            requeued = ElectronicDocument.objects.filter(pk__in=[document.pk for document in documents]).update(
+                status=ElectronicDocument.PENDING,
+                attempts=0,
+                next_attempt_at=timezone.now(),
+                updated_at=timezone.now()
+            )
+            for document in documents:
+                document.status = ElectronicDocument.PENDING
+            cls.sync_sources(documents)
+        return requeued
+
+
+class ElectronicDocumentQueue:
+    """
+    Cola de comprobantes electrónicos en segundo plano
+
+    Cada etapa toma un lote de comprobantes vencidos ('pending' para firmar,
+    'signed' para recepción) reservándolos con next_attempt_at; los errores
+    transitorios reintentan con espera exponencial. Los recibidos pasan a
+    AuthorizationScheduler hasta que el SRI los autoriza o rechaza.
+    La firma (CPU) se reparte en un pool de procesos y las llamadas al SRI (red)
+    en un pool de hilos; la base de datos solo se toca desde el proceso principal
+    """
+
+    BATCH_SIZE = 100
+    LEASE_SECONDS = 300
+    BACKOFF_BASE_SECONDS = 30
+    BACKOFF_MAX_SECONDS = 3600
+    # Comprobantes por tarea de firma: una llave y un viaje al worker por lote
+    SIGNING_CHUNK_SIZE = 50
+
+    RESULT_FIELDS = [
+        'status', 'attempts', 'next_attempt_at', 'messages', 'xml',
+        'authorization_number', 'authorized_at', 'updated_at',
+    ]
+
+    _clients = threading.local()
+    _pool = None
+    _pool_workers = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def max_attempts(cls):
+        return settings.SRI_CONFIG.get('MAX_ATTEMPTS', 8)
+
+    @classmethod
+    def backoff(cls, attempts):
+        """Espera antes del intento siguiente: 30 s, 1 min, 2 min... hasta 1 hora"""
+        return timedelta(seconds=min(
+            cls.BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), cls.BACKOFF_MAX_SECONDS
+        ))
+
+    @classmethod
+    def claim(cls, status, limit):
+        """
+        Reservar hasta `limit` comprobantes vencidos en un estado
+
+        El UPDATE condicional marca los candidatos con una hora de reserva propia de
+        este llamador (con microsegundos aleatorios); los comprobantes que quedan con
+        esa hora son los reservados, aunque otro worker consulte al mismo tiempo
+
+        Returns:
+            Lista de IDs reservados
+        """
+        from .models import ElectronicDocument
+
+        return _lease(
+            ElectronicDocument.objects.filter(status=status), 'next_attempt_at', limit, cls.LEASE_SECONDS
+        )
+
+    @classmethod
+    def _retry(cls, document, message):
+        """Registrar un error transitorio: reintento con espera o fallo definitivo"""
+        document.attempts += 1
+        document.messages = message
+        if document.attempts >= cls.max_attempts():
+            document.status = document.FAILED
+            document.next_attempt_at = None
+        else:
+            document.next_attempt_at = timezone.now() + cls.backoff(document.attempts)
+
+    @classmethod
+    def _advance(cls, document, status, delay_seconds=0, messages=''):
+        """Pasar a la siguiente etapa"""
+        document.status = status
+        document.attempts = 0
+        document.messages = messages
+        document.next_attempt_at = (
+            timezone.now() + timedelta(seconds=delay_seconds)
+            if status in document.QUEUED_STATUSES else None
+        )
+
+    @classmethod
+    def _save(cls, documents, fields=None):
+        """Guardar el resultado de un lote y reflejar los estados finales en el origen"""
+        from .models import ElectronicDocument
+
+        now = timezone.now()
+        for document in documents:
+            document.updated_at = now
+        with transaction.atomic():
+            ElectronicDocument.objects.bulk_update(documents, fields or cls.RESULT_FIELDS)
+            ElectronicDocumentService.sync_sources([
+                document for document in documents if document.status in ElectronicDocument.SETTLED_STATUSES
+            ])
+
+    @classmethod
+    def _load(cls, ids):
+        """Comprobantes con todo lo necesario para armar el XML"""
+        from django.db.models import Prefetch
+        from apps.invoicing.models import InvoiceLine
+        from .models import ElectronicDocument
+
+        return list(ElectronicDocument.objects.filter(pk__in=ids).select_related(
+            'company',
+            'invoice__customer', 'invoice__payment_form',
+            'purchase_invoice__supplier',
+        ).prefetch_related(
+            Prefetch('invoice__lines', queryset=InvoiceLine.objects.select_related('product')),
+            'purchase_invoice__lines',
+        ).order_by('pk'))
+
+    @classmethod
+    def _certificate(cls, company):
+        """Bytes del certificado PKCS#12 de la empresa"""
+        if not company.certificate_file:
+            raise ValueError(f"La empresa {company.trade_name} no tiene certificado digital")
+        with company.certificate_file.open('rb') as certificate_file:
+            return certificate_file.read()
+
+    @classmethod
+    def signing_workers(cls, workers=None):
+        from apps.core.documents import get_render_workers
+
+        return workers or settings.SRI_CONFIG.get('SIGNING_WORKERS') or get_render_workers()
+
+    @classmethod
+    def signing_pool(cls, workers):
+        """
+        Pool de procesos de firma, persistente mientras corre el comando: cada worker
+        conserva sus llaves descifradas (SigningKeyCache) entre lotes
+        """
+        from apps.core.documents import create_process_pool
+
+        with cls._pool_lock:
+            if cls._pool is None or cls._pool_workers != workers:
+                if cls._pool is not None:
+                    cls._pool.shutdown(wait=False, cancel_futures=True)
+                cls._pool = create_process_pool(workers)
+                cls._pool_workers = workers
+            return cls._pool
+
+    @classmethod
+    def shutdown(cls):
+        """Cerrar el pool de firma"""
+        with cls._pool_lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=True, cancel_futures=True)
+                cls._pool = None
+                cls._pool_workers = None
+
+    @classmethod
+    def signing_jobs(cls, items, workers, signing_time):
+        """
+        Repartir comprobantes en lotes de firma por empresa
+
+        Args:
+            items: Iterable de (id, xml canónico, p12, contraseña)
+            workers: Procesos de firma (dos lotes por worker como mínimo)
+            signing_time: Fecha y hora de firma en ISO 8601
+
+        Returns:
+            list: [(nombre del lote, payload para signing.sign_batch)]
+        """
+        by_certificate = {}
+        for document_id, xml, p12, password in items:
+            by_certificate.setdefault((p12, password), []).append((document_id, xml))
+
+        total = sum(len(documents) for documents in by_certificate.values())
+        size = max(1, min(cls.SIGNING_CHUNK_SIZE, -(-total // (workers * 2))))
+
+        jobs = []
+        for (p12, password), documents in by_certificate.items():
+            for start in range(0, len(documents), size):
+                jobs.append((len(jobs), {
+                    'documents': documents[start:start + size],
+                    'p12': p12,
+                    'password': password,
+                    'signing_time': signing_time,
+                }))
+        return jobs
+
+    @classmethod
+    def sign_pending(cls, limit=None, workers=None):
+        """
+        Generar y firmar un lote de comprobantes pendientes
+
+        Returns:
+            dict: {'signed': int, 'errors': int}
+        """
+        from apps.core.documents import render_documents
+        from apps.sri_integration.electronic import ComprobanteXMLBuilder
+        from apps.sri_integration.signing import sign_batch
+        from .models import ElectronicDocument
+
+        ids = cls.claim(ElectronicDocument.PENDING, limit or cls.BATCH_SIZE)
+        if not ids:
+            return {'signed': 0, 'errors': 0}
+
+        documents = {document.pk: document for document in cls._load(ids)}
+        certificates = {}
+        items = []
+        errors = 0
+        for document in documents.values():
+            try:
+                if document.company_id not in certificates:
+                    certificates[document.company_id] = cls._certificate(document.company)
+                xml = ComprobanteXMLBuilder.build(document, settings.SRI_CONFIG['TIPO_EMISION'])
+            except Exception as e:
+                cls._retry(document, f"Error generando el XML: {e}")
+                errors += 1
+                continue
+            items.append((
+                document.pk, xml, certificates[document.company_id], document.company.certificate_password
+            ))
+
+        workers = cls.signing_workers(workers)
+        jobs = cls.signing_jobs(items, workers, timezone.localtime().isoformat(timespec='seconds'))
+        executor = cls.signing_pool(workers) if workers > 1 and len(jobs) > 1 else None
+        for chunk, results, error in render_documents(sign_batch, jobs, workers, executor=executor):
+            if error:
+                # Falló el lote completo (certificado inválido o contraseña incorrecta)
+                results = [(document_id, None, error) for document_id, xml in jobs[chunk][1]['documents']]
+            for document_id, signed_xml, document_error in results:
+                document = documents[document_id]
+                if document_error:
+                    cls._retry(document, f"Error de firma: {document_error}")
+                    errors += 1
+                else:
+                    document.xml = signed_xml.decode('utf-8')
+                    cls._advance(document, ElectronicDocument.SIGNED)
+
+        cls._save(list(documents.values()))
+        return {'signed': len(documents) - errors, 'errors': errors}
+
+    @classmethod
+    def _client(cls, client_factory):
+        """Un cliente SOAP (sesión HTTP) por hilo"""
+        client = getattr(cls._clients, 'client', None)
+        if client is None or getattr(cls._clients, 'factory', None) is not client_factory:
+            client = client_factory()
+            cls._clients.client = client
+            cls._clients.factory = client_factory
+        return client
+
+    @classmethod
+    def _call_all(cls, documents, call, client_factory, concurrency):
+        """
+        Ejecutar una llamada al SRI por comprobante en un pool de hilos
+        `concurrency` limita las llamadas simultáneas (hilos del pool)
+
+        Yields:
+            tuple: (comprobante, respuesta, error)
+        """
+        from apps.sri_integration.client import SRIServiceError
+
+        def task(document):
+            try:
+                return document, call(cls._client(client_factory), document), None
+            except SRIServiceError as e:
+                return document, None, str(e)
+
+        concurrency = concurrency or settings.SRI_CONFIG.get('CONCURRENCY', 8)
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(documents)))) as pool:
+            yield from pool.map(task, documents)
+
+    @classmethod
+    def submit_signed(cls, limit=None, client_factory=None, concurrency=None):
+        """
+        Enviar a recepción un lote de comprobantes firmados
+
+        Returns:
+            dict: {'received': int, 'returned': int, 'errors': int}
+        """
+        from apps.sri_integration.client import SRIClient, format_messages
+        from .models import ElectronicDocument
+
+        result = {'received': 0, 'returned': 0, 'errors': 0}
+        ids = cls.claim(ElectronicDocument.SIGNED, limit or cls.BATCH_SIZE)
+        if not ids:
+            return result
+
+        documents = list(ElectronicDocument.objects.filter(pk__in=ids).order_by('pk'))
+        for document, response, error in cls._call_all(
+            documents, lambda client, document: client.validate(document.xml),
+            client_factory or SRIClient, concurrency
+        ):
+            if error:
+                cls._retry(document, error)
+                result['errors'] += 1
+            elif response['state'] == 'RECIBIDA' or response['already_received']:
+                cls._advance(document, ElectronicDocument.RECEIVED, messages=format_messages(response['messages']))
+                result['received'] += 1
+            else:
+                cls._advance(document, ElectronicDocument.RETURNED, messages=format_messages(response['messages']))
+                result['returned'] += 1
+
+        with transaction.atomic():
+            cls._save(documents)
+            AuthorizationScheduler.enqueue([
+                document for document in documents if document.status == ElectronicDocument.RECEIVED
+            ])
+        return result
+
+    @classmethod
+    def run_once(cls, limit=None, workers=None, client_factory=None, concurrency=None):
+        """Una pasada por las etapas de la cola y por las autorizaciones vencidas"""
+        result = {}
+        result.update(cls.sign_pending(limit, workers))
+        submitted = cls.submit_signed(limit, client_factory, concurrency)
+        checked = AuthorizationScheduler.poll(limit, client_factory, concurrency)
+        result['errors'] += submitted.pop('errors') + checked.pop('errors')
+        result.update(submitted)
+        result.update(checked)
+        return result
+
+
+class AdaptiveConcurrency:
+    """
+    Límite de llamadas simultáneas al SRI que se adapta a sus respuestas
+    Sube de uno en uno mientras las pasadas salen bien y se reduce a la mitad
+    cuando una pasada tiene muchos errores (SRI caído o saturado)
+    """
+
+    ERROR_RATIO = 0.2
+
+    def __init__(self, maximum, minimum=1):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.current = self.maximum
+
+    def record(self, calls, errors):
+        """Ajustar el límite con el resultado de una pasada; devuelve el nuevo límite"""
+        if calls:
+            if errors > calls * self.ERROR_RATIO:
+                self.current = max(self.minimum, self.current // 2)
+            else:
+                self.current = min(self.maximum, self.current + 1)
+        return self.current
+
+
+class AuthorizationScheduler:
+    """
+    Consulta de autorizaciones en el SRI
+
+    Las claves de acceso recibidas esperan en AuthorizationPoll con su próxima
+    consulta. Cada pasada reserva las vencidas (índice por next_poll_at), las
+    consulta con concurrencia limitada y guarda los resultados en bloque: los
+    comprobantes resueltos, su factura o factura de compra y el borrado de sus
+    claves en la misma transacción. Las que siguen EN PROCESO se reprograman con
+    una espera que crece en cada consulta (3 s, 4 s, 6 s... hasta 15 minutos)
+    """
+
+    BATCH_SIZE = 500
+    LEASE_SECONDS = 120
+    # El SRI tarda unos segundos en autorizar un comprobante recibido
+    FIRST_POLL_SECONDS = 3
+    BACKOFF_FACTOR = 1.5
+    ERROR_BACKOFF_FACTOR = 2
+    MAX_INTERVAL_SECONDS = 900
+    # Variación aleatoria de la espera: claves recibidas juntas no se consultan juntas
+    JITTER = 0.1
+
+    POLL_FIELDS = ['next_poll_at', 'interval_seconds', 'polls', 'last_polled_at', 'last_state', 'updated_at']
+    DOCUMENT_FIELDS = [
+        'status', 'attempts', 'next_attempt_at', 'messages',
+        'authorization_number', 'authorized_at', 'updated_at',
+    ]
+
+    @classmethod
+    def max_wait(cls):
+        """Tiempo máximo esperando la autorización antes de dar el comprobante por fallido"""
+        return timedelta(hours=settings.SRI_CONFIG.get('AUTHORIZATION_MAX_HOURS', 72))
+
+    @classmethod
+    def next_interval(cls, interval, factor):
+        """Siguiente espera en segundos, con variación aleatoria"""
+        interval = min(max(int(interval * factor), interval + 1), cls.MAX_INTERVAL_SECONDS)
+        return max(1, round(interval * random.uniform(1 - cls.JITTER, 1 + cls.JITTER)))
+
+    @classmethod
+    def enqueue(cls, documents):
+        """Programar la consulta de autorización de comprobantes recibidos"""
+        from .models import AuthorizationPoll
+
+        next_poll_at = timezone.now() + timedelta(seconds=cls.FIRST_POLL_SECONDS)
+        return len(AuthorizationPoll.objects.bulk_create([
+            AuthorizationPoll(
+                document=document,
+                access_key=document.access_key,
+                next_poll_at=next_poll_at,
+                interval_seconds=cls.FIRST_POLL_SECONDS,
+            )
+            for document in documents
+        ], ignore_conflicts=True))
+
+    @classmethod
+    def claim(cls, limit):
+        """Reservar hasta `limit` claves con la consulta vencida (ver ElectronicDocumentQueue.claim)"""
+        from .models import AuthorizationPoll
+
+        return _lease(AuthorizationPoll.objects.all(), 'next_poll_at', limit, cls.LEASE_SECONDS)
+
+    @classmethod
+    def next_poll_in(cls):
+        """Segundos hasta la próxima consulta programada (None si no hay claves pendientes)"""
+        from .models import AuthorizationPoll
+
+        next_poll_at = AuthorizationPoll.objects.order_by('next_poll_at').values_list(
+            'next_poll_at', flat=True
+        ).first()
+        if next_poll_at is None:
+            return None
+        return max(0.0, (next_poll_at - timezone.now()).total_seconds())
+
+    @classmethod
+    def poll(cls, limit=None, client_factory=None, concurrency=None):
+        """
+        Consultar un lote de claves vencidas
+
+        Returns:
+            dict: {'authorized': int, 'rejected': int, 'pending': int,
+                   'expired': int, 'errors': int}
+        """
+        from apps.sri_integration.client import SRIClient, format_messages
+        from .models import AuthorizationPoll, ElectronicDocument
+
+        result = {'authorized': 0, 'rejected': 0, 'pending': 0, 'expired': 0, 'errors': 0}
+        ids = cls.claim(limit or cls.BATCH_SIZE)
+        if not ids:
+            return result
+
+        polls = list(AuthorizationPoll.objects.filter(pk__in=ids).select_related(
+            'document'
+        ).defer('document__xml').order_by('next_poll_at'))
+        now = timezone.now()
+        expires_before = now - cls.max_wait()
+        settled = []
+        waiting = []
+
+        for poll, response, error in ElectronicDocumentQueue._call_all(
+            polls, lambda client, poll: client.authorization(poll.access_key),
+            client_factory or SRIClient, concurrency
+        ):
+            document = poll.document
+            poll.polls += 1
+            poll.last_polled_at = now
+            state = response['state'] if response else ''
+
+            if state == 'AUTORIZADO':
+                ElectronicDocumentQueue._advance(
+                    document, ElectronicDocument.AUTHORIZED, messages=format_messages(response['messages'])
+                )
+                document.authorization_number = response['number'] or document.access_key
+                document.authorized_at = parse_datetime(response['date']) or now
+                settled.append(poll)
+                result['authorized'] += 1
+                continue
+            if state == 'NO AUTORIZADO':
+                ElectronicDocumentQueue._advance(
+                    document, ElectronicDocument.REJECTED, messages=format_messages(response['messages'])
+                )
+                settled.append(poll)
+                result['rejected'] += 1
+                continue
+
+            poll.last_state = error[:200] if error else state or 'Sin registro en el SRI'
+            if poll.created_at < expires_before:
+                ElectronicDocumentQueue._advance(
+                    document, ElectronicDocument.FAILED,
+                    messages=f"Sin autorización del SRI tras {poll.polls} consultas: {poll.last_state}"
+                )
+                settled.append(poll)
+                result['expired'] += 1
+                continue
+
+            result['errors' if error else 'pending'] += 1
+            poll.interval_seconds = cls.next_interval(
+                poll.interval_seconds, cls.ERROR_BACKOFF_FACTOR if error else cls.BACKOFF_FACTOR
+            )
+            poll.next_poll_at = now + timedelta(seconds=poll.interval_seconds)
+            poll.updated_at = now
+            waiting.append(poll)
+
+        with transaction.atomic():
+            if settled:
+                ElectronicDocumentQueue._save([poll.document for poll in settled], cls.DOCUMENT_FIELDS)
+                AuthorizationPoll.objects.filter(pk__in=[poll.pk for poll in settled]).delete()
+            if waiting:
+                AuthorizationPoll.objects.bulk_update(waiting, cls.POLL_FIELDS)
+        return result
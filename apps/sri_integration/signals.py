@@ -0,0 +1,19 @@
+"""
+Señales del módulo de Integración SRI
+Mantienen el catálogo de retenciones cargado en memoria
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import RetentionRate
+from .services import RetentionRateCatalog
+
+
+@receiver(post_save, sender=RetentionRate)
+@receiver(post_delete, sender=RetentionRate)
+def invalidate_retention_catalog(sender, instance, **kwargs):
+    """Cambios en porcentajes o vigencias del catálogo"""
+    RetentionRateCatalog.invalidate()
+    transaction.on_commit(RetentionRateCatalog.invalidate)
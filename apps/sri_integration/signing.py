@@ -0,0 +1,315 @@
+"""
+Firma electrónica XAdES-BES de comprobantes del SRI
+Firma envuelta RSA-SHA1 con el certificado PKCS#12 de la empresa
+
+Los fragmentos firmados (SignedInfo, SignedProperties, KeyInfo) se escriben
+directamente en forma canónica C14N: los digests se calculan sobre el mismo texto
+que se inserta en el documento, con los namespaces ds y etsi declarados en cada
+fragmento como los vería un canonicalizador inclusivo dentro de ds:Signature
+"""
+
+import base64
+import hashlib
+import secrets
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509 import load_der_x509_certificate
+from django.utils import timezone
+
+from apps.core.cache import TTLCache
+
+DS_NS = 'http://www.w3.org/2000/09/xmldsig#'
+ETSI_NS = 'http://uri.etsi.org/01903/v1.3.2#'
+NAMESPACES = f'xmlns:ds="{DS_NS}" xmlns:etsi="{ETSI_NS}"'
+
+C14N = 'http://www.w3.org/TR/2001/REC-xml-c14n-20010315'
+RSA_SHA1 = 'http://www.w3.org/2000/09/xmldsig#rsa-sha1'
+SHA1 = 'http://www.w3.org/2000/09/xmldsig#sha1'
+ENVELOPED = 'http://www.w3.org/2000/09/xmldsig#enveloped-signature'
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+class SignatureError(Exception):
+    """Certificado inválido o documento que no se puede firmar"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _sha1(text):
+    return _b64(hashlib.sha1(text.encode('utf-8')).digest())
+
+
+def _escape(text):
+    """Escape de texto C14N"""
+    return (
+        text.replace('&', '&amp;').replace('<', '&lt;')
+        .replace('>', '&gt;').replace('\r', '&#xD;')
+    )
+
+
+def _int_b64(value):
+    return _b64(value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+
+
+def load_certificate(p12_data, password):
+    """
+    Leer llave privada y certificado de firma de un archivo PKCS#12
+
+    Si el archivo trae la cadena de certificación, se usa el certificado cuya llave
+    pública corresponde a la llave privada
+
+    Returns:
+        tuple: (llave privada, certificado)
+    """
+    try:
+        key, certificate, additional = pkcs12.load_key_and_certificates(
+            p12_data, (password or '').encode('utf-8')
+        )
+    except ValueError as e:
+        raise SignatureError(f"No se pudo abrir el certificado: {e}")
+
+    if key is None:
+        raise SignatureError("El certificado no contiene llave privada")
+
+    public_numbers = key.public_key().public_numbers()
+    for candidate in [certificate] + list(additional or []):
+        if candidate is not None and candidate.public_key().public_numbers() == public_numbers:
+            return key, candidate
+    raise SignatureError("El certificado no corresponde a la llave privada")
+
+
+class SigningKey:
+    """
+    Llave de firma con los fragmentos del certificado ya calculados
+    (certificado en base64, digest, emisor, serie, módulo y exponente)
+    """
+
+    __slots__ = ('key', 'certificate_b64', 'certificate_digest', 'issuer_name',
+                 'serial_number', 'modulus', 'exponent')
+
+    def __init__(self, key, certificate):
+        certificate_der = certificate.public_bytes(serialization.Encoding.DER)
+        public_numbers = key.public_key().public_numbers()
+
+        self.key = key
+        self.certificate_b64 = _b64(certificate_der)
+        self.certificate_digest = _b64(hashlib.sha1(certificate_der).digest())
+        self.issuer_name = _escape(certificate.issuer.rfc4514_string())
+        self.serial_number = certificate.serial_number
+        self.modulus = _int_b64(public_numbers.n)
+        self.exponent = _int_b64(public_numbers.e)
+
+    @classmethod
+    def from_p12(cls, p12_data, password):
+        return cls(*load_certificate(p12_data, password))
+
+
+class SigningKeyCache:
+    """
+    Llaves de firma descifradas, en memoria del proceso (cada worker tiene la suya)
+
+    Abrir el PKCS#12 (derivación de la clave y descifrado) cuesta más que firmar
+    varios comprobantes: se hace una vez por certificado y proceso, y el TTL acota
+    cuánto tiempo permanece la llave descifrada en memoria
+    """
+
+    _cache = TTLCache(ttl_seconds=600)
+
+    @classmethod
+    def get(cls, p12_data, password):
+        """SigningKey del certificado, descifrándolo solo si no está en memoria o expiró"""
+        fingerprint = hashlib.sha256(
+            hashlib.sha256(p12_data).digest() + (password or '').encode('utf-8')
+        ).hexdigest()
+
+        return cls._cache.get(fingerprint, lambda: SigningKey.from_p12(p12_data, password))
+
+    @classmethod
+    def invalidate(cls):
+        """Descartar las llaves descifradas"""
+        cls._cache.invalidate()
+
+
+def sign_xml(xml, signing_key, signing_time=None, canonical=False):
+    """
+    Firmar un comprobante con XAdES-BES
+
+    Args:
+        xml: XML del comprobante (raíz con id="comprobante", sin firma)
+        signing_key: SigningKey (ver SigningKeyCache)
+        signing_time: Fecha y hora de firma (por defecto ahora)
+        canonical: El XML ya está en forma canónica (plantillas de
+            ComprobanteXMLBuilder): no se vuelve a canonicalizar
+
+    Returns:
+        str: XML firmado con declaración UTF-8
+    """
+    if canonical:
+        document = xml
+    else:
+        if xml.startswith('<?xml'):
+            xml = xml[xml.index('?>') + 2:].lstrip()
+        try:
+            document = ET.canonicalize(xml_data=xml)
+        except ET.ParseError as e:
+            raise SignatureError(f"XML mal formado: {e}")
+
+    signing_time = signing_time or timezone.localtime()
+    ids = secrets.randbelow(900000) + 100000
+    signature_id = f'Signature{ids}'
+    signed_properties_id = f'{signature_id}-SignedProperties{ids}'
+    certificate_id = f'Certificate{ids}'
+    reference_id = f'Reference-ID-{ids}'
+
+    signed_properties = (
+        f'<etsi:SignedProperties {NAMESPACES} Id="{signed_properties_id}">'
+        f'<etsi:SignedSignatureProperties>'
+        f'<etsi:SigningTime>{signing_time.isoformat(timespec="seconds")}</etsi:SigningTime>'
+        f'<etsi:SigningCertificate><etsi:Cert><etsi:CertDigest>'
+        f'<ds:DigestMethod Algorithm="{SHA1}"></ds:DigestMethod>'
+        f'<ds:DigestValue>{signing_key.certificate_digest}</ds:DigestValue>'
+        f'</etsi:CertDigest><etsi:IssuerSerial>'
+        f'<ds:X509IssuerName>{signing_key.issuer_name}</ds:X509IssuerName>'
+        f'<ds:X509SerialNumber>{signing_key.serial_number}</ds:X509SerialNumber>'
+        f'</etsi:IssuerSerial></etsi:Cert></etsi:SigningCertificate>'
+        f'</etsi:SignedSignatureProperties>'
+        f'<etsi:SignedDataObjectProperties>'
+        f'<etsi:DataObjectFormat ObjectReference="#{reference_id}">'
+        f'<etsi:Description>contenido comprobante</etsi:Description>'
+        f'<etsi:MimeType>text/xml</etsi:MimeType>'
+        f'</etsi:DataObjectFormat></etsi:SignedDataObjectProperties>'
+        f'</etsi:SignedProperties>'
+    )
+
+    key_info = (
+        f'<ds:KeyInfo {NAMESPACES} Id="{certificate_id}">'
+        f'<ds:X509Data><ds:X509Certificate>{signing_key.certificate_b64}</ds:X509Certificate></ds:X509Data>'
+        f'<ds:KeyValue><ds:RSAKeyValue>'
+        f'<ds:Modulus>{signing_key.modulus}</ds:Modulus>'
+        f'<ds:Exponent>{signing_key.exponent}</ds:Exponent>'
+        f'</ds:RSAKeyValue></ds:KeyValue>'
+        f'</ds:KeyInfo>'
+    )
+
+    signed_info = (
+        f'<ds:SignedInfo {NAMESPACES} Id="Signature-SignedInfo{ids}">'
+        f'<ds:CanonicalizationMethod Algorithm="{C14N}"></ds:CanonicalizationMethod>'
+        f'<ds:SignatureMethod Algorithm="{RSA_SHA1}"></ds:SignatureMethod>'
+        f'<ds:Reference Id="SignedPropertiesID{ids}" Type="http://uri.etsi.org/01903#SignedProperties" URI="#{signed_properties_id}">'
+        f'<ds:DigestMethod Algorithm="{SHA1}"></ds:DigestMethod>'
+        f'<ds:DigestValue>{_sha1(signed_properties)}</ds:DigestValue>'
+        f'</ds:Reference>'
+        f'<ds:Reference URI="#{certificate_id}">'
+        f'<ds:DigestMethod Algorithm="{SHA1}"></ds:DigestMethod>'
+        f'<ds:DigestValue>{_sha1(key_info)}</ds:DigestValue>'
+        f'</ds:Reference>'
+        f'<ds:Reference Id="{reference_id}" URI="#comprobante">'
+        f'<ds:Transforms><ds:Transform Algorithm="{ENVELOPED}"></ds:Transform></ds:Transforms>'
+        f'<ds:DigestMethod Algorithm="{SHA1}"></ds:DigestMethod>'
+        f'<ds:DigestValue>{_sha1(document)}</ds:DigestValue>'
+        f'</ds:Reference>'
+        f'</ds:SignedInfo>'
+    )
+
+    signature_value = signing_key.key.sign(signed_info.encode('utf-8'), padding.PKCS1v15(), hashes.SHA1())
+
+    # Dentro de ds:Signature los fragmentos heredan los namespaces del elemento padre
+    signature = (
+        f'<ds:Signature {NAMESPACES} Id="{signature_id}">'
+        f'{signed_info.replace(f" {NAMESPACES}", "", 1)}'
+        f'<ds:SignatureValue Id="SignatureValue{ids}">{_b64(signature_value)}</ds:SignatureValue>'
+        f'{key_info.replace(f" {NAMESPACES}", "", 1)}'
+        f'<ds:Object Id="{signature_id}-Object{ids}">'
+        f'<etsi:QualifyingProperties Target="#{signature_id}">'
+        f'{signed_properties.replace(f" {NAMESPACES}", "", 1)}'
+        f'</etsi:QualifyingProperties></ds:Object>'
+        f'</ds:Signature>'
+    )
+
+    closing = document.rindex('</')
+    return XML_DECLARATION + document[:closing] + signature + document[closing:]
+
+
+def sign_batch(payload):
+    """
+    Tarea de firma por lotes para el pool de procesos
+    (ver apps.core.documents.render_documents)
+
+    Todos los comprobantes del lote son de la misma empresa: la llave se obtiene una
+    vez (SigningKeyCache) y cada comprobante se firma sin volver a canonicalizarlo
+
+    Args:
+        payload: dict con 'documents' [(id, xml canónico)], 'p12' (bytes del
+            certificado), 'password' y 'signing_time' (ISO 8601, calculada en el
+            proceso principal)
+
+    Returns:
+        list: [(id, XML firmado en UTF-8 o None, error o None)]
+    """
+    signing_key = SigningKeyCache.get(payload['p12'], payload['password'])
+    signing_time = datetime.fromisoformat(payload['signing_time'])
+
+    results = []
+    for document_id, xml in payload['documents']:
+        try:
+            signed = sign_xml(xml, signing_key, signing_time, canonical=True)
+            results.append((document_id, signed.encode('utf-8'), None))
+        except Exception as e:
+            results.append((document_id, None, str(e)))
+    return results
+
+
+def verify_signature(signed_xml):
+    """
+    Verificar digest del comprobante y valor de la firma (usado por el SRI de prueba)
+
+    Returns:
+        tuple: (válida, mensaje)
+    """
+    if isinstance(signed_xml, bytes):
+        signed_xml = signed_xml.decode('utf-8')
+
+    start = signed_xml.find('<ds:Signature ')
+    end = signed_xml.find('</ds:Signature>')
+    if start < 0 or end < 0:
+        return False, 'El comprobante no está firmado'
+
+    body = signed_xml[:start] + signed_xml[end + len('</ds:Signature>'):]
+    if body.startswith('<?xml'):
+        body = body[body.index('?>') + 2:].lstrip()
+    signature = signed_xml[start:end]
+
+    try:
+        canonical = ET.canonicalize(xml_data=body)
+        root = ET.fromstring(signed_xml[start:end + len('</ds:Signature>')])
+    except ET.ParseError as e:
+        return False, f'XML mal formado: {e}'
+
+    digest = root.find(f'.//{{{DS_NS}}}Reference[@URI="#comprobante"]/{{{DS_NS}}}DigestValue')
+    if digest is None or digest.text != _sha1(canonical):
+        return False, 'El digest del comprobante no coincide'
+
+    info_start = signature.index('<ds:SignedInfo ')
+    info_end = signature.index('</ds:SignedInfo>') + len('</ds:SignedInfo>')
+    signed_info = signature[info_start:info_end].replace(
+        '<ds:SignedInfo ', f'<ds:SignedInfo {NAMESPACES} ', 1
+    )
+
+    certificate = load_der_x509_certificate(
+        base64.b64decode(root.find(f'.//{{{DS_NS}}}X509Certificate').text)
+    )
+    value = base64.b64decode(root.find(f'{{{DS_NS}}}SignatureValue').text)
+    try:
+        certificate.public_key().verify(
+            value, signed_info.encode('utf-8'), padding.PKCS1v15(), hashes.SHA1()
+        )
+    except Exception:
+        return False, 'Firma inválida'
+    return True, 'Firma válida'
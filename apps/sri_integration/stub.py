@@ -0,0 +1,220 @@
+"""
+Servidor SOAP local que imita los servicios offline del SRI
+Para pruebas y desarrollo: recibe comprobantes, verifica la firma y los autoriza
+sin salir de la máquina (ver comando sri_stub_server)
+
+    with SRIStubServer() as stub:
+        client = SRIClient(stub.recepcion_url, stub.autorizacion_url)
+"""
+
+import base64
+import threading
+import time
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .client import AUTORIZACION_NS, RECEPCION_NS, _find, _text
+from .electronic import AccessKey
+from .signing import verify_signature
+
+RESPONSE = (
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+    '{body}</soap:Body></soap:Envelope>'
+)
+
+
+def _message(code, text, info='', message_type='ERROR'):
+    return (
+        '<mensaje>'
+        f'<identificador>{code}</identificador><mensaje>{escape(text)}</mensaje>'
+        + (f'<informacionAdicional>{escape(info)}</informacionAdicional>' if info else '')
+        + f'<tipo>{message_type}</tipo></mensaje>'
+    )
+
+
+class SRIStubServer:
+    """
+    SRI de prueba en un hilo
+
+    Args:
+        port: Puerto (0 = uno libre)
+        authorization_delay: Segundos desde la recepción hasta que el comprobante
+            aparece autorizado (simula el procesamiento del SRI)
+        reject_keys: Claves de acceso que se devuelven en recepción
+        unauthorized_keys: Claves de acceso que quedan NO AUTORIZADO
+        fail_requests: Cantidad de solicitudes iniciales que responden HTTP 503
+        verify_signatures: Devolver comprobantes con firma inválida (mensaje 39)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, authorization_delay=0.0,
+                 reject_keys=(), unauthorized_keys=(), fail_requests=0,
+                 verify_signatures=True):
+        self.authorization_delay = authorization_delay
+        self.reject_keys = set(reject_keys)
+        self.unauthorized_keys = set(unauthorized_keys)
+        self.fail_requests = fail_requests
+        self.verify_signatures = verify_signatures
+
+        self.received = {}  # clave de acceso -> (hora de recepción, XML)
+        self.requests = {'recepcion': 0, 'autorizacion': 0}
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def recepcion_url(self):
+        return f'{self.url}/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl'
+
+    @property
+    def autorizacion_url(self):
+        return f'{self.url}/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = self.rfile.read(length)
+
+                with stub.lock:
+                    failing = stub.fail_requests > 0
+                    if failing:
+                        stub.fail_requests -= 1
+                if failing:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                try:
+                    body = stub.dispatch(payload)
+                    status = 200
+                except Exception as e:
+                    body = (
+                        '<soap:Fault><faultcode>soap:Server</faultcode>'
+                        f'<faultstring>{escape(str(e))}</faultstring></soap:Fault>'
+                    )
+                    status = 500
+
+                content = RESPONSE.format(body=body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def dispatch(self, payload):
+        root = ET.fromstring(payload)
+        if _find(root, 'validarComprobante') is not None:
+            with self.lock:
+                self.requests['recepcion'] += 1
+            return self.validate(base64.b64decode(_text(root, 'xml')))
+        if _find(root, 'autorizacionComprobante') is not None:
+            with self.lock:
+                self.requests['autorizacion'] += 1
+            return self.authorize(_text(root, 'claveAccesoComprobante'))
+        raise ValueError('Operación no soportada')
+
+    def validate(self, signed_xml):
+        """Respuesta de validarComprobante"""
+        access_key = ''
+        messages = []
+        try:
+            access_key = _text(ET.fromstring(signed_xml), 'claveAcceso')
+        except ET.ParseError:
+            messages.append(_message('35', 'ARCHIVO NO CUMPLE ESTRUCTURA XML'))
+
+        if not messages:
+            with self.lock:
+                already_received = access_key in self.received
+            if not AccessKey.is_valid(access_key):
+                messages.append(_message('80', 'ERROR EN LA ESTRUCTURA DE LA CLAVE DE ACCESO'))
+            elif already_received:
+                messages.append(_message('43', 'CLAVE ACCESO REGISTRADA'))
+            elif access_key in self.reject_keys:
+                messages.append(_message('65', 'FECHA DE EMISIÓN EXTEMPORANEA'))
+            elif self.verify_signatures:
+                valid, detail = verify_signature(signed_xml)
+                if not valid:
+                    messages.append(_message('39', 'FIRMA INVALIDA', detail))
+
+        if messages:
+            return (
+                f'<ns2:validarComprobanteResponse xmlns:ns2="{RECEPCION_NS}">'
+                '<RespuestaRecepcionComprobante><estado>DEVUELTA</estado><comprobantes>'
+                f'<comprobante><claveAcceso>{access_key}</claveAcceso><mensajes>{"".join(messages)}</mensajes></comprobante>'
+                '</comprobantes></RespuestaRecepcionComprobante></ns2:validarComprobanteResponse>'
+            )
+
+        with self.lock:
+            self.received[access_key] = (time.monotonic(), signed_xml.decode('utf-8'))
+        return (
+            f'<ns2:validarComprobanteResponse xmlns:ns2="{RECEPCION_NS}">'
+            '<RespuestaRecepcionComprobante><estado>RECIBIDA</estado><comprobantes></comprobantes>'
+            '</RespuestaRecepcionComprobante></ns2:validarComprobanteResponse>'
+        )
+
+    def authorize(self, access_key):
+        """Respuesta de autorizacionComprobante"""
+        with self.lock:
+            received = self.received.get(access_key)
+
+        authorizations = ''
+        count = 0
+        if received and time.monotonic() - received[0] >= self.authorization_delay:
+            count = 1
+            now = timezone.localtime().isoformat(timespec='seconds')
+            if access_key in self.unauthorized_keys:
+                authorizations = (
+                    '<autorizacion><estado>NO AUTORIZADO</estado>'
+                    f'<fechaAutorizacion>{now}</fechaAutorizacion><ambiente>PRUEBAS</ambiente>'
+                    f'<mensajes>{_message("56", "ERROR ESTABLECIMIENTO CERRADO")}</mensajes></autorizacion>'
+                )
+            else:
+                authorizations = (
+                    '<autorizacion><estado>AUTORIZADO</estado>'
+                    f'<numeroAutorizacion>{access_key}</numeroAutorizacion>'
+                    f'<fechaAutorizacion>{now}</fechaAutorizacion><ambiente>PRUEBAS</ambiente>'
+                    f'<comprobante><![CDATA[{received[1]}]]></comprobante><mensajes></mensajes></autorizacion>'
+                )
+
+        return (
+            f'<ns2:autorizacionComprobanteResponse xmlns:ns2="{AUTORIZACION_NS}">'
+            f'<RespuestaAutorizacionComprobante><claveAccesoConsultada>{access_key}</claveAccesoConsultada>'
+            f'<numeroComprobantes>{count}</numeroComprobantes>'
+            f'<autorizaciones>{authorizations}</autorizaciones>'
+            '</RespuestaAutorizacionComprobante></ns2:autorizacionComprobanteResponse>'
+        )
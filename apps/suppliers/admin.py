@@ -15,7 +15,7 @@ class PurchaseInvoiceLineInline(admin.TabularInline):
     """Inline para líneas de factura de compra"""
     model = PurchaseInvoiceLine
     extra = 1
-    fields = ('product', 'description', 'quantity', 'unit_cost', 'discount', 'iva_rate', 'account', 'line_total')
+    fields = ('product', 'description', 'quantity', 'unit_cost', 'discount', 'iva_rate', 'retention_concept', 'account', 'line_total')
     readonly_fields = ('line_total',)
     
     def get_queryset(self, request):
@@ -174,7 +174,7 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
         'print_retention_voucher_button',
         'purchase_invoice_buttons'
     )
-    list_filter = ('status', UserCompanyListFilter, 'date', 'payment_form', 'created_at')
+    list_filter = ('status', 'retention_sri_status', UserCompanyListFilter, 'date', 'payment_form', 'created_at')
     search_fields = ('internal_number', 'supplier_invoice_number', 'supplier__trade_name', 'supplier__identification')
     ordering = ('-date', '-internal_number')
     date_hierarchy = 'date'
@@ -187,7 +187,7 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
             'fields': ('date', 'due_date')
         }),
         ('Configuración', {
-            'fields': ('payment_form', 'payable_account', 'status')
+            'fields': ('payment_form', 'payable_account', 'warehouse', 'status')
         }),
         ('Montos Básicos', {
             'fields': ('subtotal', 'tax_amount', 'total'),
@@ -195,16 +195,20 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
         }),
         ('Retenciones Ecuatorianas - IMPLEMENTADO', {
             'fields': (
+                'manual_retention_rates',
                 ('iva_retention_percentage', 'iva_retention_amount'),
                 ('ir_retention_percentage', 'ir_retention_amount'),
                 'total_retentions',
                 'net_payable'
             ),
-            'description': 'Retenciones aplicadas según normativas ecuatorianas. Los cálculos son automáticos según la configuración del proveedor.',
+            'description': 'Retenciones aplicadas según normativas ecuatorianas. Los cálculos son automáticos por línea según el catálogo de retenciones del SRI y la configuración del proveedor, salvo que se marquen porcentajes manuales.',
             'classes': ('collapse',)
         }),
         ('Comprobante de Retención', {
-            'fields': ('retention_voucher_number', 'retention_voucher_date'),
+            'fields': (
+                'retention_voucher_number', 'retention_voucher_date',
+                'retention_sri_status', 'retention_authorization_number', 'retention_authorized_at'
+            ),
             'classes': ('collapse',)
         }),
         ('Información Adicional', {
@@ -216,7 +220,8 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
     readonly_fields = (
         'internal_number', 'subtotal', 'tax_amount', 'total',
         'iva_retention_amount', 'ir_retention_amount', 'total_retentions', 'net_payable',
-        'retention_voucher_number', 'retention_voucher_date'
+        'retention_voucher_number', 'retention_voucher_date',
+        'retention_sri_status', 'retention_authorization_number', 'retention_authorized_at'
     )
     inlines = [PurchaseInvoiceLineInline]
     
@@ -228,7 +233,8 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
         'mark_as_cancelled', 
         'create_journal_entries',
         'print_multiple_retention_vouchers',
-        'print_selected_purchase_invoices_pdf'
+        'print_selected_purchase_invoices_pdf',
+        'issue_electronic_retentions'
     ]
     
     def retentions_summary(self, obj):
@@ -346,7 +352,7 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
                     company_id__in=user_companies
                 )
             
-            elif db_field.name in ["payable_account"]:
+            elif db_field.name in ["payable_account", "warehouse"]:
                 # Solo cuentas de empresas del usuario
                 kwargs["queryset"] = db_field.remote_field.model.objects.filter(
                     company_id__in=user_companies
@@ -605,6 +611,20 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
         return mark_safe(' '.join(buttons))
     purchase_invoice_buttons.short_description = 'Factura Compra'
     
+    @admin.action(description='🧾 Emitir comprobante de retención electrónico (SRI)')
+    def issue_electronic_retentions(self, request, queryset):
+        """Poner en cola de emisión electrónica los comprobantes de retención"""
+        from apps.sri_integration.services import ElectronicDocumentService
+        
+        documents, errors = ElectronicDocumentService.issue_many(
+            ElectronicDocumentService.issue_retention,
+            queryset.filter(status__in=['validated', 'paid']).select_related('company', 'supplier')
+        )
+        if documents:
+            self.message_user(request, f'{len(documents)} comprobantes de retención en cola de emisión electrónica.')
+        for invoice, error in errors:
+            self.message_user(request, f'{invoice.internal_number}: {error}', level=messages.ERROR)
+    
     @admin.action(description='🖨️ Imprimir facturas seleccionadas (PDF)')
     def print_selected_purchase_invoices_pdf(self, request, queryset):
         """Imprimir múltiples facturas de compra en PDF (sin afectar sistemas existentes)"""
@@ -0,0 +1,128 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.companies.models import CompanySettings
+from apps.suppliers.models import PurchaseInvoice
+
+
+class Command(BaseCommand):
+    help = 'Revisar la numeración interna de facturas de compra: duplicados, huecos y contador desfasado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='ID de empresa (por defecto todas)'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Renumerar duplicados y facturas sin número, y adelantar el contador si está atrasado'
+        )
+
+    def handle(self, *args, **options):
+        pattern = re.compile(rf'^{re.escape(PurchaseInvoice.INTERNAL_NUMBER_PREFIX)}(\d+)$')
+
+        invoices = PurchaseInvoice.objects.all()
+        counters = CompanySettings.objects.all()
+        if options['company']:
+            invoices = invoices.filter(company_id=options['company'])
+            counters = counters.filter(company_id=options['company'])
+
+        # Una sola lectura de todos los números: (empresa, id, número)
+        companies = {}
+        for company_id, invoice_id, internal_number in invoices.order_by(
+            'company_id', 'pk'
+        ).values_list('company_id', 'pk', 'internal_number').iterator(chunk_size=2000):
+            numbering = companies.setdefault(company_id, {'used': {}, 'malformed': [], 'blank': []})
+            match = pattern.match(internal_number)
+            if match:
+                numbering['used'].setdefault(int(match.group(1)), []).append(invoice_id)
+            elif internal_number:
+                numbering['malformed'].append(internal_number)
+            else:
+                numbering['blank'].append(invoice_id)
+
+        next_values = dict(counters.values_list('company_id', 'purchase_invoice_sequential'))
+
+        issues = 0
+        fixed = 0
+        for company_id, numbering in sorted(companies.items()):
+            used = numbering['used']
+            duplicates = {sequential: ids for sequential, ids in used.items() if len(ids) > 1}
+            gaps = self._gaps(used)
+            last = max(used) if used else 0
+            next_value = next_values.get(company_id, 1)
+            counter_behind = next_value <= last
+
+            if not (duplicates or gaps or counter_behind or numbering['malformed'] or numbering['blank']):
+                continue
+
+            self.stdout.write(f'Empresa {company_id}: {len(used)} números, último {last}, contador {next_value}')
+            for sequential, ids in sorted(duplicates.items()):
+                self.stdout.write(self.style.WARNING(
+                    f'  Duplicado {PurchaseInvoice.format_internal_number(sequential)}: facturas {ids}'
+                ))
+            if gaps:
+                self.stdout.write(self.style.WARNING(f'  Huecos: {", ".join(gaps)}'))
+            if counter_behind:
+                self.stdout.write(self.style.WARNING(
+                    f'  Contador atrasado: siguiente {next_value}, último usado {last}'
+                ))
+            if numbering['malformed']:
+                self.stdout.write(self.style.WARNING(
+                    f'  Números con otro formato: {", ".join(numbering["malformed"][:20])}'
+                ))
+            if numbering['blank']:
+                self.stdout.write(self.style.WARNING(f'  Sin número: facturas {numbering["blank"]}'))
+
+            issues += (
+                sum(len(ids) - 1 for ids in duplicates.values()) + len(gaps) + counter_behind
+                + len(numbering['malformed']) + len(numbering['blank'])
+            )
+
+            if options['fix']:
+                fixed += self._fix(company_id, duplicates, numbering['blank'], last, counter_behind)
+
+        summary = f'Proceso completado. {len(companies)} empresas revisadas, {issues} inconsistencias.'
+        if options['fix']:
+            summary += f' {fixed} facturas renumeradas (los huecos no se rellenan).'
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def _gaps(self, used):
+        """Rangos de secuenciales faltantes entre el primero y el último usados"""
+        gaps = []
+        previous = None
+        for sequential in sorted(used):
+            if previous is not None and sequential > previous + 1:
+                start, end = previous + 1, sequential - 1
+                gaps.append(str(start) if start == end else f'{start}-{end}')
+            previous = sequential
+        return gaps
+
+    def _fix(self, company_id, duplicates, blank_ids, last, counter_behind):
+        """Adelantar el contador y asignar números nuevos; la primera factura de cada duplicado conserva el suyo"""
+        renumber_ids = [invoice_id for ids in duplicates.values() for invoice_id in ids[1:]] + blank_ids
+
+        with transaction.atomic():
+            if counter_behind:
+                CompanySettings.objects.get_or_create(company_id=company_id)
+                CompanySettings.objects.filter(company_id=company_id).update(
+                    purchase_invoice_sequential=last + 1
+                )
+
+            if not renumber_ids:
+                return 0
+
+            first = CompanySettings.allocate_sequential(
+                company_id, 'purchase_invoice_sequential', count=len(renumber_ids)
+            )
+            invoices = list(PurchaseInvoice.objects.filter(pk__in=renumber_ids).order_by('pk'))
+            for offset, invoice in enumerate(invoices):
+                invoice.internal_number = PurchaseInvoice.format_internal_number(first + offset)
+                self.stdout.write(f'  Factura {invoice.pk} -> {invoice.internal_number}')
+            PurchaseInvoice.objects.bulk_update(invoices, ['internal_number'])
+
+        return len(invoices)
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_warehouse_is_default'),
+        ('suppliers', '0003_change_iva_default_to_15'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='warehouse',
+            field=models.ForeignKey(blank=True, help_text='Bodega que recibe la mercadería (vacío: bodega por defecto de la empresa)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='purchase_invoices', to='inventory.warehouse', verbose_name='Bodega'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+def mark_existing_rates_as_manual(apps, schema_editor):
+    """
+    Hasta ahora cualquier porcentaje guardado en la factura se trataba como manual:
+    conservar ese comportamiento para las facturas existentes
+    """
+    PurchaseInvoice = apps.get_model('suppliers', 'PurchaseInvoice')
+    PurchaseInvoice.objects.filter(
+        models.Q(iva_retention_percentage__gt=0) | models.Q(ir_retention_percentage__gt=0)
+    ).update(manual_retention_rates=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0004_purchaseinvoice_warehouse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='manual_retention_rates',
+            field=models.BooleanField(default=False, help_text='Aplicar los porcentajes de la factura en lugar del catálogo de retenciones del SRI', verbose_name='Porcentajes de retención manuales'),
+        ),
+        migrations.AddField(
+            model_name='purchaseinvoiceline',
+            name='retention_concept',
+            field=models.CharField(blank=True, help_text='Código SRI del concepto de retención (vacío: porcentaje por defecto del proveedor)', max_length=10, verbose_name='Concepto retención IR'),
+        ),
+        migrations.RunPython(mark_existing_rates_as_manual, migrations.RunPython.noop),
+    ]
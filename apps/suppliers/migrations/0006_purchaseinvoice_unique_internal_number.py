@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:51
+
+import re
+
+from django.db import migrations, models
+
+# PurchaseInvoice.INTERNAL_NUMBER_PREFIX
+INTERNAL_NUMBER = re.compile(r'^FC-001-(\d+)$')
+
+
+def check_duplicate_internal_numbers(apps, schema_editor):
+    """La restricción no se puede crear con números repetidos: se corrigen con el comando de revisión"""
+    PurchaseInvoice = apps.get_model('suppliers', 'PurchaseInvoice')
+    duplicates = PurchaseInvoice.objects.exclude(internal_number='').values(
+        'company_id', 'internal_number'
+    ).annotate(total=models.Count('id')).filter(total__gt=1)
+    if duplicates.exists():
+        raise RuntimeError(
+            f"Hay {duplicates.count()} números internos de compra repetidos. "
+            f"Ejecute 'python manage.py check_purchase_numbering --fix' y vuelva a migrar."
+        )
+
+
+def advance_purchase_counters(apps, schema_editor):
+    """
+    Adelantar los contadores que quedaron detrás del último número usado
+    El número ya no se busca libre en la tabla: un contador atrasado haría fallar
+    cada factura nueva contra la restricción única
+    """
+    PurchaseInvoice = apps.get_model('suppliers', 'PurchaseInvoice')
+    CompanySettings = apps.get_model('companies', 'CompanySettings')
+
+    last_used = {}
+    for company_id, internal_number in PurchaseInvoice.objects.filter(
+        internal_number__startswith='FC-001-'
+    ).values_list('company_id', 'internal_number').iterator():
+        match = INTERNAL_NUMBER.match(internal_number)
+        if match:
+            last_used[company_id] = max(last_used.get(company_id, 0), int(match.group(1)))
+
+    for company_id, last in last_used.items():
+        CompanySettings.objects.get_or_create(company_id=company_id)
+        CompanySettings.objects.filter(
+            company_id=company_id, purchase_invoice_sequential__lte=last
+        ).update(purchase_invoice_sequential=last + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0005_purchaseinvoice_manual_retention_rates'),
+        ('companies', '0003_companysettings_purchase_invoice_sequential'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_internal_numbers, migrations.RunPython.noop),
+        migrations.RunPython(advance_purchase_counters, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='purchaseinvoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('internal_number', ''), _negated=True), fields=('company', 'internal_number'), name='unique_purchase_invoice_internal_number'),
+        ),
+    ]
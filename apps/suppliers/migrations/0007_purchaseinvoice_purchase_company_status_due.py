@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0006_purchaseinvoice_unique_internal_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseinvoice',
+            index=models.Index(fields=['company', 'status', 'due_date'], name='purchase_company_status_due'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0007_purchaseinvoice_purchase_company_status_due'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='retention_authorization_number',
+            field=models.CharField(blank=True, max_length=49, verbose_name='Autorización SRI Retención'),
+        ),
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='retention_authorized_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha Autorización Retención'),
+        ),
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='retention_sri_status',
+            field=models.CharField(blank=True, choices=[('', 'Sin emitir'), ('pending', 'En trámite'), ('authorized', 'Autorizado'), ('rejected', 'Devuelto o no autorizado'), ('failed', 'Error de emisión')], default='', max_length=10, verbose_name='Estado SRI Retención'),
+        ),
+    ]
@@ -108,61 +108,41 @@ class Supplier(BaseModel):
     def __str__(self):
         return f"{self.identification} - {self.trade_name}"
     
-    def get_automatic_retention_rates(self):
+    def get_automatic_retention_rates(self, on_date=None):
         """
-        Calcula automáticamente las tasas de retención según clasificación SRI
-        Basado en normativas ecuatorianas vigentes
+        Tasas de retención por defecto según clasificación SRI
+        Tomadas del catálogo de retenciones vigente a la fecha (por defecto hoy);
+        los porcentajes configurados en el proveedor reemplazan a los del catálogo
         """
-        rates = {
-            'iva_retention': Decimal('0.00'),
-            'ir_retention': Decimal('0.00')
-        }
+        from apps.sri_integration.services import RetentionService
         
         if not self.retention_agent:
-            return rates
-        
-        # Tasas de retención IVA según clasificación SRI
-        iva_rates = {
-            'persona_natural_no_obligada': Decimal('30.00'),
-            'persona_natural_obligada': Decimal('30.00'),
-            'sociedad': Decimal('70.00'),
-            'institucion_publica': Decimal('100.00'),
-            'regimen_rimpe': Decimal('30.00'),
-        }
-        
-        # Tasas de retención IR por defecto (pueden ser ajustadas manualmente)
-        ir_rates = {
-            'persona_natural_no_obligada': Decimal('2.00'),
-            'persona_natural_obligada': Decimal('2.00'),
-            'sociedad': Decimal('1.00'),
-            'institucion_publica': Decimal('1.00'),
-            'regimen_rimpe': Decimal('1.00'),
-        }
-        
-        # Usar tasas personalizadas si están configuradas, sino usar automáticas
-        rates['iva_retention'] = (
-            self.iva_retention_percentage if self.iva_retention_percentage > 0
-            else iva_rates.get(self.sri_classification, Decimal('0.00'))
-        )
+            return {
+                'iva_retention': Decimal('0.00'),
+                'ir_retention': Decimal('0.00')
+            }
         
-        rates['ir_retention'] = (
-            self.ir_retention_percentage if self.ir_retention_percentage > 0
-            else ir_rates.get(self.sri_classification, Decimal('0.00'))
+        return RetentionService.default_rates(
+            self.sri_classification,
+            on_date,
+            iva_percentage=self.iva_retention_percentage,
+            ir_percentage=self.ir_retention_percentage
         )
-        
-        return rates
     
-    def calculate_retentions(self, subtotal, iva_amount):
+    def calculate_retentions(self, subtotal, iva_amount, on_date=None):
         """
         Calcula los montos de retención para una compra específica
         
         Args:
             subtotal (Decimal): Monto base sin IVA
             iva_amount (Decimal): Monto del IVA
+            on_date (date): Fecha de la compra (por defecto hoy)
             
         Returns:
             dict: Montos calculados de retenciones
         """
+        from apps.sri_integration.services import RetentionService
+        
         if not self.retention_agent:
             return {
                 'iva_retention_amount': Decimal('0.00'),
@@ -170,23 +150,23 @@ class Supplier(BaseModel):
                 'net_payable': subtotal + iva_amount
             }
         
-        rates = self.get_automatic_retention_rates()
-        
-        # Calcular retenciones
-        iva_retention = iva_amount * (rates['iva_retention'] / Decimal('100'))
-        ir_retention = subtotal * (rates['ir_retention'] / Decimal('100'))
+        result = RetentionService.compute(
+            [(subtotal, iva_amount, '')],
+            self.sri_classification,
+            on_date,
+            iva_percentage=self.iva_retention_percentage,
+            ir_percentage=self.ir_retention_percentage
+        )
         
         # Monto neto a pagar (total menos retenciones)
-        total_amount = subtotal + iva_amount
-        total_retentions = iva_retention + ir_retention
-        net_payable = total_amount - total_retentions
+        net_payable = subtotal + iva_amount - result['total_retentions']
         
         return {
-            'iva_retention_rate': rates['iva_retention'],
-            'ir_retention_rate': rates['ir_retention'],
-            'iva_retention_amount': iva_retention.quantize(Decimal('0.01')),
-            'ir_retention_amount': ir_retention.quantize(Decimal('0.01')),
-            'total_retentions': total_retentions.quantize(Decimal('0.01')),
+            'iva_retention_rate': result['iva_retention_rate'],
+            'ir_retention_rate': result['ir_retention_rate'],
+            'iva_retention_amount': result['iva_retention_amount'],
+            'ir_retention_amount': result['ir_retention_amount'],
+            'total_retentions': result['total_retentions'],
             'net_payable': net_payable.quantize(Decimal('0.01'))
         }
 
@@ -207,6 +187,21 @@ class PurchaseInvoice(BaseModel):
         (CANCELLED, 'Anulada'),
     ]
     
+    # Estado del comprobante de retención electrónico en el SRI
+    # (lo actualiza apps.sri_integration)
+    SRI_PENDING = 'pending'
+    SRI_AUTHORIZED = 'authorized'
+    SRI_REJECTED = 'rejected'
+    SRI_FAILED = 'failed'
+    
+    SRI_STATUS_CHOICES = [
+        ('', 'Sin emitir'),
+        (SRI_PENDING, 'En trámite'),
+        (SRI_AUTHORIZED, 'Autorizado'),
+        (SRI_REJECTED, 'Devuelto o no autorizado'),
+        (SRI_FAILED, 'Error de emisión'),
+    ]
+    
     company = models.ForeignKey(Company, on_delete=models.CASCADE, verbose_name='Empresa')
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, verbose_name='Proveedor')
     
@@ -235,6 +230,17 @@ class PurchaseInvoice(BaseModel):
         verbose_name='Cuenta por pagar'
     )
     
+    # Bodega de recepción
+    warehouse = models.ForeignKey(
+        'inventory.Warehouse',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='purchase_invoices',
+        verbose_name='Bodega',
+        help_text='Bodega que recibe la mercadería (vacío: bodega por defecto de la empresa)'
+    )
+    
     # Montos
     subtotal = models.DecimalField(
         max_digits=12, 
@@ -296,6 +302,11 @@ class PurchaseInvoice(BaseModel):
         default=Decimal('0.00'),
         verbose_name='Monto Retención IR'
     )
+    manual_retention_rates = models.BooleanField(
+        default=False,
+        verbose_name='Porcentajes de retención manuales',
+        help_text='Aplicar los porcentajes de la factura en lugar del catálogo de retenciones del SRI'
+    )
     
     # Total retenciones y neto a pagar
     total_retentions = models.DecimalField(
@@ -324,6 +335,23 @@ class PurchaseInvoice(BaseModel):
         blank=True,
         verbose_name='Fecha Comprobante Retención'
     )
+    retention_sri_status = models.CharField(
+        max_length=10,
+        choices=SRI_STATUS_CHOICES,
+        blank=True,
+        default='',
+        verbose_name='Estado SRI Retención'
+    )
+    retention_authorization_number = models.CharField(
+        max_length=49,
+        blank=True,
+        verbose_name='Autorización SRI Retención'
+    )
+    retention_authorized_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Fecha Autorización Retención'
+    )
     
     # Usuario
     received_by = models.ForeignKey(
@@ -341,81 +369,60 @@ class PurchaseInvoice(BaseModel):
         verbose_name_plural = 'Facturas de Compra'
         unique_together = ['company', 'supplier', 'supplier_invoice_number']
         ordering = ['-date', '-supplier_invoice_number']
+        indexes = [
+            # Antigüedad de cuentas por pagar (apps.reports)
+            models.Index(fields=['company', 'status', 'due_date'], name='purchase_company_status_due'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'internal_number'],
+                condition=~models.Q(internal_number=''),
+                name='unique_purchase_invoice_internal_number'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.supplier_invoice_number} - {self.supplier.trade_name}"
     
+    INTERNAL_NUMBER_PREFIX = 'FC-001-'
+    
+    @classmethod
+    def format_internal_number(cls, sequential):
+        """Número interno a partir del secuencial: 5 -> FC-001-000005"""
+        return f"{cls.INTERNAL_NUMBER_PREFIX}{str(sequential).zfill(6)}"
+    
     def generate_internal_number(self):
         """
         Genera número interno automático para la factura de compra
-        MEJORADO: Sincroniza con facturas existentes para evitar duplicados y saltos
+        Toma el siguiente valor del contador de la empresa, bloqueado hasta el fin de
+        la transacción; huecos y duplicados se revisan fuera de línea con el comando
+        check_purchase_numbering
         """
         from apps.companies.models import CompanySettings
-        from django.db import transaction
-        
-        with transaction.atomic():
-            # Obtener o crear configuración de la empresa
-            settings, created = CompanySettings.objects.get_or_create(
-                company=self.company,
-                defaults={
-                    'invoice_sequential': 1,
-                    'purchase_invoice_sequential': 1,
-                    'credit_note_sequential': 1,
-                    'debit_note_sequential': 1,
-                    'withholding_sequential': 1,
-                }
-            )
-            
-            # MEJORA: Verificar si existe la última factura real para sincronizar
-            last_invoice = PurchaseInvoice.objects.filter(
-                company=self.company,
-                internal_number__startswith='FC-001-'
-            ).exclude(pk=self.pk if self.pk else None).order_by('-internal_number').first()
-            
-            if last_invoice:
-                # Extraer número de la última factura: FC-001-000005 -> 5
-                try:
-                    last_number_str = last_invoice.internal_number.split('-')[-1]
-                    last_number = int(last_number_str)
-                    
-                    # SINCRONIZACIÓN: Si hay desfase, corregir el secuencial
-                    expected_next = last_number + 1
-                    if settings.purchase_invoice_sequential != expected_next:
-                        settings.purchase_invoice_sequential = expected_next
-                        settings.save()
-                        
-                except (ValueError, IndexError):
-                    # Si no se puede parsear, usar el secuencial actual
-                    pass
-            
-            # Generar próximo número
-            sequential = str(settings.purchase_invoice_sequential).zfill(6)
-            internal_number = f"FC-001-{sequential}"
-            
-            # VERIFICACIÓN: Asegurar que no existe duplicado
-            while PurchaseInvoice.objects.filter(
-                company=self.company,
-                internal_number=internal_number
-            ).exclude(pk=self.pk if self.pk else None).exists():
-                settings.purchase_invoice_sequential += 1
-                sequential = str(settings.purchase_invoice_sequential).zfill(6)
-                internal_number = f"FC-001-{sequential}"
-            
-            # Incrementar secuencial para la próxima factura
-            settings.purchase_invoice_sequential += 1
-            settings.save()
-            
-            return internal_number
+        
+        sequential = CompanySettings.allocate_sequential(self.company, 'purchase_invoice_sequential')
+        return self.format_internal_number(sequential)
     
     def save(self, *args, **kwargs):
         """
         Generar número interno automático si no existe
         MEJORADO: Incluye generación automática de comprobantes de retención
         """
-        if not self.internal_number:
+        if self.internal_number:
+            self._save_document(*args, **kwargs)
+            return
+        
+        # Número y alta en la misma transacción: si el guardado falla el secuencial no se consume
+        try:
             with transaction.atomic():
                 self.internal_number = self.generate_internal_number()
-        
+                self._save_document(*args, **kwargs)
+        except Exception:
+            self.internal_number = ''
+            raise
+    
+    def _save_document(self, *args, **kwargs):
+        """Guardar la factura con vencimiento, cuenta por pagar, totales y retención"""
         # Calcular fecha de vencimiento si no se especifica
         if not self.due_date and self.supplier.payment_terms:
             from datetime import timedelta
@@ -442,45 +449,47 @@ class PurchaseInvoice(BaseModel):
         Calcular subtotal, impuestos, retenciones y total de la factura de compra
         COMPATIBLE: Mantiene funcionalidad original + nuevas retenciones
         """
+        from apps.sri_integration.services import RetentionService
+        
         lines = self.lines.all()
         
         subtotal = Decimal('0.00')
         tax_amount = Decimal('0.00')
+        line_values = []
         
         for line in lines:
-            line_subtotal = line.quantity * line.unit_cost
-            discount_amount = line_subtotal * (line.discount / 100)
-            line_net = line_subtotal - discount_amount
+            line_net, line_tax, concept_code = RetentionService.purchase_line_values(line)
+            line_values.append((line_net, line_tax, concept_code))
             
             subtotal += line_net
-            
-            # Calcular IVA usando la tasa de la línea
-            line_tax = line_net * (line.iva_rate / 100)
             tax_amount += line_tax
         
-        # NUEVO: Calcular retenciones automáticamente si aplica
+        # Calcular retenciones automáticamente si aplica
         retentions_data = {'iva_retention_amount': Decimal('0.00'), 'ir_retention_amount': Decimal('0.00')}
         
         if (self.supplier and 
             self.supplier.retention_agent and 
             subtotal > 0):
             
-            # Usar porcentajes específicos de la factura o automáticos del proveedor
-            if self.iva_retention_percentage > 0 or self.ir_retention_percentage > 0:
-                # Cálculo manual con porcentajes específicos
+            if self.manual_retention_rates:
+                # Cálculo manual con porcentajes específicos de la factura
                 iva_ret_amount = tax_amount * (self.iva_retention_percentage / Decimal('100'))
                 ir_ret_amount = subtotal * (self.ir_retention_percentage / Decimal('100'))
             else:
-                # Cálculo automático desde configuración del proveedor
-                retentions_data = self.supplier.calculate_retentions(subtotal, tax_amount)
-                iva_ret_amount = retentions_data['iva_retention_amount']
-                ir_ret_amount = retentions_data['ir_retention_amount']
+                # Cálculo por línea desde el catálogo de retenciones (concepto de cada línea)
+                result = RetentionService.compute(
+                    line_values,
+                    self.supplier.sri_classification,
+                    self.date,
+                    iva_percentage=self.supplier.iva_retention_percentage,
+                    ir_percentage=self.supplier.ir_retention_percentage
+                )
+                iva_ret_amount = result['iva_retention_amount']
+                ir_ret_amount = result['ir_retention_amount']
                 
-                # Actualizar porcentajes automáticos para referencia
-                if 'iva_retention_rate' in retentions_data:
-                    self.iva_retention_percentage = retentions_data['iva_retention_rate']
-                if 'ir_retention_rate' in retentions_data:
-                    self.ir_retention_percentage = retentions_data['ir_retention_rate']
+                # Porcentajes aplicados (efectivos si hay varios conceptos) para referencia
+                self.iva_retention_percentage = result['iva_retention_rate']
+                self.ir_retention_percentage = result['ir_retention_rate']
             
             retentions_data['iva_retention_amount'] = iva_ret_amount.quantize(Decimal('0.01'))
             retentions_data['ir_retention_amount'] = ir_ret_amount.quantize(Decimal('0.01'))
@@ -660,30 +669,23 @@ class PurchaseInvoice(BaseModel):
         try:
             from apps.companies.models import CompanySettings
             
-            # Obtener configuración de secuenciales
-            settings, created = CompanySettings.objects.get_or_create(
-                company=self.company,
-                defaults={'withholding_sequential': 1}
-            )
-            
-            # Generar número de comprobante según normativa ecuatoriana
-            # Formato: ESTABLECIMIENTO-PUNTO_EMISION-SECUENCIAL
-            establishment = getattr(self.company, 'establishment_code', '001').zfill(3)
-            emission_point = getattr(self.company, 'emission_point', '001').zfill(3)
-            sequential = str(settings.withholding_sequential).zfill(9)
-            
-            voucher_number = f"{establishment}-{emission_point}-{sequential}"
-            
-            # Actualizar factura con datos del comprobante
-            self.retention_voucher_number = voucher_number
-            self.retention_voucher_date = timezone.now().date()
-            
-            # Incrementar secuencial
-            settings.withholding_sequential += 1
-            settings.save()
-            
-            # Guardar factura con nueva información
-            super().save(update_fields=['retention_voucher_number', 'retention_voucher_date'])
+            # El número y el guardado van juntos: un error no consume secuencial
+            with transaction.atomic():
+                # Secuencial reservado con UPDATE atómico: no pisa los demás contadores
+                sequential = CompanySettings.allocate_sequential(self.company, 'withholding_sequential')
+                
+                # Generar número de comprobante según normativa ecuatoriana
+                # Formato: ESTABLECIMIENTO-PUNTO_EMISION-SECUENCIAL
+                establishment = getattr(self.company, 'establishment_code', '001').zfill(3)
+                emission_point = getattr(self.company, 'emission_point', '001').zfill(3)
+                voucher_number = f"{establishment}-{emission_point}-{str(sequential).zfill(9)}"
+                
+                # Actualizar factura con datos del comprobante
+                self.retention_voucher_number = voucher_number
+                self.retention_voucher_date = timezone.now().date()
+                
+                # Guardar factura con nueva información
+                super().save(update_fields=['retention_voucher_number', 'retention_voucher_date'])
             
             return voucher_number
             
@@ -824,6 +826,14 @@ class PurchaseInvoiceLine(BaseModel):
         verbose_name='IVA (%)'
     )
     
+    # Concepto de retención en la fuente (catálogo SRI)
+    retention_concept = models.CharField(
+        max_length=10,
+        blank=True,
+        verbose_name='Concepto retención IR',
+        help_text='Código SRI del concepto de retención (vacío: porcentaje por defecto del proveedor)'
+    )
+    
     # Cuenta contable (para gastos directos)
     account = models.ForeignKey(
         'accounting.ChartOfAccounts',
@@ -927,83 +937,15 @@ class PurchaseInvoiceLine(BaseModel):
         Crear movimiento de entrada en inventario al recibir compra
         Solo si es un producto físico que maneja inventario
         """
-        from apps.inventory.models import StockMovement, Warehouse
-        
-        # Obtener bodega principal de la empresa
-        main_warehouse = Warehouse.objects.filter(
-            company=self.purchase_invoice.company,
-            is_active=True
-        ).first()
-        
-        if not main_warehouse:
-            # Si no hay bodegas, crear una por defecto
-            main_warehouse = Warehouse.objects.create(
-                company=self.purchase_invoice.company,
-                code='001',
-                name='Bodega Principal',
-                address='Oficina principal',
-                responsible=self.purchase_invoice.received_by,
-                is_active=True
-            )
-        
-        # Verificar si ya existe un movimiento para esta línea de compra
-        existing_movement = StockMovement.objects.filter(
-            product=self.product,
-            warehouse=main_warehouse,
-            reference=f"Compra {self.purchase_invoice.internal_number}",
-            movement_type=StockMovement.IN,
-            quantity=self.quantity
-        ).first()
-        
-        if not existing_movement:
-            # Crear movimiento de entrada
-            movement = StockMovement.objects.create(
-                product=self.product,
-                warehouse=main_warehouse,
-                movement_type=StockMovement.IN,
-                quantity=self.quantity,
-                unit_cost=self.unit_cost,
-                total_cost=self.quantity * self.unit_cost,
-                reference=f"Compra {self.purchase_invoice.internal_number}",
-                description=f"Compra según factura {self.purchase_invoice.supplier_invoice_number} - Proveedor: {self.purchase_invoice.supplier.trade_name}",
-                created_by=self.purchase_invoice.received_by
-            )
-            
-            # Actualizar stock actual
-            self.update_stock_quantity(main_warehouse, movement)
-    
-    def update_stock_quantity(self, warehouse, movement):
-        """Actualizar la cantidad en stock después del movimiento"""
-        from apps.inventory.models import Stock, StockMovement
-        from django.utils import timezone
-        
-        # Obtener o crear registro de stock
-        stock, created = Stock.objects.get_or_create(
-            product=self.product,
-            warehouse=warehouse,
-            defaults={
-                'quantity': Decimal('0.00'),
-                'average_cost': self.unit_cost,
-                'last_movement': timezone.now()
-            }
-        )
-        
-        if movement.movement_type == StockMovement.IN:
-            # Entrada: aumentar stock y recalcular costo promedio
-            total_value_before = stock.quantity * stock.average_cost
-            total_value_new = movement.quantity * movement.unit_cost
-            total_quantity_after = stock.quantity + movement.quantity
-            
-            if total_quantity_after > 0:
-                stock.average_cost = (total_value_before + total_value_new) / total_quantity_after
-            
-            stock.quantity += movement.quantity
-        elif movement.movement_type == StockMovement.OUT:
-            # Salida: reducir stock
-            stock.quantity -= movement.quantity
-        
-        stock.last_movement = timezone.now()
-        stock.save()
+        from apps.inventory.services import InventoryLedgerService
+        from .services import PurchaseReceiptService
+        
+        # Un movimiento por línea de compra: si ya existe, no se vuelve a registrar
+        InventoryLedgerService.record_movements([PurchaseReceiptService.build_movement(
+            self.purchase_invoice,
+            self,
+            PurchaseReceiptService.warehouse_for(self.purchase_invoice)
+        )])
     
     def update_product_cost(self):
         """Actualizar el costo del producto con el nuevo costo de compra"""
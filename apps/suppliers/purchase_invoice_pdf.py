@@ -8,7 +8,7 @@ from io import BytesIO
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from apps.core.pdf_templates import get_sample_styles, paragraph_style
 from reportlab.lib.units import inch, cm, mm
 from reportlab.pdfgen import canvas
 from django.utils import timezone
@@ -40,10 +40,10 @@ def generate_purchase_invoice_pdf(purchase_invoice):
     )
     
     # Obtener estilos
-    styles = getSampleStyleSheet()
+    styles = get_sample_styles()
     
     # Estilos personalizados conforme regulaciones ecuatorianas
-    title_style = ParagraphStyle(
+    title_style = paragraph_style(
         'PurchaseInvoiceTitle',
         parent=styles['Heading1'],
         fontSize=16,
@@ -52,7 +52,7 @@ def generate_purchase_invoice_pdf(purchase_invoice):
         textColor=colors.darkblue
     )
     
-    company_style = ParagraphStyle(
+    company_style = paragraph_style(
         'CompanyInfo',
         parent=styles['Normal'],
         fontSize=10,
@@ -60,7 +60,7 @@ def generate_purchase_invoice_pdf(purchase_invoice):
         alignment=0,  # Izquierda
     )
     
-    supplier_style = ParagraphStyle(
+    supplier_style = paragraph_style(
         'SupplierInfo',
         parent=styles['Normal'],
         fontSize=9,
@@ -68,7 +68,7 @@ def generate_purchase_invoice_pdf(purchase_invoice):
         alignment=0,
     )
     
-    normal_style = ParagraphStyle(
+    normal_style = paragraph_style(
         'CustomNormal',
         parent=styles['Normal'],
         fontSize=9,
@@ -256,7 +256,7 @@ def generate_purchase_invoice_pdf(purchase_invoice):
     ]
     
     for info in footer_info:
-        story.append(Paragraph(info, ParagraphStyle(
+        story.append(Paragraph(info, paragraph_style(
             'Footer',
             parent=styles['Normal'],
             fontSize=8,
@@ -298,8 +298,8 @@ def generate_multiple_purchase_invoices_pdf(invoices):
     story = []
     
     # Título del documento
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
+    styles = get_sample_styles()
+    title_style = paragraph_style(
         'MultipleInvoicesTitle',
         parent=styles['Heading1'],
         fontSize=18,
@@ -309,7 +309,7 @@ def generate_multiple_purchase_invoices_pdf(invoices):
     )
     
     story.append(Paragraph(f"FACTURAS DE COMPRA - LOTE DE {len(invoices)} DOCUMENTOS", title_style))
-    story.append(Paragraph(f"Generado el: {timezone.now().strftime('%d/%m/%Y %H:%M')}", ParagraphStyle(
+    story.append(Paragraph(f"Generado el: {timezone.now().strftime('%d/%m/%Y %H:%M')}", paragraph_style(
         'SubTitle',
         parent=styles['Normal'],
         fontSize=10,
@@ -327,7 +327,7 @@ def generate_multiple_purchase_invoices_pdf(invoices):
         
         # Re-crear el story para esta factura específica
         # (esto es una simplificación, en un caso real se extraería el contenido)
-        story.append(Paragraph(f"FACTURA DE COMPRA #{invoice.internal_number}", ParagraphStyle(
+        story.append(Paragraph(f"FACTURA DE COMPRA #{invoice.internal_number}", paragraph_style(
             'InvoiceTitle',
             parent=styles['Heading2'],
             fontSize=14,
@@ -10,7 +10,7 @@ from reportlab.platypus import (
     SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
     PageBreak
 )
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from apps.core.pdf_templates import get_sample_styles, paragraph_style
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from reportlab.lib.units import mm, cm
@@ -49,10 +49,10 @@ def generate_purchase_invoice_pdf_enhanced(invoice):
     # ==================
     # ESTILOS DEL DOCUMENTO
     # ==================
-    styles = getSampleStyleSheet()
+    styles = get_sample_styles()
     
     # Estilo título principal
-    title_style = ParagraphStyle(
+    title_style = paragraph_style(
         'TitleStyle',
         parent=styles['Title'],
         fontSize=18,
@@ -63,7 +63,7 @@ def generate_purchase_invoice_pdf_enhanced(invoice):
     )
     
     # Estilo encabezado
-    header_style = ParagraphStyle(
+    header_style = paragraph_style(
         'HeaderStyle',
         parent=styles['Heading2'],
         fontSize=12,
@@ -74,7 +74,7 @@ def generate_purchase_invoice_pdf_enhanced(invoice):
     )
     
     # Estilo normal con espaciado
-    normal_style = ParagraphStyle(
+    normal_style = paragraph_style(
         'NormalStyle',
         parent=styles['Normal'],
         fontSize=10,
@@ -84,7 +84,7 @@ def generate_purchase_invoice_pdf_enhanced(invoice):
     )
     
     # Estilo para información importante
-    info_style = ParagraphStyle(
+    info_style = paragraph_style(
         'InfoStyle',
         parent=styles['Normal'],
         fontSize=10,
@@ -278,7 +278,7 @@ def generate_purchase_invoice_pdf_enhanced(invoice):
     Este documento es una representación impresa de la factura de compra registrada en el sistema.</i>
     """
     
-    story.append(Paragraph(footer_text, ParagraphStyle(
+    story.append(Paragraph(footer_text, paragraph_style(
         'FooterStyle',
         parent=styles['Normal'],
         fontSize=8,
@@ -306,6 +306,15 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
     Returns:
         BytesIO: Buffer con el PDF generado
     """
+    from django.db.models import Prefetch
+    from apps.suppliers.models import PurchaseInvoiceLine
+    
+    # Proveedor, empresa, forma de pago y líneas en pocas consultas
+    invoices = list(
+        invoices.select_related('company', 'supplier', 'payment_form').prefetch_related(
+            Prefetch('lines', queryset=PurchaseInvoiceLine.objects.select_related('product').order_by('id'))
+        )
+    )
     
     buffer = BytesIO()
     
@@ -320,10 +329,10 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
     )
     
     story = []
-    styles = getSampleStyleSheet()
+    styles = get_sample_styles()
     
     # Estilo título principal para portada
-    title_style = ParagraphStyle(
+    title_style = paragraph_style(
         'TitleStyle',
         parent=styles['Title'],
         fontSize=16,
@@ -341,7 +350,7 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
     story.append(Paragraph(f"FACTURAS DE COMPRA", title_style))
     story.append(Paragraph(f"LOTE DE {len(invoices)} DOCUMENTOS", title_style))
     story.append(Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 
-                          ParagraphStyle('SubTitle', parent=styles['Normal'], 
+                          paragraph_style('SubTitle', parent=styles['Normal'], 
                                        fontSize=12, alignment=TA_CENTER, textColor=colors.grey)))
     story.append(Spacer(1, 15*mm))
     
@@ -394,7 +403,7 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
             story.append(PageBreak())
         
         # Agregar título de factura individual
-        invoice_title_style = ParagraphStyle(
+        invoice_title_style = paragraph_style(
             'InvoiceTitle',
             parent=styles['Heading1'],
             fontSize=14,
@@ -414,7 +423,7 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
         # Recrear todo el contenido de la factura individual aquí
         # (copiando la lógica de generate_purchase_invoice_pdf_enhanced)
         
-        header_style = ParagraphStyle(
+        header_style = paragraph_style(
             'HeaderStyle',
             parent=styles['Heading2'],
             fontSize=12,
@@ -424,7 +433,7 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
             fontName='Helvetica-Bold'
         )
         
-        normal_style = ParagraphStyle(
+        normal_style = paragraph_style(
             'NormalStyle',
             parent=styles['Normal'],
             fontSize=10,
@@ -433,7 +442,7 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
             fontName='Helvetica'
         )
         
-        info_style = ParagraphStyle(
+        info_style = paragraph_style(
             'InfoStyle',
             parent=styles['Normal'],
             fontSize=10,
@@ -444,7 +453,7 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
         )
         
         # Título del documento
-        story.append(Paragraph("FACTURA DE COMPRA", ParagraphStyle(
+        story.append(Paragraph("FACTURA DE COMPRA", paragraph_style(
             'TitleStyleInvoice',
             parent=styles['Title'],
             fontSize=16,
@@ -512,10 +521,9 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
         # DETALLE DE PRODUCTOS/SERVICIOS
         story.append(Paragraph("DETALLE DE PRODUCTOS/SERVICIOS", header_style))
         
-        from apps.suppliers.models import PurchaseInvoiceLine
-        lines = PurchaseInvoiceLine.objects.filter(purchase_invoice=invoice).order_by('id')
+        lines = list(invoice.lines.all())
         
-        if lines.exists():
+        if lines:
             products_data = [
                 ['#', 'Producto/Servicio', 'Cant.', 'Precio Unit.', 'Subtotal', 'IVA %', 'IVA', 'Total']
             ]
@@ -609,7 +617,7 @@ def generate_multiple_purchase_invoices_pdf_enhanced(invoices):
     Lote de {len(invoices)} facturas de compra completas.</i>
     """
     
-    story.append(Paragraph(footer_text, ParagraphStyle(
+    story.append(Paragraph(footer_text, paragraph_style(
         'FooterStyle',
         parent=styles['Normal'],
         fontSize=8,
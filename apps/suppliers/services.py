@@ -0,0 +1,145 @@
+"""
+Servicios de Proveedores
+Recepción de facturas de compra: entradas de inventario y costo de productos
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Value, When
+from django.utils import timezone
+
+
+class PurchaseReceiptService:
+    """
+    Recepción de una factura de compra validada
+
+    Crea las entradas de inventario de todas las líneas con un solo
+    InventoryLedgerService.record_movements (stock, capas de costo y existencias en
+    bloque) y actualiza el costo de los productos con un UPDATE, sin pasar por
+    PurchaseInvoiceLine.save() ni recalcular los totales de la factura
+    """
+
+    COST_TOLERANCE = Decimal('0.01')
+
+    @classmethod
+    def receive(cls, purchase_invoice, lines=None):
+        """
+        Registrar la recepción de la factura (idempotente)
+
+        Las líneas que ya tienen movimiento de inventario se omiten; el costo del
+        producto se actualiza solo con las líneas recibidas por primera vez
+
+        Args:
+            purchase_invoice: PurchaseInvoice validada
+            lines: Líneas a recibir (por defecto todas las de la factura)
+
+        Returns:
+            dict: {'movements': [StockMovement creados], 'updated_costs': int}
+        """
+        from apps.inventory.models import StockMovement
+        from apps.inventory.services import InventoryLedgerService
+
+        result = {'movements': [], 'updated_costs': 0}
+        if purchase_invoice.status != purchase_invoice.VALIDATED:
+            return result
+
+        if lines is None:
+            lines = purchase_invoice.lines.select_related('product')
+        lines = [line for line in lines if line.product_id]
+        if not lines:
+            return result
+
+        recorded = InventoryLedgerService.recorded_lines(
+            StockMovement.SOURCE_PURCHASE_INVOICE, [purchase_invoice.pk]
+        )
+        first_receipt = not recorded
+
+        inventory_lines = []
+        cost_lines = []
+        for line in lines:
+            if line.product.manages_inventory and line.product.product_type == 'product':
+                if (StockMovement.SOURCE_PURCHASE_INVOICE, purchase_invoice.pk, line.pk) in recorded:
+                    continue
+                inventory_lines.append(line)
+                cost_lines.append(line)
+            elif first_receipt:
+                cost_lines.append(line)
+
+        with transaction.atomic():
+            if inventory_lines:
+                warehouse = cls.warehouse_for(purchase_invoice)
+                result['movements'] = InventoryLedgerService.record_movements(
+                    cls.build_movement(purchase_invoice, line, warehouse)
+                    for line in inventory_lines
+                )
+            result['updated_costs'] = cls._update_product_costs(cost_lines)
+
+        return result
+
+    @classmethod
+    def warehouse_for(cls, purchase_invoice):
+        """Bodega de la factura de compra o bodega por defecto de la empresa"""
+        from apps.inventory.services import WarehouseRouter
+
+        if purchase_invoice.warehouse_id:
+            return purchase_invoice.warehouse
+        return WarehouseRouter.default_for_company(
+            purchase_invoice.company,
+            responsible=purchase_invoice.received_by
+        )
+
+    @classmethod
+    def build_movement(cls, purchase_invoice, line, warehouse):
+        """Movimiento de entrada de una línea (sin guardar), con clave de origen por línea"""
+        from apps.inventory.models import StockMovement
+
+        return StockMovement(
+            product=line.product,
+            warehouse=warehouse,
+            movement_type=StockMovement.IN,
+            quantity=line.quantity,
+            unit_cost=line.unit_cost,
+            total_cost=line.quantity * line.unit_cost,
+            reference=f"Compra {purchase_invoice.internal_number}",
+            description=f"Compra según factura {purchase_invoice.supplier_invoice_number} - Proveedor: {purchase_invoice.supplier.trade_name}",
+            created_by=purchase_invoice.received_by,
+            source_type=StockMovement.SOURCE_PURCHASE_INVOICE,
+            source_id=purchase_invoice.pk,
+            source_line_id=line.pk
+        )
+
+    @classmethod
+    def _update_product_costs(cls, lines):
+        """
+        Costo del producto = costo unitario de compra (la última línea de cada producto)
+
+        Returns:
+            int: Productos actualizados
+        """
+        from apps.inventory.models import Product
+
+        costs = {}
+        for line in lines:
+            if line.unit_cost > 0:
+                costs[line.product_id] = (line.product, line.unit_cost)
+
+        changed = {
+            product_id: unit_cost
+            for product_id, (product, unit_cost) in costs.items()
+            if abs(product.cost_price - unit_cost) > cls.COST_TOLERANCE
+        }
+        if not changed:
+            return 0
+
+        Product.objects.filter(id__in=list(changed)).update(
+            cost_price=Case(
+                *[When(id=product_id, then=Value(unit_cost)) for product_id, unit_cost in changed.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            ),
+            updated_at=timezone.now()
+        )
+        for product_id, (product, unit_cost) in costs.items():
+            if product_id in changed:
+                product.cost_price = unit_cost
+        return len(changed)
@@ -4,7 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from apps.core.pdf_templates import get_sample_styles, paragraph_style
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
@@ -20,7 +20,7 @@ def generate_sri_compliant_voucher(invoice, elements, styles):
     Esta función se usa tanto para comprobantes individuales como múltiples
     """
     # Estilos personalizados
-    title_style = ParagraphStyle(
+    title_style = paragraph_style(
         'SRITitle',
         parent=styles['Heading1'],
         fontSize=14,
@@ -30,7 +30,7 @@ def generate_sri_compliant_voucher(invoice, elements, styles):
         fontName='Helvetica-Bold'
     )
     
-    heading_style = ParagraphStyle(
+    heading_style = paragraph_style(
         'SRIHeading',
         parent=styles['Heading2'],
         fontSize=11,
@@ -224,7 +224,7 @@ def generate_sri_compliant_voucher(invoice, elements, styles):
     • Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')} por el sistema ContaEC.
     """
     
-    footer_style = ParagraphStyle(
+    footer_style = paragraph_style(
         'Footer',
         parent=normal_style,
         fontSize=8,
@@ -239,6 +239,39 @@ def generate_sri_compliant_voucher(invoice, elements, styles):
     return elements
 
 
+def render_retention_voucher_pdf(invoice):
+    """
+    Renderiza el comprobante de retención SRI-compliant de una factura de compra
+    
+    Returns:
+        bytes: Contenido del PDF
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, leftMargin=0.5*inch, rightMargin=0.5*inch, 
+                           topMargin=0.5*inch, bottomMargin=0.5*inch)
+    
+    # Generar comprobante SRI-compliant
+    elements = generate_sri_compliant_voucher(invoice, [], get_sample_styles())
+    doc.build(elements)
+    
+    return buffer.getvalue()
+
+
+def retention_voucher_fingerprint(invoice):
+    """Datos que determinan el contenido del comprobante de retención"""
+    return {
+        'invoice': [
+            invoice.internal_number, invoice.supplier_invoice_number, invoice.date, invoice.status,
+            invoice.subtotal, invoice.tax_amount, invoice.total,
+            invoice.iva_retention_percentage, invoice.iva_retention_amount,
+            invoice.ir_retention_percentage, invoice.ir_retention_amount,
+            invoice.total_retentions, invoice.net_payable, invoice.updated_at,
+        ],
+        'supplier': [invoice.supplier_id, invoice.supplier.updated_at],
+        'company': [invoice.company_id, invoice.company.updated_at],
+    }
+
+
 @login_required
 def print_retention_voucher(request, invoice_id):
     """
@@ -275,27 +308,25 @@ def print_retention_voucher(request, invoice_id):
             messages.error(request, f"La factura {invoice.internal_number} no tiene retenciones aplicadas.")
             return HttpResponse("Sin retenciones", status=400)
         
-        # Generar PDF usando ReportLab con formato SRI
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, leftMargin=0.5*inch, rightMargin=0.5*inch, 
-                               topMargin=0.5*inch, bottomMargin=0.5*inch)
-        elements = []
-        
-        # Obtener estilos
-        styles = getSampleStyleSheet()
-        
-        # Generar comprobante SRI-compliant
-        elements = generate_sri_compliant_voucher(invoice, elements, styles)
+        filename = f"comprobante_retencion_{invoice.internal_number}.pdf"
         
-        # Generar PDF
-        doc.build(elements)
+        # Comprobantes emitidos: renderizar una vez y servir desde el almacén de documentos
+        if invoice.status in (PurchaseInvoice.VALIDATED, PurchaseInvoice.PAID):
+            from apps.core.document_store import RenderedDocumentStore
+            
+            return RenderedDocumentStore.serve(
+                request,
+                'retention_voucher',
+                invoice.pk,
+                retention_voucher_fingerprint(invoice),
+                lambda: render_retention_voucher_pdf(invoice),
+                filename
+            )
         
         # Crear respuesta HTTP con PDF para descarga
-        buffer.seek(0)
         response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="comprobante_retencion_{invoice.internal_number}.pdf"'
-        response.write(buffer.getvalue())
-        buffer.close()
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.write(render_retention_voucher_pdf(invoice))
         
         return response
         
@@ -355,7 +386,7 @@ def print_multiple_retention_vouchers(request):
         elements = []
         
         # Obtener estilos
-        styles = getSampleStyleSheet()
+        styles = get_sample_styles()
         
         # Generar cada comprobante individual con formato SRI
         for i, invoice in enumerate(invoices):
@@ -158,8 +158,19 @@ SRI_CONFIG = {
     'TIPO_EMISION': config('SRI_TIPO_EMISION', default='1'),  # 1=Normal
     'WS_RECEPCION': config('SRI_WS_RECEPCION', default='https://celcer.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl'),
     'WS_AUTORIZACION': config('SRI_WS_AUTORIZACION', default='https://celcer.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl'),
+    'TIMEOUT': config('SRI_TIMEOUT', default=30, cast=int),  # Segundos por llamada SOAP
+    'MAX_ATTEMPTS': config('SRI_MAX_ATTEMPTS', default=8, cast=int),  # Reintentos por etapa
+    'SIGNING_WORKERS': config('SRI_SIGNING_WORKERS', default=0, cast=int),  # 0 = número de CPUs
+    'CONCURRENCY': config('SRI_CONCURRENCY', default=8, cast=int),  # Llamadas simultáneas al SRI
+    'AUTHORIZATION_MAX_HOURS': config('SRI_AUTHORIZATION_MAX_HOURS', default=72, cast=int),  # Espera máxima de autorización
 }
 
+# Procesos para renderizar PDFs por lotes (0 = número de CPUs)
+DOCUMENT_RENDER_WORKERS = config('DOCUMENT_RENDER_WORKERS', default=0, cast=int)
+
+# Tamaño máximo del almacén de PDF renderizados en MEDIA_ROOT (desalojo LRU)
+DOCUMENT_STORE_MAX_BYTES = config('DOCUMENT_STORE_MAX_BYTES', default=512 * 1024 * 1024, cast=int)
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = config('CORS_ALLOW_ALL_ORIGINS', default=True, cast=bool)
 
@@ -172,6 +183,9 @@ SPECTACULAR_SETTINGS = {
 }
 
 # Logging
+# El FileHandler no crea la carpeta: sin ella falla cualquier comando en un checkout limpio
+os.makedirs(BASE_DIR / 'logs', exist_ok=True)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
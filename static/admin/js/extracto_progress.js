@@ -0,0 +1,63 @@
+/**
+ * Avance en vivo de extractos bancarios en cola o en procesamiento
+ * Consulta periódicamente la vista de avance del admin y actualiza las barras
+ */
+(function () {
+    'use strict';
+
+    var POLL_INTERVAL = 3000;
+    var ACTIVE_STATUSES = ['queued', 'processing'];
+
+    function progressUrl() {
+        var path = window.location.pathname;
+        var match = path.match(/^(.*\/banking\/extractobancario\/)/);
+        return match ? match[1] + 'progress/' : null;
+    }
+
+    function activeElements() {
+        var elements = document.querySelectorAll('.extracto-progress');
+        return Array.prototype.filter.call(elements, function (element) {
+            return ACTIVE_STATUSES.indexOf(element.dataset.status) !== -1;
+        });
+    }
+
+    function update(element, data) {
+        element.dataset.status = data.status;
+        element.querySelector('.extracto-progress-bar').style.width = data.percentage + '%';
+        element.querySelector('.extracto-progress-text').textContent =
+            data.rows_processed + ' / ' + data.rows_total + ' filas (' + data.status_display + ')';
+    }
+
+    function poll() {
+        var url = progressUrl();
+        var elements = activeElements();
+        if (!url || elements.length === 0) {
+            return;
+        }
+
+        var ids = elements.map(function (element) {
+            return element.dataset.extractoId;
+        });
+
+        fetch(url + '?ids=' + ids.join(','), {
+            credentials: 'same-origin',
+            headers: {'X-Requested-With': 'XMLHttpRequest'}
+        })
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                elements.forEach(function (element) {
+                    var item = data[element.dataset.extractoId];
+                    if (item) {
+                        update(element, item);
+                    }
+                });
+            })
+            .finally(function () {
+                window.setTimeout(poll, POLL_INTERVAL);
+            });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        window.setTimeout(poll, POLL_INTERVAL);
+    });
+})();